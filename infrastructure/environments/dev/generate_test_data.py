@@ -1,58 +1,98 @@
-import uuid
-from datetime import datetime, timedelta
-import boto3
-from typing import List, Dict
+import argparse
+import asyncio
 import os
+import sys
+import uuid
+from datetime import datetime, timedelta, UTC
+from typing import Iterator, Dict
 
-records_to_generate = 99999
-table_name = os.getenv('EVENT_STORE_TABLE_NAME')
-region = os.getenv('AWS_REGION')
-profile = os.getenv('AWS_PROFILE')
-
-def chunk_items(items: List[Dict], chunk_size: int = 25):
-    """Split items into chunks of specified size"""
-    for i in range(0, len(items), chunk_size):
-        yield items[i:i + chunk_size]
-
-session = boto3.Session(profile_name=profile, region_name=region)
-dynamodb = session.client('dynamodb')
-
-# Generate a single UUID for all records
-log_id = f"{records_to_generate}_{str(uuid.uuid4())}"
-base_time = datetime.now()
-
-# Generate all items first
-all_items = [
-    {
-        "PutRequest": {
-            "Item": {
-                "PK": {"S": log_id},
-                "SK": {"S": f"{base_time.strftime('%Y%m%d%H%M%S%f')}_LedgerCreated"},
-                "event_type": {"S": "src.domain.ledger.LedgerCreatedEvent"},
-                "initial_balance": {"N": "0.0"}
-            }
-        }
+from sh_dendrite.bulk import import_items, write_dump
+from sh_dendrite.dynamodb_event_store import COUNTER_ATTRIBUTE_PREFIX, DynamodbEventStore, LOG_METADATA_ITEM
+from sh_dendrite.event import next_event_id
+
+LEDGER_EVENTS_MODULE = "sh_api.domain.ledger"
+
+
+def generate_ledger_items(log_id: str, records_to_generate: int, initial_balance: float = 0.0) -> Iterator[Dict]:
+    """Yields a LedgerCreated event, `records_to_generate` credits of 1.0 and the log metadata item"""
+    base_time = datetime.now(UTC)
+    # ids, versions and the head as Aggregate.apply and the store write them
+    event_id = next_event_id(None, base_time, 1, "LedgerCreated")
+    yield {
+        "PK": log_id,
+        "SK": event_id,
+        "event_type": f"{LEDGER_EVENTS_MODULE}.LedgerCreatedEvent",
+        "event_id": event_id,
+        "created_time": base_time.isoformat(),
+        "applied_time": base_time.isoformat(),
+        "version": 1,
+        "aggregate_type": f"{LEDGER_EVENTS_MODULE}.Ledger",
+        "ledger_id": log_id,
+        "initial_balance": initial_balance,
     }
-] + [
-    {
-        "PutRequest": {
-            "Item": {
-                "PK": {"S": log_id},
-                "SK": {"S": f"{(base_time + timedelta(seconds=i+1)).strftime('%Y%m%d%H%M%S%f')}_LedgerCredited"},
-                "event_type": {"S": "src.domain.ledger.LedgerCreditedEvent"},
-                "amount": {"N": "1.0"}
-            }
-        }
-    } for i in range(records_to_generate)
-]
-
-# Process in batches of 25
-for batch in chunk_items(all_items):
-    response = dynamodb.batch_write_item(
-        RequestItems={
-            "sh-event-store": batch
+
+    balance = initial_balance
+    for version in range(2, records_to_generate + 2):
+        applied_time = base_time + timedelta(milliseconds=version - 1)
+        event_id = next_event_id(event_id, applied_time, version, "LedgerCredited")
+        yield {
+            "PK": log_id,
+            "SK": event_id,
+            "event_type": f"{LEDGER_EVENTS_MODULE}.LedgerCreditedEvent",
+            "event_id": event_id,
+            "created_time": applied_time.isoformat(),
+            "applied_time": applied_time.isoformat(),
+            "version": version,
+            "aggregate_type": f"{LEDGER_EVENTS_MODULE}.Ledger",
+            "ledger_id": log_id,
+            "amount": 1.0,
+            "current_balance": balance,
         }
-    )
-    print(f"Processed batch of {len(batch)} items")
+        balance += 1.0
+
+    yield {"PK": log_id, "SK": LOG_METADATA_ITEM, "last_event": event_id, "version": records_to_generate + 1,
+           f"{COUNTER_ATTRIBUTE_PREFIX}balance": balance}
+
+
+async def async_main(args):
+    log_id = f"{args.records}_{uuid.uuid4()}"
+    items = generate_ledger_items(log_id, args.records)
+
+    if args.output:
+        async def as_async(iterable):
+            for item in iterable:
+                yield item
+
+        count = await write_dump(args.output, as_async(items))
+        print(f"Wrote {count} items to {args.output}")
+    else:
+        store = DynamodbEventStore(args.table, args.region, args.profile, endpoint_url=args.endpoint_url)
+        try:
+            progress = await import_items(store, items, writers=args.writers,
+                                          on_progress=lambda p: print(p, file=sys.stderr))
+            print(f"Imported {progress}")
+        finally:
+            await store.close()
+
+    print(f"Generated events with log id: {log_id}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the event store with a single long ledger")
+    parser.add_argument("--records", type=int, default=99999, help="Number of credit events to generate")
+    parser.add_argument("--table", default=os.getenv('EVENT_STORE_TABLE_NAME'))
+    parser.add_argument("--region", default=os.getenv('AWS_REGION'))
+    parser.add_argument("--profile", default=os.getenv('AWS_PROFILE'))
+    parser.add_argument("--endpoint-url", default=os.getenv('DYNAMODB_ENDPOINT_URL'))
+    parser.add_argument("--writers", type=int, default=64, help="Concurrent batch writers")
+    parser.add_argument("--output", help="Write a JSONL/Parquet dump instead of writing to the table")
+    args = parser.parse_args()
+
+    if not args.output and not args.table:
+        parser.error("--table or EVENT_STORE_TABLE_NAME is required")
+
+    asyncio.run(async_main(args))
+
 
-print(f"Generated events with UUID: {log_id}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,37 @@ resource "aws_dynamodb_table" "event_store" {
         type = "S"
     }
 
+    # keys of the sparse indexes written by DynamodbEventStore(index_events=True): "<type>#<YYYYMM>"
+    # partitions, sorted by event id
+    attribute {
+        name = "type_bucket"
+        type = "S"
+    }
+
+    attribute {
+        name = "aggregate_bucket"
+        type = "S"
+    }
+
+    attribute {
+        name = "event_id"
+        type = "S"
+    }
+
+    global_secondary_index {
+        name            = "by_event_type"
+        hash_key        = "type_bucket"
+        range_key       = "event_id"
+        projection_type = "ALL"
+    }
+
+    global_secondary_index {
+        name            = "by_aggregate_type"
+        hash_key        = "aggregate_bucket"
+        range_key       = "event_id"
+        projection_type = "ALL"
+    }
+
     tags = var.tags
 
     lifecycle {
@@ -10,7 +10,35 @@ ALTER ROLE skinny_hedgehog_pg_rms SET search_path TO skinny_hedgehog_read_models
 CREATE TABLE IF NOT EXISTS skinny_hedgehog_read_models.ledger_state (
   ID_ledger VARCHAR(255) PRIMARY KEY,
   initial_balance NUMERIC,
-  current_balance NUMERIC
+  current_balance NUMERIC,
+  -- version of the last event applied to the row; replayed and duplicate events are ignored
+  version BIGINT
+);
+
+ALTER TABLE skinny_hedgehog_read_models.ledger_state ADD COLUMN IF NOT EXISTS version BIGINT;
+
+-- daily and monthly rollups of each ledger's credits and debits, by applied time in UTC
+CREATE TABLE IF NOT EXISTS skinny_hedgehog_read_models.ledger_statement (
+  ID_ledger VARCHAR(255) NOT NULL,
+  granularity VARCHAR(8) NOT NULL,    -- day or month
+  bucket_start DATE NOT NULL,
+  credits NUMERIC NOT NULL DEFAULT 0,
+  debits NUMERIC NOT NULL DEFAULT 0,
+  credit_count INTEGER NOT NULL DEFAULT 0,
+  debit_count INTEGER NOT NULL DEFAULT 0,
+  opening_balance NUMERIC,
+  closing_balance NUMERIC,
+  -- versions of the first and last events folded into the bucket, which place its opening and closing balances
+  first_version BIGINT,
+  version BIGINT,
+  PRIMARY KEY (ID_ledger, granularity, bucket_start)
+);
+
+-- the ledger events folded into the statements, so that replays and backfills count each one once
+CREATE TABLE IF NOT EXISTS skinny_hedgehog_read_models.ledger_statement_event (
+  ID_ledger VARCHAR(255) NOT NULL,
+  version BIGINT NOT NULL,
+  PRIMARY KEY (ID_ledger, version)
 );
 
 SELECT * FROM skinny_hedgehog_read_models.ledger_state;
\ No newline at end of file
@@ -0,0 +1,338 @@
+"""Load-tests the ledger API end to end on the in-process LocalDynamoDB stand-in.
+
+    python packages/sh_api/benchmarks/api_load.py --mix create=1,credit=4,debit=2,get=3 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import random
+import socket
+import statistics
+import sys
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import asdict, dataclass, field
+
+import httpx
+from fastapi import FastAPI
+
+from sh_api.domain.ledger import LedgerCreatedEvent, LedgerCreditedEvent, LedgerDebitEvent, LedgerReadModel
+from sh_api.routes.ledger import LedgerRouter
+from sh_dendrite.actor_runtime import ActorRuntime
+from sh_dendrite.aggregate import uuid_log_id_generator
+from sh_dendrite.aggregate_factory import AggregateFactory
+from sh_dendrite.dynamodb_event_store import DynamodbEventStore
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+from sh_dendrite.projector import PartitionedProjector
+
+OPERATIONS = ("create", "credit", "debit", "get")
+
+
+class FakeConnectionPool:
+    """Stands in for the psycopg pool behind LedgerReadModel; each statement costs `delay` seconds"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.rows: dict[str, tuple] = {}
+        self.statements = 0
+
+    @contextmanager
+    def connection(self):
+        yield self
+
+    @contextmanager
+    def cursor(self):
+        yield self
+
+    def executemany(self, query, rows) -> None:
+        if self.delay:
+            time.sleep(self.delay)
+        self.statements += 1
+        for row in rows:
+            self.rows[row[0]] = row
+
+
+class LoopLagMonitor:
+    """Samples how late the loop wakes a task that sleeps for `interval`"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: list[float] = []
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+def create_app(args, monitor: LoopLagMonitor) -> FastAPI:
+    """The ledger API wired as in sh_api.main, on stand-ins for DynamoDB and the read model database"""
+    local = LocalDynamoDB()
+    local.create_table("bench")
+    store = DynamodbEventStore("bench", "local", client=local.client())
+    projector = PartitionedProjector(LedgerReadModel(FakeConnectionPool(args.read_model_delay)),
+                                     key_of=lambda event: event.ledger_id, partitions=args.projector_partitions)
+    factory = AggregateFactory(store, uuid_log_id_generator,
+                               {event_type: [projector] for event_type in
+                                (LedgerCreatedEvent, LedgerCreditedEvent, LedgerDebitEvent)})
+    actor_runtime = ActorRuntime(factory) if args.actors else None
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        await projector.start()
+        monitor.start()
+        yield
+        await monitor.stop()
+        if actor_runtime:
+            await actor_runtime.close()
+        await projector.stop()
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(LedgerRouter(factory, actor_runtime=actor_runtime).get_router())
+    app.state.projector = projector
+    return app
+
+
+@dataclass
+class OperationResult:
+    count: int
+    errors: int
+    throughput: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+
+@dataclass
+class RunResult:
+    transport: str
+    actors: bool
+    mix: dict[str, int]
+    concurrency: int
+    elapsed: float
+    requests: int
+    throughput: float
+    cpu_ms_per_request: float
+    loop_lag_p99_ms: float
+    loop_lag_max_ms: float
+    operations: dict[str, OperationResult] = field(default_factory=dict)
+
+
+def percentiles(latencies: list[float]) -> tuple[float, float, float]:
+    if len(latencies) < 2:
+        value = latencies[0] * 1000 if latencies else 0.0
+        return value, value, value
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+    return cuts[49] * 1000, cuts[94] * 1000, cuts[98] * 1000
+
+
+class Workload:
+    def __init__(self, client: httpx.AsyncClient, mix: dict[str, int], seed: int):
+        self.client = client
+        self.operations = [operation for operation in OPERATIONS if mix.get(operation)]
+        self.weights = [mix[operation] for operation in self.operations]
+        self.random = random.Random(seed)
+        self.ledger_ids: list[str] = []
+        self.latencies: dict[str, list[float]] = {operation: [] for operation in self.operations}
+        self.errors: dict[str, int] = {operation: 0 for operation in self.operations}
+
+    async def create_ledgers(self, count: int) -> None:
+        for _ in range(max(count, 1)):     # operations other than create need a ledger to act on
+            response = await self.client.post("/ledger/")
+            response.raise_for_status()
+            self.ledger_ids.append(response.json()["ledger_id"])
+
+    def _request(self, operation: str):
+        if operation == "create":
+            return self.client.post("/ledger/")
+        ledger_id = self.random.choice(self.ledger_ids)
+        match operation:
+            case "credit":
+                return self.client.post(f"/ledger/{ledger_id}/credits", json={"amount": 1.0})
+            case "debit":
+                return self.client.post(f"/ledger/{ledger_id}/debits", json={"amount": 1.0})
+            case "get":
+                return self.client.get(f"/ledger/{ledger_id}")
+
+    async def worker(self, deadline: float, remaining: list[int]) -> None:
+        while time.perf_counter() < deadline and remaining[0] > 0:
+            remaining[0] -= 1
+            operation = self.random.choices(self.operations, self.weights)[0]
+            started = time.perf_counter()
+            try:
+                response = await self._request(operation)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            self.latencies[operation].append(time.perf_counter() - started)
+            if failed:
+                self.errors[operation] += 1
+            elif operation == "create":
+                self.ledger_ids.append(response.json()["ledger_id"])
+
+
+async def drive(client: httpx.AsyncClient, args, cpu_clock) -> tuple[Workload, float, float]:
+    """Runs the workload, returning it with the elapsed wall time and CPU time of the serving side"""
+    workload = Workload(client, args.mix, args.seed)
+    await workload.create_ledgers(args.ledgers)
+
+    remaining = [args.requests or sys.maxsize]
+    cpu_started, started = cpu_clock(), time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(*(workload.worker(deadline, remaining) for _ in range(args.concurrency)))
+    return workload, time.perf_counter() - started, cpu_clock() - cpu_started
+
+
+async def run_in_process(args) -> tuple[Workload, float, float, LoopLagMonitor]:
+    monitor = LoopLagMonitor()
+    app = create_app(args, monitor)
+    # ASGITransport does not run the lifespan, so it is entered here
+    async with app.router.lifespan_context(app):
+        # failures come back as 500s, as they would from a server, rather than raising in the client
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # client and app share the process and loop, so CPU time includes the client's share
+            workload, elapsed, cpu = await drive(client, args, time.process_time)
+        await app.state.projector.drain()
+    return workload, elapsed, cpu, monitor
+
+
+async def run_against_server(args) -> tuple[Workload, float, float, LoopLagMonitor]:
+    import uvicorn
+
+    monitor = LoopLagMonitor()
+    app = create_app(args, monitor)
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning", access_log=False))
+    # the server gets a thread and event loop of its own, so that its loop lag and CPU time are its own
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [listener]}, daemon=True)
+    thread.start()
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    server_clock = time.pthread_getcpuclockid(thread.ident)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{listener.getsockname()[1]}",
+                                     limits=limits) as client:
+            workload, elapsed, cpu = await drive(client, args, lambda: time.clock_gettime(server_clock))
+    finally:
+        server.should_exit = True
+        await asyncio.to_thread(thread.join)
+    return workload, elapsed, cpu, monitor
+
+
+def summarize(args, workload: Workload, elapsed: float, cpu: float, monitor: LoopLagMonitor) -> RunResult:
+    requests = sum(len(latencies) for latencies in workload.latencies.values())
+    lag = monitor.samples or [0.0]
+    result = RunResult(
+        transport="server" if args.server else "asgi",
+        actors=args.actors,
+        mix=args.mix,
+        concurrency=args.concurrency,
+        elapsed=elapsed,
+        requests=requests,
+        throughput=requests / elapsed,
+        cpu_ms_per_request=cpu / max(requests, 1) * 1000,
+        loop_lag_p99_ms=percentiles(lag)[2],
+        loop_lag_max_ms=max(lag) * 1000,
+    )
+    for operation, latencies in workload.latencies.items():
+        p50, p95, p99 = percentiles(latencies)
+        result.operations[operation] = OperationResult(len(latencies), workload.errors[operation],
+                                                       len(latencies) / elapsed, p50, p95, p99)
+    return result
+
+
+def report(result: RunResult) -> None:
+    print(f"{result.transport}: {result.requests} requests in {result.elapsed:.1f} s, "
+          f"{result.throughput:.0f} req/s, {result.cpu_ms_per_request:.2f} ms CPU/request, "
+          f"loop lag p99 {result.loop_lag_p99_ms:.2f} ms max {result.loop_lag_max_ms:.2f} ms")
+    for operation, op in result.operations.items():
+        print(f"{operation:>8}: {op.count:7d} ({op.errors} errors) {op.throughput:8.0f} req/s  "
+              f"p50 {op.p50_ms:7.2f} ms  p95 {op.p95_ms:7.2f} ms  p99 {op.p99_ms:7.2f} ms")
+
+
+def compare(result: RunResult, baseline: dict, threshold: float) -> list[str]:
+    """Returns a line for every operation whose throughput fell or whose p95/p99 rose by more than threshold percent"""
+    for setting in ("transport", "actors", "mix", "concurrency"):
+        if baseline.get(setting) != getattr(result, setting):
+            print(f"warning: the baseline was run with {setting} {baseline.get(setting)}, this run with "
+                  f"{getattr(result, setting)}")
+    regressions = []
+    for operation, op in result.operations.items():
+        before = baseline["operations"].get(operation)
+        if before is None:
+            continue
+        checks = [("throughput", before["throughput"], op.throughput, -1),
+                  ("p95", before["p95_ms"], op.p95_ms, 1),
+                  ("p99", before["p99_ms"], op.p99_ms, 1)]
+        for metric, old, new, worse in checks:
+            if old <= 0:
+                continue
+            change = (new - old) / old * 100
+            print(f"{operation:>8} {metric:>10}: {old:9.2f} -> {new:9.2f} ({change:+6.1f}%)")
+            if change * worse > threshold:
+                regressions.append(f"{operation} {metric} {change:+.1f}%")
+    return regressions
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        operation, _, weight = part.partition("=")
+        if operation not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {operation!r}, expected one of {', '.join(OPERATIONS)}")
+        mix[operation] = int(weight or 1)
+    return mix
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("create=1,credit=4,debit=2,get=3"),
+                        help="Weighted operations, e.g. create=1,credit=4,debit=2,get=3")
+    parser.add_argument("--concurrency", type=int, default=32, help="Requests in flight")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run for")
+    parser.add_argument("--requests", type=int, help="Stop after this many requests, if sooner")
+    parser.add_argument("--ledgers", type=int, default=100, help="Ledgers created before the run")
+    parser.add_argument("--read-model-delay", type=float, default=0.0,
+                        help="Seconds each read model statement takes")
+    parser.add_argument("--projector-partitions", type=int, default=4)
+    parser.add_argument("--actors", action="store_true", help="Serve ledger commands through ActorRuntime")
+    parser.add_argument("--server", action="store_true", help="Serve the app with uvicorn and drive it over HTTP")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="Write the run's results to this JSON file")
+    parser.add_argument("--compare", help="Compare against the results saved in this JSON file")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Regression threshold, in percent")
+    args = parser.parse_args()
+
+    run = run_against_server if args.server else run_in_process
+    result = summarize(args, *asyncio.run(run(args)))
+    report(result)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(asdict(result), f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(result, json.load(f), args.threshold)
+        if regressions:
+            print(f"regressed: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""Routes each ledger's requests to the worker process that owns it on a consistent-hash ring.
+
+Ownership is a routing hint, not a lock; the event store's concurrency checks keep a ledger served in two
+places correct.
+"""
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+FORWARDED_HEADER = "x-sh-affinity-forwarded"
+
+# routes under /ledger/ that are not a ledger id, e.g. transfers, which load two ledgers
+RESERVED_LEDGER_SEGMENTS = ("transfers",)
+
+# requests that load a single ledger aggregate; other paths are always served locally
+LEDGER_PATH = re.compile(rf"^/ledger/(?!(?:{'|'.join(RESERVED_LEDGER_SEGMENTS)})/?$)"
+                         r"(?P<log_id>[^/]+)(/(credits|debits|transactions))?/?$")
+
+# errors raised before a forwarded request reaches the owner, and methods safe to serve twice
+_UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+_IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# response headers that describe the hop rather than the response
+_HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "content-length", "content-encoding"}
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    def __init__(self, members: dict[str, str] | None = None, vnodes: int = 64):
+        """members maps worker ids to their addresses; each worker is placed on the ring vnodes times"""
+        self.vnodes = vnodes
+        self.members: dict[str, str] = dict(members or {})
+        self._points: list[int] = []
+        self._owners: list[str] = []
+        self._rebuild()
+
+    def add(self, worker_id: str, address: str) -> None:
+        self.members[worker_id] = address
+        self._rebuild()
+
+    def remove(self, worker_id: str) -> None:
+        self.members.pop(worker_id, None)
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        points = sorted((_hash(f"{worker_id}#{n}"), worker_id)
+                        for worker_id in self.members for n in range(self.vnodes))
+        self._points = [point for point, _ in points]
+        self._owners = [worker_id for _, worker_id in points]
+
+    def owner(self, key: str) -> str | None:
+        """The id of the worker owning the key, or None for an empty ring"""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+
+class FileMembership:
+    """Workers on one host (or sharing a volume) announce themselves with heartbeat files in a directory"""
+
+    def __init__(self, directory: str, worker_id: str, address: str, ttl: float = 10.0):
+        self.directory = directory
+        self.worker_id = worker_id
+        self.address = address
+        self.ttl = ttl
+
+    def _path(self, worker_id: str) -> str:
+        return os.path.join(self.directory, f"{worker_id}.worker")
+
+    def heartbeat(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(self.worker_id)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({"worker_id": self.worker_id, "address": self.address, "heartbeat": time.time()}, f)
+        os.replace(temp_path, path)
+
+    def leave(self) -> None:
+        try:
+            os.remove(self._path(self.worker_id))
+        except FileNotFoundError:
+            pass
+
+    def members(self) -> dict[str, str]:
+        """The live workers, by id, with their addresses"""
+        members = {}
+        now = time.time()
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return members
+        for name in names:
+            if not name.endswith(".worker"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    worker = json.load(f)
+            except (OSError, ValueError):
+                continue    # removed or being replaced while listing
+            if now - worker["heartbeat"] <= self.ttl:
+                members[worker["worker_id"]] = worker["address"]
+        return members
+
+
+def _client_for(address: str) -> httpx.AsyncClient:
+    if address.startswith("unix:"):
+        return httpx.AsyncClient(transport=httpx.AsyncHTTPTransport(uds=address[len("unix:"):]),
+                                 base_url="http://worker")
+    return httpx.AsyncClient(base_url=address)
+
+
+@dataclass
+class ForwardTarget:
+    worker_id: str
+    address: str
+
+
+class LogAffinity:
+    def __init__(self, membership: FileMembership, vnodes: int = 64, refresh_interval: float = 2.0,
+                 forward_timeout: float = 10.0):
+        """refresh_interval is how often the heartbeat is renewed and the ring rebuilt from the membership"""
+        self.membership = membership
+        self.worker_id = membership.worker_id
+        self.refresh_interval = refresh_interval
+        self.forward_timeout = forward_timeout
+        self.ring = HashRing({membership.worker_id: membership.address}, vnodes)
+        self._clients: dict[str, httpx.AsyncClient] = {}
+        self._task: asyncio.Task | None = None
+
+    def refresh(self) -> bool:
+        """Renews this worker's heartbeat and rebuilds the ring if the membership changed"""
+        self.membership.heartbeat()
+        members = self.membership.members()
+        members[self.worker_id] = self.membership.address     # a worker always routes to itself
+        if members == self.ring.members:
+            return False
+        logger.info("affinity ring changed", extra={"workers": sorted(members)})
+        self.ring = HashRing(members, self.ring.vnodes)
+        return True
+
+    def target_for(self, log_id: str) -> ForwardTarget | None:
+        """Where to forward a request for the log, or None when this worker owns it"""
+        owner = self.ring.owner(log_id)
+        if owner is None or owner == self.worker_id:
+            return None
+        return ForwardTarget(owner, self.ring.members[owner])
+
+    def client(self, address: str) -> httpx.AsyncClient:
+        client = self._clients.get(address)
+        if client is None:
+            client = self._clients[address] = _client_for(address)
+        return client
+
+    async def start(self) -> None:
+        await asyncio.to_thread(self.refresh)
+        self._task = asyncio.create_task(self._refresh_periodically())
+
+    async def _refresh_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except OSError:
+                logger.warning("failed to refresh affinity membership", exc_info=True)
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await asyncio.to_thread(self.membership.leave)
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+
+class AffinityMiddleware:
+    """ASGI middleware forwarding requests for ledgers owned by another worker to that worker"""
+
+    def __init__(self, app, affinity: LogAffinity, path_pattern: re.Pattern = LEDGER_PATH):
+        self.app = app
+        self.affinity = affinity
+        self.path_pattern = path_pattern
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        match = self.path_pattern.match(scope["path"])
+        if match is None or any(name.decode('latin-1') == FORWARDED_HEADER for name, _ in scope["headers"]):
+            return await self.app(scope, receive, send)
+        target = self.affinity.target_for(match.group("log_id"))
+        if target is None:
+            return await self.app(scope, receive, send)
+
+        body = await self._read_body(receive)
+        try:
+            response = await self._forward(scope, body, target)
+        except httpx.TransportError as e:
+            if isinstance(e, _UNSENT_ERRORS) or scope["method"] in _IDEMPOTENT_METHODS:
+                # the owner is gone or unreachable; serving here is correct, just colder
+                logger.warning("failed to forward request to owner, serving locally",
+                               extra={"owner": target.worker_id}, exc_info=True)
+                return await self.app(scope, self._replay(body, receive), send)
+            # the owner may have applied the command already, so serving it here could apply it twice
+            logger.warning("lost the owner's response to a forwarded request",
+                           extra={"owner": target.worker_id}, exc_info=True)
+            status = 504 if isinstance(e, httpx.TimeoutException) else 502
+            response = httpx.Response(status, json={"detail": "the ledger's owner did not respond"})
+
+        await send({
+            "type": "http.response.start",
+            "status": response.status_code,
+            "headers": [(name.encode('latin-1'), value.encode('latin-1'))
+                        for name, value in response.headers.items() if name.lower() not in _HOP_HEADERS]
+                       + [(b"content-length", str(len(response.content)).encode())],
+        })
+        await send({"type": "http.response.body", "body": response.content})
+
+    async def _forward(self, scope, body: bytes, target: ForwardTarget) -> httpx.Response:
+        headers = [(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope["headers"]
+                   if name.lower() not in (b"host", b"content-length")]
+        headers.append((FORWARDED_HEADER, self.affinity.worker_id))
+        return await self.affinity.client(target.address).request(
+            scope["method"], scope["path"], params=scope["query_string"].decode('latin-1'),
+            headers=headers, content=body, timeout=self.affinity.forward_timeout)
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    @staticmethod
+    def _replay(body: bytes, receive):
+        """A receive channel that delivers the already consumed body, then the client's own messages"""
+        sent = False
+
+        async def replay():
+            nonlocal sent
+            if sent:
+                return await receive()
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return replay
@@ -2,11 +2,17 @@ from dataclasses import dataclass
 import logging
 
 from sh_dendrite.aggregate import Aggregate
+from sh_dendrite.blind_append import BlindAppendUnavailable, BlindCommand
 from sh_dendrite.event import Event
 from sh_dendrite.event_handler import EventHandler
+from sh_dendrite.log_head import LogHead
+from sh_dendrite.structured_logging import LogSampler
 
 logger = logging.getLogger(__name__)
 
+# per-event debug output is sampled so that replays and bulk projections don't flood the log
+_event_log_sampler = LogSampler(every=100)
+
 #commands
 @dataclass
 class CreateLedgerCommand:
@@ -20,24 +26,56 @@ class CreditLedgerCommand:
 class DebitLedgerCommand:
     amount: float
 
-# events
+@dataclass
+class PostTransactionsCommand:
+    # credits and debits, applied in order
+    transactions: list[CreditLedgerCommand | DebitLedgerCommand]
+
+@dataclass
+class TransferCommand:
+    amount: float
+
+# events; each keeps the ledger's balance in the log head, for the blind commands below
 @dataclass
 class LedgerCreatedEvent(Event):
     ledger_id: str
     initial_balance: float
 
+    def head_counters(self) -> dict[str, float]:
+        return {"balance": self.initial_balance}
+
 @dataclass
 class LedgerCreditedEvent(Event):
     ledger_id: str
     amount: float
     current_balance: float
 
+    def head_counters(self) -> dict[str, float]:
+        return {"balance": self.current_balance + self.amount}
+
 @dataclass
 class LedgerDebitEvent(Event):
     ledger_id: str
     amount: float
     current_balance: float
 
+    def head_counters(self) -> dict[str, float]:
+        return {"balance": self.current_balance - self.amount}
+
+LEDGER_EVENT_TYPES = (LedgerCreatedEvent, LedgerCreditedEvent, LedgerDebitEvent)
+
+
+def balance_after(event: Event) -> float | None:
+    """The ledger's balance once the event is applied - current_balance holds the balance before it"""
+    match event:
+        case LedgerCreatedEvent():
+            return event.initial_balance
+        case LedgerCreditedEvent():
+            return event.current_balance + event.amount
+        case LedgerDebitEvent():
+            return event.current_balance - event.amount
+    return None
+
 # aggregate
 class Ledger(Aggregate):
     def __init__(self,
@@ -56,53 +94,171 @@ class Ledger(Aggregate):
             case LedgerDebitEvent():
                 self.balance -= event.amount
 
+    def snapshot_state(self) -> dict:
+        return {"balance": self.balance}
+
+    def restore_state(self, state: dict) -> None:
+        self.balance = state["balance"]
+
     async def create_ledger(self, command: CreateLedgerCommand):
         event = LedgerCreatedEvent(self.log_id, command.initial_balance)
         await self.apply(event)
 
+    def _check_transaction(self, amount: float) -> None:
+        # the same rules as the blind commands, so that a command is accepted whichever path it takes
+        if amount <= 0:
+            raise ValueError(f"transaction amounts must be positive, got {amount}")
+        if self.balance is None:
+            raise ValueError(f"ledger {self.log_id} does not exist")
+
     async def credit(self, command: CreditLedgerCommand):
+        self._check_transaction(command.amount)
         event = LedgerCreditedEvent(self.log_id, command.amount, self.balance)
         await self.apply(event)
 
     async def debit(self, command: DebitLedgerCommand):
+        self._check_transaction(command.amount)
+        if self.balance < command.amount:
+            raise ValueError(f"insufficient funds in ledger {self.log_id}")
         event = LedgerDebitEvent(self.log_id, command.amount, self.balance)
         await self.apply(event)
 
+    async def post_transactions(self, command: PostTransactionsCommand) -> list[float]:
+        """Applies all of the credits and debits as one atomic append and returns the balance after each"""
+        if self.balance is None:
+            raise ValueError(f"ledger {self.log_id} does not exist")
+
+        events = []
+        balances = []
+        balance = self.balance
+        for transaction in command.transactions:
+            if transaction.amount <= 0:
+                raise ValueError(f"transaction amounts must be positive, got {transaction.amount}")
+            match transaction:
+                case CreditLedgerCommand():
+                    events.append(LedgerCreditedEvent(self.log_id, transaction.amount, balance))
+                    balance += transaction.amount
+                case DebitLedgerCommand():
+                    events.append(LedgerDebitEvent(self.log_id, transaction.amount, balance))
+                    balance -= transaction.amount
+            balances.append(balance)
+
+        await self.apply_many(events)
+        return balances
+
+# blind commands: credits and debits need no more of the ledger than its balance, which the log head keeps,
+# so they can be appended without loading the ledger (see AggregateFactory.append_blind)
+def _head_balance(head: LogHead, amount: float) -> float:
+    if amount <= 0:
+        raise ValueError(f"transaction amounts must be positive, got {amount}")
+    if head.is_empty:
+        raise ValueError(f"ledger {head.log_id} does not exist")
+    if "balance" not in head.counters:
+        raise BlindAppendUnavailable(f"the head of ledger {head.log_id} keeps no balance")
+    return head.counters["balance"]
+
+@dataclass
+class BlindCreditCommand(BlindCommand):
+    amount: float
+
+    def events(self, head: LogHead) -> list[Event]:
+        return [LedgerCreditedEvent(head.log_id, self.amount, _head_balance(head, self.amount))]
+
+    def deltas(self) -> dict[str, float]:
+        return {"balance": self.amount}
+
+@dataclass
+class BlindDebitCommand(BlindCommand):
+    amount: float
+
+    def events(self, head: LogHead) -> list[Event]:
+        balance = _head_balance(head, self.amount)
+        if balance < self.amount:
+            raise ValueError(f"insufficient funds in ledger {head.log_id}")
+        return [LedgerDebitEvent(head.log_id, self.amount, balance)]
+
+    def minimums(self, head: LogHead) -> dict[str, float]:
+        # the head may have moved since it was read; the store checks again as it appends
+        return {"balance": self.amount}
+
+    def deltas(self) -> dict[str, float]:
+        return {"balance": -self.amount}
+
+async def transfer(source: Ledger, target: Ledger, command: TransferCommand) -> None:
+    """Debits source and credits target; atomic when both ledgers are enlisted in one UnitOfWork"""
+    if command.amount <= 0:
+        raise ValueError(f"transfer amounts must be positive, got {command.amount}")
+    if source.log_id == target.log_id:
+        raise ValueError("cannot transfer from a ledger to itself")
+    for ledger in (source, target):
+        if ledger.balance is None:
+            raise ValueError(f"ledger {ledger.log_id} does not exist")
+    await source.debit(DebitLedgerCommand(command.amount))
+    await target.credit(CreditLedgerCommand(command.amount))
+
+@dataclass
+class LedgerState:
+    """A ledger's row in the read model"""
+    ledger_id: str
+    initial_balance: float | None
+    current_balance: float | None
+    version: int | None     # of the last event projected into the row
+
 # Note: at some point, it will likely make sense to create a base class for different
 # types of read models (e.g. RelationalReadModel, TodoListReadModel)
 class LedgerReadModel(EventHandler):
-    def __init__(self, db_connection):
-        self.db_connection = db_connection
+    def __init__(self, connection_pool):
+        # a psycopg_pool.ConnectionPool; each handled batch of events borrows one connection
+        self.connection_pool = connection_pool
 
     def handle_event(self, events):
+        # each row records the version of the last event applied to it, so a batch that is replayed or
+        # delivered twice leaves the row unchanged; within a batch only the latest state of each ledger
+        # is written, with one statement for the batch
+        rows: dict[str, tuple] = {}
         for event in events:
-            logger.info(f"Event type: {type(event).__name__}, value: {event}")
-            match event:
-                case LedgerCreatedEvent():
-                    e: LedgerCreatedEvent = event
-                    self.create_ledger_state(e.ledger_id, e.initial_balance)
-                case LedgerCreditedEvent():
-                    e: LedgerCreditedEvent = event
-                    self.update_ledger_balance(e.ledger_id, e.current_balance)
-                case LedgerDebitEvent():
-                    e: LedgerDebitEvent = event
-                    self.update_ledger_balance(e.ledger_id, e.current_balance)
-
-    def create_ledger_state(self, id_ledger, initial_balance):
+            if logger.isEnabledFor(logging.DEBUG) and _event_log_sampler():
+                logger.debug("handling event %s", event.event_id, extra={"event_type": type(event).__name__})
+            if not isinstance(event, LEDGER_EVENT_TYPES):
+                continue
+            initial_balance = event.initial_balance if isinstance(event, LedgerCreatedEvent) else None
+            if initial_balance is None and event.ledger_id in rows:
+                initial_balance = rows[event.ledger_id][1]
+            rows[event.ledger_id] = (event.ledger_id, initial_balance, balance_after(event), event.version)
+
+        if rows:
+            with self.connection_pool.connection() as conn:
+                self.upsert_ledger_states(conn, list(rows.values()))
+
+    def upsert_ledger_states(self, conn, rows):
+        """rows are (id_ledger, initial_balance, current_balance, version); older versions are ignored"""
         query = """
-        INSERT INTO skinny_hedgehog_read_models.ledger_state (ID_ledger, initial_balance, current_balance)
-        VALUES (%s, %s, %s)
+        INSERT INTO skinny_hedgehog_read_models.ledger_state AS ledger (ID_ledger, initial_balance, current_balance, version)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (ID_ledger) DO UPDATE
+        SET initial_balance = COALESCE(ledger.initial_balance, EXCLUDED.initial_balance),
+            current_balance = EXCLUDED.current_balance,
+            version = EXCLUDED.version
+        WHERE ledger.version IS NULL OR EXCLUDED.version IS NULL OR ledger.version < EXCLUDED.version
         """
-        with self.db_connection.cursor() as cursor:
-            cursor.execute(query, (id_ledger, initial_balance, initial_balance))
-        self.db_connection.commit()
+        with conn.cursor() as cursor:
+            cursor.executemany(query, rows)
 
-    def update_ledger_balance(self, id_ledger, current_balance):
+    def get_ledger_state(self, ledger_id: str) -> LedgerState | None:
         query = """
-        UPDATE skinny_hedgehog_read_models.ledger_state
-        SET current_balance = %s
+        SELECT ID_ledger, initial_balance, current_balance, version
+        FROM skinny_hedgehog_read_models.ledger_state
         WHERE ID_ledger = %s
         """
-        with self.db_connection.cursor() as cursor:
-            cursor.execute(query, (current_balance, id_ledger))
-        self.db_connection.commit()
\ No newline at end of file
+        with self.connection_pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, (ledger_id,))
+                row = cursor.fetchone()
+        if row is None:
+            return None
+        ledger_id, initial_balance, current_balance, version = row
+        # NUMERIC columns read back as Decimal
+        return LedgerState(ledger_id,
+                           float(initial_balance) if initial_balance is not None else None,
+                           float(current_balance) if current_balance is not None else None,
+                           version)
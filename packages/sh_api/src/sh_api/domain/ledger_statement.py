@@ -0,0 +1,196 @@
+from dataclasses import dataclass
+from datetime import date, datetime, UTC
+from typing import Iterable
+import asyncio
+import logging
+
+from sh_dendrite.event import Event
+from sh_dendrite.event_handler import EventHandler
+from sh_dendrite.event_store import EventStore
+
+from sh_api.domain.ledger import LedgerCreditedEvent, LedgerDebitEvent, balance_after
+
+logger = logging.getLogger(__name__)
+
+STATEMENT_EVENT_TYPES = (LedgerCreditedEvent, LedgerDebitEvent)
+GRANULARITIES = ("day", "month")
+
+
+def bucket_start(time: datetime, granularity: str) -> date:
+    """The first day of the bucket the time falls in, in UTC"""
+    day = time.astimezone(UTC).date() if time.tzinfo else time.date()
+    return day if granularity == "day" else day.replace(day=1)
+
+
+@dataclass
+class StatementBucket:
+    """A ledger's credits and debits over a day or a month"""
+    ledger_id: str
+    granularity: str
+    bucket_start: date
+    credits: float = 0.0
+    debits: float = 0.0
+    credit_count: int = 0
+    debit_count: int = 0
+    opening_balance: float | None = None    # before the first event of the bucket
+    closing_balance: float | None = None    # after the last event of the bucket
+    first_version: int | None = None        # of the first and last events folded into the bucket
+    version: int | None = None
+
+
+BucketKey = tuple[str, str, date]   # ledger, granularity, bucket start
+
+
+def fold_statement(events: Iterable[Event]) -> dict[BucketKey, StatementBucket]:
+    """Rolls the events up into the changes to make to each bucket"""
+    changes: dict[BucketKey, StatementBucket] = {}
+    for event in events:
+        if not isinstance(event, STATEMENT_EVENT_TYPES):
+            continue
+        for granularity in GRANULARITIES:
+            key = (event.ledger_id, granularity, bucket_start(event.applied_time, granularity))
+            change = changes.get(key)
+            if change is None:
+                change = changes[key] = StatementBucket(*key)
+            if isinstance(event, LedgerCreditedEvent):
+                change.credits += event.amount
+                change.credit_count += 1
+            else:
+                change.debits += event.amount
+                change.debit_count += 1
+            # events arrive in log order, except that a backfill may fold the start of a bucket after its end
+            if change.first_version is None or (event.version or 0) < change.first_version:
+                change.first_version = event.version
+                change.opening_balance = event.current_balance
+            if change.version is None or (event.version or 0) >= change.version:
+                change.version = event.version
+                change.closing_balance = balance_after(event)
+    return changes
+
+
+class LedgerStatementReadModel(EventHandler):
+    """Daily and monthly rollups of each ledger's credits and debits, by applied time in UTC"""
+    def __init__(self, connection_pool):
+        # a psycopg_pool.ConnectionPool; each handled batch borrows one connection for one transaction
+        self.connection_pool = connection_pool
+
+    def handle_event(self, events):
+        events = [event for event in events if isinstance(event, STATEMENT_EVENT_TYPES)]
+        if not events:
+            return
+        with self.connection_pool.connection() as conn:
+            events = self.claim_events(conn, events)
+            if events:
+                self.upsert_buckets(conn, [change for _, change in sorted(fold_statement(events).items())])
+
+    def claim_events(self, conn, events: list[Event]) -> list[Event]:
+        """
+        The events not folded before, marked as folded in the batch's transaction; events without a version
+        cannot be told apart from replays and are always folded
+        """
+        versioned = sorted({(event.ledger_id, event.version) for event in events if event.version is not None})
+        claimed = set()
+        if versioned:
+            query = """
+            INSERT INTO skinny_hedgehog_read_models.ledger_statement_event (ID_ledger, version)
+            SELECT * FROM unnest(%s::varchar[], %s::bigint[])
+            ON CONFLICT DO NOTHING
+            RETURNING ID_ledger, version
+            """
+            ledger_ids, versions = zip(*versioned)
+            with conn.cursor() as cursor:
+                cursor.execute(query, (list(ledger_ids), list(versions)))
+                claimed = set(cursor.fetchall())
+        return [event for event in events
+                if event.version is None or (event.ledger_id, event.version) in claimed]
+
+    def upsert_buckets(self, conn, changes: list[StatementBucket]):
+        """Adds the changes to their buckets; claim_events has left out the events the buckets already hold"""
+        query = """
+        INSERT INTO skinny_hedgehog_read_models.ledger_statement AS statement (
+            ID_ledger, granularity, bucket_start, credits, debits, credit_count, debit_count,
+            opening_balance, closing_balance, first_version, version)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (ID_ledger, granularity, bucket_start) DO UPDATE
+        SET credits = statement.credits + EXCLUDED.credits,
+            debits = statement.debits + EXCLUDED.debits,
+            credit_count = statement.credit_count + EXCLUDED.credit_count,
+            debit_count = statement.debit_count + EXCLUDED.debit_count,
+            opening_balance = CASE WHEN EXCLUDED.first_version < statement.first_version
+                                   THEN EXCLUDED.opening_balance ELSE statement.opening_balance END,
+            closing_balance = CASE WHEN statement.version IS NULL OR EXCLUDED.version >= statement.version
+                                   THEN EXCLUDED.closing_balance ELSE statement.closing_balance END,
+            first_version = LEAST(statement.first_version, EXCLUDED.first_version),
+            version = GREATEST(statement.version, EXCLUDED.version)
+        """
+        rows = [(change.ledger_id, change.granularity, change.bucket_start, change.credits, change.debits,
+                 change.credit_count, change.debit_count, change.opening_balance, change.closing_balance,
+                 change.first_version, change.version) for change in changes]
+        with conn.cursor() as cursor:
+            cursor.executemany(query, rows)
+
+    def get_statement(self,
+                      ledger_id: str,
+                      granularity: str,
+                      start: date | None = None,
+                      end: date | None = None) -> list[StatementBucket]:
+        """The ledger's buckets from start (inclusive) to end (exclusive), oldest first"""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+        query = """
+        SELECT ID_ledger, granularity, bucket_start, credits, debits, credit_count, debit_count,
+               opening_balance, closing_balance, first_version, version
+        FROM skinny_hedgehog_read_models.ledger_statement
+        WHERE ID_ledger = %s AND granularity = %s
+          AND bucket_start >= COALESCE(%s::date, '-infinity'::date) AND bucket_start < COALESCE(%s::date, 'infinity'::date)
+        ORDER BY bucket_start
+        """
+        with self.connection_pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, (ledger_id, granularity, start, end))
+                rows = cursor.fetchall()
+        # NUMERIC columns read back as Decimal
+        return [StatementBucket(ledger_id, granularity, start, float(credits), float(debits), credit_count,
+                                debit_count, _float(opening_balance), _float(closing_balance), first_version, version)
+                for ledger_id, granularity, start, credits, debits, credit_count, debit_count,
+                opening_balance, closing_balance, first_version, version in rows]
+
+    async def backfill(self,
+                       event_store: EventStore,
+                       ledger_ids: Iterable[str] | None = None,
+                       start: datetime | None = None,
+                       end: datetime | None = None,
+                       batch_size: int = 1000) -> int:
+        """Folds the credits and debits already in the store into the statements; safe alongside live projection"""
+        if ledger_ids is None:
+            events = (event async for _, event in event_store.iter_events_by_type(
+                STATEMENT_EVENT_TYPES, start=start, end=end))
+        else:
+            events = _iter_logs(event_store, ledger_ids, start, end)
+
+        count = 0
+        batch: list[Event] = []
+        async for event in events:
+            batch.append(event)
+            if len(batch) >= batch_size:
+                await asyncio.to_thread(self.handle_event, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            await asyncio.to_thread(self.handle_event, batch)
+            count += len(batch)
+        logger.info("backfilled ledger statements", extra={"event_count": count})
+        return count
+
+
+async def _iter_logs(event_store: EventStore, ledger_ids: Iterable[str], start: datetime | None,
+                     end: datetime | None):
+    for ledger_id in ledger_ids:
+        async for _, event in event_store.iter_log(ledger_id, event_types=STATEMENT_EVENT_TYPES,
+                                                   start=start, end=end):
+            yield event
+
+
+def _float(value) -> float | None:
+    return float(value) if value is not None else None
+
@@ -1,70 +1,269 @@
+import time
+_import_started = time.perf_counter()
+
+import asyncio
 import logging
 import os
 from contextlib import asynccontextmanager
 
-import psycopg
 from fastapi import FastAPI
 
-from sh_api.domain.ledger import LedgerReadModel, LedgerCreatedEvent, LedgerCreditedEvent, LedgerDebitEvent
-from sh_api.routes.account import AccountRouter
-from sh_api.routes.ledger import LedgerRouter
-from sh_dendrite.aggregate import uuid_log_id_generator
-from sh_dendrite.aggregate_factory import AggregateFactory
-from sh_dendrite.dynamodb_event_store import DynamodbEventStore
+from sh_api.routes.health import HealthRouter
+from sh_api.startup_profile import StartupProfile
+from sh_dendrite.structured_logging import configure_logging
 
-logging.basicConfig(level=logging.INFO)
+configure_logging(level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), logging.INFO),
+                  json_output=os.getenv('LOG_FORMAT') == 'json')
 logger = logging.getLogger(__name__)
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Startup
-    logger.info("Initializing event store...")
-    event_store = DynamodbEventStore(
+startup_profile = StartupProfile(import_seconds=time.perf_counter() - _import_started)
+
+
+def _create_affinity():
+    """Log-id affinity across worker processes is enabled by giving the worker its own internal address"""
+    directory, address = os.getenv('AFFINITY_DIRECTORY'), os.getenv('AFFINITY_ADDRESS')
+    if not (directory and address):
+        return None
+
+    import socket
+    from sh_api.affinity import FileMembership, LogAffinity
+
+    worker_id = os.getenv('AFFINITY_WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}"
+    return LogAffinity(FileMembership(directory, worker_id, address,
+                                      ttl=float(os.getenv('AFFINITY_TTL', '10'))))
+
+
+affinity = _create_affinity()
+
+# how long shutdown waits for the projectors to project what is queued; a projector whose read model is
+# down retries its batch until then, and without an outbox the rest of its queue is lost
+PROJECTOR_STOP_TIMEOUT_SECONDS = float(os.getenv('PROJECTOR_STOP_TIMEOUT', '10'))
+
+# modules defining the event types read back from the store, registered before the first request
+EVENT_MODULES = [
+    "sh_api.domain.ledger",
+    "sh_api.domain.family_account",
+]
+
+# aiodynamo, httpx and psycopg are only imported once startup begins - inside the initializers below,
+# on worker threads - so that they neither delay the process binding its port nor each other
+
+def _create_event_store():
+    from sh_dendrite.dynamodb_event_store import DynamodbEventStore
+
+    outbox_shards = os.getenv('EVENT_STORE_OUTBOX_SHARDS')
+    return DynamodbEventStore(
         table_name=os.getenv('EVENT_STORE_TABLE_NAME'),
         region=os.getenv('AWS_REGION'),
-        profile=os.getenv('AWS_PROFILE')
+        profile=os.getenv('AWS_PROFILE'),
+        outbox_shards=int(outbox_shards) if outbox_shards else None,
+        index_events=os.getenv('EVENT_STORE_INDEX_EVENTS', '').lower() in ('1', 'true')
     )
 
-    # Initialize the async client
-    await event_store._ensure_client()
 
-    conn = psycopg.connect(
-        dbname=os.getenv('RM_DB_NAME'),
-        user=os.getenv('RM_DB_USER'),
-        password=os.getenv('RM_DB_PASSWORD'),
-        host=os.getenv('RM_DB_HOST')
+def _open_read_model_pool():
+    from psycopg.conninfo import make_conninfo
+    from psycopg_pool import ConnectionPool
+
+    pool = ConnectionPool(
+        make_conninfo(
+            dbname=os.getenv('RM_DB_NAME'),
+            user=os.getenv('RM_DB_USER'),
+            password=os.getenv('RM_DB_PASSWORD'),
+            host=os.getenv('RM_DB_HOST')
+        ),
+        min_size=int(os.getenv('RM_DB_POOL_MIN_SIZE', '1')),
+        max_size=int(os.getenv('RM_DB_POOL_MAX_SIZE', '10')),
+        open=False
     )
+    pool.open(wait=True, timeout=float(os.getenv('RM_DB_CONNECT_TIMEOUT', '30')))
+    return pool
 
-    ledger_read_model = LedgerReadModel(conn)
 
-    aggregate_factory = AggregateFactory(
-        event_store=event_store,
-        log_id_generator=uuid_log_id_generator,
-        event_handlers={
-            LedgerCreatedEvent: [ledger_read_model],
-            LedgerCreditedEvent: [ledger_read_model],
-            LedgerDebitEvent: [ledger_read_model]
-        }
-    )
+async def init_event_store():
+    async with startup_profile.phase("event_store"):
+        event_store = await asyncio.to_thread(_create_event_store)
+        await event_store.warm_up()
+    return event_store
+
+
+async def init_read_model_pool():
+    async with startup_profile.phase("read_model_pool"):
+        return await asyncio.to_thread(_open_read_model_pool)
+
+
+async def init_event_registry():
+    from sh_dendrite.event import Event
+
+    async with startup_profile.phase("event_registry"):
+        return await asyncio.to_thread(Event.register_modules, EVENT_MODULES)
 
-    logger.info("Initialized AggregateFactory with DynamoDB Event Store and Ledger Read Model")
 
-    # Store in app state
-    app.state.event_store = event_store
-    app.state.aggregate_factory = aggregate_factory
+async def backfill_statements(statement_model, event_store):
+    try:
+        await statement_model.backfill(event_store)
+    except Exception:
+        # needs the event type index (EVENT_STORE_INDEX_EVENTS); the live statements carry on regardless
+        logger.exception("Statement backfill failed")
 
-    # Initialize routers with the factory
-    account_router = AccountRouter(aggregate_factory)
-    ledger_router = LedgerRouter(aggregate_factory)
 
-    app.include_router(account_router.get_router())
-    app.include_router(ledger_router.get_router())
+async def initialize(app: FastAPI):
+    """Initializes the store, read model pool and event registry concurrently, then mounts the API"""
+    try:
+        # every initializer runs to the end, so that what did start is kept for shutdown to close
+        event_store, read_model_pool, event_type_count = await asyncio.gather(
+            init_event_store(), init_read_model_pool(), init_event_registry(), return_exceptions=True)
+        if not isinstance(event_store, BaseException):
+            app.state.event_store = event_store
+        if not isinstance(read_model_pool, BaseException):
+            app.state.read_model_pool = read_model_pool
+        for result in (event_store, read_model_pool, event_type_count):
+            if isinstance(result, BaseException):
+                raise result
+
+        from sh_api.domain.ledger import LedgerReadModel, LedgerCreatedEvent, LedgerCreditedEvent, LedgerDebitEvent
+        from sh_api.domain.ledger_statement import LedgerStatementReadModel, STATEMENT_EVENT_TYPES
+        from sh_api.routes.account import AccountRouter
+        from sh_api.routes.ledger import LedgerRouter
+        from sh_dendrite.aggregate import uuid_log_id_generator
+        from sh_dendrite.aggregate_factory import AggregateFactory
+        from sh_dendrite.event_bus import EventBus
+        from sh_dendrite.projector import PartitionedProjector
+
+        # the read model is projected by partition workers rather than inside the requests that apply events
+        ledger_read_model = LedgerReadModel(read_model_pool)
+        ledger_projector = PartitionedProjector(ledger_read_model,
+                                                key_of=lambda event: event.ledger_id,
+                                                partitions=int(os.getenv('LEDGER_PROJECTOR_PARTITIONS', '4')))
+        await ledger_projector.start()
+        app.state.ledger_projector = ledger_projector
+        # statements roll up credits and debits by day and month, projected by partitions of their own
+        statement_model = LedgerStatementReadModel(read_model_pool)
+        statement_projector = PartitionedProjector(statement_model,
+                                                   key_of=lambda event: event.ledger_id,
+                                                   partitions=int(os.getenv('LEDGER_PROJECTOR_PARTITIONS', '4')))
+        await statement_projector.start()
+        app.state.statement_projector = statement_projector
+        if os.getenv('LEDGER_STATEMENT_BACKFILL', '').lower() in ('1', 'true'):
+            # folds the ledgers' history into the statements alongside live projection; run it on one worker
+            app.state.statement_backfill = asyncio.create_task(backfill_statements(statement_model, event_store))
+        # feeds the live balance streams; every ledger event carries the ledger it belongs to
+        ledger_event_bus = EventBus(topic_of=lambda event: getattr(event, "ledger_id", None))
+        app.state.event_bus = ledger_event_bus
+
+        ledger_events = (LedgerCreatedEvent, LedgerCreditedEvent, LedgerDebitEvent)
+
+        def projectors_of(event_type):
+            return [ledger_projector] + ([statement_projector] if event_type in STATEMENT_EVENT_TYPES else [])
+
+        if event_store.outbox_shards:
+            # with an outbox the projection is fed by the relay, which survives a crash after the append;
+            # the live streams stay in-process, where a missed push only means a reconnect
+            from sh_dendrite.outbox import OutboxRelay
+
+            outbox_relay = OutboxRelay(event_store, {event_type: projectors_of(event_type) for event_type in ledger_events})
+            await outbox_relay.start()
+            app.state.outbox_relay = outbox_relay
+            event_handlers = {event_type: [ledger_event_bus] for event_type in ledger_events}
+        else:
+            event_handlers = {event_type: projectors_of(event_type) + [ledger_event_bus] for event_type in ledger_events}
+
+        # replays of long ledgers run off the event loop, so that they do not stall the worker's other requests
+        replay_executor = None
+        if os.getenv('LEDGER_REPLAY_THRESHOLD'):
+            from sh_dendrite.replay import ReplayExecutor
+
+            replay_executor = ReplayExecutor(threshold=int(os.getenv('LEDGER_REPLAY_THRESHOLD')),
+                                             max_concurrent=int(os.getenv('LEDGER_REPLAY_CONCURRENCY', '2')))
+        app.state.replay_executor = replay_executor
+
+        aggregate_factory = AggregateFactory(
+            event_store=event_store,
+            log_id_generator=uuid_log_id_generator,
+            event_handlers=event_handlers,
+            replay_executor=replay_executor
+        )
+
+        # Store in app state
+        app.state.aggregate_factory = aggregate_factory
+
+        # hot ledgers can opt in to single-writer actors, which queue and group-commit their commands
+        actor_runtime = None
+        if os.getenv('LEDGER_ACTORS', '').lower() in ('1', 'true'):
+            from sh_dendrite.actor_runtime import ActorRuntime
+
+            actor_runtime = ActorRuntime(aggregate_factory,
+                                         commit_window=float(os.getenv('LEDGER_ACTOR_COMMIT_WINDOW', '0')))
+        app.state.actor_runtime = actor_runtime
+
+        # Initialize routers with the factory
+        account_router = AccountRouter(aggregate_factory)
+        ledger_router = LedgerRouter(aggregate_factory, ledger_event_bus, actor_runtime,
+                                     read_model=ledger_read_model, projector=ledger_projector,
+                                     consistency_timeout=float(os.getenv('LEDGER_CONSISTENCY_TIMEOUT', '0.5')),
+                                     statement_model=statement_model)
+
+        app.include_router(account_router.get_router())
+        app.include_router(ledger_router.get_router())
+    except Exception as e:
+        startup_profile.mark_failed(e)
+        logger.exception("Startup failed")
+        return
+
+    startup_profile.mark_ready()
+    logger.info("Ready to take traffic", extra={"event_type_count": event_type_count, **startup_profile.report()})
+    if affinity:
+        # joining the ring only once ready, so that other workers don't forward to a cold worker
+        await affinity.start()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup - runs in the background so that liveness can be answered while the worker warms up;
+    # traffic is routed to the worker once /health/ready reports ready
+    app.state.event_store = None
+    app.state.read_model_pool = None
+    app.state.event_bus = None
+    app.state.actor_runtime = None
+    app.state.ledger_projector = None
+    app.state.outbox_relay = None
+    app.state.replay_executor = None
+    app.state.statement_projector = None
+    app.state.statement_backfill = None
+    startup = asyncio.create_task(initialize(app))
 
     yield
 
     # Shutdown
-    logger.info("Closing event store...")
-    if event_store:
-        await event_store.close()
+    startup.cancel()
+    await asyncio.gather(startup, return_exceptions=True)
+    if affinity:
+        await affinity.stop()
+    if app.state.actor_runtime:
+        await app.state.actor_runtime.close()
+    if app.state.event_bus:
+        app.state.event_bus.close()     # ends open live streams so that the server can drain
+    if app.state.outbox_relay:
+        await app.state.outbox_relay.stop()
+    if app.state.ledger_projector:
+        # projects what is queued before the pool closes, unless the read model stays down
+        await app.state.ledger_projector.stop(timeout=PROJECTOR_STOP_TIMEOUT_SECONDS)
+    if app.state.statement_backfill:
+        app.state.statement_backfill.cancel()
+        await asyncio.gather(app.state.statement_backfill, return_exceptions=True)
+    if app.state.statement_projector:
+        await app.state.statement_projector.stop(timeout=PROJECTOR_STOP_TIMEOUT_SECONDS)
+    if app.state.event_store:
+        logger.info("Closing event store...")
+        await app.state.event_store.close()
+    if app.state.read_model_pool:
+        await asyncio.to_thread(app.state.read_model_pool.close)
+    if app.state.replay_executor:
+        app.state.replay_executor.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+app.include_router(HealthRouter(startup_profile).get_router())
+if affinity:
+    from sh_api.affinity import AffinityMiddleware
 
-app = FastAPI(lifespan=lifespan)
\ No newline at end of file
+    app.add_middleware(AffinityMiddleware, affinity=affinity)
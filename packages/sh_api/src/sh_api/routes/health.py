@@ -0,0 +1,32 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from sh_api.startup_profile import StartupProfile
+
+
+class HealthRouter:
+    """Liveness says the process is serving and startup has not failed; readiness additionally says
+    that startup has completed and the worker can take traffic."""
+
+    def __init__(self, startup_profile: StartupProfile):
+        self.router = APIRouter(prefix="/health")
+        self.startup_profile = startup_profile
+        self._register_routes()
+
+    def _register_routes(self):
+        self.router.get("/live")(self.live)
+        self.router.get("/ready")(self.ready)
+
+    async def live(self):
+        if self.startup_profile.failed:
+            return JSONResponse({"status": "failed", "error": self.startup_profile.error}, status_code=503)
+        return {"status": "live"}
+
+    async def ready(self):
+        if not self.startup_profile.ready:
+            status = "failed" if self.startup_profile.failed else "starting"
+            return JSONResponse({"status": status, "startup": self.startup_profile.report()}, status_code=503)
+        return {"status": "ready", "startup": self.startup_profile.report()}
+
+    def get_router(self) -> APIRouter:
+        return self.router
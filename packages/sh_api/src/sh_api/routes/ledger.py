@@ -1,34 +1,376 @@
-from fastapi import APIRouter
+import base64
+import binascii
+import json
+from contextlib import aclosing
+from dataclasses import fields
+from datetime import date, datetime
+from typing import Annotated, Literal
+
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 import logging
 
 
 from pydantic import BaseModel
 
-from sh_api.domain.ledger import Ledger, CreateLedgerCommand, CreditLedgerCommand, DebitLedgerCommand
+from sh_api.domain.ledger import (
+    LEDGER_EVENT_TYPES,
+    Ledger,
+    LedgerCreatedEvent,
+    LedgerReadModel,
+    balance_after,
+    BlindCreditCommand,
+    BlindDebitCommand,
+    CreateLedgerCommand,
+    CreditLedgerCommand,
+    DebitLedgerCommand,
+    PostTransactionsCommand,
+    TransferCommand,
+    transfer,
+)
+from sh_api.domain.ledger_statement import LedgerStatementReadModel, StatementBucket
+from sh_dendrite.actor_runtime import ActorRuntime
 from sh_dendrite.aggregate_factory import AggregateFactory
+from sh_dendrite.blind_append import BlindAppendUnavailable, BlindCommand
+from sh_dendrite.concurrency_violation_error import ConcurrencyViolationError
+from sh_dendrite.consistency import ConsistencyToken
+from sh_dendrite.event import Event, event_id_time
+from sh_dendrite.event_bus import EventBus
+from sh_dendrite.projector import PartitionedProjector
+from sh_dendrite.unit_of_work import UnitOfWork
 
 logger = logging.getLogger(__name__)
 
+MAX_BATCH_LEDGERS = 100
+
+# how long a read presenting a consistency token waits for the projection to catch up by default
+CONSISTENCY_TIMEOUT_SECONDS = 0.5
+
+# idle live streams send a comment this often so that proxies keep the connection open
+STREAM_KEEPALIVE_SECONDS = 15.0
+
+# event type filters accept either the class name or the event name, e.g. LedgerCreditedEvent or LedgerCredited
+EVENT_TYPES_BY_NAME = {name: cls for cls in LEDGER_EVENT_TYPES
+                       for name in (cls.__name__, cls.__name__.replace('Event', ''))}
+
+
+def encode_cursor(position: str) -> str:
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        position = base64.b64decode(cursor + "=" * (-len(cursor) % 4), altchars=b"-_", validate=True).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        position = ""
+    if not position:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+    return position
+
+
+def encode_list_cursor(event_id: str, ledger_ids: list[str]) -> str:
+    return encode_cursor(json.dumps([event_id, *ledger_ids]))
+
+
+def decode_list_cursor(cursor: str) -> tuple[str, list[str]]:
+    try:
+        position = json.loads(decode_cursor(cursor))
+    except ValueError:
+        position = None
+    if (not isinstance(position, list) or len(position) < 2 or not all(isinstance(p, str) for p in position)
+            or event_id_time(position[0]) is None):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+    return position[0], position[1:]
+
+
+def event_to_dict(event: Event) -> dict:
+    return {
+        "event_id": event.event_id,
+        "event_type": event.event_name,
+        "version": event.version,
+        "applied_time": event.applied_time.isoformat() if event.applied_time else None,
+        # the event's own fields, without the ones the framework manages
+        "data": {f.name: getattr(event, f.name) for f in fields(event) if f.init},
+    }
+
+
+def event_to_json_line(position: str, event: Event) -> str:
+    return json.dumps({**event_to_dict(event), "cursor": encode_cursor(position)}, default=str) + "\n"
+
+
+def statement_to_dict(bucket: StatementBucket) -> dict:
+    return {
+        "start": bucket.bucket_start.isoformat(),
+        "credits": bucket.credits,
+        "debits": bucket.debits,
+        "credit_count": bucket.credit_count,
+        "debit_count": bucket.debit_count,
+        "opening_balance": bucket.opening_balance,
+        "closing_balance": bucket.closing_balance,
+    }
+
+
+def balance_update(ledger_id: str, balance: float | None, event: Event | None = None) -> dict:
+    return {"ledger_id": ledger_id, "balance": balance, "event": event_to_dict(event) if event else None}
+
 class LedgerRouter:
-    def __init__(self, aggregate_factory: AggregateFactory):
+    def __init__(self,
+                 aggregate_factory: AggregateFactory,
+                 event_bus: EventBus | None = None,
+                 actor_runtime: ActorRuntime | None = None,
+                 read_model: LedgerReadModel | None = None,
+                 projector: PartitionedProjector | None = None,
+                 consistency_timeout: float = CONSISTENCY_TIMEOUT_SECONDS,
+                 statement_model: LedgerStatementReadModel | None = None):
+        """
+        event_bus: feeds the live balance streams. actor_runtime: serializes each ledger's commands.
+        read_model, projector: serve ledger states, waiting up to consistency_timeout for a consistency token.
+        statement_model: serves the daily and monthly statements.
+        """
         self.router = APIRouter(prefix="/ledger")
         self.aggregate_factory = aggregate_factory
+        self.event_bus = event_bus
+        self.actor_runtime = actor_runtime
+        self.read_model = read_model
+        self.projector = projector
+        self.consistency_timeout = consistency_timeout
+        self.statement_model = statement_model
         self._register_routes()
 
     def _register_routes(self):
+        self.router.get("")(self.get_ledgers)
         self.router.get("/{ledger_id}")(self.get_ledger)
+        self.router.get("/{ledger_id}/events")(self.get_ledger_events)
+        if self.read_model is not None:
+            self.router.get("/{ledger_id}/state")(self.get_ledger_state)
+        if self.statement_model is not None:
+            self.router.get("/{ledger_id}/statements")(self.get_ledger_statements)
+        if self.event_bus is not None:
+            self.router.get("/{ledger_id}/stream")(self.stream_ledger)
+            self.router.websocket("/{ledger_id}/ws")(self.ledger_websocket)
         self.router.post("/")(self.create_ledger)
+        self.router.post("/transfers")(self.transfer)
         self.router.post("/{ledger_id}/credits")(self.credit_ledger)
         self.router.post("/{ledger_id}/debits")(self.debit_ledger)
+        self.router.post("/{ledger_id}/transactions")(self.post_transactions)
 
     async def get_ledger(self, ledger_id: str):
-        logger.info(f"Getting ledger {ledger_id}")
-        ledger = await self.aggregate_factory.load(Ledger, ledger_id)
+        logger.debug("Getting ledger %s", ledger_id)
+        # a query: concurrent reads of the ledger share one load
+        ledger = await self.aggregate_factory.load(Ledger, ledger_id, read_only=True)
         return {
             "ledger": ledger_id,
             "balance": ledger.balance,
         }
 
+    async def get_ledger_state(self, ledger_id: str, consistency_token: str | None = None):
+        """The ledger's balance from the read model, waiting for the write of a consistency token"""
+        token = None
+        if consistency_token is not None:
+            try:
+                token = ConsistencyToken.decode(consistency_token)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if token.log_id != ledger_id:
+                raise HTTPException(status_code=400, detail="the consistency token is for another ledger")
+            if self.projector is not None:
+                await self.projector.wait_for(ledger_id, token.version, self.consistency_timeout)
+
+        # read even when the wait timed out: another process may have projected the write
+        state = await asyncio.to_thread(self.read_model.get_ledger_state, ledger_id)
+        if token is not None and (state is None or (state.version or 0) < token.version):
+            logger.info("read model behind the consistency token, reading the log",
+                        extra={"ledger_id": ledger_id, "version": token.version})
+            ledger = await self.aggregate_factory.load(Ledger, ledger_id, read_only=True)
+            return {"ledger": ledger_id, "balance": ledger.balance, "version": ledger.version, "source": "log"}
+        if state is None:
+            raise HTTPException(status_code=404, detail=f"ledger {ledger_id} not found")
+        return {"ledger": ledger_id, "balance": state.current_balance, "version": state.version,
+                "source": "read_model"}
+
+    async def get_ledger_statements(self,
+                                    ledger_id: str,
+                                    from_: Annotated[date | None, Query(alias="from")] = None,
+                                    to: date | None = None,
+                                    granularity: Literal["day", "month"] = "day"):
+        """The ledger's rollups per day or month from `from` (inclusive) to `to` (exclusive)"""
+        if from_ is not None and to is not None and from_ >= to:
+            raise HTTPException(status_code=400, detail="from must be before to")
+        buckets = await asyncio.to_thread(self.statement_model.get_statement, ledger_id, granularity, from_, to)
+        return {
+            "ledger_id": ledger_id,
+            "granularity": granularity,
+            "statements": [statement_to_dict(bucket) for bucket in buckets],
+        }
+
+    async def get_ledgers(self,
+                          ids: Annotated[list[str] | None, Query()] = None,
+                          start: datetime | None = None,
+                          cursor: str | None = None,
+                          limit: int = MAX_BATCH_LEDGERS):
+        """The balances of the requested ledgers or, without ids, a page of those created since start"""
+        if ids is None:
+            if not 0 < limit <= MAX_BATCH_LEDGERS:
+                raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_BATCH_LEDGERS}")
+            return await self._list_ledgers(start, decode_list_cursor(cursor) if cursor else None, limit)
+
+        # accept both ?ids=a,b and ?ids=a&ids=b
+        ledger_ids = list(dict.fromkeys(i for value in ids for i in value.split(',') if i))
+        if len(ledger_ids) > MAX_BATCH_LEDGERS:
+            raise HTTPException(status_code=400, detail=f"at most {MAX_BATCH_LEDGERS} ledgers can be requested at once")
+
+        logger.debug("Getting %d ledgers", len(ledger_ids))
+        ledgers = await self.aggregate_factory.load_many(Ledger, ledger_ids)
+        return {
+            "ledgers": [{"ledger": ledger.log_id, "balance": ledger.balance} for ledger in ledgers],
+        }
+
+    async def _list_ledgers(self, start: datetime | None, after: tuple[str, list[str]] | None, limit: int) -> dict:
+        # read from the event type index, so only the creation events are touched rather than every log
+        if not self.aggregate_factory.event_store.indexes_events:
+            raise HTTPException(status_code=501, detail="listing ledgers requires an event store with the event type index")
+        last_id, listed = after or (None, [])
+        if last_id is not None:
+            start = event_id_time(last_id)
+        ledgers = []
+        cursor = None
+        events = self.aggregate_factory.event_store.iter_events_by_type([LedgerCreatedEvent], start=start)
+        async with aclosing(events):
+            async for ledger_id, event in events:
+                # ledgers created in the same millisecond share their event id, so the cursor names
+                # those listed with the last id rather than resuming after it
+                if last_id is not None and (event.event_id < last_id or
+                                            (event.event_id == last_id and ledger_id in listed)):
+                    continue
+                if len(ledgers) >= limit:
+                    cursor = encode_list_cursor(last_id, listed)
+                    break
+                if event.event_id != last_id:
+                    last_id, listed = event.event_id, []
+                listed.append(ledger_id)
+                ledgers.append({"ledger": ledger_id, "created_time": event.applied_time})
+        return {"ledgers": ledgers, "cursor": cursor}
+
+    async def get_ledger_events(self,
+                                ledger_id: str,
+                                cursor: str | None = None,
+                                type: Annotated[list[str] | None, Query()] = None,
+                                start: datetime | None = None,
+                                end: datetime | None = None,
+                                limit: int | None = None):
+        """Streams the ledger's history as NDJSON, each line with a cursor to resume after it"""
+        after = decode_cursor(cursor) if cursor else None
+        event_types = None
+        if type:
+            unknown = [name for name in type if name not in EVENT_TYPES_BY_NAME]
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"unknown event types: {', '.join(unknown)}")
+            event_types = {EVENT_TYPES_BY_NAME[name] for name in type}
+        if start is not None and end is not None and start >= end:
+            raise HTTPException(status_code=400, detail="start must be before end")
+
+        events = self.aggregate_factory.event_store.iter_log(ledger_id, after=after, event_types=event_types,
+                                                             start=start, end=end)
+        # the first event is read before responding, so that a log that cannot be read fails the request
+        # instead of cutting a 200 short
+        try:
+            first = await anext(events, None)
+        except BaseException:
+            await events.aclose()
+            raise
+
+        async def lines():
+            async with aclosing(events):
+                count, line = 0, first
+                while line is not None and (limit is None or count < limit):
+                    yield event_to_json_line(*line)
+                    count += 1
+                    line = await anext(events, None)
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    async def _current_balance(self, ledger_id: str) -> dict:
+        ledger = await self.aggregate_factory.load(Ledger, ledger_id, read_only=True)
+        return balance_update(ledger_id, ledger.balance)
+
+    async def stream_ledger(self, ledger_id: str):
+        """Server-Sent Events: the current balance, then the new balance and event on every change"""
+        # subscribe before loading so that no change between the two is missed
+        subscription = self.event_bus.subscribe(ledger_id)
+        try:
+            initial = await self._current_balance(ledger_id)
+        except Exception:
+            subscription.close()
+            raise
+
+        async def messages():
+            with subscription:
+                yield f"event: balance\ndata: {json.dumps(initial, default=str)}\n\n"
+                while True:
+                    try:
+                        event = await asyncio.wait_for(subscription.next(), STREAM_KEEPALIVE_SECONDS)
+                    except TimeoutError:
+                        yield ": keepalive\n\n"
+                        continue
+                    if event is None:
+                        break
+                    update = balance_update(ledger_id, balance_after(event), event)
+                    yield f"id: {event.event_id}\nevent: balance\ndata: {json.dumps(update, default=str)}\n\n"
+                if subscription.dropped:
+                    yield "event: dropped\ndata: {}\n\n"
+
+        return StreamingResponse(messages(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    async def ledger_websocket(self, websocket: WebSocket, ledger_id: str):
+        """WebSocket variant of stream_ledger; a dropped slow consumer is closed with code 1013 (try again later)"""
+        await websocket.accept()
+        with self.event_bus.subscribe(ledger_id) as subscription:
+            # a reader notices the client going away even while the ledger is idle
+            disconnected = asyncio.create_task(self._wait_for_disconnect(websocket))
+            try:
+                await websocket.send_json(await self._current_balance(ledger_id))
+                while True:
+                    next_event = asyncio.ensure_future(subscription.next())
+                    await asyncio.wait([next_event, disconnected], return_when=asyncio.FIRST_COMPLETED)
+                    if disconnected.done():
+                        next_event.cancel()
+                        return
+                    event = next_event.result()
+                    if event is None:
+                        break
+                    update = balance_update(ledger_id, balance_after(event), event)
+                    await websocket.send_text(json.dumps(update, default=str))
+                await websocket.close(code=1013 if subscription.dropped else 1000)
+            finally:
+                disconnected.cancel()
+
+    @staticmethod
+    async def _wait_for_disconnect(websocket: WebSocket) -> None:
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+
+    async def _execute(self, ledger_id: str, command):
+        """Runs command(ledger) on the ledger's actor, or on a freshly loaded ledger without an actor runtime"""
+        if self.actor_runtime is not None:
+            return await self.actor_runtime.execute(Ledger, ledger_id, command)
+        return await command(await self.aggregate_factory.load(Ledger, ledger_id))
+
+    async def _execute_blind(self, ledger_id: str, blind_command: BlindCommand, command):
+        """Appends blind_command against the log head where the store allows, else runs command as _execute does"""
+        if self.actor_runtime is None:
+            try:
+                [event] = await self.aggregate_factory.append_blind(Ledger, ledger_id, blind_command)
+                return balance_after(event), ConsistencyToken(ledger_id, event.version)
+            except BlindAppendUnavailable:
+                pass
+        return await self._execute(ledger_id, command)
+
     async def create_ledger(self):
         ledger = self.aggregate_factory.new(Ledger)
 
@@ -38,31 +380,112 @@ class LedgerRouter:
         return {
             "ledger_id": ledger.log_id,
             "balance": ledger.balance,
+            "consistency_token": ConsistencyToken.of(ledger).encode(),
         }
 
     class CreditDebitRequest(BaseModel):
         amount: float
 
     async def credit_ledger(self, ledger_id: str, request: CreditDebitRequest):
-        ledger = await self.aggregate_factory.load(Ledger, ledger_id)
-
-        amount = request.amount
-        await ledger.credit(CreditLedgerCommand(amount))
+        async def credit(ledger: Ledger) -> tuple[float, ConsistencyToken]:
+            await ledger.credit(CreditLedgerCommand(request.amount))
+            return ledger.balance, ConsistencyToken.of(ledger)
 
+        try:
+            balance, token = await self._execute_blind(ledger_id, BlindCreditCommand(request.amount), credit)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ConcurrencyViolationError as e:
+            raise HTTPException(status_code=409, detail=str(e))
         return {
-            "ledger_id": ledger.log_id,
-            "balance": ledger.balance,
+            "ledger_id": ledger_id,
+            "balance": balance,
+            "consistency_token": token.encode(),
         }
 
     async def debit_ledger(self, ledger_id: str, request: CreditDebitRequest):
-        ledger = await self.aggregate_factory.load(Ledger, ledger_id)
+        async def debit(ledger: Ledger) -> tuple[float, ConsistencyToken]:
+            await ledger.debit(DebitLedgerCommand(request.amount))
+            return ledger.balance, ConsistencyToken.of(ledger)
 
-        amount = request.amount
-        await ledger.debit(DebitLedgerCommand(amount))
+        try:
+            balance, token = await self._execute_blind(ledger_id, BlindDebitCommand(request.amount), debit)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ConcurrencyViolationError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        return {
+            "ledger_id": ledger_id,
+            "balance": balance,
+            "consistency_token": token.encode(),
+        }
+
+    class Transaction(BaseModel):
+        type: Literal["credit", "debit"]
+        amount: float
+
+    class TransactionsRequest(BaseModel):
+        transactions: list["LedgerRouter.Transaction"]
+
+    async def post_transactions(self, ledger_id: str, request: TransactionsRequest):
+        limit = self.aggregate_factory.event_store.max_batch_events
+        if not request.transactions:
+            raise HTTPException(status_code=400, detail="at least one transaction is required")
+        if limit is not None and len(request.transactions) > limit:
+            raise HTTPException(status_code=400, detail=f"at most {limit} transactions can be posted at once")
+
+        command = PostTransactionsCommand([
+            CreditLedgerCommand(t.amount) if t.type == "credit" else DebitLedgerCommand(t.amount)
+            for t in request.transactions
+        ])
+        async def post(ledger: Ledger) -> tuple[list[float], ConsistencyToken]:
+            return await ledger.post_transactions(command), ConsistencyToken.of(ledger)
+
+        try:
+            balances, token = await self._execute(ledger_id, post)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ConcurrencyViolationError as e:
+            raise HTTPException(status_code=409, detail=str(e))
 
         return {
-            "ledger_id": ledger.log_id,
-            "balance": ledger.balance,
+            "ledger_id": ledger_id,
+            "balance": balances[-1],
+            "consistency_token": token.encode(),
+            "transactions": [
+                {"type": t.type, "amount": t.amount, "balance": balance}
+                for t, balance in zip(request.transactions, balances)
+            ],
+        }
+
+    class TransferRequest(BaseModel):
+        source_ledger_id: str
+        target_ledger_id: str
+        amount: float
+
+    async def transfer(self, request: TransferRequest):
+        """Moves the amount between the ledgers with one atomic append to both logs"""
+        # loaded rather than run on the ledgers' actors: resident actors holding either ledger see the
+        # transfer as a conflicting write, and reload before their next command
+        if not self.aggregate_factory.event_store.appends_across_logs:
+            raise HTTPException(status_code=501, detail="transfers require an event store with multi-log transactions")
+        source, target = await asyncio.gather(
+            self.aggregate_factory.load(Ledger, request.source_ledger_id),
+            self.aggregate_factory.load(Ledger, request.target_ledger_id))
+        try:
+            async with UnitOfWork(self.aggregate_factory.event_store) as unit:
+                unit.enlist(source, target)
+                await transfer(source, target, TransferCommand(request.amount))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ConcurrencyViolationError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+
+        return {
+            "source": {"ledger_id": source.log_id, "balance": source.balance,
+                       "consistency_token": ConsistencyToken.of(source).encode()},
+            "target": {"ledger_id": target.log_id, "balance": target.balance,
+                       "consistency_token": ConsistencyToken.of(target).encode()},
         }
 
     def get_router(self) -> APIRouter:
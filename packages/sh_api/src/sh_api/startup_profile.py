@@ -0,0 +1,84 @@
+"""Timing of worker startup, reported by the readiness endpoint and logged once a worker is ready.
+
+Running the module profiles import time instead, listing the slowest imports of sh_api.main:
+
+    python -m sh_api.startup_profile --top 20
+"""
+import argparse
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+
+
+class StartupProfile:
+    def __init__(self, import_seconds: float | None = None):
+        self.started = time.perf_counter()
+        self.import_seconds = import_seconds
+        self.phases: dict[str, float] = {}
+        self.ready_seconds: float | None = None
+        self.error: str | None = None
+
+    @asynccontextmanager
+    async def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - started
+
+    def mark_ready(self) -> None:
+        self.ready_seconds = time.perf_counter() - self.started
+
+    def mark_failed(self, error: BaseException) -> None:
+        self.error = f"{type(error).__name__}: {error}"
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_seconds is not None
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+    def report(self) -> dict:
+        report = {
+            "import_ms": _ms(self.import_seconds),
+            "phases_ms": {name: _ms(seconds) for name, seconds in self.phases.items()},
+            "ready_ms": _ms(self.ready_seconds),
+        }
+        if self.error:
+            report["error"] = self.error
+        return report
+
+
+def _ms(seconds: float | None) -> float | None:
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+def import_profile(module: str = "sh_api.main", top: int = 15) -> list[tuple[int, str]]:
+    """Imports the module in a fresh interpreter with -X importtime and returns the slowest
+    (cumulative microseconds, module) pairs"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        timings.append((int(cumulative), name.strip()))
+    return sorted(timings, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the slowest imports of a module")
+    parser.add_argument("--module", default="sh_api.main")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    for cumulative, name in import_profile(args.module, args.top):
+        print(f"{cumulative / 1000:9.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from sh_api.domain.ledger import (
+    CreateLedgerCommand,
+    CreditLedgerCommand,
+    DebitLedgerCommand,
+    Ledger,
+    LedgerCreatedEvent,
+    LedgerCreditedEvent,
+    LedgerDebitEvent,
+    LedgerReadModel,
+    PostTransactionsCommand,
+)
+from sh_dendrite.aggregate_factory import AggregateFactory
+from sh_dendrite.single_log_event_store import SingleLogEventStore
+
+
+@pytest.fixture
+def context():
+    event_store = SingleLogEventStore([])
+    factory = AggregateFactory(event_store, lambda: "ledger-1", {})
+    yield {"factory": factory, "event_store": event_store}
+
+
+@pytest.mark.asyncio
+async def test_post_transactions_returns_running_balances(context):
+    ledger = context["factory"].new(Ledger)
+    await ledger.create_ledger(CreateLedgerCommand(initial_balance=100.0))
+
+    balances = await ledger.post_transactions(PostTransactionsCommand([
+        CreditLedgerCommand(25.0),
+        DebitLedgerCommand(10.0),
+        CreditLedgerCommand(5.0),
+    ]))
+
+    assert balances == [125.0, 115.0, 120.0]
+    assert ledger.balance == 120.0
+    events = context["event_store"].backing_store[1:]
+    assert [type(e) for e in events] == [LedgerCreditedEvent, LedgerDebitEvent, LedgerCreditedEvent]
+    assert [e.current_balance for e in events] == [100.0, 125.0, 115.0]
+
+
+@pytest.mark.asyncio
+async def test_post_transactions_rejects_non_positive_amounts(context):
+    ledger = context["factory"].new(Ledger)
+    await ledger.create_ledger(CreateLedgerCommand(initial_balance=100.0))
+
+    with pytest.raises(ValueError):
+        await ledger.post_transactions(PostTransactionsCommand([CreditLedgerCommand(5.0), DebitLedgerCommand(0)]))
+
+    assert ledger.balance == 100.0
+    assert len(context["event_store"].backing_store) == 1
+
+
+@pytest.mark.asyncio
+async def test_post_transactions_requires_existing_ledger(context):
+    ledger = context["factory"].new(Ledger)
+
+    with pytest.raises(ValueError):
+        await ledger.post_transactions(PostTransactionsCommand([CreditLedgerCommand(5.0)]))
+
+
+@pytest.mark.asyncio
+async def test_debit_rejects_an_overdraft_on_the_loaded_path(context):
+    ledger = context["factory"].new(Ledger)
+    await ledger.create_ledger(CreateLedgerCommand(initial_balance=10.0))
+
+    with pytest.raises(ValueError, match="insufficient funds"):
+        await ledger.debit(DebitLedgerCommand(10.5))
+
+    await ledger.debit(DebitLedgerCommand(10.0))
+    assert ledger.balance == 0.0
+    assert [type(e) for e in context["event_store"].backing_store] == [LedgerCreatedEvent, LedgerDebitEvent]
+
+
+def versioned(event, version):
+    event.version = version
+    return event
+
+
+def test_read_model_upserts_latest_state_of_each_ledger_once():
+    pool = MagicMock()
+    cursor = pool.connection.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value
+
+    LedgerReadModel(pool).handle_event([
+        versioned(LedgerCreatedEvent("ledger-1", 500.0), 1),
+        versioned(LedgerCreditedEvent("ledger-1", 10.0, 500.0), 2),
+        versioned(LedgerCreditedEvent("ledger-2", 5.0, 100.0), 7),
+        versioned(LedgerDebitEvent("ledger-1", 4.0, 510.0), 3),
+    ])
+
+    query, rows = cursor.executemany.call_args.args
+    assert "ledger.version < EXCLUDED.version" in query
+    assert rows == [("ledger-1", 500.0, 506.0, 3), ("ledger-2", None, 105.0, 7)]
+
+
+def test_read_model_skips_empty_batches():
+    pool = MagicMock()
+
+    LedgerReadModel(pool).handle_event([])
+
+    pool.connection.assert_not_called()
@@ -0,0 +1,151 @@
+from datetime import date, datetime, UTC
+from unittest.mock import MagicMock
+
+import pytest
+
+from sh_api.domain.ledger import LedgerCreatedEvent, LedgerCreditedEvent, LedgerDebitEvent
+from sh_api.domain.ledger_statement import LedgerStatementReadModel, StatementBucket, bucket_start, fold_statement
+from sh_dendrite.dynamodb_event_store import DynamodbEventStore, EVENT_INDEXES
+from sh_dendrite.event import event_id_prefix
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+
+
+def applied(event, version: int, time: datetime):
+    event.version = version
+    event.applied_time = time
+    event.event_id = f"{event_id_prefix(time)}_{version:04d}_{event.event_name}"
+    return event
+
+
+def history() -> list:
+    """ledger-1: 100 to start; +50 and -20 on 30 January, +5 on 2 February"""
+    return [
+        applied(LedgerCreatedEvent("ledger-1", 100.0), 1, datetime(2026, 1, 30, 8, tzinfo=UTC)),
+        applied(LedgerCreditedEvent("ledger-1", 50.0, 100.0), 2, datetime(2026, 1, 30, 9, tzinfo=UTC)),
+        applied(LedgerDebitEvent("ledger-1", 20.0, 150.0), 3, datetime(2026, 1, 30, 23, 59, tzinfo=UTC)),
+        applied(LedgerCreditedEvent("ledger-1", 5.0, 130.0), 4, datetime(2026, 2, 2, 0, 1, tzinfo=UTC)),
+    ]
+
+
+def test_buckets_are_utc_days_and_months():
+    time = datetime.fromisoformat("2026-03-01T01:30:00+02:00")
+
+    assert bucket_start(time, "day") == date(2026, 2, 28)
+    assert bucket_start(time, "month") == date(2026, 2, 1)
+
+
+def test_rolls_credits_and_debits_up_by_day_and_month():
+    changes = fold_statement(history())
+
+    assert changes[("ledger-1", "day", date(2026, 1, 30))] == StatementBucket(
+        "ledger-1", "day", date(2026, 1, 30), credits=50.0, debits=20.0, credit_count=1, debit_count=1,
+        opening_balance=100.0, closing_balance=130.0, first_version=2, version=3)
+    assert changes[("ledger-1", "month", date(2026, 2, 1))] == StatementBucket(
+        "ledger-1", "month", date(2026, 2, 1), credits=5.0, credit_count=1,
+        opening_balance=130.0, closing_balance=135.0, first_version=4, version=4)
+    assert len(changes) == 4
+
+
+def test_handles_a_batch_in_one_transaction_of_two_statements():
+    pool = MagicMock()
+    conn = pool.connection.return_value.__enter__.return_value
+    cursor = conn.cursor.return_value.__enter__.return_value
+    # version 2 was folded before
+    cursor.fetchall.return_value = [("ledger-1", 3), ("ledger-1", 4)]
+
+    LedgerStatementReadModel(pool).handle_event(history())
+
+    pool.connection.assert_called_once()
+    claim, params = cursor.execute.call_args.args
+    assert "ON CONFLICT DO NOTHING" in claim and params == (["ledger-1"] * 3, [2, 3, 4])
+    query, rows = cursor.executemany.call_args.args
+    assert "statement.credits + EXCLUDED.credits" in query
+    assert ("ledger-1", "day", date(2026, 1, 30), 0.0, 20.0, 0, 1, 150.0, 130.0, 3, 3) in rows
+    assert len(rows) == 4
+
+
+class InMemoryStatementModel(LedgerStatementReadModel):
+    """Claims and upserts as the read model's tables do, in memory"""
+    def __init__(self):
+        super().__init__(MagicMock())
+        self.folded: set[tuple[str, int]] = set()
+        self.buckets: dict[tuple, StatementBucket] = {}
+
+    def claim_events(self, conn, events):
+        claimed = [event for event in events if (event.ledger_id, event.version) not in self.folded]
+        self.folded.update((event.ledger_id, event.version) for event in claimed)
+        return claimed
+
+    def upsert_buckets(self, conn, changes):
+        for change in changes:
+            key = (change.ledger_id, change.granularity, change.bucket_start)
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                self.buckets[key] = change
+                continue
+            bucket.credits += change.credits
+            bucket.debits += change.debits
+            bucket.credit_count += change.credit_count
+            bucket.debit_count += change.debit_count
+            if change.first_version < bucket.first_version:
+                bucket.first_version, bucket.opening_balance = change.first_version, change.opening_balance
+            if change.version >= bucket.version:
+                bucket.version, bucket.closing_balance = change.version, change.closing_balance
+
+
+def test_backfill_batches_around_a_live_event_are_each_counted_once():
+    time = datetime(2026, 3, 1, 12, tzinfo=UTC)
+    credits = [applied(LedgerCreditedEvent("ledger-1", 1.0, version - 2.0), version, time)
+               for version in range(2, 101)]
+    model = InMemoryStatementModel()
+
+    model.handle_event(credits[-1:])        # live
+    model.handle_event(credits[:49])        # backfill, versions 2 to 50
+    model.handle_event(credits[49:98])      # and 51 to 99, inside the versions the bucket spans
+    model.handle_event(credits[:10])        # a redelivery
+
+    day = model.buckets[("ledger-1", "day", date(2026, 3, 1))]
+    assert (day.credits, day.credit_count, day.first_version, day.version) == (99.0, 99, 2, 100)
+    assert (day.opening_balance, day.closing_balance) == (0.0, 99.0)
+
+
+def test_ignores_batches_without_credits_or_debits():
+    pool = MagicMock()
+
+    LedgerStatementReadModel(pool).handle_event(history()[:1])
+
+    pool.connection.assert_not_called()
+
+
+def test_rejects_unknown_granularities():
+    with pytest.raises(ValueError):
+        LedgerStatementReadModel(MagicMock()).get_statement("ledger-1", "week")
+
+
+class RecordingStatementModel(LedgerStatementReadModel):
+    def __init__(self):
+        super().__init__(None)
+        self.batches = []
+
+    def handle_event(self, events):
+        self.batches.append([(event.ledger_id, event.version) for event in events])
+
+
+@pytest.mark.asyncio
+async def test_backfills_from_the_event_type_index_in_batches():
+    local = LocalDynamoDB(page_size=2)
+    local.create_table("events", indexes=EVENT_INDEXES)
+    store = DynamodbEventStore("events", "local", client=local.client(), index_events=True)
+    await store.apply_many("ledger-1", history(), None)
+    await store.apply_many("ledger-2", [applied(LedgerCreditedEvent("ledger-2", 1.0, 0.0), 1,
+                                                datetime(2026, 2, 1, tzinfo=UTC))], None)
+    model = RecordingStatementModel()
+
+    count = await model.backfill(store, batch_size=2)
+
+    assert count == 4
+    assert model.batches == [[("ledger-1", 2), ("ledger-1", 3)], [("ledger-2", 1), ("ledger-1", 4)]]
+
+    model.batches.clear()
+    assert await model.backfill(store, ledger_ids=["ledger-1"], start=datetime(2026, 2, 1, tzinfo=UTC)) == 1
+    assert model.batches == [[("ledger-1", 4)]]
@@ -0,0 +1,25 @@
+import asyncio
+
+import pytest
+
+from sh_api.domain.ledger import Ledger
+from sh_api.routes.ledger import LedgerRouter
+from sh_dendrite.actor_runtime import ActorRuntime
+from sh_dendrite.aggregate_factory import AggregateFactory
+from sh_dendrite.dynamodb_event_store import DynamodbEventStore
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+
+
+@pytest.mark.asyncio
+async def test_concurrent_credits_to_one_ledger_all_succeed():
+    local = LocalDynamoDB()
+    local.create_table("events")
+    factory = AggregateFactory(DynamodbEventStore("events", "local", client=local.client()), lambda: "ledger-1", {})
+    router = LedgerRouter(factory, actor_runtime=ActorRuntime(factory))
+    await router.create_ledger()
+
+    responses = await asyncio.gather(*(router.credit_ledger("ledger-1", LedgerRouter.CreditDebitRequest(amount=1))
+                                       for _ in range(20)))
+
+    assert sorted(r["balance"] for r in responses) == [500.0 + n for n in range(1, 21)]
+    assert (await factory.load(Ledger, "ledger-1")).balance == 520.0
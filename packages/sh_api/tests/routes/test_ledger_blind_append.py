@@ -0,0 +1,56 @@
+import itertools
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from sh_api.routes.ledger import LedgerRouter
+from sh_dendrite.aggregate_factory import AggregateFactory
+from sh_dendrite.consistency import ConsistencyToken
+from sh_dendrite.dynamodb_event_store import DynamodbEventStore
+from sh_dendrite.in_memory_event_store import InMemoryEventStore
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+
+
+def client_for(store) -> TestClient:
+    log_ids = (f"ledger-{n}" for n in itertools.count(1))
+    factory = AggregateFactory(store, lambda: next(log_ids), {})
+    app = FastAPI()
+    app.include_router(LedgerRouter(factory).get_router())
+    return TestClient(app)
+
+
+def test_credits_and_debits_do_not_read_the_log():
+    local = LocalDynamoDB()
+    local.create_table("events")
+    client = client_for(DynamodbEventStore("events", "local", client=local.client()))
+    client.post("/ledger/")
+    local.request_counts.clear()
+
+    credited = client.post("/ledger/ledger-1/credits", json={"amount": 25}).json()
+    debited = client.post("/ledger/ledger-1/debits", json={"amount": 125}).json()
+
+    assert (credited["balance"], debited["balance"]) == (525.0, 400.0)
+    assert ConsistencyToken.decode(debited["consistency_token"]) == ConsistencyToken("ledger-1", 3)
+    assert "Query" not in local.request_counts
+    assert client.get("/ledger/ledger-1").json()["balance"] == 400.0
+
+
+def test_rejects_overdrafts_and_unknown_ledgers():
+    local = LocalDynamoDB()
+    local.create_table("events")
+    client = client_for(DynamodbEventStore("events", "local", client=local.client()))
+    client.post("/ledger/")
+
+    assert client.post("/ledger/ledger-1/debits", json={"amount": 500.01}).status_code == 400
+    assert client.post("/ledger/ledger-1/credits", json={"amount": -5}).status_code == 400
+    assert client.post("/ledger/ledger-2/credits", json={"amount": 5}).status_code == 400
+    assert client.post("/ledger/ledger-1/debits", json={"amount": 500}).json()["balance"] == 0.0
+
+
+def test_falls_back_to_loading_where_the_store_keeps_no_balance():
+    client = client_for(InMemoryEventStore())
+    client.post("/ledger/")
+
+    assert client.post("/ledger/ledger-1/credits", json={"amount": 25}).json()["balance"] == 525.0
+    assert client.post("/ledger/ledger-1/debits", json={"amount": 526}).status_code == 400
+    assert client.get("/ledger/ledger-1").json()["balance"] == 525.0
@@ -0,0 +1,122 @@
+import itertools
+import threading
+from contextlib import asynccontextmanager, contextmanager
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from sh_api.domain.ledger import LEDGER_EVENT_TYPES, LedgerReadModel
+from sh_api.routes.ledger import LedgerRouter
+from sh_dendrite.aggregate_factory import AggregateFactory
+from sh_dendrite.consistency import ConsistencyToken
+from sh_dendrite.dynamodb_event_store import DynamodbEventStore
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+from sh_dendrite.projector import PartitionedProjector
+
+
+class InMemoryPool:
+    """Stands in for the psycopg pool behind LedgerReadModel; writes wait for `gate` to be open"""
+
+    def __init__(self):
+        self.rows: dict[str, tuple] = {}
+        self.gate = threading.Event()
+        self.gate.set()
+        self._result = None
+
+    @contextmanager
+    def connection(self):
+        yield self
+
+    @contextmanager
+    def cursor(self):
+        yield self
+
+    def executemany(self, query, rows) -> None:
+        self.gate.wait()
+        for row in rows:
+            existing = self.rows.get(row[0])
+            if existing is None or existing[3] < row[3]:
+                self.rows[row[0]] = (row[0], row[1] if existing is None else existing[1], row[2], row[3])
+
+    def execute(self, query, params) -> None:
+        self._result = self.rows.get(params[0])
+
+    def fetchone(self):
+        return self._result
+
+
+@pytest.fixture
+def pool():
+    pool = InMemoryPool()
+    yield pool
+    pool.gate.set()
+
+
+def client_for(pool: InMemoryPool, consistency_timeout: float = 5.0) -> TestClient:
+    local = LocalDynamoDB()
+    local.create_table("events")
+    store = DynamodbEventStore("events", "local", client=local.client())
+    read_model = LedgerReadModel(pool)
+    projector = PartitionedProjector(read_model, key_of=lambda event: event.ledger_id)
+    log_ids = (f"ledger-{n}" for n in itertools.count(1))
+    factory = AggregateFactory(store, lambda: next(log_ids), {event_type: [projector]
+                                                               for event_type in LEDGER_EVENT_TYPES})
+
+    @asynccontextmanager
+    async def lifespan(app):
+        await projector.start()
+        yield
+        await projector.stop()
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(LedgerRouter(factory, read_model=read_model, projector=projector,
+                                    consistency_timeout=consistency_timeout).get_router())
+    return TestClient(app)
+
+
+def test_writes_return_tokens_for_the_version_they_wrote(pool):
+    with client_for(pool) as client:
+        created = client.post("/ledger/").json()
+        credited = client.post("/ledger/ledger-1/credits", json={"amount": 10}).json()
+
+    assert ConsistencyToken.decode(created["consistency_token"]) == ConsistencyToken("ledger-1", 1)
+    assert ConsistencyToken.decode(credited["consistency_token"]) == ConsistencyToken("ledger-1", 2)
+
+
+def test_a_token_waits_for_the_projection_to_reach_the_write(pool):
+    with client_for(pool) as client:
+        client.post("/ledger/")
+        pool.gate.clear()
+        token = client.post("/ledger/ledger-1/credits", json={"amount": 10}).json()["consistency_token"]
+        threading.Timer(0.1, pool.gate.set).start()
+
+        state = client.get("/ledger/ledger-1/state", params={"consistency_token": token}).json()
+
+    assert state == {"ledger": "ledger-1", "balance": 510.0, "version": 2, "source": "read_model"}
+
+
+def test_a_projection_that_does_not_catch_up_in_time_is_bypassed(pool):
+    with client_for(pool, consistency_timeout=0.05) as client:
+        created = client.post("/ledger/").json()["consistency_token"]
+        client.get("/ledger/ledger-1/state", params={"consistency_token": created})
+        pool.gate.clear()
+        token = client.post("/ledger/ledger-1/credits", json={"amount": 10}).json()["consistency_token"]
+
+        stale = client.get("/ledger/ledger-1/state").json()
+        fresh = client.get("/ledger/ledger-1/state", params={"consistency_token": token}).json()
+        pool.gate.set()
+
+    assert (stale["balance"], stale["source"]) == (500.0, "read_model")
+    assert (fresh["balance"], fresh["source"]) == (510.0, "log")
+
+
+def test_rejects_malformed_tokens_and_tokens_for_other_ledgers(pool):
+    with client_for(pool) as client:
+        created = client.post("/ledger/").json()["consistency_token"]
+        client.get("/ledger/ledger-1/state", params={"consistency_token": created})
+        other = ConsistencyToken("ledger-2", 1).encode()
+
+        assert client.get("/ledger/ledger-1/state", params={"consistency_token": "!!"}).status_code == 400
+        assert client.get("/ledger/ledger-1/state", params={"consistency_token": other}).status_code == 400
+        assert client.get("/ledger/nope/state").status_code == 404
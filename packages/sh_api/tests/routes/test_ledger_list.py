@@ -0,0 +1,102 @@
+import itertools
+from datetime import datetime, UTC
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from sh_api.domain.ledger import CreateLedgerCommand, Ledger
+from sh_api.routes.ledger import LedgerRouter
+from sh_dendrite import aggregate
+from sh_dendrite.aggregate_factory import AggregateFactory
+from sh_dendrite.dynamodb_event_store import DynamodbEventStore, EVENT_INDEXES
+from sh_dendrite.event_store_contract import frozen_clock
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+
+
+def client_for(index_events: bool) -> tuple[TestClient, LocalDynamoDB]:
+    local = LocalDynamoDB(page_size=2)
+    local.create_table("events", indexes=EVENT_INDEXES)
+    store = DynamodbEventStore("events", "local", client=local.client(), index_events=index_events)
+    log_ids = (f"ledger-{n}" for n in itertools.count(1))
+    app = FastAPI()
+    app.include_router(LedgerRouter(AggregateFactory(store, lambda: next(log_ids), {})).get_router())
+    return TestClient(app), local
+
+
+def list_all(client: TestClient, limit: int) -> list[list[str]]:
+    """The ledger ids of each page of the listing, following its cursors"""
+    pages, params = [], {"limit": limit}
+    while True:
+        page = client.get("/ledger", params=params).json()
+        pages.append([ledger["ledger"] for ledger in page["ledgers"]])
+        if page["cursor"] is None:
+            return pages
+        params["cursor"] = page["cursor"]
+
+
+def test_lists_ledgers_from_the_event_type_index():
+    client, local = client_for(index_events=True)
+    for _ in range(3):
+        client.post("/ledger/")
+    client.post("/ledger/ledger-1/credits", json={"amount": 5})
+
+    everything = client.get("/ledger").json()["ledgers"]
+    first_two = client.get("/ledger", params={"limit": 2}).json()["ledgers"]
+
+    assert [ledger["ledger"] for ledger in everything] == ["ledger-1", "ledger-2", "ledger-3"]
+    assert [ledger["ledger"] for ledger in first_two] == ["ledger-1", "ledger-2"]
+    assert "Scan" not in local.request_counts
+
+
+def test_cursors_resume_after_the_last_ledger_listed(monkeypatch):
+    client, _ = client_for(index_events=True)
+    client.post("/ledger/")
+    # created within one millisecond, so that their creation events share an id
+    monkeypatch.setattr(aggregate, "datetime", frozen_clock(datetime.now(UTC)))
+    for _ in range(3):
+        client.post("/ledger/")
+    monkeypatch.undo()
+    client.post("/ledger/")
+
+    assert list_all(client, limit=2) == [["ledger-1", "ledger-2"], ["ledger-3", "ledger-4"], ["ledger-5"]]
+    assert list_all(client, limit=1) == [["ledger-1"], ["ledger-2"], ["ledger-3"], ["ledger-4"], ["ledger-5"]]
+    assert client.get("/ledger", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_closes_the_index_read_once_the_page_is_full():
+    local = LocalDynamoDB(page_size=2)
+    local.create_table("events", indexes=EVENT_INDEXES)
+    store = DynamodbEventStore("events", "local", client=local.client(), index_events=True)
+    factory = AggregateFactory(store, iter(["ledger-1", "ledger-2", "ledger-3"]).__next__, {})
+    for _ in range(3):
+        await factory.new(Ledger).create_ledger(CreateLedgerCommand(initial_balance=500.0))
+    # the read is held on to, so that it is closed by the listing rather than when it is collected
+    reads = []
+    iter_events_by_type = store.iter_events_by_type
+
+    def read(*args, **kwargs):
+        reads.append(iter_events_by_type(*args, **kwargs))
+        return reads[-1]
+
+    store.iter_events_by_type = read
+
+    listing = await LedgerRouter(factory).get_ledgers(limit=1)
+
+    assert listing["cursor"] is not None
+    assert reads[0].ag_frame is None     # finished, so its index query span has ended
+
+
+def test_balances_are_still_read_by_id():
+    client, _ = client_for(index_events=True)
+    client.post("/ledger/")
+
+    assert client.get("/ledger", params={"ids": "ledger-1"}).json() == {"ledgers": [{"ledger": "ledger-1", "balance": 500.0}]}
+
+
+def test_listing_needs_an_indexed_store():
+    client, _ = client_for(index_events=False)
+
+    assert client.get("/ledger").status_code == 501
+    assert client.get("/ledger", params={"limit": 0}).status_code == 400
@@ -0,0 +1,68 @@
+from datetime import date
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from sh_api.domain.ledger_statement import LedgerStatementReadModel, StatementBucket
+from sh_api.routes.ledger import LedgerRouter
+from sh_dendrite.aggregate_factory import AggregateFactory
+from sh_dendrite.in_memory_event_store import InMemoryEventStore
+
+
+class FakeStatementModel(LedgerStatementReadModel):
+    def __init__(self, buckets: list[StatementBucket]):
+        super().__init__(None)
+        self.buckets = buckets
+        self.requests = []
+
+    def get_statement(self, ledger_id, granularity, start=None, end=None):
+        self.requests.append((ledger_id, granularity, start, end))
+        return [bucket for bucket in self.buckets if bucket.granularity == granularity]
+
+
+def client_for(model: FakeStatementModel) -> TestClient:
+    app = FastAPI()
+    factory = AggregateFactory(InMemoryEventStore(), lambda: "unused", {})
+    app.include_router(LedgerRouter(factory, statement_model=model).get_router())
+    return TestClient(app)
+
+
+def test_serves_statements_from_the_rollups():
+    model = FakeStatementModel([
+        StatementBucket("ledger-1", "month", date(2026, 1, 1), 50.0, 20.0, 1, 1, 100.0, 130.0, 2, 3),
+        StatementBucket("ledger-1", "day", date(2026, 1, 30), 50.0, 20.0, 1, 1, 100.0, 130.0, 2, 3),
+    ])
+
+    response = client_for(model).get("/ledger/ledger-1/statements",
+                                     params={"from": "2026-01-01", "to": "2026-02-01", "granularity": "month"})
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "ledger_id": "ledger-1",
+        "granularity": "month",
+        "statements": [{"start": "2026-01-01", "credits": 50.0, "debits": 20.0, "credit_count": 1,
+                        "debit_count": 1, "opening_balance": 100.0, "closing_balance": 130.0}],
+    }
+    assert model.requests == [("ledger-1", "month", date(2026, 1, 1), date(2026, 2, 1))]
+
+
+def test_defaults_to_daily_statements_over_all_time():
+    model = FakeStatementModel([])
+
+    assert client_for(model).get("/ledger/ledger-1/statements").json()["statements"] == []
+    assert model.requests == [("ledger-1", "day", None, None)]
+
+
+def test_rejects_bad_ranges_and_granularities():
+    client = client_for(FakeStatementModel([]))
+
+    assert client.get("/ledger/ledger-1/statements", params={"from": "2026-02-01", "to": "2026-01-01"}).status_code == 400
+    assert client.get("/ledger/ledger-1/statements", params={"granularity": "week"}).status_code == 422
+    assert client.get("/ledger/ledger-1/statements", params={"from": "yesterday"}).status_code == 422
+
+
+def test_statements_are_only_served_with_a_statement_model():
+    app = FastAPI()
+    app.include_router(LedgerRouter(AggregateFactory(InMemoryEventStore(), lambda: "unused", {})).get_router())
+
+    assert TestClient(app).get("/ledger/ledger-1/statements").status_code == 404
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from sh_api.domain.ledger import LedgerCreatedEvent, LedgerCreditedEvent, LedgerDebitEvent
+from sh_api.routes.ledger import LedgerRouter
+from sh_dendrite.aggregate_factory import AggregateFactory
+from sh_dendrite.dynamodb_event_store import DynamodbEventStore
+from sh_dendrite.event_bus import EventBus
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+
+
+@pytest.fixture
+def bus():
+    return EventBus(topic_of=lambda event: getattr(event, "ledger_id", None), max_buffered=2)
+
+
+@pytest.fixture
+def router(bus):
+    local = LocalDynamoDB()
+    local.create_table("events")
+    store = DynamodbEventStore("events", "local", client=local.client())
+    handlers = {event_type: [bus] for event_type in (LedgerCreatedEvent, LedgerCreditedEvent, LedgerDebitEvent)}
+    return LedgerRouter(AggregateFactory(store, lambda: "ledger-1", handlers), bus)
+
+
+def sse_data(message: str) -> dict:
+    return json.loads(next(line for line in message.splitlines() if line.startswith("data: "))[len("data: "):])
+
+
+@pytest.mark.asyncio
+async def test_sse_sends_current_balance_then_changes(router):
+    await router.create_ledger()
+    response = await router.stream_ledger("ledger-1")
+    messages = response.body_iterator
+
+    initial = sse_data(await anext(messages))
+    await router.post_transactions("ledger-1", _request([("credit", 10), ("debit", 4)]))
+    credited = await anext(messages)
+    debited = sse_data(await anext(messages))
+
+    assert response.media_type == "text/event-stream"
+    assert initial == {"ledger_id": "ledger-1", "balance": 500.0, "event": None}
+    assert credited.startswith("id: ") and sse_data(credited)["balance"] == 510.0
+    assert debited["balance"] == 506.0
+    assert debited["event"]["event_type"] == "LedgerDebit"
+    await messages.aclose()
+    assert router.event_bus.subscriber_count() == 0
+
+
+@pytest.mark.asyncio
+async def test_sse_tells_a_dropped_consumer_to_reconnect(router, bus):
+    await router.create_ledger()
+    response = await router.stream_ledger("ledger-1")
+    messages = response.body_iterator
+    await anext(messages)
+
+    await router.post_transactions("ledger-1", _request([("credit", 1)] * 3))
+
+    assert [m async for m in messages] == ["event: dropped\ndata: {}\n\n"]
+
+
+def test_websocket_pushes_balance_updates(router):
+    app = FastAPI()
+    app.include_router(router.get_router())
+
+    with TestClient(app) as client:
+        client.post("/ledger/")
+        with client.websocket_connect("/ledger/ledger-1/ws") as websocket:
+            initial = websocket.receive_json()
+            client.post("/ledger/ledger-1/transactions", json={"transactions": [{"type": "credit", "amount": 5}]})
+            update = websocket.receive_json()
+
+    assert initial["balance"] == 500.0
+    assert update["balance"] == 505.0
+    assert update["event"]["data"]["amount"] == 5.0
+
+
+def _request(transactions):
+    return LedgerRouter.TransactionsRequest(transactions=[{"type": t, "amount": a} for t, a in transactions])
@@ -0,0 +1,73 @@
+import itertools
+from unittest.mock import Mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from sh_api.domain.ledger import LedgerCreditedEvent, LedgerDebitEvent
+from sh_api.routes.ledger import LedgerRouter
+from sh_dendrite.aggregate_factory import AggregateFactory
+from sh_dendrite.dynamodb_event_store import DynamodbEventStore
+from sh_dendrite.event_handler import EventHandler
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+from sh_dendrite.single_log_event_store import SingleLogEventStore
+
+
+def client_for() -> tuple[TestClient, LocalDynamoDB, Mock]:
+    local = LocalDynamoDB()
+    local.create_table("events")
+    store = DynamodbEventStore("events", "local", client=local.client())
+    handler = Mock(spec=EventHandler)
+    log_ids = (f"ledger-{n}" for n in itertools.count(1))
+    factory = AggregateFactory(store, lambda: next(log_ids), {LedgerCreditedEvent: [handler],
+                                                               LedgerDebitEvent: [handler]})
+    app = FastAPI()
+    app.include_router(LedgerRouter(factory).get_router())
+    client = TestClient(app)
+    client.post("/ledger/")
+    client.post("/ledger/")
+    return client, local, handler
+
+
+def test_transfers_between_ledgers_in_one_transaction():
+    client, local, handler = client_for()
+    transactions = local.request_counts["TransactWriteItems"]
+
+    response = client.post("/ledger/transfers", json={"source_ledger_id": "ledger-1", "target_ledger_id": "ledger-2",
+                                                      "amount": 125})
+
+    body = response.json()
+    assert [(body[side]["ledger_id"], body[side]["balance"]) for side in ("source", "target")] == [
+        ("ledger-1", 375.0), ("ledger-2", 625.0)]
+    assert local.request_counts["TransactWriteItems"] == transactions + 1
+    assert client.get("/ledger", params={"ids": "ledger-1,ledger-2"}).json()["ledgers"] == [
+        {"ledger": "ledger-1", "balance": 375.0}, {"ledger": "ledger-2", "balance": 625.0}]
+    assert [type(call.args[0][0]) for call in handler.handle_event.call_args_list] == [LedgerDebitEvent,
+                                                                                       LedgerCreditedEvent]
+
+
+def test_rejects_invalid_transfers_without_writing():
+    client, local, handler = client_for()
+    transactions = local.request_counts["TransactWriteItems"]
+
+    for body in ({"source_ledger_id": "ledger-1", "target_ledger_id": "ledger-2", "amount": 0},
+                 {"source_ledger_id": "ledger-1", "target_ledger_id": "ledger-1", "amount": 5},
+                 {"source_ledger_id": "ledger-1", "target_ledger_id": "nope", "amount": 5}):
+        assert client.post("/ledger/transfers", json=body).status_code == 400
+
+    assert local.request_counts["TransactWriteItems"] == transactions
+    handler.handle_event.assert_not_called()
+
+
+def test_transfers_need_a_store_that_appends_across_logs():
+    log_ids = (f"ledger-{n}" for n in itertools.count(1))
+    app = FastAPI()
+    app.include_router(LedgerRouter(AggregateFactory(SingleLogEventStore(), lambda: next(log_ids), {})).get_router())
+    client = TestClient(app)
+    client.post("/ledger/")
+    client.post("/ledger/")
+
+    response = client.post("/ledger/transfers", json={"source_ledger_id": "ledger-1", "target_ledger_id": "ledger-2",
+                                                      "amount": 125})
+
+    assert response.status_code == 501
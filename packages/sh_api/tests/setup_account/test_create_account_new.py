@@ -28,6 +28,6 @@ async def test_create_account_emits_account_created_event(context):
 
     event_store = context["event_store"]
 
-    log = await event_store.get_log("log")
+    log = await event_store.get_log(account.log_id)
     assert len(log) == 1
     assert isinstance(log.pop(), AccountCreatedEvent)
@@ -0,0 +1,239 @@
+import os
+import subprocess
+import sys
+import textwrap
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import httpx
+import pytest
+
+from fastapi import FastAPI
+
+from sh_api.affinity import (FORWARDED_HEADER, LEDGER_PATH, AffinityMiddleware, FileMembership, HashRing,
+                             LogAffinity)
+
+LEDGER_IDS = [f"ledger-{n}" for n in range(300)]
+
+# a worker serving the ledger routes with the affinity middleware in front, answering with its own id
+WORKER = textwrap.dedent("""
+    import asyncio, sys
+    import uvicorn
+    from fastapi import FastAPI
+    from sh_api.affinity import AffinityMiddleware, FileMembership, LogAffinity
+
+    directory, worker_id, socket_path = sys.argv[1:4]
+    affinity = LogAffinity(FileMembership(directory, worker_id, f"unix:{socket_path}", ttl=1.0),
+                           refresh_interval=0.1)
+    app = FastAPI()
+    app.add_middleware(AffinityMiddleware, affinity=affinity)
+
+    @app.post("/ledger/{ledger_id}/credits")
+    async def credit(ledger_id: str, body: dict):
+        return {"served_by": worker_id, "ledger_id": ledger_id, "amount": body["amount"]}
+
+    async def main():
+        await affinity.start()
+        await uvicorn.Server(uvicorn.Config(app, uds=socket_path, log_level="warning")).serve()
+
+    asyncio.run(main())
+""")
+
+
+class TestHashRing:
+    def test_spreads_keys_over_members(self):
+        ring = HashRing({"a": "", "b": "", "c": ""})
+
+        owners = [ring.owner(key) for key in LEDGER_IDS]
+
+        assert {owner: owners.count(owner) > 50 for owner in "abc"} == {"a": True, "b": True, "c": True}
+
+    def test_only_keys_of_a_leaving_member_move(self):
+        ring = HashRing({"a": "", "b": "", "c": ""})
+        before = {key: ring.owner(key) for key in LEDGER_IDS}
+
+        ring.remove("b")
+
+        moved = [key for key in LEDGER_IDS if ring.owner(key) != before[key]]
+        assert moved and all(before[key] == "b" for key in moved)
+
+    def test_empty_ring_has_no_owner(self):
+        assert HashRing().owner("ledger-1") is None
+
+
+class TestLedgerPath:
+    def test_matches_requests_for_a_single_ledger(self):
+        assert {path: LEDGER_PATH.match(path)["log_id"]
+                for path in ("/ledger/ledger-1", "/ledger/ledger-1/credits", "/ledger/transfers-1/debits")} == {
+            "/ledger/ledger-1": "ledger-1", "/ledger/ledger-1/credits": "ledger-1",
+            "/ledger/transfers-1/debits": "transfers-1"}
+
+    def test_reserved_routes_are_not_ledgers(self):
+        assert [path for path in ("/ledger/", "/ledger/transfers", "/ledger/transfers/", "/ledger/ledger-1/events")
+                if LEDGER_PATH.match(path)] == []
+
+
+class TestMembership:
+    def test_workers_join_and_expire(self, tmp_path):
+        first = FileMembership(str(tmp_path), "w1", "unix:/tmp/w1.sock", ttl=0.2)
+        second = FileMembership(str(tmp_path), "w2", "http://127.0.0.1:9002", ttl=0.2)
+        first.heartbeat()
+        second.heartbeat()
+
+        assert first.members() == {"w1": "unix:/tmp/w1.sock", "w2": "http://127.0.0.1:9002"}
+        second.leave()
+        assert first.members() == {"w1": "unix:/tmp/w1.sock"}
+        time.sleep(0.3)
+        assert first.members() == {}
+
+    def test_ring_always_includes_the_worker_itself(self, tmp_path):
+        affinity = LogAffinity(FileMembership(str(tmp_path), "w1", "unix:/tmp/w1.sock"))
+        FileMembership(str(tmp_path), "w2", "unix:/tmp/w2.sock").heartbeat()
+
+        assert affinity.refresh()
+        assert not affinity.refresh()
+        owned_elsewhere = [key for key in LEDGER_IDS if affinity.target_for(key)]
+        assert owned_elsewhere and {affinity.target_for(key).worker_id for key in owned_elsewhere} == {"w2"}
+
+
+class TestAffinityMiddleware:
+    @pytest.fixture
+    def setup(self, tmp_path):
+        """A worker fronted by the middleware, with ledgers owned by a second worker that applies credits"""
+        affinity = LogAffinity(FileMembership(str(tmp_path), "w1", "unix:/tmp/w1.sock"))
+        FileMembership(str(tmp_path), "w2", "http://w2").heartbeat()
+        affinity.refresh()
+        applied = {"w1": 0, "w2": 0}
+        owner = {"error": None}
+
+        def serve_on_owner(request: httpx.Request) -> httpx.Response:
+            if owner["error"] is httpx.ConnectError:
+                raise httpx.ConnectError("refused", request=request)
+            if request.method == "POST":
+                applied["w2"] += 1
+            if owner["error"] is not None:
+                raise owner["error"]("timed out", request=request)
+            return httpx.Response(200, json={"served_by": "w2"})
+
+        affinity._clients["http://w2"] = httpx.AsyncClient(transport=httpx.MockTransport(serve_on_owner),
+                                                           base_url="http://w2")
+        app = FastAPI()
+
+        @app.post("/ledger/{ledger_id}/credits")
+        async def credit(ledger_id: str):
+            applied["w1"] += 1
+            return {"served_by": "w1"}
+
+        @app.get("/ledger/{ledger_id}")
+        async def get(ledger_id: str):
+            return {"served_by": "w1"}
+
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=AffinityMiddleware(app, affinity=affinity)),
+                                   base_url="http://w1")
+        ledger_id = next(key for key in LEDGER_IDS if affinity.target_for(key))
+        return client, ledger_id, applied, owner
+
+    @pytest.mark.asyncio
+    async def test_a_command_the_owner_may_have_applied_is_not_applied_again(self, setup):
+        client, ledger_id, applied, owner = setup
+        owner["error"] = httpx.ReadTimeout
+
+        response = await client.post(f"/ledger/{ledger_id}/credits", json={"amount": 5})
+
+        assert response.status_code == 504
+        assert applied == {"w1": 0, "w2": 1}
+        assert (await client.get(f"/ledger/{ledger_id}")).json() == {"served_by": "w1"}
+
+    @pytest.mark.asyncio
+    async def test_requests_the_owner_never_received_are_served_locally(self, setup):
+        client, ledger_id, applied, owner = setup
+        assert (await client.post(f"/ledger/{ledger_id}/credits", json={"amount": 5})).json() == {"served_by": "w2"}
+        owner["error"] = httpx.ConnectError
+
+        response = await client.post(f"/ledger/{ledger_id}/credits", json={"amount": 5})
+
+        assert response.json() == {"served_by": "w1"}
+        assert applied == {"w1": 1, "w2": 1}
+
+
+@contextmanager
+def running_workers(root):
+    """Starts three worker processes sharing a membership directory, each with a client for its socket"""
+    workers = {}
+    for worker_id in ("w1", "w2", "w3"):
+        socket_path = str(root / f"{worker_id}.sock")
+        process = subprocess.Popen([sys.executable, "-c", WORKER, str(root / "members"), worker_id, socket_path])
+        workers[worker_id] = Worker(process, socket_path,
+                                    httpx.Client(transport=httpx.HTTPTransport(uds=socket_path),
+                                                 base_url="http://worker"))
+    try:
+        for worker in workers.values():
+            _wait_for(lambda: os.path.exists(worker.socket_path))
+        time.sleep(0.3)     # a few refreshes, so that every worker sees the others
+        yield workers
+    finally:
+        for worker in workers.values():
+            worker.stop()
+
+
+@dataclass
+class Worker:
+    process: subprocess.Popen
+    socket_path: str
+    client: httpx.Client
+
+    def credit(self, ledger_id: str, headers: dict | None = None) -> dict:
+        response = self.client.post(f"/ledger/{ledger_id}/credits", json={"amount": 5}, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    def stop(self) -> None:
+        self.client.close()
+        if self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait(timeout=10)
+
+
+def _wait_for(condition, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("worker did not start")
+        time.sleep(0.05)
+
+
+@pytest.fixture(scope="module")
+def workers(tmp_path_factory):
+    with running_workers(tmp_path_factory.mktemp("workers")) as workers:
+        yield workers
+
+
+def test_every_worker_routes_a_ledger_to_the_same_owner(workers):
+    owners = {ledger_id: {worker.credit(ledger_id)["served_by"] for worker in workers.values()}
+              for ledger_id in LEDGER_IDS[:20]}
+
+    assert all(len(served_by) == 1 for served_by in owners.values())
+    assert len(set.union(*owners.values())) > 1
+    assert workers["w1"].credit("ledger-1") == {"served_by": next(iter(owners["ledger-1"])),
+                                               "ledger_id": "ledger-1", "amount": 5}
+
+
+def test_forwarded_requests_are_served_where_they_land(workers):
+    served_by = {workers["w1"].credit(ledger_id, headers={FORWARDED_HEADER: "w2"})["served_by"]
+                 for ledger_id in LEDGER_IDS[:20]}
+
+    assert served_by == {"w1"}
+
+
+def test_ledgers_of_a_stopped_worker_move_to_the_others(tmp_path):
+    with running_workers(tmp_path) as workers:
+        workers.pop("w2").stop()
+        time.sleep(1.3)     # past the membership ttl
+
+        owners = {ledger_id: {worker.credit(ledger_id)["served_by"] for worker in workers.values()}
+                  for ledger_id in LEDGER_IDS[:20]}
+
+    # each ledger has one owner again, rather than being served wherever the request landed
+    assert all(len(served_by) == 1 for served_by in owners.values())
+    assert set.union(*owners.values()) == {"w1", "w3"}
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from sh_api.routes.health import HealthRouter
+from sh_api.startup_profile import StartupProfile
+
+
+@pytest.fixture
+def profile():
+    return StartupProfile(import_seconds=0.25)
+
+
+@pytest.fixture
+def client(profile):
+    app = FastAPI()
+    app.include_router(HealthRouter(profile).get_router())
+    return TestClient(app)
+
+
+def test_live_but_not_ready_while_starting(client):
+    assert client.get("/health/live").status_code == 200
+
+    response = client.get("/health/ready")
+
+    assert response.status_code == 503
+    assert response.json()["status"] == "starting"
+
+
+def test_ready_reports_startup_profile(client, profile):
+    asyncio.run(timed_phase(profile, "event_store"))
+    profile.mark_ready()
+
+    response = client.get("/health/ready")
+
+    assert response.status_code == 200
+    startup = response.json()["startup"]
+    assert startup["import_ms"] == 250.0
+    assert "event_store" in startup["phases_ms"]
+    assert startup["ready_ms"] is not None
+
+
+def test_failed_startup_fails_liveness(client, profile):
+    profile.mark_failed(ConnectionError("read model unreachable"))
+
+    assert client.get("/health/live").status_code == 503
+    assert client.get("/health/ready").json()["status"] == "failed"
+
+
+async def timed_phase(profile: StartupProfile, name: str):
+    async with profile.phase(name):
+        await asyncio.sleep(0)
@@ -0,0 +1,24 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from fastapi import FastAPI
+
+from sh_api import main
+
+
+@pytest.mark.asyncio
+async def test_a_failed_startup_closes_what_did_start(monkeypatch):
+    event_store = MagicMock(close=AsyncMock())
+    monkeypatch.setattr(main, "startup_profile", main.StartupProfile())
+    monkeypatch.setattr(main, "init_event_store", AsyncMock(return_value=event_store))
+    monkeypatch.setattr(main, "init_read_model_pool", AsyncMock(side_effect=ConnectionError("read model unreachable")))
+    monkeypatch.setattr(main, "init_event_registry", AsyncMock(return_value=0))
+    app = FastAPI()
+
+    async with main.lifespan(app):
+        while not main.startup_profile.failed:
+            await asyncio.sleep(0)
+        assert app.state.event_store is event_store
+
+    event_store.close.assert_awaited_once()
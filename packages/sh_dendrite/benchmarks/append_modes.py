@@ -0,0 +1,87 @@
+"""Compares DynamodbEventStore appends in metadata mode and version mode.
+
+    python packages/sh_dendrite/benchmarks/append_modes.py --logs 20 --events 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import uuid
+from dataclasses import dataclass
+
+from sh_dendrite.aggregate import Aggregate
+from sh_dendrite.dynamodb_event_store import ConcurrencyMode, DynamodbEventStore
+from sh_dendrite.event import Event
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+
+
+@dataclass
+class Ticked(Event):
+    amount: float
+
+
+class Counter(Aggregate):
+    def on(self, event: Event) -> None:
+        pass
+
+
+async def run_mode(store: DynamodbEventStore, logs: int, events: int) -> list[float]:
+    """Appends `events` events to each of `logs` logs concurrently, returning per-append latencies"""
+    latencies = []
+
+    async def append_log() -> None:
+        aggregate = Counter(str(uuid.uuid4()), store, {})
+        for _ in range(events):
+            started = time.perf_counter()
+            await aggregate.apply(Ticked(1.0))
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(append_log() for _ in range(logs)))
+    return latencies
+
+
+def report(mode: ConcurrencyMode, latencies: list[float], elapsed: float, write_units: int | None) -> None:
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    line = (f"{mode.value:>8}: {len(latencies) / elapsed:8.0f} appends/s  "
+            f"p50 {statistics.median(latencies) * 1000:6.2f} ms  p99 {p99 * 1000:6.2f} ms")
+    if write_units is not None:
+        line += f"  {write_units / len(latencies):.1f} WCU/append"
+    print(line)
+
+
+async def main_async(args) -> None:
+    for mode in ConcurrencyMode:
+        local = None
+        if args.table:
+            store = DynamodbEventStore(args.table, args.region, args.profile, endpoint_url=args.endpoint_url,
+                                       concurrency_mode=mode)
+        else:
+            local = LocalDynamoDB()
+            local.create_table("bench")
+            store = DynamodbEventStore("bench", "local", client=local.client(), concurrency_mode=mode)
+
+        try:
+            started = time.perf_counter()
+            latencies = await run_mode(store, args.logs, args.events)
+            elapsed = time.perf_counter() - started
+        finally:
+            await store.close()
+
+        report(mode, latencies, elapsed, local.write_units if local else None)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logs", type=int, default=20, help="Logs appended to concurrently")
+    parser.add_argument("--events", type=int, default=50, help="Events appended to each log")
+    parser.add_argument("--table", help="Benchmark this DynamoDB table instead of the in-process stand-in")
+    parser.add_argument("--region", default=os.getenv('AWS_REGION'))
+    parser.add_argument("--profile", default=os.getenv('AWS_PROFILE'))
+    parser.add_argument("--endpoint-url", default=os.getenv('DYNAMODB_ENDPOINT_URL'))
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Measures how long ColumnTable takes to load rows and answer indexed queries, and what it holds in memory.
+
+    python packages/sh_dendrite/benchmarks/indexed_projection.py --rows 1000000
+"""
+import argparse
+import random
+import time
+from dataclasses import dataclass
+
+from sh_dendrite.indexed_projection import ColumnTable
+
+
+@dataclass
+class LedgerRow:
+    ledger_id: str
+    balance: float
+    family_id: str | None = None
+
+
+def timed(query, repeat: int) -> float:
+    """Best-of-three microseconds per call"""
+    best = float('inf')
+    for _ in range(3):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            query()
+        best = min(best, time.perf_counter() - started)
+    return best * 1e6 / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--families", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    table = ColumnTable(LedgerRow, key="ledger_id", sorted=["balance"], hashed=["family_id"])
+    started = time.perf_counter()
+    for n in range(args.rows):
+        table.upsert(LedgerRow(f"ledger-{n}", rng.uniform(-1000, 100_000), f"family-{n % args.families}"))
+    loaded = time.perf_counter() - started
+
+    print(f"{args.rows} rows loaded in {loaded:.2f}s ({loaded * 1e6 / args.rows:.1f} us/row)")
+    print(f"  get:                 {timed(lambda: table.get('ledger-42'), args.repeat):8.1f} us")
+    print(f"  top 100:             {timed(lambda: table.top('balance', 100), args.repeat):8.1f} us")
+    print(f"  below 0, count:      {timed(lambda: table.count_range('balance', high=0.0), args.repeat):8.1f} us")
+    print(f"  below -990:          {timed(lambda: table.range('balance', high=-990.0), args.repeat):8.1f} us")
+    print(f"  one family:          {timed(lambda: table.where('family_id', 'family-7'), args.repeat):8.1f} us")
+    print(f"  update balance:      "
+          f"{timed(lambda: table.update('ledger-42', balance=rng.uniform(0, 1000)), args.repeat):8.1f} us")
+    print(f"  totals per family:   {timed(lambda: table.sum_by('family_id', 'balance'), 3):8.1f} us")
+    usage = table.memory_usage()
+    print(f"  memory:              {usage['total'] / 2 ** 20:8.1f} MiB "
+          f"({usage['total'] / args.rows:.0f} bytes/row)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Compares replaying stored items through eagerly built events and lazy events.
+
+    python packages/sh_dendrite/benchmarks/lazy_replay.py --events 100000 --payload-fields 20
+"""
+import argparse
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, UTC
+
+from sh_dendrite.aggregate import Aggregate
+from sh_dendrite.dynamodb_event_store import event_to_item, item_to_event, item_to_lazy_event
+from sh_dendrite.event import Event
+
+
+@dataclass
+class Posted(Event):
+    amount: float
+    memo: dict = field(default_factory=dict)
+
+
+class Balance(Aggregate):
+    def __init__(self):
+        super().__init__("bench", None, {})
+        self.balance = 0.0
+
+    def on(self, event: Event) -> None:
+        match event:
+            case Posted():
+                self.balance += event.amount
+
+
+def make_items(count: int, payload_fields: int) -> list[dict]:
+    items = []
+    for n in range(count):
+        event = Posted(1.0, {f"field_{i}": f"value {i}" for i in range(payload_fields)})
+        event.event_id = f"{n:012d}_Posted"
+        event.applied_time = datetime.now(UTC)
+        event.version = n + 1
+        items.append(event_to_item("bench", event))
+    return items
+
+
+def replay(items: list[dict], decode) -> float:
+    aggregate = Balance()
+    started = time.perf_counter()
+    for item in items:
+        aggregate._on_event(decode(item))
+    elapsed = time.perf_counter() - started
+    assert aggregate.balance == len(items)
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--payload-fields", type=int, default=20)
+    args = parser.parse_args()
+
+    items = make_items(args.events, args.payload_fields)
+    eager = min(replay(items, item_to_event) for _ in range(3))
+    lazy = min(replay(items, item_to_lazy_event) for _ in range(3))
+    print(f"{args.events} events, {args.payload_fields} payload fields")
+    print(f"  eager: {eager * 1e6 / args.events:6.2f} us/event")
+    print(f"  lazy:  {lazy * 1e6 / args.events:6.2f} us/event  ({eager / lazy:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
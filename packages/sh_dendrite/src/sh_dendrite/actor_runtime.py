@@ -0,0 +1,281 @@
+"""Single-writer actors: one resident aggregate per log, whose queued commands are group-committed.
+
+    runtime = ActorRuntime(aggregate_factory)
+    balance = await runtime.execute(Ledger, ledger_id, lambda ledger: ledger.credit(command))
+"""
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Type, TypeVar
+
+from opentelemetry import trace
+
+from sh_dendrite.aggregate import Aggregate, dispatch_events
+from sh_dendrite.aggregate_factory import AggregateFactory
+from sh_dendrite.concurrency_violation_error import ConcurrencyViolationError
+from sh_dendrite.event import Event
+from sh_dendrite.unit_of_work import StagingEventStore, order_event_ids
+
+A = TypeVar('A', bound=Aggregate)
+R = TypeVar('R')
+
+logger = logging.getLogger(__name__)
+tracer = trace.get_tracer(__name__)
+
+
+@dataclass
+class _Command:
+    run: Callable[[Aggregate], Awaitable[Any]]
+    future: asyncio.Future
+    attempts: int = 0
+    result: Any = None
+    events: list[Event] = field(default_factory=list)
+
+    def succeed(self) -> None:
+        if not self.future.done():
+            self.future.set_result(self.result)
+
+    def fail(self, error: BaseException) -> None:
+        if not self.future.done():
+            self.future.set_exception(error)
+
+
+class AggregateActor:
+    def __init__(self, runtime: 'ActorRuntime', aggregate_type: Type[Aggregate], log_id: str):
+        self.runtime = runtime
+        self.aggregate_type = aggregate_type
+        self.log_id = log_id
+        self.mailbox: deque[_Command] = deque()
+        self.busy = False
+        self.stopped = False
+        self.aggregate: Aggregate | None = None
+        self._store = StagingEventStore(runtime.aggregate_factory.event_store)
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    @property
+    def idle(self) -> bool:
+        return not self.mailbox and not self.busy
+
+    def post(self, command: _Command) -> None:
+        self.mailbox.append(command)
+        self._wakeup.set()
+
+    def stop(self) -> None:
+        self.stopped = True
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        try:
+            while True:
+                if not self.mailbox:
+                    if self.stopped:
+                        return
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), self.runtime.idle_ttl)
+                    except TimeoutError:
+                        # nothing was posted while waiting, and nothing can be between here and retiring
+                        if not self.mailbox:
+                            self.runtime._retire(self)
+                            return
+                    continue
+
+                self.busy = True
+                try:
+                    if self.runtime.commit_window > 0:
+                        await asyncio.sleep(self.runtime.commit_window)
+                    group = [self.mailbox.popleft()
+                             for _ in range(min(len(self.mailbox), self.runtime.max_group_commands))]
+                    await self._process(group)
+                finally:
+                    self.busy = False
+        finally:
+            self.runtime._retire(self)
+            error = RuntimeError(f"actor for log {self.log_id} stopped")
+            while self.mailbox:
+                self.mailbox.popleft().fail(error)
+
+    async def _load(self) -> None:
+        aggregate = await self.runtime.aggregate_factory.load(self.aggregate_type, self.log_id)
+        # appends are staged until the group commits, and the handlers run once it has
+        aggregate.event_store = self._store
+        aggregate.event_handlers = {}
+        aggregate.after_append = None
+        self.aggregate = aggregate
+
+    async def _process(self, commands: list[_Command]) -> None:
+        if self.aggregate is None:
+            try:
+                await self._load()
+            except Exception as e:
+                for command in commands:
+                    command.fail(e)
+                return
+
+        with tracer.start_as_current_span("actor.process") as span:
+            span.set_attribute("log_id", self.log_id)
+            span.set_attribute("command_count", len(commands))
+
+            committed_event = self.aggregate.last_event_name
+            ran: list[_Command] = []
+            for index, command in enumerate(commands):
+                staged_before = len(self._store.staged)
+                try:
+                    command.result = await command.run(self.aggregate)
+                except Exception as e:
+                    command.fail(e)
+                    if len(self._store.staged) == staged_before:
+                        continue
+                    # the command changed the in-memory state before failing, so the state is rebuilt
+                    # from the store once the commands before it are committed
+                    del self._store.staged[staged_before:]
+                    self.mailbox.extendleft(reversed(commands[index + 1:]))
+                    await self._commit(ran, committed_event)
+                    await self._reload()
+                    return
+                command.events = self._store.staged[staged_before:]
+                ran.append(command)
+
+            await self._commit(ran, committed_event)
+
+    def _chunks(self, commands: list[_Command]) -> list[list[_Command]]:
+        """Splits the group at command boundaries so that no append exceeds the store's atomic limit"""
+        limit = self._store.max_batch_events
+        chunks: list[list[_Command]] = [[]]
+        size = 0
+        for command in commands:
+            if limit is not None and chunks[-1] and size + len(command.events) > limit:
+                chunks.append([])
+                size = 0
+            chunks[-1].append(command)
+            size += len(command.events)
+        return chunks
+
+    async def _commit(self, commands: list[_Command], committed_event: str | None) -> None:
+        self._store.staged.clear()
+        event_store = self.runtime.aggregate_factory.event_store
+        chunks = self._chunks(commands)
+        for index, chunk in enumerate(chunks):
+            events = [event for command in chunk for event in command.events]
+            if events:
+                try:
+                    order_event_ids(events, committed_event)
+                    with tracer.start_as_current_span("actor.commit") as span:
+                        span.set_attribute("event_count", len(events))
+                        await event_store.apply_many(self.log_id, events, committed_event)
+                except ConcurrencyViolationError as e:
+                    self._retry([command for rest in chunks[index:] for command in rest], e)
+                    await self._reload()
+                    return
+                except Exception as e:
+                    for command in (command for rest in chunks[index:] for command in rest):
+                        command.fail(e)
+                    await self._reload()
+                    return
+                committed_event = events[-1].event_id
+                self.aggregate.last_event_name = committed_event
+                self.runtime.aggregate_factory.invalidate_loads(self.log_id)
+                try:
+                    dispatch_events(self.runtime.aggregate_factory.event_handlers, events)
+                except Exception as e:
+                    # the events are durable; as with Aggregate.apply the handler's error is the caller's
+                    for command in chunk:
+                        command.fail(e)
+                    continue
+            for command in chunk:
+                command.succeed()
+
+    def _retry(self, commands: list[_Command], error: ConcurrencyViolationError) -> None:
+        retried = []
+        for command in commands:
+            command.events = []
+            if command.attempts < self.runtime.max_conflict_retries:
+                command.attempts += 1
+                retried.append(command)
+            else:
+                command.fail(error)
+        logger.info("log changed outside its actor, retrying commands",
+                    extra={"log_id": self.log_id, "retried": len(retried), "failed": len(commands) - len(retried)})
+        self.mailbox.extendleft(reversed(retried))
+
+    async def _reload(self) -> None:
+        self.aggregate = None
+        try:
+            await self._load()
+        except Exception:
+            # loaded again before the next command runs
+            logger.warning("failed to reload aggregate", extra={"log_id": self.log_id}, exc_info=True)
+
+
+class ActorRuntime:
+    def __init__(self,
+                 aggregate_factory: AggregateFactory,
+                 commit_window: float = 0.0,
+                 max_group_commands: int = 256,
+                 max_actors: int = 10_000,
+                 idle_ttl: float | None = 300.0,
+                 max_conflict_retries: int = 3):
+        """
+        commit_window: seconds an actor waits after a command arrives for more to join its group.
+        max_actors: resident actors beyond this are evicted least recently used first, if idle.
+        idle_ttl: seconds after which an idle actor is evicted; None keeps it resident.
+        max_conflict_retries: times a command is run again after a write from outside this process.
+        """
+        self.aggregate_factory = aggregate_factory
+        self.commit_window = commit_window
+        self.max_group_commands = max_group_commands
+        self.max_actors = max_actors
+        self.idle_ttl = idle_ttl
+        self.max_conflict_retries = max_conflict_retries
+        self._actors: OrderedDict[tuple[type, str], AggregateActor] = OrderedDict()
+
+    @property
+    def actor_count(self) -> int:
+        return len(self._actors)
+
+    async def execute(self,
+                      aggregate_type: Type[A],
+                      log_id: str,
+                      command: Callable[[A], Awaitable[R]]) -> R:
+        """Runs command(aggregate) after the commands queued before it; returns once its events are durable"""
+        actor = self._actor_for(aggregate_type, log_id)
+        future = asyncio.get_running_loop().create_future()
+        actor.post(_Command(command, future))
+        return await future
+
+    def _actor_for(self, aggregate_type: Type[Aggregate], log_id: str) -> AggregateActor:
+        key = (aggregate_type, log_id)
+        actor = self._actors.get(key)
+        if actor is not None:
+            self._actors.move_to_end(key)
+            return actor
+        actor = self._actors[key] = AggregateActor(self, aggregate_type, log_id)
+        self._evict(keep=key)
+        return actor
+
+    def _evict(self, keep: tuple[type, str]) -> None:
+        excess = len(self._actors) - self.max_actors
+        if excess <= 0:
+            return
+        for key, actor in list(self._actors.items()):
+            if excess <= 0:
+                break
+            if key != keep and actor.idle:
+                del self._actors[key]
+                actor.stop()
+                excess -= 1
+
+    def _retire(self, actor: AggregateActor) -> None:
+        key = (actor.aggregate_type, actor.log_id)
+        if self._actors.get(key) is actor:
+            del self._actors[key]
+
+    async def close(self) -> None:
+        """Stops every actor once the commands already posted to it have completed"""
+        actors = list(self._actors.values())
+        self._actors.clear()
+        for actor in actors:
+            actor.stop()
+        await asyncio.gather(*(actor._task for actor in actors), return_exceptions=True)
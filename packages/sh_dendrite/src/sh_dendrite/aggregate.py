@@ -1,11 +1,12 @@
+import copy
 from datetime import datetime, UTC
 import uuid
 from abc import ABC, abstractmethod
-from typing import TypeVar
+from typing import Callable, TypeVar
 
 from opentelemetry import trace
 
-from sh_dendrite.event import Event
+from sh_dendrite.event import Event, next_event_id
 from sh_dendrite.event_store import EventStore
 
 tracer = trace.get_tracer(__name__)
@@ -15,7 +16,15 @@ def uuid_log_id_generator() -> str:
 
 E = TypeVar('E', bound=EventStore)
 
+
+def aggregate_type_name(aggregate_class: type) -> str:
+    return f"{aggregate_class.__module__}.{aggregate_class.__name__}"   # fully qualified type name
+
+
 class Aggregate(ABC):
+    # attributes the aggregate works with rather than owns: copies share them, and replays in another process go without
+    shared_attributes = ('event_store', 'event_handlers', 'after_append')
+
     def __init__(self,
                  log_id: str,
                  event_store: EventStore,
@@ -24,13 +33,49 @@ class Aggregate(ABC):
         self.event_store = event_store
         self.event_handlers = event_handlers
         self.last_event_name: str | None = None
+        self.version = 0     # number of events in the log as of last_event_name
+        self.read_only = False  # set on instances shared between concurrent readers, which must not apply events
+        self.after_append: Callable[[str], None] | None = None    # told the log id once an append has landed
 
     @abstractmethod
     def on(self, event: Event) -> None:
         pass
 
+    # snapshot support is opt-in: aggregates that override both methods below can be restored from a
+    # snapshot plus the tail of their log instead of replaying the full log
+    def snapshot_state(self) -> dict:
+        """Returns the aggregate's state as a JSON-compatible dict"""
+        raise NotImplementedError(f"{type(self).__name__} does not support snapshots")
+
+    def restore_state(self, state: dict) -> None:
+        """Restores state previously returned by snapshot_state"""
+        raise NotImplementedError(f"{type(self).__name__} does not support snapshots")
+
+    @classmethod
+    def supports_snapshots(cls) -> bool:
+        return (cls.snapshot_state is not Aggregate.snapshot_state and
+                cls.restore_state is not Aggregate.restore_state)
+
+    def __deepcopy__(self, memo):
+        clone = object.__new__(type(self))
+        memo[id(self)] = clone
+        for name, value in vars(self).items():
+            shared = name in self.shared_attributes
+            setattr(clone, name, value if shared else copy.deepcopy(value, memo))
+        return clone
+
+    def _check_writable(self) -> None:
+        if self.read_only:
+            raise RuntimeError(f"{type(self).__name__} {self.log_id} was loaded read-only and cannot apply events")
+
+    def _appended(self) -> None:
+        if self.after_append is not None:
+            self.after_append(self.log_id)
+
     def _on_event(self, event: Event) -> None:
         self.last_event_name = event.event_id
+        # events written before versions were recorded are counted instead
+        self.version = event.version if event.version is not None else self.version + 1
         self.on(event)
 
     async def reload(self) -> None:
@@ -40,22 +85,71 @@ class Aggregate(ABC):
                 self._on_event(event)
 
     async def apply(self, event: Event) -> None:
+        self._check_writable()
         # set key values on the event before persisting
-        applied_time = datetime.now(UTC)
-        if event.event_id is None:
-            event.event_id = f"{applied_time.strftime('%Y%m%d%H%M%S%f')[:-3]}_{event.event_name}"
-        event.applied_time = applied_time
+        stamp_events([event], type(self), self.version, self.last_event_name)
 
         # ensure the event is applied in durable storage
         with tracer.start_as_current_span("apply.event_store"):
             await self.event_store.apply(self.log_id, event, self.last_event_name)
+        self._appended()
 
         # apply the event to the aggregate
         with tracer.start_as_current_span("apply.event_sourcing_handler"):
-            self.on(event)
+            self._on_event(event)
 
         # dispatch any registered handlers for the event type
         with tracer.start_as_current_span("apply.event_handlers"):
             handlers = self.event_handlers.get(type(event), [])
             for handler in handlers:
-                handler.handle_event([event])
\ No newline at end of file
+                handler.handle_event([event])
+
+    async def apply_many(self, events: list[Event]) -> None:
+        """
+        Persists the events with a single append - atomic for stores that support it - then folds them
+        into the aggregate and dispatches them, each handler receiving all of its events in one call.
+        """
+        if not events:
+            return
+        self._check_writable()
+
+        stamp_events(events, type(self), self.version, self.last_event_name)
+
+        with tracer.start_as_current_span("apply_many.event_store") as span:
+            span.set_attribute("event_count", len(events))
+            await self.event_store.apply_many(self.log_id, events, self.last_event_name)
+        self._appended()
+
+        with tracer.start_as_current_span("apply_many.event_sourcing_handler"):
+            for event in events:
+                self._on_event(event)
+
+        with tracer.start_as_current_span("apply_many.event_handlers"):
+            dispatch_events(self.event_handlers, events)
+
+
+def stamp_events(events: list[Event], aggregate_class: type, version: int, previous: str | None,
+                 applied_time: datetime | None = None) -> None:
+    """
+    Gives events applied together, after the given version of the log and its event with id previous,
+    their ids, applied time - now, unless given - and versions
+    """
+    applied_time = applied_time or datetime.now(UTC)
+    aggregate_type = aggregate_type_name(aggregate_class)
+    for index, event in enumerate(events):
+        event.version = version + index + 1
+        if event.event_id is None:
+            event.event_id = next_event_id(previous, applied_time, event.version, event.event_name)
+        previous = event.event_id
+        event.applied_time = applied_time
+        event.aggregate_type = aggregate_type
+
+
+def dispatch_events(event_handlers: dict[type[Event], list], events: list[Event]) -> None:
+    """Dispatches the events to their registered handlers, each handler receiving all of its events in one call"""
+    batches: dict[int, tuple[object, list[Event]]] = {}
+    for event in events:
+        for handler in event_handlers.get(type(event), []):
+            batches.setdefault(id(handler), (handler, []))[1].append(event)
+    for handler, handler_events in batches.values():
+        handler.handle_event(handler_events)
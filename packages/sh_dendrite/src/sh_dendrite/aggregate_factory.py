@@ -1,15 +1,34 @@
-from typing import Callable, TypeVar, Type
+import asyncio
+import copy
+import logging
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, TypeVar, Type
 from opentelemetry import trace
-from sh_dendrite.aggregate import Aggregate
+from sh_dendrite.aggregate import Aggregate, dispatch_events, stamp_events
+from sh_dendrite.blind_append import BlindAppendUnavailable, BlindCommand
+from sh_dendrite.concurrency_violation_error import ConcurrencyViolationError
 from sh_dendrite.event import Event
 from sh_dendrite.event_handler import EventHandler
 from sh_dendrite.event_store import EventStore
+from sh_dendrite.lazy_event import lazy_reads
+from sh_dendrite.log_head import LogHead
+from sh_dendrite.replay import ReplayExecutor, fold
+from sh_dendrite.snapshot import Snapshot
 
 A = TypeVar('A', bound=Aggregate)
 E = TypeVar('E', bound=Event)
 H = TypeVar('H', bound=EventHandler)
 
 tracer = trace.get_tracer(__name__)
+logger = logging.getLogger(__name__)
+
+@dataclass
+class _Flight:
+    """A load in progress and the callers waiting for it"""
+    task: asyncio.Task
+    readers: int = 0
+    writers: int = 0
+
 
 # there may be a more pythonic way to do this since all derived classes will share the
 # same values set on the superclass
@@ -17,35 +36,237 @@ class AggregateFactory:
     def __init__(self,
                  event_store: EventStore,
                  log_id_generator: Callable[[], str],
-                 event_handlers: dict[type[E], list[H]]):
+                 event_handlers: dict[type[E], list[H]],
+                 snapshot_threshold: int | None = None,
+                 replay_executor: ReplayExecutor | None = None):
+        """
+        snapshot_threshold: loads that fold at least this many events save a snapshot, best effort.
+        replay_executor: runs replays of long logs off the event loop.
+        """
         self.event_store = event_store
         self.log_id_generator = log_id_generator
         self.event_handlers = event_handlers
+        self.snapshot_threshold = snapshot_threshold
+        self.replay_executor = replay_executor
+        # loads in progress by (aggregate type, log id), which concurrent loads of the same log join
+        self._flights: dict[tuple[type, str], _Flight] = {}
+        self.coalesced_loads = 0    # loads served by joining another caller's load
 
     def new(self, aggregate_type: Type[A]) -> A:
         instance = aggregate_type(self.log_id_generator(),
                                   self.event_store,
                                   self.event_handlers)
+        instance.after_append = self.invalidate_loads
 
         return instance
 
     async def load(self,
              aggregate_type: Type[A],
-             log_id: str) -> A:
+             log_id: str,
+             read_only: bool = False) -> A:
+        """
+        Loads the aggregate by replaying its log; concurrent loads of a log share one read until an append to it
+        lands, read_only callers sharing the instance too
+        """
+        key = (aggregate_type, log_id)
+        flight = self._flights.get(key)
+        if flight is None:
+            # a task of its own, so that the callers waiting on it can be cancelled independently
+            flight = self._flights[key] = _Flight(asyncio.create_task(self._fly(key, aggregate_type, log_id)))
+        else:
+            self.coalesced_loads += 1
+        if read_only:
+            flight.readers += 1
+        else:
+            flight.writers += 1
+
+        try:
+            instance = await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if read_only:
+                flight.readers -= 1
+            else:
+                flight.writers -= 1
+            raise
+
+        if read_only:
+            instance.read_only = True
+            return instance
+        # the last writer to resume takes the loaded instance, unless readers share it; the others get
+        # copies, taken before it is handed out
+        flight.writers -= 1
+        if flight.writers == 0 and flight.readers == 0:
+            return instance
+        clone = copy.deepcopy(instance)
+        clone.read_only = False
+        return clone
+
+    async def _fly(self, key: tuple[type, str], aggregate_type: Type[A], log_id: str) -> A:
+        try:
+            return await self._load(aggregate_type, log_id)
+        finally:
+            # removed as the load completes, so no caller can join a load whose result is being handed out -
+            # unless an append to the log has detached it already, and a later load taken its place
+            flight = self._flights.get(key)
+            if flight is not None and flight.task is asyncio.current_task():
+                del self._flights[key]
+
+    def invalidate_loads(self, log_id: str) -> None:
+        """Detaches the loads of the log in progress, so that loads from now on read past an append that has landed"""
+        for key in [key for key in self._flights if key[1] == log_id]:
+            del self._flights[key]
+
+    async def load_many(self,
+                        aggregate_type: Type[A],
+                        log_ids: list[str],
+                        concurrency: int = 16) -> list[A]:
+        """Loads the aggregates concurrently and returns them in the order of log_ids"""
+        loaded = {aggregate.log_id: aggregate
+                  async for aggregate in self.iter_load_many(aggregate_type, log_ids, concurrency)}
+        return [loaded[log_id] for log_id in log_ids]
+
+    async def iter_load_many(self,
+                             aggregate_type: Type[A],
+                             log_ids: list[str],
+                             concurrency: int = 16) -> AsyncIterator[A]:
+        """Loads the aggregates with at most `concurrency` log reads in flight, yielding each as it loads"""
+        log_ids = list(dict.fromkeys(log_ids))
+        if not log_ids:
+            return
+
+        with tracer.start_as_current_span("aggregate_load_many") as span:
+            span.set_attribute("aggregate_type", aggregate_type.__name__)
+            span.set_attribute("log_count", len(log_ids))
+
+            heads = await self.event_store.get_log_heads(log_ids)
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def load_one(log_id: str) -> A:
+                async with semaphore:
+                    return await self._load(aggregate_type, log_id, heads.get(log_id))
+
+            tasks = [asyncio.create_task(load_one(log_id)) for log_id in log_ids]
+            try:
+                for task in asyncio.as_completed(tasks):
+                    yield await task
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+    async def _load(self,
+                    aggregate_type: Type[A],
+                    log_id: str,
+                    head: LogHead | None = None) -> A:
 
         with tracer.start_as_current_span("aggregate_load") as load_span:
             load_span.set_attribute("aggregate_type", aggregate_type.__name__)
             load_span.set_attribute("log_id", log_id)
 
             instance = aggregate_type(log_id, self.event_store, self.event_handlers)
+            instance.after_append = self.invalidate_loads
+
+            snapshot = None
+            if aggregate_type.supports_snapshots():
+                snapshot = head.snapshot if head else await self.event_store.get_snapshot(log_id)
 
             with tracer.start_span("fetch_events") as fetch_span:
-                events = await self.event_store.get_log(log_id)
+                if snapshot:
+                    # only the tail of the log after the snapshot needs to be read
+                    instance.restore_state(snapshot.state)
+                    instance.last_event_name = snapshot.last_event
+                    instance.version = snapshot.version or 0
+                # the events are only folded into the aggregate, so stores may decode them lazily
+                if head and (head.is_empty or (snapshot and head.snapshot_is_current)):
+                    events = []     # the head shows there is nothing to read
+                elif snapshot:
+                    with lazy_reads():
+                        events = await self.event_store.get_log_from(log_id, snapshot)
+                    fetch_span.set_attribute("snapshot", True)
+                else:
+                    with lazy_reads():
+                        events = await self.event_store.get_log(log_id)
                 fetch_span.set_attribute("event_count", len(events))
 
             with tracer.start_span("replay_events") as replay_span:
-                for event in events:
-                    instance._on_event(event)
+                if self.replay_executor is not None:
+                    replay_span.set_attribute("offloaded", await self.replay_executor.replay(instance, events))
+                else:
+                    fold(instance, events)
                 replay_span.set_attribute("event_count", len(events))
 
-        return instance
\ No newline at end of file
+            if (self.snapshot_threshold is not None and aggregate_type.supports_snapshots()
+                    and self.event_store.keeps_snapshots and events and len(events) >= self.snapshot_threshold):
+                try:
+                    await self.snapshot(instance)
+                except Exception:
+                    # only an optimisation of the next load, so a failed save must not fail this one
+                    logger.warning("failed to save snapshot", extra={"log_id": log_id}, exc_info=True)
+
+        return instance
+
+    async def append_blind(self,
+                           aggregate_type: Type[A],
+                           log_id: str,
+                           command: BlindCommand,
+                           max_attempts: int = 5) -> list[Event]:
+        """
+        Appends the command's events against the log head instead of a loaded aggregate, retrying when another
+        writer moved it first; raises BlindAppendUnavailable where the log keeps no head
+        """
+        if not self.event_store.keeps_counters:
+            raise BlindAppendUnavailable(f"{type(self.event_store).__name__} does not keep log heads")
+        deltas = command.deltas()
+        reserves = deltas is not None and self.event_store.reserves_appends
+
+        with tracer.start_as_current_span("aggregate_append_blind") as span:
+            span.set_attribute("aggregate_type", aggregate_type.__name__)
+            span.set_attribute("log_id", log_id)
+            for attempt in range(1, max_attempts + 1):
+                # consistent, or an append that has just landed may be missed and every attempt collide with
+                # it - a reservation returns the head it lands on, so needs it only once the log is found new
+                head = (await self.event_store.get_log_heads([log_id],
+                                                             consistent_read=not reserves or attempt > 1))[log_id]
+                if head.last_event is not None and head.version is None:
+                    raise BlindAppendUnavailable(f"the head of log {log_id} predates versions and counters")
+                events = command.events(head)
+                try:
+                    if reserves and head.last_event is not None:
+                        events = await self._append_reserved(aggregate_type, log_id, command, head, len(events),
+                                                             deltas)
+                    else:
+                        stamp_events(events, aggregate_type, head.version or 0, head.last_event)
+                        await self.event_store.apply_many_guarded(log_id, events, head.last_event,
+                                                                  command.minimums(head))
+                except ConcurrencyViolationError:
+                    if attempt == max_attempts:
+                        raise
+                    continue
+                span.set_attribute("attempts", attempt)
+                break
+
+        self.invalidate_loads(log_id)
+        dispatch_events(self.event_handlers, events)
+        return events
+
+    async def _append_reserved(self, aggregate_type: Type[A], log_id: str, command: BlindCommand, head: LogHead,
+                               count: int, deltas: dict[str, float]) -> list[Event]:
+        reservation = await self.event_store.reserve_append(log_id, count, deltas, command.minimums(head))
+        try:
+            events = command.events(reservation.head)
+            if len(events) != count:
+                raise ValueError(f"the command gave {len(events)} events for the {count} it reserved")
+            stamp_events(events, aggregate_type, reservation.head.version, reservation.head.last_event,
+                         reservation.applied_time)
+            await self.event_store.complete_append(reservation, events)
+        except BaseException:
+            await self.event_store.release_append(reservation)
+            raise
+        return events
+
+    async def snapshot(self, aggregate: Aggregate) -> Snapshot:
+        """Saves the aggregate's current state as the latest snapshot of its log"""
+        with tracer.start_as_current_span("aggregate_snapshot"):
+            snapshot = Snapshot(aggregate.log_id, aggregate.last_event_name, aggregate.snapshot_state(),
+                                version=aggregate.version)
+            await self.event_store.save_snapshot(snapshot)
+        return snapshot
\ No newline at end of file
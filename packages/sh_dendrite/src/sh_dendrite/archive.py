@@ -0,0 +1,144 @@
+"""Cold-tier storage of events that precede a log's latest snapshot, as content-addressed segments"""
+import asyncio
+import hashlib
+import json
+import os
+import zlib
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+
+import httpx
+
+SEGMENT_FORMAT = "sh_dendrite.archive/v1"
+
+
+class ArchiveIntegrityError(Exception):
+    pass
+
+
+def encode_segment(items: list[dict]) -> bytes:
+    """Encodes items column by column - attributes missing from an item are stored as null"""
+    columns: dict[str, list] = {}
+    for row, item in enumerate(items):
+        for name, value in item.items():
+            column = columns.get(name)
+            if column is None:
+                column = columns[name] = [None] * row
+            column.append(value)
+        for column in columns.values():
+            if len(column) == row:
+                column.append(None)
+    document = {"format": SEGMENT_FORMAT, "rows": len(items), "columns": dict(sorted(columns.items()))}
+    return zlib.compress(json.dumps(document, separators=(',', ':')).encode('utf-8'), level=9)
+
+
+def decode_segment(data: bytes) -> list[dict]:
+    document = json.loads(zlib.decompress(data))
+    if document.get("format") != SEGMENT_FORMAT:
+        raise ArchiveIntegrityError(f"unsupported archive segment format: {document.get('format')}")
+    columns = document["columns"]
+    return [{name: values[row] for name, values in columns.items() if values[row] is not None}
+            for row in range(document["rows"])]
+
+
+def segment_key(data: bytes) -> str:
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{digest[:2]}/{digest}"
+
+
+def _verify(key: str, data: bytes) -> bytes:
+    if segment_key(data) != key:
+        raise ArchiveIntegrityError(f"archive segment {key} does not match its content hash")
+    return data
+
+
+class ArchiveBackend(ABC):
+    @abstractmethod
+    async def put(self, key: str, data: bytes) -> None:
+        pass
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes:
+        pass
+
+    async def put_segment(self, items: list[dict]) -> str:
+        """Stores the items as a segment and returns its content address"""
+        data = encode_segment(items)
+        key = segment_key(data)
+        await self.put(key, data)
+        return key
+
+    async def get_segment(self, key: str) -> list[dict]:
+        return decode_segment(_verify(key, await self.get(key)))
+
+
+class LocalDirectoryArchive(ArchiveBackend):
+    """Stores segments as files under a root directory"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split('/'))
+
+    def _write(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        if os.path.exists(path):
+            return  # content addressed, so an existing segment already holds these bytes
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def _read(self, key: str) -> bytes:
+        with open(self._path(key), 'rb') as f:
+            return f.read()
+
+    async def put(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(self._write, key, data)
+
+    async def get(self, key: str) -> bytes:
+        return await asyncio.to_thread(self._read, key)
+
+
+class HttpObjectStoreArchive(ArchiveBackend):
+    """Stores segments in an object store that accepts plain HTTP PUT/GET of objects under a base URL
+    (e.g. a bucket behind a gateway or pre-authorized endpoint)"""
+
+    def __init__(self, base_url: str, http_client: httpx.AsyncClient | None = None):
+        self.base_url = base_url.rstrip('/')
+        self._http_client = http_client or httpx.AsyncClient()
+
+    async def put(self, key: str, data: bytes) -> None:
+        response = await self._http_client.put(f"{self.base_url}/{key}", content=data,
+                                               headers={"Content-Type": "application/octet-stream"})
+        response.raise_for_status()
+
+    async def get(self, key: str) -> bytes:
+        response = await self._http_client.get(f"{self.base_url}/{key}")
+        response.raise_for_status()
+        return response.content
+
+    async def close(self) -> None:
+        await self._http_client.aclose()
+
+
+class InMemoryArchive(ArchiveBackend):
+    def __init__(self):
+        self.objects: dict[str, bytes] = {}
+
+    async def put(self, key: str, data: bytes) -> None:
+        self.objects[key] = data
+
+    async def get(self, key: str) -> bytes:
+        return self.objects[key]
+
+
+@dataclass
+class ArchiveResult:
+    log_id: str
+    archive_key: str
+    event_count: int
+    first_event: str
+    last_event: str
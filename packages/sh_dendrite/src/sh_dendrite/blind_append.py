@@ -0,0 +1,32 @@
+"""Appends that decide their events from the log head rather than a loaded aggregate.
+
+    class Credit(BlindCommand):
+        def events(self, head):
+            return [Credited(self.amount, head.counters["balance"])]
+
+    events = await factory.append_blind(Account, account_id, Credit(10))
+"""
+from abc import ABC, abstractmethod
+
+from sh_dendrite.event import Event
+from sh_dendrite.log_head import LogHead
+
+
+class BlindAppendUnavailable(Exception):
+    """The store or the log keeps no head to append against; load the aggregate instead"""
+
+
+class BlindCommand(ABC):
+    needs_state = False     # what sets it apart from commands run against a loaded aggregate
+
+    @abstractmethod
+    def events(self, head: LogHead) -> list[Event]:
+        """The events to append after the head; raises ValueError for a command the head rules out"""
+
+    def minimums(self, head: LogHead) -> dict[str, float]:
+        """The least each counter must be for the append to go ahead, checked by the store as it appends"""
+        return {}
+
+    def deltas(self) -> dict[str, float] | None:
+        """What the events add to each counter whatever the head, or None for a command that does not commute"""
+        return None
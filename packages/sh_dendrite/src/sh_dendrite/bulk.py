@@ -0,0 +1,336 @@
+"""Bulk import and export of raw event store items as JSONL or Parquet.
+
+    python -m sh_dendrite.bulk import events.jsonl --table sh-event-store --writers 64
+    python -m sh_dendrite.bulk export events.parquet --table sh-event-store --log-id <log id>
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import pickle
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable, Iterator
+
+from aiodynamo.expressions import F
+from aiodynamo.models import BatchWriteRequest
+from aiodynamo.utils import dy2py
+from opentelemetry import trace
+
+from sh_dendrite.dynamodb_event_store import DynamodbEventStore, THROTTLING_ERRORS, TRANSIENT_ERRORS
+from sh_dendrite.structured_logging import configure_logging
+from sh_dendrite.throttle import AdaptiveThrottle
+
+logger = logging.getLogger(__name__)
+tracer = trace.get_tracer(__name__)
+
+BATCH_SIZE = 25     # BatchWriteItem limit
+DEFAULT_WRITERS = 32
+DEFAULT_SEGMENTS = 8
+PARQUET_SUFFIXES = ('.parquet', '.pq')
+PARQUET_ROW_GROUP_SIZE = 10_000
+
+
+@dataclass
+class BulkProgress:
+    items: int = 0
+    batches: int = 0
+    retries: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def items_per_second(self) -> float:
+        return self.items / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (f"{self.items} items in {self.elapsed:.1f}s ({self.items_per_second:,.0f} items/s, "
+                f"{self.batches} batches, {self.retries} retries)")
+
+
+class AdaptiveBackoff:
+    """Delay shared by all writers: doubles whenever DynamoDB pushes back, halves on clean batches"""
+
+    def __init__(self, initial: float = 0.05, maximum: float = 5.0):
+        self.initial = initial
+        self.maximum = maximum
+        self.delay = 0.0
+
+    def throttled(self) -> float:
+        self.delay = min(self.maximum, max(self.initial, self.delay * 2))
+        return self.delay
+
+    def succeeded(self) -> None:
+        self.delay = self.delay / 2 if self.delay > self.initial else 0.0
+
+
+def _batches(items: Iterable[dict], size: int = BATCH_SIZE) -> Iterator[list[dict]]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+async def _report_progress(progress: BulkProgress, on_progress: Callable[[BulkProgress], None], interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        on_progress(progress)
+
+
+async def import_items(store: DynamodbEventStore,
+                       items: Iterable[dict] | AsyncIterable[dict],
+                       writers: int = DEFAULT_WRITERS,
+                       max_attempts: int = 10,
+                       backoff: AdaptiveBackoff | None = None,
+                       on_progress: Callable[[BulkProgress], None] | None = None,
+                       progress_interval: float = 1.0) -> BulkProgress:
+    """Writes raw items to the store's table using `writers` concurrent BatchWriteItem workers"""
+    await store._ensure_client()
+    table_name = store.table_name
+    progress = BulkProgress()
+    backoff = backoff or AdaptiveBackoff()
+    queue: asyncio.Queue[list[dict] | None] = asyncio.Queue(maxsize=writers * 2)
+
+    async def write_batch(batch: list[dict]) -> None:
+        pending = batch
+        for attempt in range(max_attempts):
+            if backoff.delay:
+                await asyncio.sleep(backoff.delay)
+            try:
+                result = await store._request(
+                    AdaptiveThrottle.WRITE,
+                    lambda: store._client.batch_write({table_name: BatchWriteRequest(items_to_put=pending)}),
+                    is_throttled=lambda r: table_name in r and bool(r[table_name].unput_items))
+                pending = result[table_name].unput_items if table_name in result else []
+            except THROTTLING_ERRORS + TRANSIENT_ERRORS:
+                pass    # the whole batch is retried below
+
+            if not pending:
+                backoff.succeeded()
+                return
+            progress.retries += 1
+            await asyncio.sleep(backoff.throttled())
+        raise RuntimeError(f"{len(pending)} items were still unprocessed after {max_attempts} attempts")
+
+    async def writer() -> None:
+        while (batch := await queue.get()) is not None:
+            await write_batch(batch)
+            progress.items += len(batch)
+            progress.batches += 1
+
+    async def produce() -> None:
+        if isinstance(items, AsyncIterable):
+            batch = []
+            async for item in items:
+                batch.append(item)
+                if len(batch) == BATCH_SIZE:
+                    await queue.put(batch)
+                    batch = []
+            if batch:
+                await queue.put(batch)
+        else:
+            for batch in _batches(items):
+                await queue.put(batch)
+        for _ in range(writers):
+            await queue.put(None)
+
+    reporter = asyncio.create_task(_report_progress(progress, on_progress, progress_interval)) if on_progress else None
+    with tracer.start_as_current_span("bulk.import") as span:
+        try:
+            tasks = [asyncio.create_task(writer()) for _ in range(writers)]
+            producer = asyncio.create_task(produce())
+            try:
+                await asyncio.gather(producer, *tasks)
+            except BaseException:
+                for task in [producer, *tasks]:
+                    task.cancel()
+                raise
+        finally:
+            if reporter:
+                reporter.cancel()
+        span.set_attribute("item_count", progress.items)
+
+    logger.info("bulk import complete", extra={"table": table_name, "items": progress.items,
+                                               "retries": progress.retries, "seconds": round(progress.elapsed, 3)})
+    return progress
+
+
+async def export_items(store: DynamodbEventStore,
+                       log_ids: Iterable[str] | None = None,
+                       segments: int = DEFAULT_SEGMENTS) -> AsyncIterator[dict]:
+    """Yields raw items from the store's table - the given logs, or the whole table via a parallel scan"""
+    await store._ensure_client()
+    client = store._client
+    queue: asyncio.Queue = asyncio.Queue(maxsize=segments * 1000)
+    done = object()
+
+    async def read_log(log_id: str) -> None:
+        async for item in store._query(F("PK").equals(log_id)):
+            await queue.put(item)
+
+    async def read_segment(segment: int) -> None:
+        payload = {"TableName": store.table_name, "Segment": segment, "TotalSegments": segments}
+        while True:
+            response = await store._request(AdaptiveThrottle.READ,
+                                            lambda: client.send_request(action="Scan", payload=payload))
+            for item in response.get("Items", []):
+                await queue.put(dy2py(item, client.numeric_type))
+            if "LastEvaluatedKey" not in response:
+                return
+            payload = {**payload, "ExclusiveStartKey": response["LastEvaluatedKey"]}
+
+    async def read_all() -> None:
+        try:
+            if log_ids is not None:
+                await asyncio.gather(*(read_log(log_id) for log_id in log_ids))
+            else:
+                await asyncio.gather(*(read_segment(segment) for segment in range(segments)))
+        finally:
+            await queue.put(done)
+
+    reader = asyncio.create_task(read_all())
+    try:
+        while (item := await queue.get()) is not done:
+            yield item
+        await reader    # surfaces any read error
+    finally:
+        reader.cancel()
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# dump files
+# ---------------------------------------------------------------------------------------------------------------------
+
+def _is_parquet(path: str) -> bool:
+    return path.lower().endswith(PARQUET_SUFFIXES)
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError("Parquet dumps require pyarrow - install sh_dendrite[parquet]") from e
+    return pyarrow, pyarrow.parquet
+
+
+def read_dump(path: str) -> Iterator[dict]:
+    """Reads items from a JSONL or Parquet dump"""
+    if _is_parquet(path):
+        _, parquet = _require_pyarrow()
+        for batch in parquet.ParquetFile(path).iter_batches():
+            for row in batch.to_pylist():
+                # columns are the union of all item attributes, so absent attributes come back as nulls
+                yield {k: v for k, v in row.items() if v is not None}
+    else:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+async def write_dump(path: str, items: AsyncIterable[dict], row_group_size: int = PARQUET_ROW_GROUP_SIZE) -> int:
+    """Writes items to a JSONL or Parquet dump and returns the number of items written"""
+    if _is_parquet(path):
+        return await _write_parquet(path, items, row_group_size)
+
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        async for item in items:
+            f.write(json.dumps(item, default=str))
+            f.write('\n')
+            count += 1
+    return count
+
+
+async def _write_parquet(path: str, items: AsyncIterable[dict], row_group_size: int) -> int:
+    pyarrow, parquet = _require_pyarrow()
+    # the columns are the union of all item attributes, so row groups are spooled to disk until the
+    # schema is known, then written one at a time
+    schema = pyarrow.schema([])
+    count = 0
+    row_groups = 0
+    with tempfile.TemporaryFile() as spool:
+        def spill(rows: list[dict]) -> None:
+            nonlocal schema, row_groups
+            columns = dict.fromkeys(key for row in rows for key in row)
+            rows_schema = pyarrow.table({key: [row.get(key) for row in rows] for key in columns}).schema
+            schema = pyarrow.unify_schemas([schema, rows_schema], promote_options="permissive")
+            pickle.dump(rows, spool)
+            row_groups += 1
+
+        rows = []
+        async for item in items:
+            rows.append(item)
+            count += 1
+            if len(rows) == row_group_size:
+                spill(rows)
+                rows = []
+        if rows:
+            spill(rows)
+
+        spool.seek(0)
+        with parquet.ParquetWriter(path, schema, compression='zstd') as writer:
+            for _ in range(row_groups):
+                writer.write_table(pyarrow.Table.from_pylist(pickle.load(spool), schema=schema))
+    return count
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# cli
+# ---------------------------------------------------------------------------------------------------------------------
+
+def _print_progress(progress: BulkProgress) -> None:
+    print(progress, file=sys.stderr)
+
+
+async def async_main(args) -> None:
+    store = DynamodbEventStore(args.table, args.region, args.profile, endpoint_url=args.endpoint_url)
+    try:
+        match args.command:
+            case "import":
+                progress = await import_items(store, read_dump(args.path), writers=args.writers,
+                                              on_progress=_print_progress)
+                print(f"Imported {progress}")
+            case "export":
+                started = time.monotonic()
+                count = await write_dump(args.path, export_items(store, args.log_id, segments=args.segments))
+                print(f"Exported {count} items in {time.monotonic() - started:.1f}s")
+    finally:
+        await store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import/export of event store items (JSONL or Parquet)")
+    parser.add_argument("--table", default=os.getenv('EVENT_STORE_TABLE_NAME'), help="Event store table name")
+    parser.add_argument("--region", default=os.getenv('AWS_REGION'), help="AWS region")
+    parser.add_argument("--profile", default=os.getenv('AWS_PROFILE'), help="AWS profile")
+    parser.add_argument("--endpoint-url", default=os.getenv('DYNAMODB_ENDPOINT_URL'),
+                        help="DynamoDB-compatible endpoint, e.g. http://localhost:8000 for DynamoDB Local")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Write the items in a dump to the table")
+    import_parser.add_argument("path", help="JSONL or Parquet (.parquet) dump to read")
+    import_parser.add_argument("--writers", type=int, default=DEFAULT_WRITERS, help="Concurrent batch writers")
+
+    export_parser = subparsers.add_parser("export", help="Write table items to a dump")
+    export_parser.add_argument("path", help="JSONL or Parquet (.parquet) dump to write")
+    export_parser.add_argument("--log-id", action="append", help="Export only this log (repeatable)")
+    export_parser.add_argument("--segments", type=int, default=DEFAULT_SEGMENTS, help="Parallel scan segments")
+
+    args = parser.parse_args()
+    if not args.table:
+        parser.error("--table or EVENT_STORE_TABLE_NAME is required")
+
+    configure_logging(level=logging.WARNING)
+    asyncio.run(async_main(args))
+
+
+if __name__ == "__main__":
+    main()
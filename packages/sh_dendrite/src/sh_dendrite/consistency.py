@@ -0,0 +1,37 @@
+"""Read-your-writes tokens: the log and version a write left, for reads to wait on.
+
+    token = ConsistencyToken.of(ledger).encode()
+    caught_up = await projector.wait_for(token.log_id, token.version, timeout=0.5)
+"""
+import base64
+import binascii
+from dataclasses import dataclass
+
+from sh_dendrite.aggregate import Aggregate
+
+
+@dataclass(frozen=True)
+class ConsistencyToken:
+    log_id: str
+    version: int
+
+    @classmethod
+    def of(cls, aggregate: Aggregate) -> 'ConsistencyToken':
+        """The token for the aggregate's log as of its last applied event"""
+        return cls(aggregate.log_id, aggregate.version)
+
+    def encode(self) -> str:
+        # the version goes first, so that a log id containing the separator still splits cleanly
+        return base64.urlsafe_b64encode(f"{self.version}:{self.log_id}".encode()).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, token: str) -> 'ConsistencyToken':
+        """Raises ValueError for a string that is not an encoded token"""
+        try:
+            decoded = base64.b64decode(token + "=" * (-len(token) % 4), altchars=b"-_", validate=True).decode()
+        except (binascii.Error, UnicodeDecodeError):
+            raise ValueError(f"invalid consistency token {token!r}")
+        version, _, log_id = decoded.partition(":")
+        if not version.isdigit() or not log_id:
+            raise ValueError(f"invalid consistency token {token!r}")
+        return cls(log_id, int(version))
@@ -1,32 +1,304 @@
+import asyncio
+import heapq
 import logging
-from dataclasses import asdict
-from datetime import datetime
+import uuid
+from dataclasses import asdict, replace
+from datetime import datetime, timedelta, UTC
+from enum import StrEnum
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, TypeVar
 
 import httpx
 from aiodynamo.client import Client
 from aiodynamo.credentials import Credentials
-from aiodynamo.errors import ConditionalCheckFailed
+from aiodynamo.errors import (ConditionalCheckFailed, InternalDynamoError, ItemNotFound,
+                              ProvisionedThroughputExceeded, RequestLimitExceeded, ServiceUnavailable, Throttled,
+                              TransactionCanceled)
 from aiodynamo.expressions import F
 from aiodynamo.http.httpx import HTTPX
+from aiodynamo.models import BatchGetRequest, BatchWriteRequest, ReturnValues, StaticDelayRetry
 from aiodynamo.operations import Put, Update
 from opentelemetry import trace
+from yarl import URL
 
+from sh_dendrite.aggregate import aggregate_type_name
+from sh_dendrite.archive import ArchiveBackend, ArchiveResult
 from sh_dendrite.concurrency_violation_error import ConcurrencyViolationError
-from sh_dendrite.event import Event
-from sh_dendrite.event_store import EventStore
+from sh_dendrite.event import Event, event_id_prefix, event_id_time
+from sh_dendrite.event_store import EventStore, LogAppend, Reservation
+from sh_dendrite.lazy_event import lazy_event, lazy_reads_enabled
+from sh_dendrite.log_head import LogHead
+from sh_dendrite.outbox import OutboxEntry
+from sh_dendrite.partitioning import partition_of
+from sh_dendrite.snapshot import Snapshot
+from sh_dendrite.throttle import AdaptiveThrottle, note_retry_after, retry_after
+from sh_dendrite.unsupported_operation import UnsupportedOperation
 
 logger = logging.getLogger(__name__)
 tracer = trace.get_tracer(__name__)
 
+T = TypeVar('T')
+
+# control items share the log's partition and sort ahead of its events because of the '#' prefix
+CONTROL_ITEM_PREFIX = "#"
 LOG_METADATA_ITEM = "#LOG_METADATA"
+SNAPSHOT_ITEM = "#SNAPSHOT"
+ARCHIVE_TOMBSTONE_PREFIX = "#ARCHIVE#"
+
+# outbox markers live in partitions of their own, one per outbox shard, which no log id can collide with
+OUTBOX_PARTITION_PREFIX = "#OUTBOX#"
+
+# global secondary indexes over the event items, by name, with their partition and sort keys. Index
+# partitions are a type plus the month its events were applied in, so that a type's events spread over
+# a partition per month; only event items carry the keys, so control and outbox items stay out
+EVENT_TYPE_INDEX = "by_event_type"
+AGGREGATE_TYPE_INDEX = "by_aggregate_type"
+EVENT_INDEXES = {
+    EVENT_TYPE_INDEX: ("type_bucket", "event_id"),
+    AGGREGATE_TYPE_INDEX: ("aggregate_bucket", "event_id"),
+}
+
+# where index queries start by default; no event of an indexed table was applied before it
+INDEX_EPOCH = datetime(2025, 1, 1, tzinfo=UTC)
+
+# errors that mean the table is short of capacity for now, rather than that the request is wrong
+THROTTLING_ERRORS = (Throttled, ProvisionedThroughputExceeded, RequestLimitExceeded)
+# errors of the service rather than of capacity: retried, backing off from TRANSIENT_RETRY_DELAY, but
+# without slowing the throttle down
+TRANSIENT_ERRORS = (ServiceUnavailable, InternalDynamoError)
+TRANSIENT_RETRY_DELAY = 0.05
+
+# reasons a cancelled transaction gives when the table, rather than a condition, turned it down
+TRANSACTION_THROTTLING_REASONS = frozenset(["ThrottlingError", "ProvisionedThroughputExceeded", "RequestLimitExceeded"])
+
+# with a throttle the store retries throttled requests itself, paced by the throttle, so the client
+# makes a single attempt rather than backing off on its own; every request the store sends goes
+# through _request for that reason
+_SINGLE_ATTEMPT = StaticDelayRetry(delay=0, time_limit_secs=0)
+
+# without a throttle the client retries throttled requests, but not throttled transactions; the store
+# retries those itself, backing off from this delay
+UNPACED_TRANSACTION_ATTEMPTS = 5
+UNPACED_TRANSACTION_RETRY_DELAY = 0.05
+
+
+def transaction_throttled(error: Exception) -> bool:
+    return isinstance(error, TransactionCanceled) and any(
+        reason and reason.code in TRANSACTION_THROTTLING_REASONS for reason in error.cancellation_reasons)
+
+# DynamoDB's per-request item limits
+BATCH_GET_LIMIT = 100
+BATCH_WRITE_LIMIT = 25
+MAX_TRANSACTION_ITEMS = 100
+
+# attributes managed by the store rather than copied from the event's own fields
+CONTROL_ATTRIBUTES = frozenset(['PK', 'SK', 'event_type', 'created_time', 'applied_time', 'event_id', 'version',
+                                'aggregate_type', 'type_bucket', 'aggregate_bucket'])
+
+# the log's counters (see Event.head_counters) are attributes of its metadata item named with this prefix
+COUNTER_ATTRIBUTE_PREFIX = "counter_"
+
+# reservations (see reserve_append) are attributes of the metadata item named with this prefix, holding
+# their deltas and time. RESERVATION_COUNT counts those outstanding, which hold back other appends, and
+# LAST_RESERVED is the millisecond of the latest, which no later reservation may precede
+RESERVATION_ATTRIBUTE_PREFIX = "reservation_"
+RESERVATION_COUNT = "reservations"
+LAST_RESERVED = "last_reserved"
+# a reservation outstanding this long has lost its writer, and is released by the next append it holds back
+RESERVATION_TIMEOUT = timedelta(seconds=30)
+# reservations made on a clock behind the log's are retried this often from the log's time
+RESERVATION_CLOCK_ATTEMPTS = 3
+
+# event sort keys - event ids and versions alike - start with a digit, so sort keys from here on
+# select a log's events without its control items
+FIRST_EVENT_SORT_KEY = "0"
+
+# wide enough for any version, and zero padded so that string order is numeric order
+VERSION_SORT_KEY_WIDTH = 20
+
+
+class ConcurrencyMode(StrEnum):
+    # SK is the event id; each append is a transaction that also moves #LOG_METADATA's last_event,
+    # conditioned on the last event the writer saw
+    METADATA = "metadata"
+    # SK is the event's zero-padded version; each append is a single Put conditioned on the version
+    # not having been written yet - half the write units and no metadata item
+    VERSION = "version"
+
+
+def head_attributes(events: list[Event]) -> dict:
+    """The version and counters the events leave the log at, as attributes of its metadata item"""
+    attributes = {}
+    for event in events:
+        if event.version is not None:
+            attributes['version'] = event.version
+        for counter, value in event.head_counters().items():
+            attributes[f"{COUNTER_ATTRIBUTE_PREFIX}{counter}"] = value
+    return attributes
+
+
+def version_sort_key(version: int) -> str:
+    return f"{version:0{VERSION_SORT_KEY_WIDTH}d}"
+
+
+def unprocessed_retry_delay(attempt: int) -> float:
+    """Exponential backoff for resubmitting the unprocessed part of a batch request"""
+    return min(0.05 * 2 ** attempt, 2.0)
+
+
+def event_type_name(event: Event) -> str:
+    return event_type_name_of(type(event))
+
+
+def event_type_name_of(event_class: type[Event]) -> str:
+    return f"{event_class.__module__}.{event_class.__name__}"   # fully qualified type name
+
+
+def index_bucket(time: datetime) -> str:
+    """The month - as YYYYMM - that places an event applied at time in an index partition"""
+    return event_id_prefix(time)[:6]
+
+
+def index_buckets(start: datetime, end: datetime) -> list[str]:
+    """The index buckets from the one holding start to the one holding end, inclusive"""
+    first, last = index_bucket(start), index_bucket(end)
+    year, month = int(first[:4]), int(first[4:])
+    buckets = []
+    while (bucket := f"{year:04d}{month:02d}") <= last:
+        buckets.append(bucket)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return buckets
+
+
+def index_keys(event: Event) -> dict:
+    """The index key attributes of an event's item; events applied outside an aggregate have no aggregate type"""
+    bucket = index_bucket(event.applied_time)
+    keys = {'type_bucket': f"{event_type_name(event)}#{bucket}"}
+    if event.aggregate_type is not None:
+        keys['aggregate_bucket'] = f"{event.aggregate_type}#{bucket}"
+    return keys
+
+
+async def _merge_by(attribute: str, streams: list[AsyncIterable[dict]]) -> AsyncIterator[dict]:
+    """Merges item streams that are each sorted by attribute into one sorted stream"""
+    iterators = [aiter(stream) for stream in streams]
+    heads = []
+    for n, iterator in enumerate(iterators):
+        item = await anext(iterator, None)
+        if item is not None:
+            heads.append((item[attribute], n, item))
+    heapq.heapify(heads)
+    while heads:
+        _, n, item = heapq.heappop(heads)
+        yield item
+        following = await anext(iterators[n], None)
+        if following is not None:
+            heapq.heappush(heads, (following[attribute], n, following))
+
+
+def event_to_item(log_id: str, event: Event, sort_key: str | None = None) -> dict:
+    """Converts an event to the item shape stored in the event table, keyed by its event id by default"""
+    event_item = {
+        'PK': log_id,                       # partition key
+        'SK': sort_key or event.event_id,   # sort key
+        'event_type': event_type_name(event)
+    }
+
+    # if event is a dataclass convert it to a dictionary
+    if hasattr(event, '__dataclass_fields__'):
+        event_dict = asdict(event)
+        event_item.update(event_dict)
+
+    # Convert datetime objects to ISO format strings
+    event_item['applied_time'] = event_item['applied_time'].isoformat()
+    event_item['created_time'] = event_item['created_time'].isoformat()
+    if event_item.get('aggregate_type') is None:
+        event_item.pop('aggregate_type', None)
+    return event_item
+
+
+def item_to_event(item: dict) -> Event | None:
+    """Reconstructs an event from a stored item, or returns None if its class cannot be resolved"""
+    # get all non-control attributes
+    event_data = {k: v for k, v in item.items() if k not in CONTROL_ATTRIBUTES}
+
+    # Reconstruct the Event object based on the event_type
+    event_class = Event.class_from(item.get('event_type'))
+    if not event_class:
+        return None
+
+    event = event_class(**event_data)
+    event.event_id = item['event_id']
+    event.created_time = datetime.fromisoformat(item['created_time'])
+    event.applied_time = datetime.fromisoformat(item['applied_time'])
+    version = item.get('version')
+    event.version = int(version) if version is not None else None
+    event.aggregate_type = item.get('aggregate_type')
+    return event
+
+
+# how the attributes that item_to_event converts are decoded when a lazy event reads them
+LAZY_DECODERS = {
+    'created_time': datetime.fromisoformat,
+    'applied_time': datetime.fromisoformat,
+    'version': int,
+}
+
+
+def item_to_lazy_event(item: dict) -> Event | None:
+    """Like item_to_event, but the event decodes its attributes from the item only as they are read"""
+    event_class = Event.class_from(item.get('event_type'))
+    if not event_class:
+        return None
+    return lazy_event(event_class, item, LAZY_DECODERS)
+
+
+def item_decoder():
+    """The item decoder for reads made now: lazy while a replay has asked for lazy reads"""
+    return item_to_lazy_event if lazy_reads_enabled() else item_to_event
+
+
+def item_to_snapshot(item: dict) -> Snapshot:
+    version = item.get('version')
+    return Snapshot(item['PK'], item['last_event'], item['state'], datetime.fromisoformat(item['taken_time']),
+                    version=int(version) if version is not None else None)
 
 
 class DynamodbEventStore(EventStore):
-    def __init__(self, table_name: str, region: str, profile: str = 'default') -> None:
+    def __init__(self,
+                 table_name: str,
+                 region: str,
+                 profile: str = 'default',
+                 endpoint_url: str | None = None,
+                 client: Client | None = None,
+                 archive: ArchiveBackend | None = None,
+                 max_connections: int = 100,
+                 concurrency_mode: ConcurrencyMode = ConcurrencyMode.METADATA,
+                 outbox_shards: int | None = None,
+                 index_events: bool = False,
+                 index_since: datetime = INDEX_EPOCH,
+                 throttle: AdaptiveThrottle | None = None) -> None:
+        """
+        client: an already configured aiodynamo client, used as-is and not closed.
+        archive: the cold tier archive_log moves events into. max_connections: the HTTP connection pool size.
+        concurrency_mode: see ConcurrencyMode; a table's logs must all be written in the same mode.
+        outbox_shards: writes an outbox marker with every append, for an OutboxRelay.
+        index_events: writes the keys of EVENT_INDEXES, which the table must define; index_since is where queries start.
+        throttle: paces every request with adaptive rate limits (see sh_dendrite.throttle).
+        """
         self.table_name = table_name
         self.region = region
         self.profile = profile
-        self._client = None
+        self.endpoint_url = endpoint_url
+        self.archive = archive
+        self.max_connections = max_connections
+        self.concurrency_mode = ConcurrencyMode(concurrency_mode)
+        self.outbox_shards = outbox_shards
+        self.index_events = index_events
+        self.index_since = index_since
+        self.throttle = throttle
+        if client is not None and throttle is not None:
+            client = replace(client, throttle_config=_SINGLE_ATTEMPT)
+        self._client = client
         self._httpx_client = None
 
     async def __aenter__(self):
@@ -42,7 +314,10 @@ class DynamodbEventStore(EventStore):
         """Ensure the aiodynamo client is initialized"""
         if self._client is None:
             # Create httpx client for HTTP connections
-            self._httpx_client = httpx.AsyncClient()
+            self._httpx_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                event_hooks={"response": [note_retry_after]})
 
             # Get credentials from AWS profile
             # For now, we'll use the default credentials chain
@@ -53,9 +328,24 @@ class DynamodbEventStore(EventStore):
             self._client = Client(
                 HTTPX(self._httpx_client),
                 credentials,
-                self.region
+                self.region,
+                endpoint=URL(self.endpoint_url) if self.endpoint_url else None,
+                **({'throttle_config': _SINGLE_ATTEMPT} if self.throttle else {})
             )
 
+    async def warm_up(self) -> None:
+        """
+        Resolves credentials and opens a pooled connection with one cheap read, so that the first
+        request served does not pay for either. Raises if the table cannot be reached.
+        """
+        await self._ensure_client()
+        with tracer.start_as_current_span("dynamodb.warm_up"):
+            try:
+                await self._request(AdaptiveThrottle.READ, lambda: self._client.get_item(
+                    self.table_name, {'PK': LOG_METADATA_ITEM, 'SK': LOG_METADATA_ITEM}))
+            except ItemNotFound:
+                pass
+
     async def close(self):
         """Close the HTTP client"""
         if self._httpx_client:
@@ -63,106 +353,801 @@ class DynamodbEventStore(EventStore):
             self._httpx_client = None
             self._client = None
 
+    async def _request(self,
+                       operation_class: str,
+                       request: Callable[[], Awaitable[T]],
+                       is_throttled: Callable[[T], bool] | None = None) -> T:
+        """
+        Sends the request through the throttle's limiter for its operation class, retrying it while throttled or
+        failing transiently; is_throttled flags partial results as throttled
+        """
+        if self.throttle is None:
+            attempt = 1
+            while True:
+                try:
+                    return await request()
+                except TransactionCanceled as e:
+                    if not transaction_throttled(e) or attempt >= UNPACED_TRANSACTION_ATTEMPTS:
+                        raise
+                await asyncio.sleep(UNPACED_TRANSACTION_RETRY_DELAY * 2 ** (attempt - 1))
+                attempt += 1
+        limiter = self.throttle[operation_class]
+        attempt = 1
+        while True:
+            ticket = await limiter.acquire()
+            try:
+                result = await request()
+            except Exception as e:
+                if isinstance(e, TRANSIENT_ERRORS):
+                    if attempt >= self.throttle.max_attempts:
+                        raise
+                    await asyncio.sleep(TRANSIENT_RETRY_DELAY * 2 ** (attempt - 1))
+                    attempt += 1
+                    continue
+                if not (isinstance(e, THROTTLING_ERRORS) or transaction_throttled(e)):
+                    raise
+                limiter.on_throttle(ticket, retry_after())
+                if attempt >= self.throttle.max_attempts:
+                    raise
+                attempt += 1
+                continue
+            if is_throttled is not None and is_throttled(result):
+                limiter.on_throttle(ticket, retry_after())
+            else:
+                limiter.on_success(ticket)
+            return result
+
     async def apply(self, log_id: str, event: Event, last_event: str | None):
+        await self.apply_many(log_id, [event], last_event)
+
+    @property
+    def max_batch_events(self) -> int:
+        """The most events apply_many can append in its single transaction"""
+        limit = MAX_TRANSACTION_ITEMS
+        if self.concurrency_mode is ConcurrencyMode.METADATA:
+            limit -= 1      # the metadata item shares the transaction
+        if self.outbox_shards:
+            limit -= 1      # and so does the outbox marker
+        return limit
+
+    keeps_snapshots = True
+    appends_across_logs = True
+
+    @property
+    def keeps_counters(self) -> bool:
+        # the metadata item is the log head; version mode has none
+        return self.concurrency_mode is ConcurrencyMode.METADATA
+
+    @property
+    def indexes_events(self) -> bool:
+        return self.index_events
+
+    @property
+    def reserves_appends(self) -> bool:
+        return self.concurrency_mode is ConcurrencyMode.METADATA
+
+    async def apply_many(self, log_id: str, events: list[Event], last_event: str | None):
+        """Appends the events atomically - all of them or, on a conflict or error, none"""
+        await self._apply_many(log_id, events, last_event, None)
+
+    async def apply_many_guarded(self, log_id: str, events: list[Event], last_event: str | None,
+                                 minimums: dict[str, float]):
+        """
+        Like apply_many, conditioned as well on the counters in the log's metadata item, which the
+        transaction checks along with its last event
+        """
+        if not self.keeps_counters:
+            raise UnsupportedOperation("version mode keeps no log head to hold counters")
+        if last_event is None and minimums:
+            raise ValueError("a new log has no counters to check")
+        await self._apply_many(log_id, events, last_event, minimums)
+
+    async def _apply_many(self, log_id: str, events: list[Event], last_event: str | None,
+                          minimums: dict[str, float] | None):
+        if not events:
+            return
+        if len(events) > self.max_batch_events:
+            raise ValueError(f"cannot append {len(events)} events atomically, the limit is {self.max_batch_events}")
+        await self._ensure_client()
+
+        event_items = self._event_items(log_id, events)
+        logger.debug("apply events", extra={"log_id": log_id, "event_id": events[-1].event_id,
+                                            "event_count": len(events)})
+
+        if self.concurrency_mode is ConcurrencyMode.VERSION:
+            if len(events) == 1 and not self.outbox_shards:
+                await self._append_versioned(log_id, events[0], event_items[0])
+                return
+            await self._transact(self._append_operations(log_id, events, event_items, last_event),
+                                 f"versions {events[0].version} to {events[-1].version} of log "
+                                 f"{log_id} overlap versions that have already been written")
+            return
+
+        try:
+            await self._transact(self._append_operations(log_id, events, event_items, last_event, minimums),
+                                 "could not update log metadata because the last applied event id "
+                                 f"does not match the client's event id {last_event}"
+                                 + (f" or a counter is below {minimums}" if minimums else "")
+                                 + " or an append is reserved")
+        except ConcurrencyViolationError:
+            # the conflict may be a reservation its writer abandoned, which is released for the retry
+            await self._release_expired_reservations(log_id)
+            raise
+
+    async def reserve_append(self, log_id: str, count: int, deltas: dict[str, float],
+                             minimums: dict[str, float]) -> Reservation:
+        """
+        ADDs to the version and counters of the log's metadata item, conditioned on the minimums - not on
+        the last event - and on the reserved time not preceding the log's latest event or reservation
+        """
+        if not self.reserves_appends:
+            raise UnsupportedOperation("version mode keeps no log head to reserve on")
         await self._ensure_client()
 
-        # Prepare event item
-        event_item = {
-            'PK': log_id,               # partition key
-            'SK': event.event_id,       # sort key
-            'event_type': f"{event.__class__.__module__}.{event.__class__.__name__}"   # fully qualified type name
-        }
+        key = {'PK': log_id, 'SK': LOG_METADATA_ITEM}
+        token = uuid.uuid4().hex
+        applied_time = datetime.now(UTC)
+        for attempt in range(1, RESERVATION_CLOCK_ATTEMPTS + 1):
+            reserved = event_id_prefix(applied_time)
+            expression = (F("version").add(count) & F(RESERVATION_COUNT).add(1) & F(LAST_RESERVED).set(reserved)
+                          & F(f"{RESERVATION_ATTRIBUTE_PREFIX}{token}").set(
+                              {"deltas": deltas, "reserved_time": applied_time.isoformat()}))
+            for counter, delta in deltas.items():
+                expression &= F(f"{COUNTER_ATTRIBUTE_PREFIX}{counter}").add(delta)
+            # ids from the reserved time then sort after the log's events and earlier reservations
+            condition = (F("version").exists()
+                         & F("last_event").lt(event_id_prefix(applied_time + timedelta(milliseconds=1)))
+                         & (F(LAST_RESERVED).does_not_exist() | F(LAST_RESERVED).lte(reserved)))
+            for counter, minimum in minimums.items():
+                condition &= F(f"{COUNTER_ATTRIBUTE_PREFIX}{counter}").gte(minimum)
+            try:
+                item = await self._request(AdaptiveThrottle.WRITE, lambda: self._client.update_item(
+                    self.table_name, key, expression, condition=condition, return_values=ReturnValues.all_new))
+                break
+            except ConditionalCheckFailed as e:
+                metadata = await self._get_metadata(log_id) or {}
+                latest = max((event_id_time(metadata[name]) for name in ("last_event", LAST_RESERVED)
+                              if name in metadata), default=None)
+                if attempt < RESERVATION_CLOCK_ATTEMPTS and latest is not None and event_id_prefix(latest) > reserved:
+                    applied_time = latest   # this clock is behind another writer's
+                    continue
+                raise ConcurrencyViolationError(
+                    message=f"log {log_id} keeps no version, or a counter is below {minimums}",
+                    code="ConditionalCheckFailed",
+                    reason=str(e),
+                ) from e
 
-        # if event is a dataclass convert it to a dictionary
-        if hasattr(event, '__dataclass_fields__'):
-            event_dict = asdict(event)
-            event_item.update(event_dict)
+        counters = {name.removeprefix(COUNTER_ATTRIBUTE_PREFIX): float(value)
+                    for name, value in item.items() if name.startswith(COUNTER_ATTRIBUTE_PREFIX)}
+        # ADD is atomic, so the values before the reservation are exactly those after it less its own
+        head = LogHead(log_id, item.get('last_event'), version=int(item['version']) - count,
+                       counters={name: value - deltas.get(name, 0.0) for name, value in counters.items()})
+        return Reservation(log_id, token, head, applied_time, count, deltas)
 
-        # Convert datetime objects to ISO format strings
-        event_item['applied_time'] = event_item['applied_time'].isoformat()
-        event_item['created_time'] = event_item['created_time'].isoformat()
+    async def complete_append(self, reservation: Reservation, events: list[Event]):
+        """
+        Writes the events in one transaction with the end of their reservation, which moves last_event on
+        unless a later reservation has been completed first
+        """
+        await self._ensure_client()
+        log_id = reservation.log_id
+        event_items = self._event_items(log_id, events)
+        attribute = f"{RESERVATION_ATTRIBUTE_PREFIX}{reservation.token}"
+        last_event = event_items[-1]['SK']
+        for moves_last_event in (True, False):
+            expression = F(attribute).remove() & F(RESERVATION_COUNT).add(-1)
+            condition = F(attribute).exists()
+            if moves_last_event:
+                expression &= F("last_event").set(last_event)
+                condition &= F("last_event").lt(last_event)
+            operations = [Put(table=self.table_name, item=item, condition=F("PK").does_not_exist())
+                          for item in event_items]
+            operations.extend(self._outbox_operations(log_id, event_items))
+            operations.append(Update(table=self.table_name, key={'PK': log_id, 'SK': LOG_METADATA_ITEM},
+                                     expression=expression, condition=condition))
+            try:
+                await self._transact(operations, f"the reservation of versions {events[0].version} to "
+                                                 f"{events[-1].version} of log {log_id} has been released")
+                return
+            except ConcurrencyViolationError:
+                if not moves_last_event:
+                    raise
+
+    async def release_append(self, reservation: Reservation):
+        await self._ensure_client()
+        await self._release(reservation.log_id, reservation.token, reservation.deltas)
+
+    async def _release(self, log_id: str, token: str, deltas: dict[str, float]) -> None:
+        # the versions are not given back: the log skips them
+        attribute = f"{RESERVATION_ATTRIBUTE_PREFIX}{token}"
+        expression = F(attribute).remove() & F(RESERVATION_COUNT).add(-1)
+        for counter, delta in deltas.items():
+            expression &= F(f"{COUNTER_ATTRIBUTE_PREFIX}{counter}").add(-delta)
+        try:
+            await self._request(AdaptiveThrottle.WRITE, lambda: self._client.update_item(
+                self.table_name, {'PK': log_id, 'SK': LOG_METADATA_ITEM}, expression,
+                condition=F(attribute).exists()))
+        except ConditionalCheckFailed:
+            pass    # completed or released already
+
+    async def _release_expired_reservations(self, log_id: str) -> None:
+        metadata = await self._get_metadata(log_id) or {}
+        expired = datetime.now(UTC) - RESERVATION_TIMEOUT
+        for name, reservation in metadata.items():
+            if (name.startswith(RESERVATION_ATTRIBUTE_PREFIX)
+                    and datetime.fromisoformat(reservation['reserved_time']) < expired):
+                logger.warning("releasing an abandoned reservation", extra={"log_id": log_id, "reservation": name})
+                await self._release(log_id, name.removeprefix(RESERVATION_ATTRIBUTE_PREFIX),
+                                    {counter: float(delta) for counter, delta in reservation['deltas'].items()})
+
+    async def _get_metadata(self, log_id: str) -> dict | None:
+        try:
+            return await self._request(AdaptiveThrottle.READ, lambda: self._client.get_item(
+                self.table_name, {'PK': log_id, 'SK': LOG_METADATA_ITEM}, consistent_read=True))
+        except ItemNotFound:
+            return None
+
+    async def apply_many_logs(self, appends: list[LogAppend]):
+        """Appends to all of the logs in one transaction, each conditioned as apply_many conditions it"""
+        appends = [append for append in appends if append.events]
+        if not appends:
+            return
+        log_ids = [append.log_id for append in appends]
+        if len(set(log_ids)) < len(log_ids):
+            raise ValueError("each log can only be appended to once per transaction")
+        await self._ensure_client()
 
-        logger.info(f"DynamoDB Item: {event_item}")
+        operations = []
+        for append in appends:
+            event_items = self._event_items(append.log_id, append.events)
+            operations.extend(self._append_operations(append.log_id, append.events, event_items,
+                                                      append.consistency_tag))
+        if len(operations) > MAX_TRANSACTION_ITEMS:
+            raise ValueError(f"cannot append to {len(appends)} logs atomically: the transaction would write "
+                             f"{len(operations)} items, the limit is {MAX_TRANSACTION_ITEMS}")
+
+        logger.debug("apply events to logs", extra={"log_ids": log_ids,
+                                                    "event_count": sum(len(a.events) for a in appends)})
+        try:
+            await self._transact(operations, f"one of the logs {', '.join(log_ids)} has moved past the event "
+                                             "the client last read, or has an append reserved")
+        except ConcurrencyViolationError:
+            if self.reserves_appends:
+                for log_id in log_ids:
+                    await self._release_expired_reservations(log_id)
+            raise
+
+    def _event_items(self, log_id: str, events: list[Event]) -> list[dict]:
+        event_items = [event_to_item(log_id, event, self._sort_key(event)) for event in events]
+        if self.index_events:
+            for event, item in zip(events, event_items):
+                item.update(index_keys(event))
+        return event_items
+
+    def _append_operations(self,
+                           log_id: str,
+                           events: list[Event],
+                           event_items: list[dict],
+                           last_event: str | None,
+                           minimums: dict[str, float] | None = None) -> list:
+        """The transaction items that append the events, conditioned on the log's last event and minimums"""
+        if self.concurrency_mode is ConcurrencyMode.VERSION:
+            # each version can be written once, which is the whole conflict check
+            operations = [Put(table=self.table_name, item=item, condition=F("PK").does_not_exist())
+                          for item in event_items]
+            operations.extend(self._outbox_operations(log_id, event_items))
+            return operations
 
         # Build transaction items using aiodynamo's Put and Update classes
+        # an event must not overwrite another with the same id, which the last event condition alone allows
+        operations = [Put(table=self.table_name, item=item, condition=F("PK").does_not_exist())
+                      for item in event_items]
+        operations.extend(self._outbox_operations(log_id, event_items))
+        if last_event is None:
+            # First event - need to create both event and metadata, unless another writer got there first
+            operations.append(Put(
+                table=self.table_name,
+                item={
+                    'PK': log_id,
+                    'SK': LOG_METADATA_ITEM,
+                    'last_event': event_items[-1]['SK'],
+                    **head_attributes(events),
+                },
+                condition=F("PK").does_not_exist()
+            ))
+        else:
+            # Subsequent event - update metadata with condition check
+            metadata_key = {'PK': log_id, 'SK': LOG_METADATA_ITEM}
+            expression = F("last_event").set(event_items[-1]['SK'])
+            for name, value in head_attributes(events).items():
+                expression &= F(name).set(value)
+            # and on no append being reserved, whose versions these events would take
+            condition = F("last_event").equals(last_event) & (
+                F(RESERVATION_COUNT).does_not_exist() | F(RESERVATION_COUNT).equals(0))
+            for counter, minimum in (minimums or {}).items():
+                condition &= F(f"{COUNTER_ATTRIBUTE_PREFIX}{counter}").gte(minimum)
+            operations.append(Update(
+                table=self.table_name,
+                key=metadata_key,
+                expression=expression,
+                condition=condition
+            ))
+        return operations
+
+    async def _transact(self, operations: list, conflict_message: str) -> None:
         try:
-            if last_event is None:
-                # First event - need to create both event and metadata
-                await self._client.transact_write_items([
-                    Put(
-                        table=self.table_name,
-                        item=event_item
-                    ),
-                    Put(
-                        table=self.table_name,
-                        item={
-                            'PK': log_id,
-                            'SK': LOG_METADATA_ITEM,
-                            'last_event': event.event_id
-                        }
-                    )
-                ])
-            else:
-                # Subsequent event - update metadata with condition check
-                metadata_key = {'PK': log_id, 'SK': LOG_METADATA_ITEM}
-
-                await self._client.transact_write_items([
-                    Put(
-                        table=self.table_name,
-                        item=event_item
-                    ),
-                    Update(
-                        table=self.table_name,
-                        key=metadata_key,
-                        expression=F("last_event").set(event.event_id),
-                        condition=F("last_event").equals(last_event)
-                    )
-                ])
+            await self._request(AdaptiveThrottle.WRITE, lambda: self._client.transact_write_items(operations))
+        except (ConditionalCheckFailed, TransactionCanceled) as e:
+            # a failed condition inside a transaction surfaces as a cancelled transaction
+            if isinstance(e, TransactionCanceled) and not any(
+                    reason and reason.code == "ConditionalCheckFailed" for reason in e.cancellation_reasons):
+                logger.error("Failed to apply event: %s", e)
+                raise
+            logger.warning("Transaction failed due to conditional check: %s", e)
+            raise ConcurrencyViolationError(
+                message=conflict_message,
+                code="ConditionalCheckFailed",
+                reason=str(e),
+            ) from e
+        except Exception as e:
+            logger.error("Failed to apply event: %s", e)
+            raise
+
+    async def _append_versioned(self, log_id: str, event: Event, event_item: dict) -> None:
+        try:
+            # the version is the sort key, so a second writer of the same version fails the condition
+            await self._request(AdaptiveThrottle.WRITE, lambda: self._client.put_item(
+                self.table_name, event_item, condition=F("PK").does_not_exist()))
         except ConditionalCheckFailed as e:
-            logger.warning(f"Transaction failed due to conditional check: {e}")
+            logger.warning("Append failed due to conditional check: %s", e)
             raise ConcurrencyViolationError(
-                message=f"could not update log metadata because the last applied event id does not match the client's event id {last_event}",
+                message=f"version {event.version} of log {log_id} has already been written",
                 code="ConditionalCheckFailed",
                 reason=str(e),
             ) from e
         except Exception as e:
-            logger.error(f"Failed to apply event: {e}")
+            logger.error("Failed to apply event: %s", e)
             raise
 
+    def _outbox_operations(self, log_id: str, event_items: list[dict]) -> list[Put]:
+        if not self.outbox_shards:
+            return []
+        first, last = event_items[0]['SK'], event_items[-1]['SK']
+        # keyed by log and first event, so that a shard's markers list each log's appends in order
+        return [Put(table=self.table_name, item={
+            'PK': f"{OUTBOX_PARTITION_PREFIX}{self.outbox_shard_of(log_id)}",
+            'SK': f"{log_id}#{first}",
+            'log_id': log_id,
+            'first_event': first,
+            'last_event': last,
+            'event_count': len(event_items),
+            'created_time': datetime.now(UTC).isoformat(),
+        })]
+
+    def _sort_key(self, event: Event) -> str:
+        if self.concurrency_mode is ConcurrencyMode.VERSION:
+            if event.version is None:
+                raise ValueError(f"event {event.event_id} has no version to key it by")
+            return version_sort_key(event.version)
+        return event.event_id
+
     async def get_log(self, log_id: str):
+        """Returns the full history of the log, reading archived events back from the cold tier"""
         await self._ensure_client()
 
-        table = self._client.table(self.table_name)
+        decode = item_decoder()
         events = []
+        tombstones = []
+        item_count = 0
 
         # Query all items with the given log_id
         with tracer.start_as_current_span("dynamodb.query"):
-            async for item in table.query(key_condition=F("PK").equals(log_id)):
+            async for item in self._query(F("PK").equals(log_id)):
+                item_count += 1
                 sk = item.get('SK')
-                logger.info(f"get_log: item with SK: {sk}")
 
-                if sk == LOG_METADATA_ITEM:
-                    continue  # skip metadata item
+                if sk.startswith(CONTROL_ITEM_PREFIX):
+                    if sk.startswith(ARCHIVE_TOMBSTONE_PREFIX):
+                        tombstones.append(item)
+                    continue  # skip metadata, snapshot and tombstone items
+
+                event = decode(item)
+                if event:
+                    events.append(event)
+
+        if tombstones:
+            events = await self._with_archived_events(log_id, tombstones, events)
 
-                event_type = item.get('event_type')
+        # one summary line per log rather than one line per item
+        logger.debug("get_log complete", extra={"log_id": log_id, "item_count": item_count,
+                                                "event_count": len(events)})
+        return events
+
+    async def _query(self,
+                     key_condition,
+                     filter_expression=None,
+                     index: str | None = None,
+                     limit: int | None = None) -> AsyncIterator[dict]:
+        """Yields the query's items a page at a time, each page paced and retried on its own (see _request)"""
+        start_key = None
+        while True:
+            page = await self._request(AdaptiveThrottle.READ, lambda: self._client.query_single_page(
+                self.table_name, key_condition, start_key=start_key, filter_expression=filter_expression,
+                index=index, limit=limit))
+            for item in page.items:
+                yield item
+            if limit is not None:
+                limit -= len(page.items)
+                if limit <= 0:
+                    return
+            if page.last_evaluated_key is None:
+                return
+            start_key = page.last_evaluated_key
 
-                # get all non-control attributes
-                event_data = {k: v for k, v in item.items() if k not in ['PK', 'SK', 'event_type', 'created_time', 'applied_time', 'event_id']}
+    async def get_log_from(self,
+                           log_id: str,
+                           starting_point: Event | Snapshot | datetime | str,
+                           include_archived: bool = False):
+        """
+        Returns the events after starting_point - an event, snapshot or event id (exclusive) or a datetime
+        (inclusive) - reading the archive too with include_archived
+        """
+        await self._ensure_client()
 
-                # Reconstruct the Event object based on the event_type
-                event_class = Event.class_from(event_type)
-                if event_class:
-                    event = event_class(**event_data)
-                    event.event_id = item['event_id']
-                    event.created_time = datetime.fromisoformat(item['created_time'])
-                    event.applied_time = datetime.fromisoformat(item['applied_time'])
+        key_condition, filter_expression, is_after = self._starting_point(log_id, starting_point)
+
+        decode = item_decoder()
+        events = []
+        with tracer.start_as_current_span("dynamodb.query"):
+            async for item in self._query(key_condition, filter_expression):
+                if item['SK'].startswith(CONTROL_ITEM_PREFIX):
+                    continue
+                event = decode(item)
+                if event:
                     events.append(event)
 
+        if include_archived:
+            tombstones = [item async for item in self._query(
+                F("PK").equals(log_id) & F("SK").begins_with(ARCHIVE_TOMBSTONE_PREFIX))]
+            if tombstones:
+                events = await self._with_archived_events(log_id, tombstones, events)
+                events = [event for event in events if is_after(event)]
+
+        logger.debug("get_log_from complete", extra={"log_id": log_id, "event_count": len(events)})
+        return events
+
+    async def iter_log(self,
+                       log_id: str,
+                       after: str | None = None,
+                       event_types: Iterable[type[Event]] | None = None,
+                       start: datetime | None = None,
+                       end: datetime | None = None) -> AsyncIterator[tuple[str, Event]]:
+        """Streams the log as (sort key, event) pairs, archived events first, a page at a time"""
+        await self._ensure_client()
+
+        type_names = [event_type_name_of(t) for t in event_types] if event_types is not None else None
+        start_id = event_id_prefix(start) if start else None
+        end_id = event_id_prefix(end) if end else None
+
+        def selected(sort_key: str, item: dict) -> bool:
+            return ((after is None or sort_key > after)
+                    and (type_names is None or item['event_type'] in type_names)
+                    and (start_id is None or item['event_id'] >= start_id)
+                    and (end_id is None or item['event_id'] < end_id))
+
+        tombstones = [item async for item in self._query(
+            F("PK").equals(log_id) & F("SK").begins_with(ARCHIVE_TOMBSTONE_PREFIX))]
+        if tombstones and self.archive is None:
+            raise ValueError(f"log {log_id} has archived events but the store has no archive backend")
+
+        archived_through = None
+        for tombstone in sorted(tombstones, key=lambda t: t['last_event']):
+            archived_through = tombstone['last_event']
+            if after is not None and archived_through <= after:
+                continue
+            with tracer.start_as_current_span("archive.read"):
+                segment = await self.archive.get_segment(tombstone['archive_key'])
+            for item in segment:
+                if selected(item['SK'], item):
+                    yield item['SK'], item_to_event(item)
+
+        # hot events - from behind the cursor and whatever has been archived, and within the time range
+        lower, exclusive = FIRST_EVENT_SORT_KEY, False
+        metadata_mode = self.concurrency_mode is ConcurrencyMode.METADATA
+        if start_id and metadata_mode and start_id > lower:
+            lower = start_id
+        for resume_from in (after, archived_through):
+            if resume_from is not None and resume_from >= lower:
+                lower, exclusive = resume_from, True
+        upper = end_id if end_id and metadata_mode else None
+        if upper is not None and lower > upper:
+            return
+
+        partition = F("PK").equals(log_id)
+        if upper is not None:
+            key_condition = partition & F("SK").between(lower, upper)
+        else:
+            key_condition = partition & (F("SK").gt(lower) if exclusive else F("SK").gte(lower))
+
+        filters = []
+        if type_names is not None:
+            filters.append(F("event_type").is_in(type_names))
+        if not metadata_mode:
+            if start_id:
+                filters.append(F("event_id").gte(start_id))
+            if end_id:
+                filters.append(F("event_id").lt(end_id))
+        filter_expression = None
+        for condition in filters:
+            filter_expression = condition if filter_expression is None else filter_expression & condition
+
+        # not the current span: the generator may be suspended and resumed in other contexts
+        with tracer.start_span("dynamodb.query"):
+            async for item in self._query(key_condition, filter_expression):
+                sort_key = item['SK']
+                if exclusive and sort_key == lower:
+                    continue    # between() is inclusive of the resume position
+                event = item_to_event(item)
+                if event:
+                    yield sort_key, event
+
+    async def iter_events_by_type(self,
+                                  event_types: Iterable[type[Event]],
+                                  start: datetime | None = None,
+                                  end: datetime | None = None) -> AsyncIterator[tuple[str, Event]]:
+        """Reads the event type index month by month from start; archived events are not included"""
+        type_names = [event_type_name_of(t) for t in event_types]
+        async for log_id, event in self._iter_index(EVENT_TYPE_INDEX, type_names, start, end):
+            yield log_id, event
+
+    async def iter_events_by_aggregate_type(self,
+                                            aggregate_type: type | str,
+                                            start: datetime | None = None,
+                                            end: datetime | None = None) -> AsyncIterator[tuple[str, Event]]:
+        """aggregate_type is an Aggregate subclass or its fully qualified name; see iter_events_by_type"""
+        name = aggregate_type if isinstance(aggregate_type, str) else aggregate_type_name(aggregate_type)
+        async for log_id, event in self._iter_index(AGGREGATE_TYPE_INDEX, [name], start, end):
+            yield log_id, event
+
+    async def _iter_index(self, index: str, type_names: list[str], start: datetime | None,
+                          end: datetime | None) -> AsyncIterator[tuple[str, Event]]:
+        if not self.index_events:
+            raise UnsupportedOperation(f"the store does not write the {index} index; construct it with index_events=True")
+        await self._ensure_client()
+
+        partition_key, sort_key = EVENT_INDEXES[index]
+        start = start or self.index_since
+        start_id = event_id_prefix(start)
+        end_id = event_id_prefix(end) if end else None
+        decode = item_decoder()
+
+        # not the current span: the generator may be suspended and resumed in other contexts
+        with tracer.start_span("dynamodb.query_index") as span:
+            span.set_attribute("index", index)
+            for bucket in index_buckets(start, end or datetime.now(UTC)):
+                # each type's partition is in event id order; merging them keeps the whole stream in order
+                items = _merge_by(sort_key, [
+                    self._query(F(partition_key).equals(f"{type_name}#{bucket}") & F(sort_key).gte(start_id),
+                                index=index)
+                    for type_name in type_names])
+                async for item in items:
+                    if end_id is not None and item[sort_key] >= end_id:
+                        break
+                    event = decode(item)
+                    if event:
+                        yield item['PK'], event
+
+    def _starting_point(self, log_id: str, starting_point: Event | Snapshot | datetime | str):
+        """Returns the key condition, filter and in-memory predicate selecting events after starting_point"""
+        partition = F("PK").equals(log_id)
+
+        if isinstance(starting_point, datetime):
+            # event ids start with their applied time, so a time maps directly onto an event id prefix
+            starting_id = event_id_prefix(starting_point)
+            if self.concurrency_mode is ConcurrencyMode.VERSION:
+                return partition, F("event_id").gte(starting_id), lambda e: e.event_id >= starting_id
+            return partition & F("SK").gte(starting_id), None, lambda e: e.event_id >= starting_id
+
+        if self.concurrency_mode is ConcurrencyMode.VERSION:
+            version = starting_point.version if isinstance(starting_point, (Event, Snapshot)) else None
+            if version is not None:
+                return partition & F("SK").gt(version_sort_key(version)), None, lambda e: e.version > version
+
+        match starting_point:
+            case Event():
+                starting_id = starting_point.event_id
+            case Snapshot():
+                starting_id = starting_point.last_event
+            case _:
+                starting_id = starting_point
+        if self.concurrency_mode is ConcurrencyMode.VERSION:
+            return partition, F("event_id").gt(starting_id), lambda e: e.event_id > starting_id
+        return partition & F("SK").gt(starting_id), None, lambda e: e.event_id > starting_id
+
+    # snapshots
+    async def get_snapshot(self, log_id: str) -> Snapshot | None:
+        await self._ensure_client()
+        try:
+            item = await self._request(AdaptiveThrottle.READ, lambda: self._client.get_item(
+                self.table_name, {'PK': log_id, 'SK': SNAPSHOT_ITEM}))
+        except ItemNotFound:
+            return None
+        return item_to_snapshot(item)
+
+    async def save_snapshot(self, snapshot: Snapshot) -> None:
+        await self._ensure_client()
+        try:
+            # never let a slower writer replace a snapshot that already covers more of the log
+            await self._request(AdaptiveThrottle.WRITE, lambda: self._client.put_item(
+                self.table_name,
+                {
+                    'PK': snapshot.log_id,
+                    'SK': SNAPSHOT_ITEM,
+                    'last_event': snapshot.last_event,
+                    'state': snapshot.state,
+                    'taken_time': snapshot.taken_time.isoformat(),
+                    **({'version': snapshot.version} if snapshot.version is not None else {}),
+                },
+                condition=F("last_event").does_not_exist() | F("last_event").lt(snapshot.last_event)
+            ))
+        except ConditionalCheckFailed:
+            logger.debug("newer snapshot already saved", extra={"log_id": snapshot.log_id})
+
+    async def get_log_heads(self, log_ids: list[str], consistent_read: bool = False) -> dict[str, LogHead]:
+        """
+        Reads the metadata and snapshot items of the logs with BatchGetItem. Version mode keeps no
+        metadata item, so its heads carry only the snapshot. Consistent reads cost twice the capacity.
+        """
+        await self._ensure_client()
+
+        tracks_last_event = self.concurrency_mode is ConcurrencyMode.METADATA
+        control_items = (LOG_METADATA_ITEM, SNAPSHOT_ITEM) if tracks_last_event else (SNAPSHOT_ITEM,)
+        keys = [{'PK': log_id, 'SK': sk} for log_id in dict.fromkeys(log_ids) for sk in control_items]
+        items = []
+        with tracer.start_as_current_span("dynamodb.batch_get") as span:
+            for start in range(0, len(keys), BATCH_GET_LIMIT):
+                pending = keys[start:start + BATCH_GET_LIMIT]
+                attempt = 0
+                while pending:
+                    if attempt:
+                        await asyncio.sleep(unprocessed_retry_delay(attempt))
+                    attempt += 1
+                    response = await self._request(
+                        AdaptiveThrottle.READ,
+                        lambda: self._client.batch_get({self.table_name: BatchGetRequest(keys=pending, consistent_read=consistent_read)}),
+                        is_throttled=lambda r: bool(r.unprocessed_keys.get(self.table_name)))
+                    items.extend(response.items.get(self.table_name, []))
+                    pending = response.unprocessed_keys.get(self.table_name, [])
+            span.set_attribute("log_count", len(log_ids))
+
+        heads = {log_id: LogHead(log_id, None, last_event_known=tracks_last_event) for log_id in log_ids}
+        for item in items:
+            head = heads[item['PK']]
+            if item['SK'] == LOG_METADATA_ITEM:
+                head.last_event = item['last_event']
+                # metadata written before heads kept versions has neither the version nor counters
+                head.version = int(item['version']) if 'version' in item else None
+                head.counters = {name.removeprefix(COUNTER_ATTRIBUTE_PREFIX): float(value)
+                                 for name, value in item.items() if name.startswith(COUNTER_ATTRIBUTE_PREFIX)}
+            else:
+                head.snapshot = item_to_snapshot(item)
+        return heads
+
+    # outbox
+    def outbox_shard_of(self, log_id: str) -> int:
+        return partition_of(log_id, self.outbox_shards)
+
+    async def read_outbox(self, shard: int, limit: int = 100) -> list[OutboxEntry]:
+        """Returns up to limit of the shard's pending markers, each log's in the order they were appended"""
+        await self._ensure_client()
+        with tracer.start_as_current_span("dynamodb.query"):
+            return [OutboxEntry(shard, item['SK'], item['log_id'], item['first_event'], item['last_event'],
+                                int(item['event_count']))
+                    async for item in self._query(F("PK").equals(f"{OUTBOX_PARTITION_PREFIX}{shard}"), limit=limit)]
+
+    async def outbox_events(self, entry: OutboxEntry) -> list[Event]:
+        """Reads the events a marker stands for"""
+        await self._ensure_client()
+        key_condition = F("PK").equals(entry.log_id) & F("SK").between(entry.first_event, entry.last_event)
+        with tracer.start_as_current_span("dynamodb.query"):
+            items = [item async for item in self._query(key_condition)]
+        if len(items) < entry.event_count:
+            # archived since they were appended; the full log includes the archive
+            events = [event for event in await self.get_log(entry.log_id)
+                      if entry.first_event <= self._sort_key(event) <= entry.last_event]
+        else:
+            events = [event for event in map(item_to_event, items) if event]
         return events
 
-    async def get_log_from(self, log_id: str, from_timestamp: datetime):
-        # Logic to retrieve logs from a specific timestamp in DynamoDB
+    async def ack_outbox(self, entries: list[OutboxEntry]) -> None:
+        """Deletes the markers of events that have been dispatched"""
         await self._ensure_client()
+        await self._batch_delete([{'PK': f"{OUTBOX_PARTITION_PREFIX}{entry.shard}", 'SK': entry.key}
+                                  for entry in entries])
+
+    async def _batch_delete(self, keys: list[dict]) -> None:
+        for start in range(0, len(keys), BATCH_WRITE_LIMIT):
+            pending = keys[start:start + BATCH_WRITE_LIMIT]
+            attempt = 0
+            while pending:
+                if attempt:
+                    await asyncio.sleep(unprocessed_retry_delay(attempt))
+                attempt += 1
+                response = await self._request(
+                    AdaptiveThrottle.WRITE,
+                    lambda: self._client.batch_write({self.table_name: BatchWriteRequest(keys_to_delete=pending)}),
+                    is_throttled=lambda r: self.table_name in r and bool(r[self.table_name].undeleted_keys))
+                pending = response[self.table_name].undeleted_keys if self.table_name in response else []
+
+    # archival
+    async def archive_log(self, log_id: str) -> ArchiveResult | None:
+        """
+        Moves the log's events up to its latest snapshot into the archive behind a tombstone; None when there is
+        nothing to archive
+        """
+        if self.archive is None:
+            raise ValueError("archive_log requires the store to be configured with an archive backend")
+        await self._ensure_client()
+
+        snapshot = await self.get_snapshot(log_id)
+        if snapshot is None:
+            return None
+        if self.concurrency_mode is ConcurrencyMode.VERSION:
+            if snapshot.version is None:
+                logger.warning("snapshot has no version, not archiving", extra={"log_id": log_id})
+                return None
+            archive_through = version_sort_key(snapshot.version)
+        else:
+            archive_through = snapshot.last_event
+
+        with tracer.start_as_current_span("archive_log") as span:
+            key_condition = F("PK").equals(log_id) & F("SK").lte(archive_through)
+            items = [item async for item in self._query(key_condition)
+                     if not item['SK'].startswith(CONTROL_ITEM_PREFIX)]
+            if not items:
+                return None
+
+            archive_key = await self.archive.put_segment(items)
+            result = ArchiveResult(log_id, archive_key, len(items), items[0]['SK'], items[-1]['SK'])
+            await self._request(AdaptiveThrottle.WRITE, lambda: self._client.put_item(self.table_name, {
+                'PK': log_id,
+                'SK': f"{ARCHIVE_TOMBSTONE_PREFIX}{result.last_event}",
+                'archive_key': archive_key,
+                'first_event': result.first_event,
+                'last_event': result.last_event,
+                'event_count': result.event_count,
+                'archived_time': datetime.now(UTC).isoformat(),
+            }))
+
+            await self._batch_delete([{'PK': log_id, 'SK': item['SK']} for item in items])
+
+            span.set_attribute("event_count", result.event_count)
+
+        logger.info("archived log", extra={"log_id": log_id, "event_count": result.event_count,
+                                           "archive_key": archive_key})
+        return result
+
+    async def archive_logs(self, log_ids: list[str], concurrency: int = 8) -> list[ArchiveResult]:
+        """Archives many logs with at most `concurrency` archival runs in flight"""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def archive_one(log_id: str) -> ArchiveResult | None:
+            async with semaphore:
+                return await self.archive_log(log_id)
+
+        results = await asyncio.gather(*(archive_one(log_id) for log_id in log_ids))
+        return [result for result in results if result]
+
+    async def _with_archived_events(self, log_id: str, tombstones: list[dict], hot_events: list[Event]) -> list[Event]:
+        if self.archive is None:
+            raise ValueError(f"log {log_id} has archived events but the store has no archive backend")
+
+        tombstones = sorted(tombstones, key=lambda t: t['last_event'])
+        with tracer.start_as_current_span("archive.read") as span:
+            segments = await asyncio.gather(*(self.archive.get_segment(t['archive_key']) for t in tombstones))
+            span.set_attribute("segment_count", len(segments))
 
-        # Not implemented yet
-        pass
+        archived_through = tombstones[-1]['last_event']
+        events = [event for segment in segments for event in map(item_decoder(), segment) if event]
+        # events deleted by an interrupted archival run may still be hot as well as archived
+        return events + [event for event in hot_events if self._sort_key(event) > archived_through]
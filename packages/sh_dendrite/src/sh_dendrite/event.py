@@ -1,12 +1,48 @@
 from dataclasses import dataclass, field
-from datetime import datetime, UTC
+from datetime import datetime, timedelta, UTC
 from importlib import import_module
+from typing import Iterable
+
+# fully qualified type name -> event class, filled in by Event.__init_subclass__
+_registry: dict[str, type['Event']] = {}
+
+
+def event_id_prefix(time: datetime) -> str:
+    """The millisecond timestamp that event ids start with; naive times are taken to be UTC"""
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=UTC)
+    return time.astimezone(UTC).strftime('%Y%m%d%H%M%S%f')[:-3]
+
+
+def event_id_time(event_id: str) -> datetime | None:
+    """The millisecond an event id starts with, or None for an id that is not timestamped"""
+    try:
+        return datetime.strptime(event_id[:17], '%Y%m%d%H%M%S%f').replace(tzinfo=UTC)
+    except ValueError:
+        return None
+
+
+def next_event_id(previous: str | None, time: datetime, version: int, event_name: str) -> str:
+    """
+    The id of the event at version applied at time, sorting after previous even when this clock is behind
+    the clock that wrote it
+    """
+    event_id = f"{event_id_prefix(time)}_{version:010d}_{event_name}"
+    if previous is None or event_id > previous:
+        return event_id
+    previous_time = event_id_time(previous)
+    if previous_time is None:
+        return event_id     # not a timestamped id, so there is no order to keep
+    return next_event_id(None, previous_time + timedelta(milliseconds=1), version, event_name)
+
 
 @dataclass
 class Event:
     event_id: str | None = field(default=None, init=False)
     created_time: datetime = field(default_factory=lambda: datetime.now(UTC), init=False)
     applied_time: datetime | None = field(default=None, init=False)
+    version: int | None = field(default=None, init=False)     # position of the event in its log, from 1
+    aggregate_type: str | None = field(default=None, init=False)    # set by the aggregate that applies it
 
 
     @property
@@ -15,10 +51,24 @@ class Event:
         return self.__class__.__name__.replace('Event', '')
 
 
-    # TODO: evaluate an optimization approach wherein the fx scans on load for all event types and adds them to
-    #  global scope - the hypothesis is that this would simplify the process of finding and loading the event class
+    def head_counters(self) -> dict[str, float]:
+        """The log's counters once the event is applied, e.g. a running balance, kept in the log head"""
+        return {}
+
+    def __init_subclass__(cls, register: bool = True, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # every event type registers itself as its module is imported, so resolving a stored
+        # event_type is a dictionary lookup rather than an import; derived helper classes such as
+        # lazy views opt out
+        if register:
+            _registry[f"{cls.__module__}.{cls.__name__}"] = cls
+
     @classmethod
     def class_from(cls, event_type: str):
+        event_class = _registry.get(event_type)
+        if event_class is not None:
+            return event_class
+
         # Split into module path and class name
         module_path, class_name = event_type.rsplit('.', 1)
 
@@ -29,3 +79,13 @@ class Event:
             return getattr(module, class_name)
         except (ImportError, AttributeError) as e:
             raise ValueError(f"Could not load event class: {event_type}") from e
+
+    @classmethod
+    def register_modules(cls, module_paths: Iterable[str]) -> int:
+        """
+        Imports the modules that define event types so that they are registered up front, e.g. during
+        application startup instead of on the first read of each type. Returns the number of registered types.
+        """
+        for module_path in module_paths:
+            import_module(module_path)
+        return len(_registry)
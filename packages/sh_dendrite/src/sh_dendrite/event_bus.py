@@ -0,0 +1,115 @@
+"""In-process publish/subscribe of applied events, dropping subscribers that fall behind.
+
+    bus = EventBus(topic_of=lambda event: event.ledger_id)
+    with bus.subscribe(ledger_id) as subscription:
+        async for event in subscription:
+            ...
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Callable
+
+from sh_dendrite.event import Event
+from sh_dendrite.event_handler import EventHandler
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, bus: 'EventBus', topic: str, max_buffered: int):
+        self.bus = bus
+        self.topic = topic
+        self.max_buffered = max_buffered
+        self.dropped = False
+        self.closed = False
+        self._buffer: deque[Event] = deque()
+        self._waiter: asyncio.Future | None = None
+
+    def _offer(self, event: Event) -> None:
+        if len(self._buffer) >= self.max_buffered:
+            self.dropped = True
+            logger.info("dropping slow subscriber", extra={"topic": self.topic, "buffered": len(self._buffer)})
+            self.close()
+            return
+        self._buffer.append(event)
+        self._wake()
+
+    def _wake(self) -> None:
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.bus._unsubscribe(self)
+            self._wake()
+
+    async def next(self) -> Event | None:
+        """Returns the next event, waiting for one if necessary, or None once the subscription is closed"""
+        while not self._buffer:
+            if self.closed:
+                return None
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        if self.dropped:
+            return None     # a dropped subscriber has already missed events, so buffered ones are moot
+        return self._buffer.popleft()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Event:
+        event = await self.next()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class EventBus(EventHandler):
+    def __init__(self, topic_of: Callable[[Event], str | None], max_buffered: int = 64):
+        """topic_of maps an event to its topic, or None to leave it unpublished"""
+        self.topic_of = topic_of
+        self.max_buffered = max_buffered
+        self._subscriptions: dict[str, set[Subscription]] = {}
+
+    def subscribe(self, topic: str, max_buffered: int | None = None) -> Subscription:
+        subscription = Subscription(self, topic, max_buffered or self.max_buffered)
+        self._subscriptions.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def subscriber_count(self, topic: str | None = None) -> int:
+        if topic is not None:
+            return len(self._subscriptions.get(topic, ()))
+        return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def handle_event(self, events):
+        for event in events:
+            topic = self.topic_of(event)
+            subscriptions = self._subscriptions.get(topic) if topic is not None else None
+            if subscriptions:
+                # copied because dropping a subscriber removes it from the set
+                for subscription in list(subscriptions):
+                    subscription._offer(event)
+
+    def close(self) -> None:
+        """Ends every subscription, e.g. on shutdown"""
+        for subscriptions in list(self._subscriptions.values()):
+            for subscription in list(subscriptions):
+                subscription.close()
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscriptions.get(subscription.topic)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.topic]
@@ -5,4 +5,8 @@ from abc import abstractmethod, ABC
 class EventHandler(ABC):
     @abstractmethod
     def handle_event(self, events):
-        pass
\ No newline at end of file
+        pass
+
+    async def handle_event_and_wait(self, events):
+        """Returns once the events are handled, for handlers whose handle_event only queues them"""
+        self.handle_event(events)
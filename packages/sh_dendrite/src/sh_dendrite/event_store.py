@@ -1,16 +1,131 @@
+from dataclasses import dataclass
 from datetime import datetime
-from sh_dendrite.event import Event
+from typing import AsyncIterator, Iterable
+from sh_dendrite.event import Event, event_id_prefix
+from sh_dendrite.log_head import LogHead
+from sh_dendrite.snapshot import Snapshot
+from sh_dendrite.unsupported_operation import UnsupportedOperation
 from abc import ABC, abstractmethod
 
+
+@dataclass
+class LogAppend:
+    """Events to append to one log, conditioned - like apply_many - on the log's last event"""
+    log_id: str
+    events: list[Event]
+    consistency_tag: str | None
+
+
+@dataclass
+class Reservation:
+    """Versions and counter changes taken on a log's head for events still to be written (see reserve_append)"""
+    log_id: str
+    token: str
+    head: LogHead               # the head as the reservation found it
+    applied_time: datetime      # of the reserved events, which keeps their ids in version order
+    count: int
+    deltas: dict[str, float]
+
+
 class EventStore(ABC):
+    # the most events apply_many can append atomically, or None when it does not append atomically
+    max_batch_events: int | None = None
+    # whether log heads carry the log's version and counters, and appends can be guarded by counters
+    keeps_counters: bool = False
+    # whether save_snapshot keeps snapshots; the others always replay the full log
+    keeps_snapshots: bool = False
+    # whether appends can reserve versions and counter changes on the log head (reserve_append), so that
+    # those which only add to counters commute rather than conflict
+    reserves_appends: bool = False
+    # whether apply_many_logs appends to several logs atomically
+    appends_across_logs: bool = False
+    # whether the store indexes events by type and aggregate type, and provides iter_events_by_type and
+    # iter_events_by_aggregate_type to read them across logs
+    indexes_events: bool = False
+
     @abstractmethod
     async def apply(self, log_id: str, event: Event, consistency_tag: str):
         pass
 
+    async def apply_many(self, log_id: str, events: list[Event], consistency_tag: str):
+        """
+        Appends the events in order. Stores that can write several events atomically override this;
+        the default appends them one at a time, so a failure can leave a prefix of the batch applied.
+        """
+        for event in events:
+            await self.apply(log_id, event, consistency_tag)
+            consistency_tag = event.event_id
+
+    async def apply_many_guarded(self, log_id: str, events: list[Event], consistency_tag: str,
+                                 minimums: dict[str, float]):
+        """
+        Like apply_many, and only if each counter in minimums (see Event.head_counters) is at least its
+        minimum. Only stores that keep counters support it.
+        """
+        raise UnsupportedOperation(f"{type(self).__name__} does not keep counters")
+
+    async def reserve_append(self, log_id: str, count: int, deltas: dict[str, float],
+                             minimums: dict[str, float]) -> Reservation:
+        """
+        Takes the log's next count versions and adds deltas to its counters whatever was appended meanwhile,
+        provided each counter is at least its minimum
+        """
+        raise UnsupportedOperation(f"{type(self).__name__} cannot reserve appends")
+
+    async def complete_append(self, reservation: Reservation, events: list[Event]):
+        """Appends the events - stamped with the reserved versions - and ends the reservation"""
+        raise UnsupportedOperation(f"{type(self).__name__} cannot reserve appends")
+
+    async def release_append(self, reservation: Reservation):
+        """Gives up a reservation that will not be completed, taking its deltas back off the counters"""
+        raise UnsupportedOperation(f"{type(self).__name__} cannot reserve appends")
+
+    async def apply_many_logs(self, appends: list[LogAppend]):
+        """
+        Appends to several logs atomically: every append or, if any log has moved past its consistency
+        tag, none. Only stores that append across logs support it.
+        """
+        raise UnsupportedOperation(f"{type(self).__name__} cannot append to several logs atomically")
+
     @abstractmethod
     async def get_log(self, log_id: str):
         pass
 
     @abstractmethod
-    async def get_log_from(self, log_id: str, starting_point: Event | datetime):
-        pass
\ No newline at end of file
+    async def get_log_from(self, log_id: str, starting_point: Event | Snapshot | datetime | str):
+        """
+        Returns the events after starting_point: an event, a snapshot (the events it does not cover)
+        or an event id, exclusive; or a datetime, inclusive.
+        """
+        pass
+
+    # snapshots are optional - stores that don't keep them always replay the full log
+    async def get_snapshot(self, log_id: str) -> Snapshot | None:
+        return None
+
+    async def save_snapshot(self, snapshot: Snapshot) -> None:
+        raise UnsupportedOperation(f"{type(self).__name__} does not keep snapshots")
+
+    async def get_log_heads(self, log_ids: list[str], consistent_read: bool = False) -> dict[str, LogHead]:
+        """
+        Returns the head of each log in one round trip where the store supports it; logs missing from the result
+        have to be read in full
+        """
+        return {}
+
+    async def iter_log(self,
+                       log_id: str,
+                       after: str | None = None,
+                       event_types: Iterable[type[Event]] | None = None,
+                       start: datetime | None = None,
+                       end: datetime | None = None) -> AsyncIterator[tuple[str, Event]]:
+        """Yields (position, event) pairs in log order; pass a position as `after` to resume behind it"""
+        types = set(event_types) if event_types is not None else None
+        start_id = event_id_prefix(start) if start else None
+        end_id = event_id_prefix(end) if end else None
+        for event in await self.get_log(log_id):
+            position = event.event_id
+            if ((after is None or position > after) and (types is None or type(event) in types)
+                    and (start_id is None or event.event_id >= start_id)
+                    and (end_id is None or event.event_id < end_id)):
+                yield position, event
@@ -0,0 +1,329 @@
+"""Conformance and performance tests every EventStore runs against itself.
+
+    class TestInMemoryEventStore(EventStoreContract):
+        @pytest.fixture
+        def event_store(self):
+            return InMemoryEventStore()
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone, UTC
+
+import pytest
+
+from sh_dendrite import aggregate
+from sh_dendrite.aggregate import Aggregate
+from sh_dendrite.concurrency_violation_error import ConcurrencyViolationError
+from sh_dendrite.event import Event, event_id_prefix
+from sh_dendrite.event_store import EventStore, LogAppend
+from sh_dendrite.snapshot import Snapshot
+from sh_dendrite.unsupported_operation import UnsupportedOperation
+
+# applied times of the contract's events are seconds apart from here, so that datetimes select them
+FIRST_APPLIED_TIME = datetime(2026, 1, 1, 9, 30, 0, 123456, tzinfo=UTC)
+
+
+@dataclass
+class ContractAccountOpened(Event):
+    family_name: str
+    kids: list[str]
+    guardians: list[dict] = field(default_factory=list)
+    nickname: str | None = None
+
+
+@dataclass
+class ContractDeposited(Event):
+    amount: float
+    memo: str = ""
+
+
+class ContractAccount(Aggregate):
+    def __init__(self, log_id, event_store, event_handlers):
+        super().__init__(log_id, event_store, event_handlers)
+        self.balance = None
+
+    def on(self, event: Event) -> None:
+        match event:
+            case ContractAccountOpened():
+                self.balance = 0.0
+            case ContractDeposited():
+                self.balance += event.amount
+
+
+def frozen_clock(now: datetime) -> type[datetime]:
+    """A datetime whose now() is always now, to stand in for the one aggregates stamp events with"""
+    class FrozenClock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return now
+    return FrozenClock
+
+
+@dataclass(frozen=True)
+class PerformanceContract:
+    log_size: int
+    append_per_second: float    # events appended per second, writing the log in batches
+    replay_per_second: float    # events read back per second by get_log
+
+
+def stamped(events: list[Event], log: list[Event]) -> list[Event]:
+    """Gives the events the ids, applied times and versions an aggregate would, following log"""
+    for version, event in enumerate(events, start=len(log) + 1):
+        event.applied_time = FIRST_APPLIED_TIME + timedelta(seconds=version)
+        event.event_id = f"{event_id_prefix(event.applied_time)}_{version:06d}_{event.event_name}"
+        event.version = version
+    log.extend(events)
+    return events
+
+
+def deposits(count: int, log: list[Event]) -> list[Event]:
+    return stamped([ContractDeposited(float(n), f"deposit {n}") for n in range(count)], log)
+
+
+class EventStoreContract:
+    """Subclasses provide the store under test as the event_store fixture, a new store or log space per test"""
+    performance_contracts: tuple[PerformanceContract, ...] = (
+        PerformanceContract(log_size=100, append_per_second=200, replay_per_second=2_000),
+        PerformanceContract(log_size=1_000, append_per_second=200, replay_per_second=2_000),
+    )
+    # events per apply_many when appending for a performance contract, bounded by the store's max_batch_events
+    append_batch_size: int = 10
+    concurrent_appenders: int = 5
+
+    def pytest_generate_tests(self, metafunc):
+        if "performance_contract" in metafunc.fixturenames:
+            metafunc.parametrize("performance_contract", self.performance_contracts,
+                                 ids=[f"{contract.log_size}-events" for contract in self.performance_contracts])
+
+    # ordering
+
+    @pytest.mark.asyncio
+    async def test_an_unknown_log_is_empty(self, event_store: EventStore):
+        assert list(await event_store.get_log("contract-missing")) == []
+        assert list(await event_store.get_log_from("contract-missing", FIRST_APPLIED_TIME)) == []
+
+    @pytest.mark.asyncio
+    async def test_reads_a_log_in_the_order_it_was_appended(self, event_store: EventStore):
+        log: list[Event] = []
+        tag = None
+        for batch in ([1], [2, 3, 4], [5], [6, 7]):
+            events = deposits(len(batch), log)
+            if len(events) == 1:
+                await event_store.apply("contract-log", events[0], tag)
+            else:
+                await event_store.apply_many("contract-log", events, tag)
+            tag = events[-1].event_id
+
+        read = await event_store.get_log("contract-log")
+
+        assert [event.event_id for event in read] == [event.event_id for event in log]
+        assert [event.version for event in read] == list(range(1, 8))
+        # positions are opaque, but resume behind the event they were yielded with
+        positions = [(position, event.event_id) async for position, event in event_store.iter_log("contract-log")]
+        assert [event_id for _, event_id in positions] == [event.event_id for event in log]
+        assert [event.event_id async for _, event in event_store.iter_log("contract-log", after=positions[3][0])] == [
+            event.event_id for event in log[4:]]
+
+    @pytest.mark.asyncio
+    async def test_keeps_logs_apart(self, event_store: EventStore):
+        first, second = [], []
+        await event_store.apply_many("contract-first", deposits(2, first), None)
+        await event_store.apply_many("contract-second", deposits(3, second), None)
+
+        assert [event.event_id for event in await event_store.get_log("contract-first")] == [
+            event.event_id for event in first]
+        assert len(await event_store.get_log("contract-second")) == 3
+
+    # optimistic concurrency
+
+    @pytest.mark.asyncio
+    async def test_rejects_an_append_behind_the_head_of_the_log(self, event_store: EventStore):
+        log: list[Event] = []
+        await event_store.apply_many("contract-log", deposits(2, log), None)
+        # written by someone who has only read the first event
+        behind = stamped([ContractDeposited(1.0)], log[:1])[0]
+
+        with pytest.raises(ConcurrencyViolationError):
+            await event_store.apply("contract-log", behind, log[0].event_id)
+
+        assert len(await event_store.get_log("contract-log")) == 2
+
+    @pytest.mark.asyncio
+    async def test_one_of_several_concurrent_appenders_wins(self, event_store: EventStore):
+        log: list[Event] = []
+        await event_store.apply_many("contract-log", deposits(3, log), None)
+        head = log[-1].event_id
+        rivals = [stamped([ContractDeposited(float(n), f"appender {n}")], list(log))[0]
+                  for n in range(self.concurrent_appenders)]
+
+        results = await asyncio.gather(*(event_store.apply("contract-log", event, head) for event in rivals),
+                                       return_exceptions=True)
+
+        failures = [result for result in results if isinstance(result, BaseException)]
+        assert len(failures) == self.concurrent_appenders - 1
+        assert all(isinstance(failure, ConcurrencyViolationError) for failure in failures)
+        read = await event_store.get_log("contract-log")
+        winner = rivals[results.index(None)]
+        assert [event.memo for event in read[3:]] == [winner.memo]
+
+    @pytest.mark.asyncio
+    async def test_one_of_several_concurrent_creators_of_a_log_wins(self, event_store: EventStore):
+        rivals = [stamped([ContractAccountOpened(f"family {n}", [])], [])[0]
+                  for n in range(self.concurrent_appenders)]
+
+        results = await asyncio.gather(*(event_store.apply("contract-new", event, None) for event in rivals),
+                                       return_exceptions=True)
+
+        assert sum(result is None for result in results) == 1
+        assert all(isinstance(result, ConcurrencyViolationError) for result in results if result is not None)
+        assert len(await event_store.get_log("contract-new")) == 1
+
+    @pytest.mark.asyncio
+    async def test_an_atomic_batch_that_conflicts_appends_nothing(self, event_store: EventStore):
+        if event_store.max_batch_events is None:
+            pytest.skip(f"{type(event_store).__name__} does not append batches atomically")
+        log: list[Event] = []
+        await event_store.apply_many("contract-log", deposits(2, log), None)
+
+        with pytest.raises(ConcurrencyViolationError):
+            await event_store.apply_many("contract-log", deposits(3, log[:1]), log[0].event_id)
+
+        assert len(await event_store.get_log("contract-log")) == 2
+
+    @pytest.mark.asyncio
+    async def test_aggregates_append_in_order_within_a_millisecond(self, event_store: EventStore, monkeypatch):
+        monkeypatch.setattr(aggregate, "datetime", frozen_clock(FIRST_APPLIED_TIME))
+        account = ContractAccount("contract-log", event_store, {})
+        await account.apply(ContractAccountOpened("Smith", []))
+        await account.apply_many([ContractDeposited(10.0), ContractDeposited(20.0)])
+        await account.apply(ContractDeposited(30.0))
+        await account.apply(ContractDeposited(40.0))
+        # and a clock behind the log's last event
+        monkeypatch.setattr(aggregate, "datetime", frozen_clock(FIRST_APPLIED_TIME - timedelta(seconds=1)))
+        await account.apply(ContractDeposited(50.0))
+
+        read = await event_store.get_log("contract-log")
+
+        assert [event.version for event in read] == [1, 2, 3, 4, 5, 6]
+        assert [event.event_id for event in read] == sorted(event.event_id for event in read)
+        reloaded = ContractAccount("contract-log", event_store, {})
+        await reloaded.reload()
+        assert reloaded.balance == account.balance == 150.0
+
+    # range reads
+
+    @pytest.mark.asyncio
+    async def test_reads_a_log_from_an_event_a_snapshot_or_an_event_id(self, event_store: EventStore):
+        log: list[Event] = []
+        await event_store.apply_many("contract-log", deposits(5, log), None)
+        snapshot = Snapshot("contract-log", log[2].event_id, {}, version=log[2].version)
+
+        for starting_point in (log[2], snapshot, log[2].event_id):
+            read = await event_store.get_log_from("contract-log", starting_point)
+            assert [event.event_id for event in read] == [event.event_id for event in log[3:]], starting_point
+        assert list(await event_store.get_log_from("contract-log", log[-1])) == []
+
+    @pytest.mark.asyncio
+    async def test_reads_a_log_from_a_time_inclusively(self, event_store: EventStore):
+        log: list[Event] = []
+        await event_store.apply_many("contract-log", deposits(5, log), None)
+
+        read = await event_store.get_log_from("contract-log", log[2].applied_time)
+        assert [event.event_id for event in read] == [event.event_id for event in log[2:]]
+        later = log[-1].applied_time + timedelta(seconds=1)
+        assert list(await event_store.get_log_from("contract-log", later)) == []
+
+    # fidelity
+
+    @pytest.mark.asyncio
+    async def test_events_read_back_equal_to_what_was_written(self, event_store: EventStore):
+        log: list[Event] = []
+        opened = ContractAccountOpened("Smith", ["Amy", "Bob"],
+                                       guardians=[{"name": "John", "emails": ["john@example.com"]}])
+        opened.created_time = datetime(2026, 1, 1, 11, 29, 59, 654321, tzinfo=timezone(timedelta(hours=2)))
+        events = stamped([opened, ContractAccountOpened("Jones", []), ContractDeposited(12.5)], log)
+        await event_store.apply_many("contract-log", events, None)
+
+        read = await event_store.get_log("contract-log")
+
+        assert read == log
+        for written, event in zip(log, read):
+            assert type(event) is type(written)
+            assert event.created_time.utcoffset() == written.created_time.utcoffset()
+            assert event.applied_time.utcoffset() == written.applied_time.utcoffset()
+        assert type(read[0].kids) is list and read[0].kids == ["Amy", "Bob"]
+        assert read[1].kids == [] and read[1].nickname is None
+
+    @pytest.mark.asyncio
+    async def test_events_do_not_change_with_the_writer_s_copies(self, event_store: EventStore):
+        log: list[Event] = []
+        opened = stamped([ContractAccountOpened("Smith", ["Amy"])], log)[0]
+        await event_store.apply("contract-log", opened, None)
+
+        opened.kids.append("Bob")
+
+        assert (await event_store.get_log("contract-log"))[0].kids == ["Amy"]
+
+    # capabilities
+
+    @pytest.mark.asyncio
+    async def test_appends_to_several_logs_atomically(self, event_store: EventStore):
+        if not event_store.appends_across_logs:
+            pytest.skip(f"{type(event_store).__name__} does not append across logs")
+        first: list[Event] = []
+        second: list[Event] = []
+        await event_store.apply_many("contract-first", deposits(1, first), None)
+
+        with pytest.raises(ConcurrencyViolationError):
+            await event_store.apply_many_logs([LogAppend("contract-first", deposits(1, []), None),
+                                               LogAppend("contract-second", deposits(1, []), None)])
+        await event_store.apply_many_logs([LogAppend("contract-first", deposits(1, first), first[0].event_id),
+                                           LogAppend("contract-second", deposits(1, second), None)])
+
+        assert len(await event_store.get_log("contract-first")) == 2
+        assert len(await event_store.get_log("contract-second")) == 1
+
+    @pytest.mark.asyncio
+    async def test_declines_the_operations_its_capabilities_leave_out(self, event_store: EventStore):
+        if not event_store.keeps_counters:
+            with pytest.raises(UnsupportedOperation):
+                await event_store.apply_many_guarded("contract-log", deposits(1, []), None, {})
+        if not event_store.appends_across_logs:
+            with pytest.raises(UnsupportedOperation):
+                await event_store.apply_many_logs([LogAppend("contract-log", deposits(1, []), None)])
+        if not event_store.keeps_snapshots:
+            with pytest.raises(UnsupportedOperation):
+                await event_store.save_snapshot(Snapshot("contract-log", "", {}))
+        if not event_store.reserves_appends:
+            with pytest.raises(UnsupportedOperation):
+                await event_store.reserve_append("contract-log", 1, {}, {})
+
+        assert await event_store.get_log("contract-log") == []
+
+    # performance
+
+    @pytest.mark.asyncio
+    async def test_meets_its_performance_contract(self, event_store: EventStore,
+                                                  performance_contract: PerformanceContract):
+        log: list[Event] = []
+        batch_size = min(self.append_batch_size, event_store.max_batch_events or self.append_batch_size)
+        log_id = f"contract-performance-{performance_contract.log_size}"
+
+        started = time.perf_counter()
+        tag = None
+        while len(log) < performance_contract.log_size:
+            events = deposits(min(batch_size, performance_contract.log_size - len(log)), log)
+            await event_store.apply_many(log_id, events, tag)
+            tag = events[-1].event_id
+        append_rate = performance_contract.log_size / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        read = await event_store.get_log(log_id)
+        replay_rate = performance_contract.log_size / (time.perf_counter() - started)
+
+        assert len(read) == performance_contract.log_size
+        assert append_rate >= performance_contract.append_per_second, \
+            f"appended {append_rate:,.0f} events/s, the contract is {performance_contract.append_per_second:,.0f}"
+        assert replay_rate >= performance_contract.replay_per_second, \
+            f"replayed {replay_rate:,.0f} events/s, the contract is {performance_contract.replay_per_second:,.0f}"
@@ -1,19 +1,60 @@
+import copy
+import sys
 from datetime import datetime
 
-from sh_dendrite.event_store import EventStore
+from sh_dendrite.concurrency_violation_error import ConcurrencyViolationError
+from sh_dendrite.event import Event, event_id_prefix
+from sh_dendrite.event_store import EventStore, LogAppend
+from sh_dendrite.snapshot import Snapshot
+
+
+def events_after(events: list[Event], starting_point: Event | Snapshot | datetime | str) -> list[Event]:
+    """The events after starting_point, with the semantics of EventStore.get_log_from"""
+    if isinstance(starting_point, datetime):
+        starting_id = event_id_prefix(starting_point)
+        return [event for event in events if event.event_id >= starting_id]
+    match starting_point:
+        case Event():
+            starting_id = starting_point.event_id
+        case Snapshot():
+            starting_id = starting_point.last_event
+        case _:
+            starting_id = starting_point
+    return [event for event in events if event.event_id > starting_id]
+
 
 class InMemoryEventStore(EventStore):
+    """Keeps each log in a list in memory, with the optimistic concurrency of the durable stores"""
+    # a batch is checked and appended without yielding to the event loop
+    max_batch_events = sys.maxsize
+    appends_across_logs = True
+
     def __init__(self):
-        self.store = {}
+        self.store: dict[str, list[Event]] = {}
+
+    async def apply(self, log_id: str, event: Event, consistency_tag: str | None):
+        await self.apply_many(log_id, [event], consistency_tag)
 
-    def apply(self, log_id, event, consistency_tag: str):
-        if log_id not in self.store:
-            self.store[log_id] = []
+    async def apply_many(self, log_id: str, events: list[Event], consistency_tag: str | None):
+        await self.apply_many_logs([LogAppend(log_id, events, consistency_tag)])
 
-        self.store[log_id].append((event.event_id, event))
+    async def apply_many_logs(self, appends: list[LogAppend]):
+        if len({append.log_id for append in appends}) != len(appends):
+            raise ValueError("each log can only be appended to once per transaction")
+        for append in appends:
+            log = self.store.get(append.log_id, [])
+            last_event = log[-1].event_id if log else None
+            if last_event != append.consistency_tag:
+                raise ConcurrencyViolationError(
+                    message=f"log {append.log_id} has moved past {append.consistency_tag}",
+                    code="ConditionalCheckFailed",
+                    reason=f"the last event of the log is {last_event}",
+                )
+        for append in appends:
+            self.store.setdefault(append.log_id, []).extend(copy.deepcopy(append.events))
 
-    def get_log(self, log_id: str):
-        return [e[0] for e in self.store.get(log_id, [])]
+    async def get_log(self, log_id: str) -> list[Event]:
+        return list(self.store.get(log_id, []))
 
-    def get_log_from(self, log_id: str, from_timestamp: datetime):
-        raise NotImplementedError("InMemoryEventStore does not support get_log_from")
+    async def get_log_from(self, log_id: str, starting_point: Event | Snapshot | datetime | str) -> list[Event]:
+        return events_after(self.store.get(log_id, []), starting_point)
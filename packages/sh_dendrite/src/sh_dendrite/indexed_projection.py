@@ -0,0 +1,450 @@
+"""In-memory read models kept in column arrays, with sorted and hash indexes for ad-hoc queries.
+
+    richest = balances.table.top("balance", 100)
+    per_family = balances.table.sum_by("family_id", "balance")
+"""
+import asyncio
+import dataclasses
+import itertools
+import math
+import sys
+import threading
+import types
+import typing
+from abc import abstractmethod
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import AsyncIterable, AsyncIterator, Generic, Iterable, Iterator, TypeVar
+
+from sh_dendrite.event import Event
+from sh_dendrite.event_handler import EventHandler
+
+R = TypeVar('R')
+
+# null markers of the numeric columns; floats use NaN
+_INT_NULL = -2 ** 63
+_NO_VERSION = -1
+
+
+def _column_type(annotation) -> type | None:
+    """float or int for a column that fits an array, None for one that holds objects"""
+    if typing.get_origin(annotation) in (typing.Union, types.UnionType):
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        annotation = args[0] if len(args) == 1 else None
+    return annotation if annotation in (float, int) else None
+
+
+class _Column:
+    def __init__(self, column_type: type | None):
+        self.typecode = {float: 'd', int: 'q'}.get(column_type)
+        self.values = array(self.typecode) if self.typecode else []
+        self._null = {'d': math.nan, 'q': _INT_NULL}.get(self.typecode)
+
+    def get(self, row: int):
+        value = self.values[row]
+        if self.typecode == 'd':
+            return None if math.isnan(value) else value
+        if self.typecode == 'q':
+            return None if value == _INT_NULL else value
+        return value
+
+    def set(self, row: int, value) -> None:
+        self.values[row] = self._null if value is None else value
+
+    def sum(self, rows: Iterable[int]) -> float:
+        values = self.values
+        if self.typecode == 'd':
+            return math.fsum(value for row in rows if (value := values[row]) == value)     # NaN is not equal to itself
+        if self.typecode == 'q':
+            return sum(value for row in rows if (value := values[row]) != _INT_NULL)
+        return math.fsum(value for row in rows if (value := values[row]) is not None)
+
+    def append_null(self) -> None:
+        self.values.append(self._null)
+
+    def memory_usage(self) -> int:
+        if self.typecode:
+            return sys.getsizeof(self.values)
+        # objects shared between rows - repeated ids or group names - are counted once
+        distinct = {id(value): value for value in self.values if value is not None}
+        return sys.getsizeof(self.values) + sum(sys.getsizeof(value) for value in distinct.values())
+
+
+class _SortedIndex:
+    """(value, row) pairs in order, held in chunks of parallel arrays so that an insert moves one chunk"""
+
+    CHUNK_SIZE = 512
+
+    def __init__(self, column: _Column):
+        self.typecode = column.typecode
+        self.values: list = []                  # chunks of values
+        self.rows: list[array] = []             # and of their rows
+        self.maxes: list[tuple] = []            # the last pair of each chunk
+
+    def _new_values(self, values=()):
+        return array(self.typecode, values) if self.typecode else list(values)
+
+    def _find(self, chunk: int, value, row: int) -> tuple[int, bool]:
+        values, rows = self.values[chunk], self.rows[chunk]
+        low = bisect_left(values, value)
+        high = bisect_right(values, value, low)
+        # equal values are kept in row order, so the row can be found by bisection too
+        position = bisect_left(rows, row, low, high)
+        return position, position < high and rows[position] == row
+
+    def add(self, value, row: int) -> None:
+        if value is None:
+            return
+        if not self.values:
+            self.values.append(self._new_values([value]))
+            self.rows.append(array('q', [row]))
+            self.maxes.append((value, row))
+            return
+        chunk = min(bisect_left(self.maxes, (value, row)), len(self.maxes) - 1)
+        position, _ = self._find(chunk, value, row)
+        values, rows = self.values[chunk], self.rows[chunk]
+        values.insert(position, value)
+        rows.insert(position, row)
+        self.maxes[chunk] = (values[-1], rows[-1])
+        if len(values) > 2 * self.CHUNK_SIZE:
+            half = len(values) // 2
+            self.values[chunk:chunk + 1] = [values[:half], values[half:]]
+            self.rows[chunk:chunk + 1] = [rows[:half], rows[half:]]
+            self.maxes[chunk:chunk + 1] = [(values[half - 1], rows[half - 1]), (values[-1], rows[-1])]
+
+    def remove(self, value, row: int) -> None:
+        if value is None:
+            return
+        chunk = bisect_left(self.maxes, (value, row))
+        if chunk == len(self.maxes):
+            return
+        position, found = self._find(chunk, value, row)
+        if not found:
+            return
+        values, rows = self.values[chunk], self.rows[chunk]
+        del values[position]
+        del rows[position]
+        if values:
+            self.maxes[chunk] = (values[-1], rows[-1])
+        else:
+            del self.values[chunk], self.rows[chunk], self.maxes[chunk]
+
+    def _bound(self, value, start: bool) -> tuple[int, int]:
+        """The (chunk, position) where values of at least value begin; None is the start or the end"""
+        if value is None:
+            return (0, 0) if start else (len(self.values), 0)
+        # (value,) sorts before every pair holding value
+        chunk = bisect_left(self.maxes, (value,))
+        if chunk == len(self.values):
+            return chunk, 0
+        return chunk, bisect_left(self.values[chunk], value)
+
+    def iter_rows(self, low, high, descending: bool = False) -> Iterator[int]:
+        """Rows whose values are from low (inclusive) to high (exclusive), in value order"""
+        first_chunk, first = self._bound(low, True)
+        last_chunk, last = self._bound(high, False)
+        chunks = range(first_chunk, min(last_chunk, len(self.rows) - 1) + 1)
+        for chunk in (reversed(chunks) if descending else chunks):
+            rows = self.rows[chunk]
+            start = first if chunk == first_chunk else 0
+            end = last if chunk == last_chunk else len(rows)
+            if start < end:
+                yield from (reversed(rows[start:end]) if descending else rows[start:end])
+
+    def count(self, low, high) -> int:
+        first_chunk, first = self._bound(low, True)
+        last_chunk, last = self._bound(high, False)
+        if (first_chunk, first) >= (last_chunk, last):
+            return 0
+        if first_chunk == last_chunk:
+            return last - first
+        inner = sum(len(rows) for rows in self.rows[first_chunk + 1:last_chunk])
+        return len(self.rows[first_chunk]) - first + inner + last
+
+    def memory_usage(self) -> int:
+        return (sys.getsizeof(self.values) + sys.getsizeof(self.rows) + sys.getsizeof(self.maxes)
+                + sum(sys.getsizeof(chunk) for chunk in self.values)
+                + sum(sys.getsizeof(chunk) for chunk in self.rows)
+                + sum(sys.getsizeof(pair) for pair in self.maxes))
+
+
+class _HashIndex:
+    def __init__(self):
+        self.rows: dict[object, set[int]] = {}
+
+    def add(self, value, row: int) -> None:
+        self.rows.setdefault(value, set()).add(row)
+
+    def remove(self, value, row: int) -> None:
+        rows = self.rows.get(value)
+        if rows is not None:
+            rows.discard(row)
+            if not rows:
+                del self.rows[value]
+
+    def memory_usage(self) -> int:
+        return sys.getsizeof(self.rows) + sum(sys.getsizeof(rows) for rows in self.rows.values())
+
+
+class ColumnTable(Generic[R]):
+    def __init__(self,
+                 row_type: type[R],
+                 key: str,
+                 sorted: Iterable[str] = (),
+                 hashed: Iterable[str] = ()):
+        """
+        row_type: a dataclass whose fields are the columns; key: the field that identifies a row.
+        sorted, hashed: the columns indexed for range and top-k queries, and for equality lookups.
+        """
+        self.row_type = row_type
+        self.key = key
+        hints = typing.get_type_hints(row_type)
+        names = [field.name for field in dataclasses.fields(row_type)]
+        if key not in names:
+            raise ValueError(f"{row_type.__name__} has no field {key}")
+        self._columns = {name: _Column(_column_type(hints[name])) for name in names if name != key}
+        self._sorted = {name: _SortedIndex(self._column(name)) for name in sorted}
+        self._hashed = {name: _HashIndex() for name in hashed}
+        self._keys: list[str | None] = []       # by row; None for a free row
+        self._rows: dict[str, int] = {}
+        self._versions = array('q')
+        self._free: list[int] = []
+        # projections are fed from several partitions' worker threads at once
+        self.lock = threading.RLock()
+
+    def _column(self, name: str) -> _Column:
+        column = self._columns.get(name)
+        if column is None:
+            raise ValueError(f"{self.row_type.__name__} has no column {name}")
+        return column
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._rows
+
+    # writes
+
+    def upsert(self, row: R, version: int | None = None) -> bool:
+        """Writes the row, unless it already holds a later version; returns whether it was written"""
+        key = getattr(row, self.key)
+        with self.lock:
+            index = self._rows.get(key)
+            if index is None:
+                index = self._allocate(key)
+            elif self._is_stale(index, version):
+                return False
+            self._write(index, {name: getattr(row, name) for name in self._columns}, version)
+        return True
+
+    def update(self, key: str, version: int | None = None, **values) -> bool:
+        """Writes some of a row's columns; False if the row does not exist or holds a later version"""
+        for name in values:
+            self._column(name)
+        with self.lock:
+            index = self._rows.get(key)
+            if index is None or self._is_stale(index, version):
+                return False
+            self._write(index, values, version)
+        return True
+
+    def delete(self, key: str) -> bool:
+        with self.lock:
+            index = self._rows.pop(key, None)
+            if index is None:
+                return False
+            self._write(index, dict.fromkeys(self._columns), None)
+            for hashed in self._hashed.values():
+                hashed.remove(None, index)
+            self._keys[index] = None
+            self._versions[index] = _NO_VERSION
+            self._free.append(index)
+        return True
+
+    def clear(self) -> None:
+        with self.lock:
+            for column in self._columns.values():
+                del column.values[:]
+            for name in self._sorted:
+                self._sorted[name] = _SortedIndex(self._columns[name])
+            for name in self._hashed:
+                self._hashed[name] = _HashIndex()
+            self._keys.clear()
+            self._rows.clear()
+            del self._versions[:]
+            self._free.clear()
+
+    def _allocate(self, key: str) -> int:
+        if self._free:
+            index = self._free.pop()
+        else:
+            index = len(self._keys)
+            self._keys.append(None)
+            self._versions.append(_NO_VERSION)
+            for column in self._columns.values():
+                column.append_null()
+        self._keys[index] = key
+        self._rows[key] = index
+        return index
+
+    def _is_stale(self, index: int, version: int | None) -> bool:
+        return version is not None and self._versions[index] >= version
+
+    def _write(self, index: int, values: dict, version: int | None) -> None:
+        for name, value in values.items():
+            column = self._columns[name]
+            old = column.get(index)
+            sorted_index, hashed = self._sorted.get(name), self._hashed.get(name)
+            if sorted_index is not None:
+                sorted_index.remove(old, index)
+            if hashed is not None:
+                hashed.remove(old, index)
+            column.set(index, value)
+            value = column.get(index)
+            if sorted_index is not None:
+                sorted_index.add(value, index)
+            if hashed is not None:
+                hashed.add(value, index)
+        if version is not None:
+            self._versions[index] = version
+
+    # queries
+
+    def _row(self, index: int) -> R:
+        values = {name: column.get(index) for name, column in self._columns.items()}
+        return self.row_type(**{self.key: self._keys[index]}, **values)
+
+    def get(self, key: str) -> R | None:
+        with self.lock:
+            index = self._rows.get(key)
+            return self._row(index) if index is not None else None
+
+    def version(self, key: str) -> int | None:
+        with self.lock:
+            index = self._rows.get(key)
+            if index is None or self._versions[index] == _NO_VERSION:
+                return None
+            return self._versions[index]
+
+    def range(self,
+              column: str,
+              low=None,
+              high=None,
+              limit: int | None = None,
+              descending: bool = False) -> list[R]:
+        """Rows whose value of the sorted column is from low (inclusive) to high (exclusive), in its order"""
+        index = self._sorted_index(column)
+        with self.lock:
+            rows = itertools.islice(index.iter_rows(low, high, descending), limit)
+            return [self._row(row) for row in rows]
+
+    def top(self, column: str, k: int) -> list[R]:
+        """The k rows with the largest values of the sorted column, largest first"""
+        return self.range(column, limit=k, descending=True)
+
+    def bottom(self, column: str, k: int) -> list[R]:
+        """The k rows with the smallest values of the sorted column, smallest first"""
+        return self.range(column, limit=k)
+
+    def count_range(self, column: str, low=None, high=None) -> int:
+        with self.lock:
+            return self._sorted_index(column).count(low, high)
+
+    def where(self, column: str, value) -> list[R]:
+        """Rows whose value of the hashed column equals value"""
+        hashed = self._hashed_index(column)
+        with self.lock:
+            return [self._row(index) for index in sorted(hashed.rows.get(value, ()))]
+
+    def sum_by(self, group_column: str, value_column: str) -> dict:
+        """Totals of value_column per value of the hashed group_column, empty values counting as zero"""
+        hashed = self._hashed_index(group_column)
+        column = self._column(value_column)
+        with self.lock:
+            return {group: column.sum(rows) for group, rows in hashed.rows.items()}
+
+    def _sorted_index(self, column: str) -> _SortedIndex:
+        index = self._sorted.get(column)
+        if index is None:
+            raise ValueError(f"column {column} has no sorted index")
+        return index
+
+    def _hashed_index(self, column: str) -> _HashIndex:
+        index = self._hashed.get(column)
+        if index is None:
+            raise ValueError(f"column {column} has no hash index")
+        return index
+
+    def memory_usage(self) -> dict[str, int]:
+        """Approximate bytes held per column and index, plus the key map and the total"""
+        with self.lock:
+            usage = {f"column:{name}": column.memory_usage() for name, column in self._columns.items()}
+            usage.update({f"sorted:{name}": index.memory_usage() for name, index in self._sorted.items()})
+            usage.update({f"hashed:{name}": index.memory_usage() for name, index in self._hashed.items()})
+            usage["keys"] = (sys.getsizeof(self._keys) + sys.getsizeof(self._rows) + sys.getsizeof(self._versions)
+                             + sum(sys.getsizeof(key) for key in self._rows))
+            usage["total"] = sum(usage.values())
+            return usage
+
+
+class IndexedProjection(EventHandler, Generic[R]):
+    def __init__(self, table: ColumnTable[R]):
+        self.table = table
+
+    @abstractmethod
+    def project(self, event: Event) -> None:
+        """Applies one event to the table"""
+
+    def handle_event(self, events):
+        # a batch is applied under the table's lock, so queries never see half of it
+        with self.table.lock:
+            for event in events:
+                self.project(event)
+
+    async def rebuild(self, events: AsyncIterable[Event] | Iterable[Event], batch_size: int = 1000) -> int:
+        """Empties the table and projects the events, yielding to the event loop between batches"""
+        self.table.clear()
+        count = 0
+        batch: list[Event] = []
+        if isinstance(events, AsyncIterable):
+            async for event in events:
+                batch.append(event)
+                if len(batch) >= batch_size:
+                    count += await self._rebuild_batch(batch)
+        else:
+            for event in events:
+                batch.append(event)
+                if len(batch) >= batch_size:
+                    count += await self._rebuild_batch(batch)
+        count += await self._rebuild_batch(batch)
+        return count
+
+    async def _rebuild_batch(self, batch: list[Event]) -> int:
+        count = len(batch)
+        self.handle_event(batch)
+        batch.clear()
+        await asyncio.sleep(0)
+        return count
+
+    async def rebuild_from(self,
+                           event_store,
+                           event_types: Iterable[type[Event]],
+                           log_ids: Iterable[str] | None = None,
+                           **options) -> int:
+        """
+        Rebuilds the table from the store's event type index or, given log_ids, from the logs - which a store that
+        archives must be given
+        """
+        event_types = list(event_types)
+        if log_ids is not None:
+            return await self.rebuild(_events_of_logs(event_store, log_ids, event_types))
+        if getattr(event_store, "archive", None) is not None:
+            raise ValueError("archived events are not in the event type index; pass log_ids to rebuild from the logs")
+        return await self.rebuild(event async for _, event in event_store.iter_events_by_type(event_types, **options))
+
+
+async def _events_of_logs(event_store, log_ids: Iterable[str], event_types: list[type[Event]]) -> AsyncIterator[Event]:
+    for log_id in log_ids:
+        async for _, event in event_store.iter_log(log_id, event_types=event_types):
+            yield event
@@ -0,0 +1,99 @@
+"""Events that decode their fields when first read, for replays that read only a few of them"""
+import types
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import MISSING, fields
+from typing import Any, Callable
+
+from sh_dendrite.event import Event
+
+_lazy_reads: ContextVar[bool] = ContextVar('lazy_reads', default=False)
+
+# event class -> its lazy subclass
+_lazy_classes: dict[type[Event], type[Event]] = {}
+
+
+@contextmanager
+def lazy_reads():
+    """Lets stores return lazy events from the reads made within the block"""
+    token = _lazy_reads.set(True)
+    try:
+        yield
+    finally:
+        _lazy_reads.reset(token)
+
+
+def lazy_reads_enabled() -> bool:
+    return _lazy_reads.get()
+
+
+class _LazyField:
+    """A non-data descriptor: once a value is decoded into the instance dict, attribute lookup finds it there"""
+
+    def __init__(self, name: str, default: Callable[[], Any]):
+        self.name = name
+        self.default = default
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        state = instance.__dict__
+        if self.name in state['_item']:
+            value = state['_item'][self.name]
+            decode = state['_decoders'].get(self.name)
+            if decode is not None and value is not None:
+                value = decode(value)
+        else:
+            value = self.default()
+        state[self.name] = value
+        return value
+
+
+def _default_of(f) -> Callable[[], Any]:
+    if f.default is not MISSING:
+        return lambda: f.default
+    if f.default_factory is not MISSING:
+        return f.default_factory
+    return lambda: None
+
+
+def _lazy_class(event_class: type[Event]) -> type[Event]:
+    lazy_class = _lazy_classes.get(event_class)
+    if lazy_class is None:
+        def body(namespace):
+            namespace.update({f.name: _LazyField(f.name, _default_of(f)) for f in fields(event_class)})
+            namespace['__lazy_source__'] = event_class
+            # pickles as the raw item, e.g. to replay in another process, since the generated class cannot be
+            namespace['__reduce__'] = lambda self: (
+                lazy_event, (event_class, self.__dict__['_item'], self.__dict__['_decoders']))
+
+        lazy_class = types.new_class(event_class.__name__, (event_class,), {'register': False}, body)
+        # reads as the event class in names, reprs and event_name
+        lazy_class.__qualname__ = event_class.__qualname__
+        lazy_class.__module__ = event_class.__module__
+        _lazy_classes[event_class] = lazy_class
+    return lazy_class
+
+
+def lazy_event(event_class: type[Event], item: dict, decoders: dict[str, Callable[[Any], Any]]) -> Event:
+    """Wraps the stored item as an event of event_class without decoding it"""
+    event = object.__new__(_lazy_class(event_class))
+    event.__dict__['_item'] = item
+    event.__dict__['_decoders'] = decoders
+    return event
+
+
+def is_lazy(event: Event) -> bool:
+    return '_item' in event.__dict__
+
+
+def materialize(event: Event) -> Event:
+    """Returns an ordinary instance of the event's class with all fields decoded; real events are returned as-is"""
+    if not is_lazy(event):
+        return event
+    event_class = type(event).__lazy_source__
+    real = event_class(**{f.name: getattr(event, f.name) for f in fields(event_class) if f.init})
+    for f in fields(event_class):
+        if not f.init:
+            setattr(real, f.name, getattr(event, f.name))
+    return real
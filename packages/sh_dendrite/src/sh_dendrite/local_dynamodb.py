@@ -0,0 +1,855 @@
+import base64
+import json
+import re
+import time
+import zlib
+from bisect import bisect_left, bisect_right, insort
+from decimal import Decimal
+from typing import Any
+
+import httpx
+from aiodynamo.client import Client
+from aiodynamo.credentials import Key, StaticCredentials
+from aiodynamo.http.httpx import HTTPX
+from yarl import URL
+
+from sh_dendrite.throttle import note_retry_after
+
+LOCAL_ENDPOINT = "http://local-dynamodb"
+_ERROR_PREFIX = "com.amazonaws.dynamodb.v20120810#"
+
+# the capacity that each operation draws on
+_READ_ACTIONS = frozenset(["GetItem", "Query", "Scan", "BatchGetItem"])
+_WRITE_ACTIONS = frozenset(["PutItem", "UpdateItem", "DeleteItem", "BatchWriteItem", "TransactWriteItems"])
+
+
+class _DynamoError(Exception):
+    def __init__(self, error_type: str, message: str, **extra):
+        super().__init__(message)
+        self.error_type = error_type
+        self.message = message
+        self.extra = extra
+
+    def to_body(self) -> dict:
+        return {"__type": f"{_ERROR_PREFIX}{self.error_type}", "message": self.message, **self.extra}
+
+
+def _conditional_check_failed():
+    return _DynamoError("ConditionalCheckFailedException", "The conditional request failed")
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# expression parsing - covers the subset of the DynamoDB expression grammar that aiodynamo emits
+# ---------------------------------------------------------------------------------------------------------------------
+
+_TOKEN = re.compile(r"\s*(#\w+|:\w+|<>|<=|>=|[A-Za-z_]\w*|\d+|[=<>(),.\[\]+\-])")
+_KEYWORDS = {"AND", "OR", "NOT", "BETWEEN", "IN", "SET", "REMOVE", "ADD", "DELETE"}
+
+
+def _tokenize(expression: str) -> list[str]:
+    tokens, pos = [], 0
+    expression = expression.rstrip()
+    while pos < len(expression):
+        match = _TOKEN.match(expression, pos)
+        if not match:
+            raise _DynamoError("ValidationException", f"Invalid expression: {expression}")
+        tokens.append(match.group(1))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, expression: str, names: dict, values: dict):
+        self.tokens = _tokenize(expression)
+        self.pos = 0
+        self.names = names or {}
+        self.values = values or {}
+
+    def peek(self, offset: int = 0) -> str | None:
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def next(self) -> str:
+        token = self.peek()
+        if token is None:
+            raise _DynamoError("ValidationException", "Unexpected end of expression")
+        self.pos += 1
+        return token
+
+    def expect(self, token: str) -> None:
+        actual = self.next()
+        if actual.upper() != token:
+            raise _DynamoError("ValidationException", f"Expected {token} but found {actual}")
+
+    def done(self) -> bool:
+        return self.pos >= len(self.tokens)
+
+    # conditions
+    def condition(self):
+        node = self.conjunction()
+        while self.peek() and self.peek().upper() == "OR":
+            self.next()
+            node = ("or", node, self.conjunction())
+        return node
+
+    def conjunction(self):
+        node = self.negation()
+        while self.peek() and self.peek().upper() == "AND":
+            self.next()
+            node = ("and", node, self.negation())
+        return node
+
+    def negation(self):
+        if self.peek() and self.peek().upper() == "NOT":
+            self.next()
+            return ("not", self.negation())
+        return self.predicate()
+
+    def predicate(self):
+        token = self.peek()
+        if token == "(":
+            self.next()
+            node = self.condition()
+            self.expect(")")
+            return node
+        if token in ("attribute_exists", "attribute_not_exists", "begins_with", "contains", "attribute_type"):
+            self.next()
+            self.expect("(")
+            args = [self.operand()]
+            while self.peek() == ",":
+                self.next()
+                args.append(self.operand())
+            self.expect(")")
+            return ("func", token, args)
+
+        left = self.operand()
+        operator = self.next()
+        if operator.upper() == "BETWEEN":
+            low = self.operand()
+            self.expect("AND")
+            return ("between", left, low, self.operand())
+        if operator.upper() == "IN":
+            self.expect("(")
+            options = [self.operand()]
+            while self.peek() == ",":
+                self.next()
+                options.append(self.operand())
+            self.expect(")")
+            return ("in", left, options)
+        if operator not in ("=", "<>", "<", "<=", ">", ">="):
+            raise _DynamoError("ValidationException", f"Unsupported operator {operator}")
+        return ("cmp", operator, left, self.operand())
+
+    def operand(self):
+        token = self.peek()
+        if token is not None and token.startswith(":"):
+            self.next()
+            if token not in self.values:
+                raise _DynamoError("ValidationException", f"Value {token} is not defined")
+            return ("value", self.values[token])
+        if token == "size":
+            self.next()
+            self.expect("(")
+            path = self.path()
+            self.expect(")")
+            return ("size", path)
+        return self.path()
+
+    def path(self):
+        parts = [self.name(self.next())]
+        while self.peek() in (".", "["):
+            if self.next() == ".":
+                parts.append(self.name(self.next()))
+            else:
+                parts.append(int(self.next()))
+                self.expect("]")
+        return ("path", tuple(parts))
+
+    def name(self, token: str) -> str:
+        if token.startswith("#"):
+            if token not in self.names:
+                raise _DynamoError("ValidationException", f"Name {token} is not defined")
+            return self.names[token]
+        if token.upper() in _KEYWORDS:
+            raise _DynamoError("ValidationException", f"Unexpected keyword {token}")
+        return token
+
+    # updates
+    def update(self):
+        actions = []
+        while not self.done():
+            clause = self.next().upper()
+            while True:
+                path = self.path()
+                if clause == "SET":
+                    self.expect("=")
+                    actions.append(("set", path, self.set_value()))
+                elif clause == "REMOVE":
+                    actions.append(("remove", path))
+                elif clause in ("ADD", "DELETE"):
+                    actions.append((clause.lower(), path, self.operand()))
+                else:
+                    raise _DynamoError("ValidationException", f"Unknown update clause {clause}")
+                if self.peek() != ",":
+                    break
+                self.next()
+        return actions
+
+    def set_value(self):
+        token = self.peek()
+        if token in ("if_not_exists", "list_append"):
+            self.next()
+            self.expect("(")
+            first = self.operand()
+            self.expect(",")
+            second = self.operand()
+            self.expect(")")
+            left = (token, first, second)
+        else:
+            left = self.operand()
+        if self.peek() in ("+", "-"):
+            return ("arith", self.next(), left, self.operand())
+        return left
+
+    def projection(self):
+        paths = [self.path()]
+        while self.peek() == ",":
+            self.next()
+            paths.append(self.path())
+        return paths
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# evaluation over wire-format (typed) items
+# ---------------------------------------------------------------------------------------------------------------------
+
+def _comparable(value: dict):
+    tag, raw = next(iter(value.items()))
+    if tag == "N":
+        return tag, Decimal(raw)
+    if tag == "B":
+        return tag, base64.b64decode(raw)
+    if tag in ("SS", "BS"):
+        return tag, frozenset(raw)
+    if tag == "NS":
+        return tag, frozenset(Decimal(v) for v in raw)
+    if tag == "L":
+        return tag, tuple(_comparable(v) for v in raw)
+    if tag == "M":
+        return tag, tuple(sorted((k, _comparable(v)) for k, v in raw.items()))
+    return tag, raw
+
+
+def _get_path(item: dict, parts: tuple) -> dict | None:
+    value: Any = {"M": item}
+    for part in parts:
+        tag, raw = next(iter(value.items()))
+        if isinstance(part, int):
+            if tag != "L" or part >= len(raw):
+                return None
+            value = raw[part]
+        else:
+            if tag != "M" or part not in raw:
+                return None
+            value = raw[part]
+    return value
+
+
+def _set_path(item: dict, parts: tuple, value: dict) -> None:
+    container = item
+    for part in parts[:-1]:
+        container = container[part]["M"] if isinstance(part, str) else container[part]
+    container[parts[-1]] = value
+
+
+def _remove_path(item: dict, parts: tuple) -> None:
+    container = item
+    for part in parts[:-1]:
+        container = container.get(part, {}).get("M", {})
+    container.pop(parts[-1], None)
+
+
+def _resolve(operand, item: dict) -> dict | None:
+    kind = operand[0]
+    if kind == "value":
+        return operand[1]
+    if kind == "path":
+        return _get_path(item, operand[1])
+    if kind == "size":
+        value = _get_path(item, operand[1][1])
+        if value is None:
+            return None
+        tag, raw = next(iter(value.items()))
+        size = len(base64.b64decode(raw)) if tag == "B" else len(raw)
+        return {"N": str(size)}
+    raise _DynamoError("ValidationException", f"Unsupported operand {operand}")
+
+
+def _compare(operator: str, left: dict | None, right: dict | None) -> bool:
+    if left is None or right is None:
+        return operator == "<>" and not (left is None and right is None)
+    left_tag, left_value = _comparable(left)
+    right_tag, right_value = _comparable(right)
+    if operator == "=":
+        return left_tag == right_tag and left_value == right_value
+    if operator == "<>":
+        return left_tag != right_tag or left_value != right_value
+    if left_tag != right_tag or left_tag not in ("S", "N", "B"):
+        return False
+    return {"<": left_value < right_value, "<=": left_value <= right_value,
+            ">": left_value > right_value, ">=": left_value >= right_value}[operator]
+
+
+def _evaluate(node, item: dict) -> bool:
+    kind = node[0]
+    if kind == "and":
+        return _evaluate(node[1], item) and _evaluate(node[2], item)
+    if kind == "or":
+        return _evaluate(node[1], item) or _evaluate(node[2], item)
+    if kind == "not":
+        return not _evaluate(node[1], item)
+    if kind == "cmp":
+        return _compare(node[1], _resolve(node[2], item), _resolve(node[3], item))
+    if kind == "between":
+        value = _resolve(node[1], item)
+        return _compare(">=", value, _resolve(node[2], item)) and _compare("<=", value, _resolve(node[3], item))
+    if kind == "in":
+        value = _resolve(node[1], item)
+        return any(_compare("=", value, _resolve(option, item)) for option in node[2])
+    if kind == "func":
+        name, args = node[1], node[2]
+        value = _resolve(args[0], item)
+        if name == "attribute_exists":
+            return value is not None
+        if name == "attribute_not_exists":
+            return value is None
+        if name == "attribute_type":
+            return value is not None and next(iter(value)) == _resolve(args[1], item)["S"]
+        if value is None:
+            return False
+        other = _resolve(args[1], item)
+        tag, raw = next(iter(value.items()))
+        if name == "begins_with":
+            return tag == next(iter(other)) and raw.startswith(next(iter(other.values())))
+        if name == "contains":
+            if tag == "S":
+                return next(iter(other.values())) in raw
+            return any(_compare("=", member if isinstance(member, dict) else {tag[0]: member}, other)
+                       for member in raw)
+    raise _DynamoError("ValidationException", f"Unsupported condition {node}")
+
+
+def _number(value: Decimal) -> dict:
+    normalized = value.normalize()
+    text = format(normalized, "f") if normalized == normalized.to_integral() else str(normalized)
+    return {"N": text}
+
+
+def _set_value(node, item: dict) -> dict:
+    kind = node[0]
+    if kind == "arith":
+        left, right = _resolve_set_operand(node[2], item), _resolve_set_operand(node[3], item)
+        if left is None or right is None:
+            raise _DynamoError("ValidationException", "An operand in the update expression does not exist")
+        total = Decimal(left["N"]) + Decimal(right["N"]) if node[1] == "+" else Decimal(left["N"]) - Decimal(right["N"])
+        return _number(total)
+    return _resolve_set_operand(node, item)
+
+
+def _resolve_set_operand(node, item: dict) -> dict | None:
+    if node[0] == "if_not_exists":
+        existing = _resolve(node[1], item)
+        return existing if existing is not None else _resolve(node[2], item)
+    if node[0] == "list_append":
+        first, second = _resolve(node[1], item), _resolve(node[2], item)
+        return {"L": (first or {"L": []})["L"] + (second or {"L": []})["L"]}
+    return _resolve(node, item)
+
+
+def _apply_update(actions, item: dict) -> dict:
+    updated = json.loads(json.dumps(item))
+    for action in actions:
+        kind, path = action[0], action[1][1]
+        if kind == "set":
+            _set_path(updated, path, _set_value(action[2], item))
+        elif kind == "remove":
+            _remove_path(updated, path)
+        elif kind == "add":
+            value = _resolve(action[2], item)
+            existing = _get_path(item, path)
+            tag = next(iter(value))
+            if existing is None:
+                _set_path(updated, path, value)
+            elif tag == "N":
+                _set_path(updated, path, _number(Decimal(existing["N"]) + Decimal(value["N"])))
+            else:
+                _set_path(updated, path, {tag: sorted(set(existing[tag]) | set(value[tag]))})
+        elif kind == "delete":
+            value = _resolve(action[2], item)
+            existing = _get_path(item, path)
+            if existing is not None:
+                tag = next(iter(value))
+                remaining = sorted(set(existing[tag]) - set(value[tag]))
+                if remaining:
+                    _set_path(updated, path, {tag: remaining})
+                else:
+                    _remove_path(updated, path)
+    return updated
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# tables
+# ---------------------------------------------------------------------------------------------------------------------
+
+class _Index:
+    """A global secondary index projecting all attributes; items without both key attributes are left out"""
+
+    def __init__(self, name: str, hash_key: str, range_key: str):
+        self.name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        # index partition key -> sorted list of (index range value, table key)
+        self.partitions: dict[Any, list] = {}
+
+    def _entry(self, item: dict, table_key: tuple) -> tuple | None:
+        if self.hash_key not in item or self.range_key not in item:
+            return None
+        return _comparable(item[self.hash_key])[1], (_comparable(item[self.range_key])[1], table_key)
+
+    def add(self, item: dict, table_key: tuple) -> None:
+        entry = self._entry(item, table_key)
+        if entry is not None:
+            insort(self.partitions.setdefault(entry[0], []), entry[1])
+
+    def remove(self, item: dict, table_key: tuple) -> None:
+        entry = self._entry(item, table_key)
+        if entry is not None:
+            partition = self.partitions[entry[0]]
+            partition.pop(bisect_left(partition, entry[1]))
+            if not partition:
+                del self.partitions[entry[0]]
+
+
+class _Table:
+    def __init__(self, name: str, hash_key: str, range_key: str | None, indexes: dict[str, _Index] | None = None):
+        self.name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.items: dict[tuple, dict] = {}
+        # partition key -> sorted list of range key values, used for ordered queries
+        self.partitions: dict[Any, list] = {}
+        self.indexes = indexes or {}
+
+    def key_of(self, item: dict) -> tuple:
+        try:
+            hash_value = _comparable(item[self.hash_key])[1]
+            range_value = _comparable(item[self.range_key])[1] if self.range_key else None
+        except KeyError as e:
+            raise _DynamoError("ValidationException", f"Missing key attribute {e}") from e
+        return hash_value, range_value
+
+    def get(self, key: dict) -> dict | None:
+        return self.items.get(self.key_of(key))
+
+    def put(self, item: dict) -> None:
+        key = self.key_of(item)
+        existing = self.items.get(key)
+        if existing is None:
+            insort(self.partitions.setdefault(key[0], []), key[1])
+        for index in self.indexes.values():
+            if existing is not None:
+                index.remove(existing, key)
+            index.add(item, key)
+        self.items[key] = item
+
+    def delete(self, key: dict) -> None:
+        hash_value, range_value = self.key_of(key)
+        existing = self.items.pop((hash_value, range_value), None)
+        if existing is not None:
+            partition = self.partitions[hash_value]
+            partition.pop(bisect_left(partition, range_value))
+            if not partition:
+                del self.partitions[hash_value]
+            for index in self.indexes.values():
+                index.remove(existing, (hash_value, range_value))
+
+
+class _Capacity:
+    """A token bucket of requests per second, holding a tenth of a second's worth"""
+
+    def __init__(self, per_second: float):
+        self.per_second = per_second
+        self.size = max(1.0, per_second / 10)
+        self.tokens = self.size
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.size, self.tokens + (now - self.updated) * self.per_second)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class LocalDynamoDB(httpx.AsyncBaseTransport):
+    """
+    In-process stand-in for DynamoDB that speaks the JSON wire protocol, for the subset of the API sh_dendrite uses.
+
+        local = LocalDynamoDB()
+        local.create_table("sh-event-store")
+        store = DynamodbEventStore("sh-event-store", "local", client=local.client())
+    """
+
+    def __init__(self,
+                 page_size: int = 1000,
+                 max_batch_write_items: int | None = None,
+                 read_capacity: float | None = None,
+                 write_capacity: float | None = None,
+                 retry_after: float | None = None):
+        self.tables: dict[str, _Table] = {}
+        self.retry_after = retry_after
+        self.page_size = page_size
+        self.max_batch_write_items = max_batch_write_items
+        self.request_counts: dict[str, int] = {}
+        self.write_units = 0
+        self._read_capacity = _Capacity(read_capacity) if read_capacity else None
+        self._write_capacity = _Capacity(write_capacity) if write_capacity else None
+        self._forced_throttles = 0
+        self._forced_transaction_throttles = 0
+        self.throttled_requests = 0
+        self.consistent_reads = 0
+
+    def create_table(self,
+                     name: str,
+                     hash_key: str = "PK",
+                     range_key: str | None = "SK",
+                     indexes: dict[str, tuple[str, str]] | None = None) -> None:
+        """indexes maps the names of global secondary indexes to their (hash key, range key) attributes"""
+        self.tables[name] = _Table(name, hash_key, range_key,
+                                   {index_name: _Index(index_name, *keys) for index_name, keys in (indexes or {}).items()})
+
+    def client(self) -> Client:
+        """Returns an aiodynamo client whose requests are served by this stand-in"""
+        return Client(
+            HTTPX(httpx.AsyncClient(transport=self, event_hooks={"response": [note_retry_after]})),
+            StaticCredentials(Key("local", "local")),
+            "local",
+            endpoint=URL(LOCAL_ENDPOINT),
+        )
+
+    def throttle_next(self, count: int = 1) -> None:
+        """Throttles the next count requests, whatever capacity is left"""
+        self._forced_throttles += count
+
+    def throttle_next_transactions(self, count: int = 1) -> None:
+        """Cancels the next count transactions as DynamoDB does when an item's partition is throttled"""
+        self._forced_transaction_throttles += count
+
+    def _throttle(self, action: str) -> None:
+        capacity = (self._read_capacity if action in _READ_ACTIONS else
+                    self._write_capacity if action in _WRITE_ACTIONS else None)
+        if self._forced_throttles:
+            self._forced_throttles -= 1
+        elif capacity is None or capacity.take():
+            return
+        self.throttled_requests += 1
+        raise _DynamoError("ProvisionedThroughputExceededException",
+                           "The level of configured provisioned throughput for the table was exceeded")
+
+    def items(self, table_name: str) -> list[dict]:
+        """All items in a table as wire-format dictionaries, in key order"""
+        table = self._table(table_name)
+        return [table.items[(hash_value, range_value)]
+                for hash_value, partition in table.partitions.items() for range_value in partition]
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        action = request.headers.get("x-amz-target", "").split(".")[-1]
+        self.request_counts[action] = self.request_counts.get(action, 0) + 1
+        body = await request.aread()
+        throttled_requests = self.throttled_requests
+        try:
+            handler = getattr(self, f"_op_{action}", None)
+            if handler is None:
+                raise _DynamoError("UnknownOperationException", f"Unsupported operation {action}")
+            self._throttle(action)
+            result = handler(json.loads(body))
+            return httpx.Response(200, content=json.dumps(result).encode())
+        except _DynamoError as e:
+            headers = ({"Retry-After": str(self.retry_after)}
+                       if self.retry_after is not None and self.throttled_requests > throttled_requests else {})
+            return httpx.Response(400, headers=headers, content=json.dumps(e.to_body()).encode())
+
+    # helpers
+    def _table(self, name: str) -> _Table:
+        try:
+            return self.tables[name]
+        except KeyError:
+            raise _DynamoError("ResourceNotFoundException", f"Requested resource not found: {name}") from None
+
+    @staticmethod
+    def _parser(expression: str, payload: dict) -> _Parser:
+        return _Parser(expression, payload.get("ExpressionAttributeNames"), payload.get("ExpressionAttributeValues"))
+
+    def _charge(self, item: dict | None, transactional: bool = False) -> None:
+        size = len(json.dumps(item, separators=(',', ':'))) if item else 0
+        self.write_units += max(1, -(-size // 1024)) * (2 if transactional else 1)
+
+    def _check(self, payload: dict, existing: dict | None) -> None:
+        if "ConditionExpression" in payload:
+            condition = self._parser(payload["ConditionExpression"], payload).condition()
+            if not _evaluate(condition, existing or {}):
+                raise _conditional_check_failed()
+
+    @staticmethod
+    def _project(item: dict, payload: dict) -> dict:
+        if "ProjectionExpression" not in payload:
+            return item
+        paths = LocalDynamoDB._parser(payload["ProjectionExpression"], payload).projection()
+        projected = {}
+        for path in paths:
+            value = _get_path(item, path[1])
+            if value is not None:
+                projected[path[1][0]] = item[path[1][0]]
+        return projected
+
+    def _put(self, payload: dict, transactional: bool = False) -> None:
+        table = self._table(payload["TableName"])
+        self._charge(payload["Item"], transactional)
+        self._check(payload, table.get(payload["Item"]))
+        table.put(payload["Item"])
+
+    def _update(self, payload: dict, transactional: bool = False) -> dict:
+        table = self._table(payload["TableName"])
+        existing = table.get(payload["Key"])
+        self._charge(existing, transactional)
+        self._check(payload, existing)
+        actions = self._parser(payload["UpdateExpression"], payload).update()
+        updated = _apply_update(actions, existing or dict(payload["Key"]))
+        table.put(updated)
+        return updated
+
+    def _delete(self, payload: dict, transactional: bool = False) -> None:
+        table = self._table(payload["TableName"])
+        existing = table.get(payload["Key"])
+        self._charge(existing, transactional)
+        self._check(payload, existing)
+        table.delete(payload["Key"])
+
+    # operations
+    def _op_PutItem(self, payload: dict) -> dict:
+        self._put(payload)
+        return {}
+
+    def _op_GetItem(self, payload: dict) -> dict:
+        self.consistent_reads += bool(payload.get("ConsistentRead"))
+        item = self._table(payload["TableName"]).get(payload["Key"])
+        return {"Item": self._project(item, payload)} if item is not None else {}
+
+    def _op_UpdateItem(self, payload: dict) -> dict:
+        updated = self._update(payload)
+        return {"Attributes": updated} if payload.get("ReturnValues") == "ALL_NEW" else {}
+
+    def _op_DeleteItem(self, payload: dict) -> dict:
+        self._delete(payload)
+        return {}
+
+    def _op_BatchWriteItem(self, payload: dict) -> dict:
+        budget = self.max_batch_write_items
+        unprocessed: dict[str, list] = {}
+        for table_name, requests in payload["RequestItems"].items():
+            table = self._table(table_name)
+            for request in requests:
+                if budget is not None:
+                    if budget <= 0:
+                        unprocessed.setdefault(table_name, []).append(request)
+                        continue
+                    budget -= 1
+                if "PutRequest" in request:
+                    self._charge(request["PutRequest"]["Item"])
+                    table.put(request["PutRequest"]["Item"])
+                else:
+                    self._charge(table.get(request["DeleteRequest"]["Key"]))
+                    table.delete(request["DeleteRequest"]["Key"])
+        return {"UnprocessedItems": unprocessed}
+
+    def _op_BatchGetItem(self, payload: dict) -> dict:
+        responses = {}
+        for table_name, request in payload["RequestItems"].items():
+            self.consistent_reads += bool(request.get("ConsistentRead"))
+            table = self._table(table_name)
+            found = [table.get(key) for key in request["Keys"]]
+            responses[table_name] = [self._project(item, request) for item in found if item is not None]
+        return {"Responses": responses, "UnprocessedKeys": {}}
+
+    def _op_TransactWriteItems(self, payload: dict) -> dict:
+        operations = payload["TransactItems"]
+        if len(operations) > 100:
+            raise _DynamoError("ValidationException", "Member must have length less than or equal to 100")
+        keys = set()
+        for operation in operations:
+            kind, body = next(iter(operation.items()))
+            table = self._table(body["TableName"])
+            key = (table.name, table.key_of(body["Item"] if kind == "Put" else body["Key"]))
+            if key in keys:
+                raise _DynamoError("ValidationException",
+                                   "Transaction request cannot include multiple operations on one item")
+            keys.add(key)
+        if self._forced_transaction_throttles:
+            self._forced_transaction_throttles -= 1
+            self.throttled_requests += 1
+            raise _DynamoError("TransactionCanceledException",
+                               "Transaction cancelled, please refer cancellation reasons for specific reasons",
+                               CancellationReasons=[{"Code": "ThrottlingError", "Message": "Throughput exceeds "
+                                                     "the current capacity for one or more global secondary indexes"}]
+                               + [{"Code": "None"}] * (len(operations) - 1))
+        reasons, failed = [], False
+        # validate every condition first so that the transaction applies all or nothing
+        for operation in operations:
+            kind, body = next(iter(operation.items()))
+            table = self._table(body["TableName"])
+            existing = table.get(body["Item"] if kind == "Put" else body["Key"])
+            try:
+                self._check(body, existing)
+                reasons.append({"Code": "None"})
+            except _DynamoError as e:
+                failed = True
+                self._charge(existing, transactional=True)
+                reasons.append({"Code": "ConditionalCheckFailed", "Message": e.message})
+        if failed:
+            raise _DynamoError("TransactionCanceledException",
+                               "Transaction cancelled, please refer cancellation reasons for specific reasons",
+                               CancellationReasons=reasons)
+        for operation in operations:
+            kind, body = next(iter(operation.items()))
+            body = {k: v for k, v in body.items() if k != "ConditionExpression"}
+            if kind == "Put":
+                self._put(body, transactional=True)
+            elif kind == "Update":
+                self._update(body, transactional=True)
+            elif kind == "Delete":
+                self._delete(body, transactional=True)
+            else:
+                self._charge(None, transactional=True)
+        return {}
+
+    def _op_Query(self, payload: dict) -> dict:
+        self.consistent_reads += bool(payload.get("ConsistentRead"))
+        table = self._table(payload["TableName"])
+        condition = self._parser(payload["KeyConditionExpression"], payload).condition()
+        if "IndexName" in payload:
+            return self._query_index(table, condition, payload)
+        hash_value, bounds = self._key_bounds(table.hash_key, table.range_key, condition)
+
+        partition = table.partitions.get(hash_value, [])
+        low, high = bounds
+        start = bisect_left(partition, low[0]) if low else 0
+        if low and not low[1]:
+            start = bisect_right(partition, low[0])
+        end = bisect_right(partition, high[0]) if high else len(partition)
+        if high and not high[1]:
+            end = bisect_left(partition, high[0])
+        range_values = partition[start:end]
+
+        forward = payload.get("ScanIndexForward", True)
+        if not forward:
+            range_values = range_values[::-1]
+        if "ExclusiveStartKey" in payload:
+            start_value = table.key_of(payload["ExclusiveStartKey"])[1]
+            if forward:
+                range_values = range_values[bisect_right(range_values, start_value):]
+            else:
+                range_values = [v for v in range_values if v < start_value]
+
+        candidates = (table.items[(hash_value, range_value)] for range_value in range_values)
+        return self._page(table, candidates, condition, payload)
+
+    def _query_index(self, table: _Table, condition, payload: dict) -> dict:
+        index = table.indexes.get(payload["IndexName"])
+        if index is None:
+            raise _DynamoError("ValidationException", f"The table does not have the specified index: {payload['IndexName']}")
+        hash_value, (low, high) = self._key_bounds(index.hash_key, index.range_key, condition)
+
+        partition = index.partitions.get(hash_value, [])
+        range_of = lambda entry: entry[0]
+        start = 0
+        if low:
+            start = (bisect_left if low[1] else bisect_right)(partition, low[0], key=range_of)
+        end = len(partition)
+        if high:
+            end = (bisect_right if high[1] else bisect_left)(partition, high[0], key=range_of)
+        entries = partition[start:end]
+
+        if not payload.get("ScanIndexForward", True):
+            entries = entries[::-1]
+        if "ExclusiveStartKey" in payload:
+            start_key = payload["ExclusiveStartKey"]
+            position = (_comparable(start_key[index.range_key])[1], table.key_of(start_key))
+            entries = entries[entries.index(position) + 1:] if position in entries else []
+
+        candidates = (table.items[table_key] for _, table_key in entries)
+        return self._page(table, candidates, condition, payload, index)
+
+    def _op_Scan(self, payload: dict) -> dict:
+        table = self._table(payload["TableName"])
+        keys = [(hash_value, range_value)
+                for hash_value, partition in sorted(table.partitions.items()) for range_value in partition]
+        if "TotalSegments" in payload:
+            segment, total = payload["Segment"], payload["TotalSegments"]
+            keys = [key for key in keys if zlib.crc32(str(key[0]).encode()) % total == segment]
+        if "ExclusiveStartKey" in payload:
+            start_key = table.key_of(payload["ExclusiveStartKey"])
+            keys = keys[keys.index(start_key) + 1:] if start_key in keys else []
+        return self._page(table, (table.items[key] for key in keys), None, payload)
+
+    def _page(self, table: _Table, candidates, key_condition, payload: dict, index: _Index | None = None) -> dict:
+        limit = min(payload.get("Limit", self.page_size), self.page_size)
+        filter_expression = None
+        if "FilterExpression" in payload:
+            filter_expression = self._parser(payload["FilterExpression"], payload).condition()
+
+        items, scanned, last = [], 0, None
+        for item in candidates:
+            if key_condition is not None and not _evaluate(key_condition, item):
+                continue
+            scanned += 1
+            last = item
+            if filter_expression is None or _evaluate(filter_expression, item):
+                items.append(self._project(item, payload))
+            if scanned >= limit:
+                break
+
+        response: dict = {"Count": len(items), "ScannedCount": scanned}
+        if payload.get("Select") != "COUNT":
+            response["Items"] = items
+        more = next(candidates, None) is not None if scanned >= limit else False
+        if more and last is not None:
+            key_names = (table.hash_key, table.range_key) + ((index.hash_key, index.range_key) if index else ())
+            response["LastEvaluatedKey"] = {name: last[name] for name in key_names if name}
+        return response
+
+    @staticmethod
+    def _key_bounds(hash_key: str, range_key: str | None, condition):
+        """Splits a key condition into the partition value and (low, high) range bounds"""
+        hash_value, bounds = None, (None, None)
+        clauses = [condition]
+        while clauses:
+            node = clauses.pop()
+            if node[0] == "and":
+                clauses.extend(node[1:])
+            elif node[0] == "cmp" and node[2] == ("path", (hash_key,)):
+                hash_value = _comparable(node[3][1])[1]
+            elif node[0] == "cmp" and node[2] == ("path", (range_key,)):
+                value = _comparable(node[3][1])[1]
+                bounds = {"=": ((value, True), (value, True)),
+                          "<": (None, (value, False)), "<=": (None, (value, True)),
+                          ">": ((value, False), None), ">=": ((value, True), None)}[node[1]]
+            elif node[0] == "between":
+                bounds = ((_comparable(node[2][1])[1], True), (_comparable(node[3][1])[1], True))
+            elif node[0] == "func" and node[1] == "begins_with":
+                prefix = _comparable(node[2][1][1])[1]
+                bounds = ((prefix, True), (prefix + "￿", True))
+        if hash_value is None:
+            raise _DynamoError("ValidationException", "Query key condition must specify the partition key")
+        return hash_value, bounds
@@ -0,0 +1,23 @@
+from dataclasses import dataclass, field
+
+from sh_dendrite.snapshot import Snapshot
+
+
+@dataclass
+class LogHead:
+    """What a store knows about a log without reading its events"""
+    log_id: str
+    last_event: str | None      # None when the log has no events
+    snapshot: Snapshot | None = None
+    last_event_known: bool = True   # False for stores that don't track the last event outside the log
+    version: int | None = None      # of the last event, where the store keeps it in the head
+    counters: dict[str, float] = field(default_factory=dict)    # see Event.head_counters
+
+    @property
+    def is_empty(self) -> bool:
+        return self.last_event_known and self.last_event is None
+
+    @property
+    def snapshot_is_current(self) -> bool:
+        return (self.last_event_known and self.snapshot is not None and
+                self.snapshot.last_event == self.last_event)
@@ -0,0 +1,108 @@
+"""Relays appended events to their handlers from the outbox markers written with them, at least once.
+
+    relay = OutboxRelay(event_store, {LedgerCreditedEvent: [projector], ...})
+    await relay.start()
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Iterable
+
+from opentelemetry import trace
+
+from sh_dendrite.event import Event
+from sh_dendrite.event_handler import EventHandler
+
+logger = logging.getLogger(__name__)
+tracer = trace.get_tracer(__name__)
+
+
+@dataclass
+class OutboxEntry:
+    shard: int
+    key: str
+    log_id: str
+    first_event: str     # sort keys of the first and last event of the append
+    last_event: str
+    event_count: int
+
+
+async def deliver(event_handlers: dict[type[Event], list], events: list[Event]) -> None:
+    """Like dispatch_events, but returns only once projectors have handled their events rather than queued them"""
+    batches: dict[int, tuple[object, list[Event]]] = {}
+    for event in events:
+        for handler in event_handlers.get(type(event), []):
+            batches.setdefault(id(handler), (handler, []))[1].append(event)
+    for handler, handler_events in batches.values():
+        if isinstance(handler, EventHandler):
+            await handler.handle_event_and_wait(handler_events)
+        else:
+            handler.handle_event(handler_events)
+
+
+class OutboxRelay:
+    def __init__(self,
+                 event_store,
+                 event_handlers: dict[type[Event], list],
+                 shards: Iterable[int] | None = None,
+                 batch_size: int = 100,
+                 poll_interval: float = 0.5):
+        """shards: the outbox shards this relay drains, all by default"""
+        if not event_store.outbox_shards:
+            raise ValueError("the event store has no outbox")
+        self.event_store = event_store
+        self.event_handlers = event_handlers
+        self.shards = list(shards) if shards is not None else list(range(event_store.outbox_shards))
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._task: asyncio.Task | None = None
+
+    async def relay_once(self) -> int:
+        """Dispatches one batch of markers from each shard and returns the number of events dispatched"""
+        counts = await asyncio.gather(*(self._relay_shard(shard) for shard in self.shards))
+        return sum(counts)
+
+    async def _relay_shard(self, shard: int) -> int:
+        entries = await self.event_store.read_outbox(shard, self.batch_size)
+        if not entries:
+            return 0
+
+        dispatched: list[OutboxEntry] = []
+        event_count = 0
+        with tracer.start_as_current_span("outbox.relay") as span:
+            span.set_attribute("shard", shard)
+            try:
+                for entry in entries:
+                    events = await self.event_store.outbox_events(entry)
+                    await deliver(self.event_handlers, events)
+                    dispatched.append(entry)
+                    event_count += len(events)
+            except Exception:
+                # the failed marker and those after it stay in the outbox, and are retried in order
+                logger.exception("failed to relay outbox entry", extra={"shard": shard, "log_id": entry.log_id})
+            finally:
+                # deleting the dispatched markers is the shard's checkpoint
+                if dispatched:
+                    await self.event_store.ack_outbox(dispatched)
+            span.set_attribute("event_count", event_count)
+        return event_count
+
+    async def run(self) -> None:
+        while True:
+            try:
+                dispatched = await self.relay_once()
+            except Exception:
+                logger.exception("outbox relay failed")
+                dispatched = 0
+            if not dispatched:
+                await asyncio.sleep(self.poll_interval)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
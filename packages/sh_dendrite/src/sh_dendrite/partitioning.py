@@ -0,0 +1,6 @@
+import zlib
+
+
+def partition_of(key: str, partitions: int) -> int:
+    """A partition that is stable across processes, unlike the salted built-in hash"""
+    return zlib.crc32(key.encode('utf-8')) % partitions
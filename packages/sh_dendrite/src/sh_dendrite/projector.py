@@ -0,0 +1,226 @@
+"""Projects events into read models from per-partition workers, each log in order.
+
+Failed batches are retried, so handlers must tolerate seeing events again.
+
+    projector = PartitionedProjector(read_model, key_of=lambda event: event.ledger_id, partitions=8)
+    await projector.start()
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import AsyncIterable, Callable, Iterable
+
+from opentelemetry import trace
+
+from sh_dendrite.event import Event
+from sh_dendrite.event_handler import EventHandler
+from sh_dendrite.partitioning import partition_of
+
+logger = logging.getLogger(__name__)
+tracer = trace.get_tracer(__name__)
+
+
+class PartitionedProjector(EventHandler):
+    def __init__(self,
+                 handler: EventHandler,
+                 key_of: Callable[[Event], str],
+                 partitions: int = 4,
+                 max_batch: int = 500,
+                 retry_delay: float = 0.1,
+                 max_retry_delay: float = 30.0,
+                 max_attempts: int | None = 20,
+                 dead_letter: EventHandler | None = None,
+                 tracked_keys: int = 10_000):
+        """
+        max_batch: the most events handed to the handler in one call.
+        retry_delay: the wait before a failed batch is retried, doubling up to max_retry_delay.
+        max_attempts: tries before a batch is given to dead_letter - or logged - and skipped; None retries forever.
+        tracked_keys: how many keys' projected versions wait_for remembers.
+        """
+        self.handler = handler
+        self.key_of = key_of
+        self.partitions = partitions
+        self.max_batch = max_batch
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_attempts = max_attempts
+        self.dead_letter = dead_letter
+        self.tracked_keys = tracked_keys
+        self.failed_attempts = 0
+        self.dead_lettered = 0     # events given up on
+        self.stalled_partitions: set[int] = set()      # whose current batch has failed and is being retried
+        self._versions: OrderedDict[str, int] = OrderedDict()     # highest projected version by key
+        self._waiters: dict[str, list[tuple[int, asyncio.Future]]] = {}
+        self._queues: list[asyncio.Queue] = []
+        self._workers: list[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    @property
+    def lag(self) -> int:
+        """Events queued but not yet handed to the handler"""
+        return sum(queue.qsize() for queue in self._queues)
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queues = [asyncio.Queue() for _ in range(self.partitions)]
+        self._workers = [asyncio.create_task(self._run(partition)) for partition in range(self.partitions)]
+
+    def handle_event(self, events):
+        for event in events:
+            self._enqueue(event)
+
+    def _enqueue(self, event: Event, handled: asyncio.Future | None = None) -> int:
+        """Queues the event on its partition, with a future to resolve once it is handled; returns the partition"""
+        if not self.running:
+            raise RuntimeError("the projector has not been started")
+        partition = partition_of(self.key_of(event), self.partitions)
+        self._queues[partition].put_nowait((event, handled))
+        return partition
+
+    async def project(self, events: AsyncIterable[Event] | Iterable[Event]) -> int:
+        """Feeds the events through the partitions and waits until the read model has them"""
+        loop = asyncio.get_running_loop()
+        last: dict[int, asyncio.Future] = {}    # partitions handle in order, so their last event will do
+        count = 0
+
+        def enqueue(event: Event) -> None:
+            handled = loop.create_future()
+            partition = self._enqueue(event, handled)
+            previous = last.get(partition)
+            if previous is not None:
+                previous.cancel()   # no longer waited on
+            last[partition] = handled
+
+        if isinstance(events, AsyncIterable):
+            async for event in events:
+                enqueue(event)
+                count += 1
+        else:
+            for event in events:
+                enqueue(event)
+                count += 1
+        await asyncio.gather(*last.values())
+        return count
+
+    async def handle_event_and_wait(self, events):
+        await self.project(events)
+
+    async def drain(self) -> None:
+        """Waits until every event queued so far has been handled"""
+        await asyncio.gather(*(queue.join() for queue in self._queues))
+
+    def projected_version(self, key: str) -> int | None:
+        """The highest version projected for the key, or None if none is remembered"""
+        return self._versions.get(key)
+
+    async def wait_for(self, key: str, version: int, timeout: float) -> bool:
+        """
+        Whether an event of the key at version or later was projected within the timeout; False means unknown
+        for keys projected elsewhere or forgotten
+        """
+        projected = self._versions.get(key)
+        if projected is not None and projected >= version:
+            return True
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (version, waiter)
+        self._waiters.setdefault(key, []).append(entry)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except TimeoutError:
+            return False
+        finally:
+            waiters = self._waiters.get(key)
+            if waiters is not None and entry in waiters:
+                waiters.remove(entry)
+                if not waiters:
+                    del self._waiters[key]
+
+    def _advance(self, batch: list[Event]) -> None:
+        for event in batch:
+            if event.version is None:
+                continue
+            key = self.key_of(event)
+            if event.version > self._versions.get(key, 0):
+                self._versions[key] = event.version
+            self._versions.move_to_end(key)
+            for version, waiter in self._waiters.get(key, ()):
+                if version <= self._versions[key] and not waiter.done():
+                    waiter.set_result(None)
+        while len(self._versions) > self.tracked_keys:
+            self._versions.popitem(last=False)
+
+    async def stop(self, timeout: float | None = None) -> None:
+        """Handles the queued events, giving up on a stalled partition after timeout, and stops"""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self.drain(), timeout)
+        except TimeoutError:
+            logger.error("stopped with events still queued", extra={"queued": self.lag,
+                                                                    "stalled_partitions": sorted(self.stalled_partitions)})
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _run(self, partition: int) -> None:
+        queue = self._queues[partition]
+        while True:
+            items = [await queue.get()]
+            while len(items) < self.max_batch and not queue.empty():
+                items.append(queue.get_nowait())
+            handled = False
+            try:
+                await self._handle(partition, [event for event, _ in items])
+                handled = True
+            finally:
+                for _, future in items:
+                    queue.task_done()
+                    if future is not None and not future.done():
+                        if handled:
+                            future.set_result(None)
+                        else:
+                            future.set_exception(RuntimeError("the projector stopped before handling the event"))
+
+    async def _handle(self, partition: int, batch: list[Event]) -> None:
+        with tracer.start_as_current_span("projector.batch") as span:
+            span.set_attribute("partition", partition)
+            span.set_attribute("event_count", len(batch))
+            delay = self.retry_delay
+            attempt = 1
+            try:
+                while True:
+                    try:
+                        await asyncio.to_thread(self.handler.handle_event, batch)
+                        self._advance(batch)
+                        return
+                    except Exception:
+                        self.failed_attempts += 1
+                        if self.max_attempts is not None and attempt >= self.max_attempts:
+                            await self._give_up(partition, batch)
+                            return
+                        self.stalled_partitions.add(partition)
+                        logger.warning("failed to project batch, retrying",
+                                       extra={"partition": partition, "attempt": attempt, "event_count": len(batch),
+                                              "first_event": batch[0].event_id}, exc_info=True)
+                        await asyncio.sleep(delay)
+                        delay = min(delay * 2, self.max_retry_delay)
+                        attempt += 1
+            finally:
+                self.stalled_partitions.discard(partition)
+
+    async def _give_up(self, partition: int, batch: list[Event]) -> None:
+        self.dead_lettered += len(batch)
+        logger.error("failed to project batch, giving up on it",
+                     extra={"partition": partition, "attempts": self.max_attempts, "event_count": len(batch),
+                            "event_ids": [event.event_id for event in batch]}, exc_info=True)
+        if self.dead_letter is not None:
+            try:
+                await asyncio.to_thread(self.dead_letter.handle_event, batch)
+            except Exception:
+                logger.exception("failed to dead-letter batch", extra={"partition": partition})
@@ -0,0 +1,106 @@
+"""Replays logs longer than a threshold in an executor, so that they do not stall the event loop.
+
+    factory = AggregateFactory(..., replay_executor=ReplayExecutor(threshold=5_000, max_concurrent=2))
+"""
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from opentelemetry import metrics
+
+from sh_dendrite.aggregate import Aggregate
+from sh_dendrite.event import Event
+
+meter = metrics.get_meter(__name__)
+
+_blocking = meter.create_histogram("dendrite.replay.loop_blocking", unit="s",
+                                   description="Time a replay held the event loop for")
+_offloaded = meter.create_counter("dendrite.replay.offloaded", description="Replays run off the event loop")
+
+
+def fold(aggregate: Aggregate, events: list[Event]) -> None:
+    for event in events:
+        aggregate._on_event(event)
+
+
+def _fold_detached(aggregate_type: type[Aggregate], state: dict, events: list[Event]) -> dict:
+    """Folds the events into an aggregate rebuilt from state, in a worker process, and returns its new state"""
+    aggregate = object.__new__(aggregate_type)
+    vars(aggregate).update(state)
+    fold(aggregate, events)
+    return detached_state(aggregate)
+
+
+def detached_state(aggregate: Aggregate) -> dict:
+    """The aggregate's attributes without the store and handlers it shares, which stay in this process"""
+    return {name: value for name, value in vars(aggregate).items() if name not in Aggregate.shared_attributes}
+
+
+class ReplayExecutor:
+    def __init__(self,
+                 threshold: int = 5_000,
+                 max_concurrent: int = 2,
+                 executor: Executor | None = None):
+        """Replays of at least threshold events run in executor - a thread pool by default - max_concurrent at a time"""
+        self.threshold = threshold
+        self.max_concurrent = max_concurrent
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.inline = 0
+        self.offloaded = 0
+        self.loop_blocking = 0.0    # seconds replays held the event loop for
+        self.max_loop_blocking = 0.0
+
+    def offloads(self, event_count: int) -> bool:
+        return event_count >= self.threshold
+
+    async def replay(self, aggregate: Aggregate, events: list[Event]) -> bool:
+        """Folds the events into the aggregate, and returns whether that ran off the event loop"""
+        if not self.offloads(len(events)):
+            started = time.perf_counter()
+            fold(aggregate, events)
+            self._blocked(time.perf_counter() - started, offloaded=False)
+            self.inline += 1
+            return False
+
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            executor = self._ensure_executor()
+            started = time.perf_counter()
+            if isinstance(executor, ProcessPoolExecutor):
+                future = loop.run_in_executor(executor, _fold_detached, type(aggregate), detached_state(aggregate),
+                                              events)
+                blocked = time.perf_counter() - started
+                state = await future
+                started = time.perf_counter()
+                vars(aggregate).update(state)
+                blocked += time.perf_counter() - started
+            else:
+                future = loop.run_in_executor(executor, fold, aggregate, events)
+                blocked = time.perf_counter() - started
+                await future
+        self._blocked(blocked, offloaded=True)
+        self.offloaded += 1
+        _offloaded.add(1)
+        return True
+
+    def _ensure_executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.max_concurrent, thread_name_prefix="dendrite-replay")
+        return self._executor
+
+    def _blocked(self, seconds: float, offloaded: bool) -> None:
+        self.loop_blocking += seconds
+        self.max_loop_blocking = max(self.max_loop_blocking, seconds)
+        _blocking.record(seconds, {"offloaded": offloaded})
+
+    def shutdown(self) -> None:
+        """Shuts down the executor the ReplayExecutor started; one passed in is left to its owner"""
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {"inline": self.inline, "offloaded": self.offloaded, "loop_blocking": self.loop_blocking,
+                "max_loop_blocking": self.max_loop_blocking}
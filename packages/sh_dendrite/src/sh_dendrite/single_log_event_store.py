@@ -1,18 +1,33 @@
+import copy
 from datetime import datetime
 
+from sh_dendrite.concurrency_violation_error import ConcurrencyViolationError
 from sh_dendrite.event import Event
 from sh_dendrite.event_store import EventStore
+from sh_dendrite.in_memory_event_store import events_after
+from sh_dendrite.snapshot import Snapshot
 
 
 class SingleLogEventStore(EventStore):
-    def __init__(self, backing_store=[]):
-        self.backing_store = backing_store
+    """Appends the events of every log to one list, backing_store, for tests that assert on everything emitted"""
+    def __init__(self, backing_store: list[Event] | None = None):
+        self.backing_store = backing_store if backing_store is not None else []
+        self.log_ids: list[str] = []    # the log of each event in backing_store
 
-    async def apply(self, log_id: str, event: Event, consistency_tag):
-        self.backing_store.append(event)
+    async def apply(self, log_id: str, event: Event, consistency_tag: str | None):
+        log = await self.get_log(log_id)
+        last_event = log[-1].event_id if log else None
+        if last_event != consistency_tag:
+            raise ConcurrencyViolationError(
+                message=f"log {log_id} has moved past {consistency_tag}",
+                code="ConditionalCheckFailed",
+                reason=f"the last event of the log is {last_event}",
+            )
+        self.backing_store.append(copy.deepcopy(event))
+        self.log_ids.append(log_id)
 
-    async def get_log(self, log_id: str):
-        return self.backing_store
+    async def get_log(self, log_id: str) -> list[Event]:
+        return [event for event, event_log_id in zip(self.backing_store, self.log_ids) if event_log_id == log_id]
 
-    async def get_log_from(self, log_id: str, from_timestamp: datetime):
-        pass
\ No newline at end of file
+    async def get_log_from(self, log_id: str, starting_point: Event | Snapshot | datetime | str) -> list[Event]:
+        return events_after(await self.get_log(log_id), starting_point)
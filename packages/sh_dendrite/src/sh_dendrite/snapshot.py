@@ -0,0 +1,11 @@
+from dataclasses import dataclass, field
+from datetime import datetime, UTC
+
+
+@dataclass
+class Snapshot:
+    log_id: str
+    last_event: str     # id of the last event folded into the state
+    state: dict
+    taken_time: datetime = field(default_factory=lambda: datetime.now(UTC))
+    version: int | None = None      # version of the last event folded into the state
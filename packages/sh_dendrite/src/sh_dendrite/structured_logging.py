@@ -0,0 +1,106 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+from datetime import datetime, UTC
+
+# attributes every LogRecord carries - anything else on a record was passed in through `extra=`
+_RECORD_ATTRIBUTES = frozenset(logging.LogRecord("", 0, "", 0, "", None, None).__dict__) | {"message", "asctime"}
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+def _extra_fields(record: logging.LogRecord) -> dict:
+    return {k: v for k, v in record.__dict__.items() if k not in _RECORD_ATTRIBUTES}
+
+
+class StructuredFormatter(logging.Formatter):
+    """Renders a record as a single line followed by the `extra` fields as key=value pairs"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line = f"{line} " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """Renders a record and its `extra` fields as a single JSON object"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, UTC).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    # the stock QueueHandler formats the message in prepare(), which runs on the logging thread (usually
+    # the event loop). we hand the record over untouched so that the listener thread does all formatting.
+    # the trade-off is that log arguments are rendered later, so callers should pass immutable values.
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class LogSampler:
+    """Callable that returns True for one out of every `every` calls"""
+
+    def __init__(self, every: int = 100):
+        if every < 1:
+            raise ValueError("every must be at least 1")
+        self.every = every
+        self._count = 0
+
+    def __call__(self) -> bool:
+        self._count += 1
+        if self._count >= self.every:
+            self._count = 0
+            return True
+        return False
+
+
+def configure_logging(level: int = logging.INFO,
+                      json_output: bool = False,
+                      handlers: list[logging.Handler] | None = None) -> logging.handlers.QueueListener:
+    """Routes all logging through a queue, so that formatting and I/O run on a background thread"""
+    global _listener
+    shutdown_logging()
+
+    if handlers is None:
+        stream_handler = logging.StreamHandler()
+        if json_output:
+            stream_handler.setFormatter(JsonFormatter())
+        else:
+            stream_handler.setFormatter(StructuredFormatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        handlers = [stream_handler]
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(DeferredQueueHandler(log_queue))
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread started by configure_logging"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,166 @@
+"""Client-side throttling: token buckets whose rate adapts to throttled responses (AIMD).
+
+    store = DynamodbEventStore(..., throttle=AdaptiveThrottle(read_rate=500, write_rate=200))
+"""
+import asyncio
+import time
+import weakref
+from contextvars import ContextVar
+from typing import Callable
+
+import httpx
+from opentelemetry import metrics
+
+meter = metrics.get_meter(__name__)
+
+_admitted = meter.create_counter("dendrite.throttle.admitted", description="Requests admitted by a rate limiter")
+_throttled = meter.create_counter("dendrite.throttle.throttled", description="Requests the service throttled")
+_shed = meter.create_counter("dendrite.throttle.shed", description="Requests shed instead of queued")
+_wait = meter.create_histogram("dendrite.throttle.wait", unit="s", description="Time requests queued for")
+
+_limiters: weakref.WeakSet = weakref.WeakSet()
+
+
+def _observe_rates(options):
+    return [metrics.Observation(limiter.rate, {"operation_class": limiter.name}) for limiter in _limiters]
+
+
+meter.create_observable_gauge("dendrite.throttle.rate", [_observe_rates], unit="1/s",
+                              description="Requests per second a rate limiter currently admits")
+
+
+# the Retry-After of the latest response to the current task, in seconds
+_retry_after: ContextVar[float | None] = ContextVar("retry_after", default=None)
+
+
+async def note_retry_after(response: httpx.Response) -> None:
+    """An httpx response hook that keeps the response's Retry-After for retry_after"""
+    try:
+        seconds = float(response.headers["retry-after"])
+    except (KeyError, ValueError):
+        seconds = None
+    _retry_after.set(seconds)
+
+
+def retry_after() -> float | None:
+    """The Retry-After of the latest response the current task received from a client hooked with note_retry_after"""
+    return _retry_after.get()
+
+
+class ThrottledError(Exception):
+    def __init__(self, operation_class: str, wait: float) -> None:
+        super().__init__(f"{operation_class} request shed: it would have waited {wait:.2f}s for capacity")
+        self.operation_class = operation_class
+        self.wait = wait
+
+
+class AdaptiveRateLimiter:
+    def __init__(self,
+                 name: str,
+                 rate: float = 100.0,
+                 min_rate: float = 1.0,
+                 max_rate: float = 10_000.0,
+                 increase: float = 10.0,
+                 decrease: float = 0.7,
+                 burst: float = 0.1,
+                 max_wait: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        rate: initial requests per second, kept within [min_rate, max_rate].
+        increase: requests per second added per second of saturated success; decrease: the factor of a throttle.
+        burst: the bucket size in seconds of the current rate.
+        max_wait: the longest a request queues before it is shed.
+        """
+        self.name = name
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = burst
+        self.max_wait = max_wait
+        self.clock = clock
+        self.admitted = 0
+        self.throttled = 0
+        self.shed = 0
+        self.total_wait = 0.0
+        self._tokens = self._capacity()
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._generation = 0      # bumped by every cut
+        self._saturated = False
+        _limiters.add(self)
+
+    def _capacity(self) -> float:
+        return max(1.0, self.rate * self.burst)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self._capacity(), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> int:
+        """Waits for the request's turn and returns its ticket, for on_success and on_throttle"""
+        now = self.clock()
+        self._refill(now)
+        # tokens go negative as requests queue: each one waits for the deficit ahead of it to refill
+        self._tokens -= 1
+        wait = max(self._paused_until - now, -self._tokens / self.rate if self._tokens < 0 else 0.0)
+        if wait > self.max_wait:
+            self._tokens += 1
+            self.shed += 1
+            _shed.add(1, {"operation_class": self.name})
+            raise ThrottledError(self.name, wait)
+
+        self._saturated = wait > 0
+        self.admitted += 1
+        _admitted.add(1, {"operation_class": self.name})
+        ticket = self._generation
+        if wait > 0:
+            self.total_wait += wait
+            _wait.record(wait, {"operation_class": self.name})
+            await asyncio.sleep(wait)
+        return ticket
+
+    def on_success(self, ticket: int) -> None:
+        # grow only while requests are queueing, so that a quiet period does not inflate the rate
+        if self._saturated:
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_throttle(self, ticket: int, retry_after: float | None = None) -> None:
+        self.throttled += 1
+        _throttled.add(1, {"operation_class": self.name})
+        now = self.clock()
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+        if ticket < self._generation:
+            return      # paced at the old rate; the rate has already been cut for it
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self._generation += 1
+        # no burst after a cut: the retries it triggers are paced at the new rate from the start
+        self._refill(now)
+        self._tokens = min(self._tokens, 0.0)
+
+    def stats(self) -> dict:
+        return {"rate": self.rate, "admitted": self.admitted, "throttled": self.throttled, "shed": self.shed,
+                "total_wait": self.total_wait}
+
+
+class AdaptiveThrottle:
+    """A limiter per operation class, since a table's reads and writes have separate capacity"""
+
+    READ = "read"
+    WRITE = "write"
+
+    def __init__(self, read_rate: float = 500.0, write_rate: float = 200.0, max_attempts: int = 8, **options):
+        """max_attempts bounds how often a throttled request is retried; options go to each AdaptiveRateLimiter"""
+        self.max_attempts = max_attempts
+        self.limiters = {
+            self.READ: AdaptiveRateLimiter(self.READ, read_rate, **options),
+            self.WRITE: AdaptiveRateLimiter(self.WRITE, write_rate, **options),
+        }
+
+    def __getitem__(self, operation_class: str) -> AdaptiveRateLimiter:
+        return self.limiters[operation_class]
+
+    def stats(self) -> dict:
+        return {name: limiter.stats() for name, limiter in self.limiters.items()}
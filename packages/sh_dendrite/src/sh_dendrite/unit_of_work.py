@@ -0,0 +1,136 @@
+"""Commits the events of several aggregates with one atomic append to all of their logs.
+
+    async with UnitOfWork(event_store) as unit:
+        unit.enlist(source, target)
+        await source.debit(DebitLedgerCommand(amount))
+        await target.credit(CreditLedgerCommand(amount))
+"""
+import copy
+from dataclasses import dataclass
+from datetime import datetime, UTC
+from typing import Callable
+
+from opentelemetry import trace
+
+from sh_dendrite.aggregate import Aggregate, dispatch_events
+from sh_dendrite.event import Event, next_event_id
+from sh_dendrite.event_store import EventStore, LogAppend
+
+tracer = trace.get_tracer(__name__)
+
+
+class StagingEventStore:
+    """Stands in for the event store of an aggregate: appends are staged, reads go to the store"""
+
+    def __init__(self, event_store: EventStore):
+        self.event_store = event_store
+        self.staged: list[Event] = []
+
+    @property
+    def max_batch_events(self) -> int | None:
+        return self.event_store.max_batch_events
+
+    async def apply(self, log_id: str, event: Event, consistency_tag: str):
+        self.staged.append(event)
+
+    async def apply_many(self, log_id: str, events: list[Event], consistency_tag: str):
+        limit = self.max_batch_events
+        if limit is not None and len(events) > limit:
+            raise ValueError(f"cannot append {len(events)} events atomically, the limit is {limit}")
+        self.staged.extend(events)
+
+    def __getattr__(self, name):
+        return getattr(self.event_store, name)
+
+
+def order_event_ids(events: list[Event], previous: str | None) -> None:
+    """Renumbers a group of staged events that no longer sorts after previous"""
+    ids = [event.event_id for event in events]
+    if all(a < b for a, b in zip([previous or ""] + ids, ids)):
+        return
+    applied_time = datetime.now(UTC)
+    for event in events:
+        event.event_id = previous = next_event_id(previous, applied_time, event.version, event.event_name)
+
+
+@dataclass
+class _Enlistment:
+    aggregate: Aggregate
+    original: Aggregate     # a copy of the aggregate as it was enlisted, to roll back to
+    store: StagingEventStore
+    event_handlers: dict
+    after_append: Callable[[str], None] | None
+
+
+class UnitOfWork:
+    def __init__(self, event_store: EventStore):
+        self.event_store = event_store
+        self._enlisted: dict[str, _Enlistment] = {}     # by log id
+
+    def enlist(self, *aggregates: Aggregate) -> None:
+        """Holds back the aggregates' appends and dispatches until the unit commits"""
+        for aggregate in aggregates:
+            aggregate._check_writable()
+            if aggregate.log_id in self._enlisted:
+                raise ValueError(f"log {aggregate.log_id} is already enlisted")
+            if aggregate.event_store is not self.event_store:
+                raise ValueError(f"{type(aggregate).__name__} {aggregate.log_id} is not backed by the unit's event "
+                                 "store, or is enlisted in another unit")
+            store = StagingEventStore(self.event_store)
+            self._enlisted[aggregate.log_id] = _Enlistment(aggregate, copy.deepcopy(aggregate), store,
+                                                           aggregate.event_handlers, aggregate.after_append)
+            aggregate.event_store = store
+            aggregate.event_handlers = {}
+            aggregate.after_append = None
+
+    async def commit(self) -> None:
+        """Appends the staged events of every enlisted aggregate atomically, then dispatches them"""
+        enlistments = list(self._enlisted.values())
+        appends = []
+        for enlistment in enlistments:
+            events = enlistment.store.staged
+            if events:
+                consistency_tag = enlistment.original.last_event_name
+                order_event_ids(events, consistency_tag)
+                enlistment.aggregate.last_event_name = events[-1].event_id
+                appends.append(LogAppend(enlistment.aggregate.log_id, events, consistency_tag))
+
+        if appends:
+            with tracer.start_as_current_span("unit_of_work.commit") as span:
+                span.set_attribute("log_count", len(appends))
+                span.set_attribute("event_count", sum(len(append.events) for append in appends))
+                try:
+                    await self.event_store.apply_many_logs(appends)
+                except BaseException:
+                    self.rollback()
+                    raise
+
+        self._release()
+        for enlistment in enlistments:
+            if enlistment.store.staged:
+                enlistment.aggregate._appended()
+            dispatch_events(enlistment.event_handlers, enlistment.store.staged)
+
+    def rollback(self) -> None:
+        """Discards the staged events, restoring the aggregates to their state when enlisted"""
+        for enlistment in self._enlisted.values():
+            state = vars(enlistment.aggregate)
+            state.clear()
+            state.update(vars(enlistment.original))
+        self._enlisted.clear()
+
+    def _release(self) -> None:
+        for enlistment in self._enlisted.values():
+            enlistment.aggregate.event_store = self.event_store
+            enlistment.aggregate.event_handlers = enlistment.event_handlers
+            enlistment.aggregate.after_append = enlistment.after_append
+        self._enlisted.clear()
+
+    async def __aenter__(self) -> 'UnitOfWork':
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            await self.commit()
+        else:
+            self.rollback()
@@ -0,0 +1,2 @@
+class UnsupportedOperation(Exception):
+    """Raised by an event store asked for an operation its capability flags say it does not provide"""
@@ -0,0 +1,156 @@
+import asyncio
+from dataclasses import dataclass
+from unittest.mock import Mock
+
+import pytest
+
+from sh_dendrite.actor_runtime import ActorRuntime
+from sh_dendrite.aggregate import Aggregate
+from sh_dendrite.aggregate_factory import AggregateFactory
+from sh_dendrite.concurrency_violation_error import ConcurrencyViolationError
+from sh_dendrite.dynamodb_event_store import DynamodbEventStore
+from sh_dendrite.event import Event
+from sh_dendrite.event_handler import EventHandler
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+
+TABLE = "sh-event-store"
+
+
+@dataclass
+class Incremented(Event):
+    amount: int
+
+
+class Counter(Aggregate):
+    def __init__(self, log_id, event_store, event_handlers):
+        super().__init__(log_id, event_store, event_handlers)
+        self.total = 0
+
+    def on(self, event: Event) -> None:
+        self.total += event.amount
+
+    async def increment(self, amount: int) -> int:
+        if amount <= 0:
+            raise ValueError("amount must be positive")
+        await self.apply(Incremented(amount))
+        return self.total
+
+    async def increment_twice_then_fail(self) -> None:
+        await self.apply(Incremented(100))
+        await self.apply(Incremented(100))
+        raise RuntimeError("failed half way")
+
+
+@pytest.fixture
+def local():
+    local = LocalDynamoDB()
+    local.create_table(TABLE)
+    return local
+
+
+@pytest.fixture
+def handler():
+    return Mock(spec=EventHandler)
+
+
+@pytest.fixture
+def factory(local, handler):
+    store = DynamodbEventStore(TABLE, "local", client=local.client())
+    return AggregateFactory(store, lambda: "counter-1", {Incremented: [handler]})
+
+
+async def total(factory, log_id="counter-1") -> int:
+    return (await factory.load(Counter, log_id)).total
+
+
+class TestActorRuntime:
+    @pytest.mark.asyncio
+    async def test_concurrent_commands_are_group_committed(self, factory, local, handler):
+        runtime = ActorRuntime(factory)
+
+        results = await asyncio.gather(*(runtime.execute(Counter, "counter-1", lambda c: c.increment(1))
+                                         for _ in range(50)))
+
+        assert sorted(results) == list(range(1, 51))
+        assert local.request_counts["TransactWriteItems"] == 1
+        assert await total(factory) == 50
+        handler.handle_event.assert_called_once()
+        assert len(handler.handle_event.call_args.args[0]) == 50
+
+    @pytest.mark.asyncio
+    async def test_groups_are_split_at_the_atomic_append_limit(self, factory, local):
+        runtime = ActorRuntime(factory)
+
+        await asyncio.gather(*(runtime.execute(Counter, "counter-1", lambda c: c.increment(1))
+                               for _ in range(150)))
+
+        assert local.request_counts["TransactWriteItems"] == 2
+        assert await total(factory) == 150
+
+    @pytest.mark.asyncio
+    async def test_rejected_command_does_not_affect_the_group(self, factory):
+        runtime = ActorRuntime(factory)
+
+        results = await asyncio.gather(runtime.execute(Counter, "counter-1", lambda c: c.increment(1)),
+                                       runtime.execute(Counter, "counter-1", lambda c: c.increment(-1)),
+                                       runtime.execute(Counter, "counter-1", lambda c: c.increment(2)),
+                                       return_exceptions=True)
+
+        assert results[0] == 1 and results[2] == 3
+        assert isinstance(results[1], ValueError)
+        assert await total(factory) == 3
+
+    @pytest.mark.asyncio
+    async def test_command_failing_after_applying_events_is_rolled_back(self, factory):
+        runtime = ActorRuntime(factory)
+
+        results = await asyncio.gather(runtime.execute(Counter, "counter-1", lambda c: c.increment(1)),
+                                       runtime.execute(Counter, "counter-1", lambda c: c.increment_twice_then_fail()),
+                                       runtime.execute(Counter, "counter-1", lambda c: c.increment(2)),
+                                       return_exceptions=True)
+
+        assert results[0] == 1 and results[2] == 3
+        assert isinstance(results[1], RuntimeError)
+        assert await total(factory) == 3
+
+    @pytest.mark.asyncio
+    async def test_write_from_outside_the_process_is_retried(self, factory):
+        runtime = ActorRuntime(factory)
+        await runtime.execute(Counter, "counter-1", lambda c: c.increment(1))
+        elsewhere = await factory.load(Counter, "counter-1")
+        await elsewhere.increment(10)
+
+        assert await runtime.execute(Counter, "counter-1", lambda c: c.increment(1)) == 12
+        assert await total(factory) == 12
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_conflict_retries(self, factory):
+        factory.event_store.apply_many = Mock(side_effect=ConcurrencyViolationError("conflict", "", ""))
+        runtime = ActorRuntime(factory, max_conflict_retries=2)
+
+        with pytest.raises(ConcurrencyViolationError):
+            await runtime.execute(Counter, "counter-1", lambda c: c.increment(1))
+
+        assert factory.event_store.apply_many.call_count == 3
+
+    @pytest.mark.asyncio
+    async def test_idle_actors_are_evicted_after_ttl(self, factory):
+        runtime = ActorRuntime(factory, idle_ttl=0.01)
+        await runtime.execute(Counter, "counter-1", lambda c: c.increment(1))
+
+        assert runtime.actor_count == 1
+        await asyncio.sleep(0.05)
+        assert runtime.actor_count == 0
+        assert await runtime.execute(Counter, "counter-1", lambda c: c.increment(1)) == 2
+
+    @pytest.mark.asyncio
+    async def test_least_recently_used_idle_actors_are_evicted(self, factory):
+        runtime = ActorRuntime(factory, max_actors=2)
+
+        for log_id in ("a", "b", "a", "c"):
+            await runtime.execute(Counter, log_id, lambda c: c.increment(1))
+
+        assert runtime.actor_count == 2
+        assert {key[1] for key in runtime._actors} == {"a", "c"}
+        await runtime.close()
+        assert runtime.actor_count == 0
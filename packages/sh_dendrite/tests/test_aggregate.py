@@ -80,6 +80,27 @@ class TestAggregateOnEvent:
 
         assert event in aggregate.applied_events
 
+    def test_counts_version_for_unversioned_events(self):
+        aggregate = ConcreteAggregate("log-123", Mock(spec=EventStore))
+
+        for event_id in ("event-1", "event-2"):
+            event = Mock(spec=Event)
+            event.event_id = event_id
+            event.version = None
+            aggregate._on_event(event)
+
+        assert aggregate.version == 2
+
+    def test_takes_version_from_versioned_events(self):
+        aggregate = ConcreteAggregate("log-123", Mock(spec=EventStore))
+
+        event = Mock(spec=Event)
+        event.event_id = "event-7"
+        event.version = 7
+        aggregate._on_event(event)
+
+        assert aggregate.version == 7
+
 
 class TestAggregateApply:
     @pytest.mark.asyncio
@@ -172,6 +193,27 @@ class TestAggregateApply:
 
         event_store.apply.assert_called_once_with("log-123", event, "previous-event")
 
+    @pytest.mark.asyncio
+    @patch('sh_dendrite.aggregate.tracer')
+    async def test_stamps_next_version_and_advances(self, mock_tracer):
+        mock_tracer.start_as_current_span.return_value.__enter__ = Mock()
+        mock_tracer.start_as_current_span.return_value.__exit__ = Mock()
+
+        event_store = Mock(spec=EventStore)
+        event_store.apply = AsyncMock()
+        aggregate = ConcreteAggregate("log-123", event_store)
+        aggregate.version = 4
+
+        first = Event()
+        second = Event()
+        await aggregate.apply(first)
+        await aggregate.apply(second)
+
+        assert (first.version, second.version) == (5, 6)
+        assert aggregate.version == 6
+        assert aggregate.last_event_name == second.event_id
+        assert event_store.apply.await_args_list[1].args[2] == first.event_id
+
     @pytest.mark.asyncio
     @patch('sh_dendrite.aggregate.tracer')
     async def test_calls_on_method(self, mock_tracer):
@@ -246,3 +288,47 @@ class TestAggregateApply:
         assert "apply.event_store" in span_names
         assert "apply.event_sourcing_handler" in span_names
         assert "apply.event_handlers" in span_names
+
+
+class TestAggregateApplyMany:
+    @pytest.mark.asyncio
+    async def test_appends_all_events_with_one_store_call(self):
+        event_store = Mock(spec=EventStore)
+        event_store.apply_many = AsyncMock()
+        aggregate = ConcreteAggregate("log-123", event_store)
+        aggregate.last_event_name = "previous-event"
+        aggregate.version = 2
+        events = [Event(), Event(), Event()]
+
+        await aggregate.apply_many(events)
+
+        event_store.apply_many.assert_awaited_once_with("log-123", events, "previous-event")
+        assert [e.version for e in events] == [3, 4, 5]
+        assert len({e.event_id for e in events}) == 3
+        assert [e.event_id for e in events] == sorted(e.event_id for e in events)
+        assert aggregate.applied_events == events
+        assert aggregate.last_event_name == events[-1].event_id
+
+    @pytest.mark.asyncio
+    async def test_dispatches_each_handler_once_per_batch(self):
+        event_store = Mock(spec=EventStore)
+        event_store.apply_many = AsyncMock()
+        handler = Mock()
+        aggregate = ConcreteAggregate("log-123", event_store, {Event: [handler]})
+        events = [Event(), Event()]
+
+        await aggregate.apply_many(events)
+
+        handler.handle_event.assert_called_once_with(events)
+
+    @pytest.mark.asyncio
+    async def test_nothing_is_folded_when_the_store_rejects_the_batch(self):
+        event_store = Mock(spec=EventStore)
+        event_store.apply_many = AsyncMock(side_effect=RuntimeError("conflict"))
+        aggregate = ConcreteAggregate("log-123", event_store)
+
+        with pytest.raises(RuntimeError):
+            await aggregate.apply_many([Event(), Event()])
+
+        assert aggregate.applied_events == []
+        assert aggregate.version == 0
@@ -1,12 +1,18 @@
+import asyncio
 import pytest
+from datetime import datetime, UTC
 from unittest.mock import Mock, MagicMock, patch, AsyncMock
 from typing import List
 
 from sh_dendrite.aggregate_factory import AggregateFactory
 from sh_dendrite.aggregate import Aggregate
+from sh_dendrite.dynamodb_event_store import DynamodbEventStore
 from sh_dendrite.event import Event
 from sh_dendrite.event_store import EventStore
 from sh_dendrite.event_handler import EventHandler
+from sh_dendrite.in_memory_event_store import InMemoryEventStore
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+from sh_dendrite.snapshot import Snapshot
 
 
 class ConcreteAggregate(Aggregate):
@@ -275,3 +281,295 @@ class TestAggregateFactoryLoad:
         aggregate = await factory.load(ConcreteAggregate, "log-123")
 
         assert aggregate.event_handlers == event_handlers
+
+
+class CountingAggregate(Aggregate):
+    """Snapshot-capable aggregate for testing."""
+
+    def __init__(self, log_id: str, event_store: EventStore, event_handlers: dict = None):
+        super().__init__(log_id, event_store, event_handlers or {})
+        self.count = 0
+
+    def on(self, event: Event) -> None:
+        self.count += 1
+
+    def snapshot_state(self) -> dict:
+        return {"count": self.count}
+
+    def restore_state(self, state: dict) -> None:
+        self.count = state["count"]
+
+
+def mock_event(event_id: str) -> Event:
+    event = Mock(spec=Event)
+    event.event_id = event_id
+    event.version = None
+    return event
+
+
+class TestAggregateFactorySnapshots:
+    def test_supports_snapshots_only_when_both_hooks_overridden(self):
+        assert CountingAggregate.supports_snapshots()
+        assert not ConcreteAggregate.supports_snapshots()
+
+    @pytest.mark.asyncio
+    async def test_loads_from_snapshot_and_reads_only_the_tail(self):
+        event_store = Mock(spec=EventStore)
+        snapshot = Snapshot("log-123", "event-5", {"count": 5}, version=5)
+        event_store.get_snapshot = AsyncMock(return_value=snapshot)
+        event_store.get_log_from = AsyncMock(return_value=[mock_event("event-6")])
+
+        factory = AggregateFactory(event_store, Mock(), {})
+        aggregate = await factory.load(CountingAggregate, "log-123")
+
+        event_store.get_log_from.assert_awaited_once_with("log-123", snapshot)
+        event_store.get_log.assert_not_called()
+        assert aggregate.count == 6
+        assert aggregate.last_event_name == "event-6"
+        assert aggregate.version == 6
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_full_log_without_snapshot(self):
+        event_store = Mock(spec=EventStore)
+        event_store.get_snapshot = AsyncMock(return_value=None)
+        event_store.get_log = AsyncMock(return_value=[mock_event("event-1")])
+
+        factory = AggregateFactory(event_store, Mock(), {})
+        aggregate = await factory.load(CountingAggregate, "log-123")
+
+        assert aggregate.count == 1
+
+    @pytest.mark.asyncio
+    async def test_does_not_ask_for_snapshots_of_unsupported_aggregates(self):
+        event_store = Mock(spec=EventStore)
+        event_store.get_snapshot = AsyncMock()
+        event_store.get_log = AsyncMock(return_value=[])
+
+        factory = AggregateFactory(event_store, Mock(), {})
+        await factory.load(ConcreteAggregate, "log-123")
+
+        event_store.get_snapshot.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_saves_snapshot_when_replay_reaches_threshold(self):
+        event_store = Mock(spec=EventStore)
+        event_store.get_snapshot = AsyncMock(return_value=None)
+        event_store.get_log = AsyncMock(return_value=[mock_event(f"event-{i}") for i in range(3)])
+        event_store.save_snapshot = AsyncMock()
+
+        factory = AggregateFactory(event_store, Mock(), {}, snapshot_threshold=3)
+        await factory.load(CountingAggregate, "log-123")
+
+        snapshot = event_store.save_snapshot.await_args.args[0]
+        assert (snapshot.log_id, snapshot.last_event, snapshot.state) == ("log-123", "event-2", {"count": 3})
+        assert snapshot.version == 3
+
+    @pytest.mark.asyncio
+    async def test_does_not_snapshot_below_threshold(self):
+        event_store = Mock(spec=EventStore)
+        event_store.get_snapshot = AsyncMock(return_value=None)
+        event_store.get_log = AsyncMock(return_value=[mock_event("event-1")])
+        event_store.save_snapshot = AsyncMock()
+
+        factory = AggregateFactory(event_store, Mock(), {}, snapshot_threshold=3)
+        await factory.load(CountingAggregate, "log-123")
+
+        event_store.save_snapshot.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_does_not_snapshot_into_stores_without_snapshots(self):
+        event_store = InMemoryEventStore()
+        aggregate = CountingAggregate("log-123", event_store)
+        for _ in range(3):
+            await aggregate.apply(Event())
+
+        factory = AggregateFactory(event_store, Mock(), {}, snapshot_threshold=3)
+        loaded = await factory.load(CountingAggregate, "log-123")
+
+        assert loaded.count == 3
+
+    @pytest.mark.asyncio
+    async def test_a_failed_snapshot_does_not_fail_the_load(self):
+        event_store = Mock(spec=EventStore)
+        event_store.get_snapshot = AsyncMock(return_value=None)
+        event_store.get_log = AsyncMock(return_value=[mock_event(f"event-{i}") for i in range(3)])
+        event_store.save_snapshot = AsyncMock(side_effect=ConnectionError("throttled"))
+
+        factory = AggregateFactory(event_store, Mock(), {}, snapshot_threshold=3)
+        aggregate = await factory.load(CountingAggregate, "log-123", read_only=True)
+
+        assert aggregate.count == 3
+        event_store.save_snapshot.assert_awaited_once()
+
+
+class TestAggregateFactoryLoadMany:
+    @pytest.fixture
+    def store(self):
+        local = LocalDynamoDB()
+        local.create_table("events")
+        self.local = local
+        return DynamodbEventStore("events", "local", client=local.client())
+
+    async def seed(self, store, log_id: str, count: int) -> None:
+        previous = None
+        for i in range(count):
+            event = Event()
+            event.event_id = f"{i:03d}_Event"
+            event.applied_time = datetime.now(UTC)
+            await store.apply(log_id, event, previous)
+            previous = event.event_id
+
+    @pytest.mark.asyncio
+    async def test_returns_aggregates_in_requested_order(self, store):
+        for n in range(5):
+            await self.seed(store, f"log-{n}", n + 1)
+        factory = AggregateFactory(store, Mock(), {})
+
+        aggregates = await factory.load_many(CountingAggregate, ["log-3", "log-0", "log-4"], concurrency=2)
+
+        assert [a.log_id for a in aggregates] == ["log-3", "log-0", "log-4"]
+        assert [a.count for a in aggregates] == [4, 1, 5]
+
+    @pytest.mark.asyncio
+    async def test_skips_queries_for_empty_logs_and_current_snapshots(self, store):
+        await self.seed(store, "log-1", 3)
+        await self.seed(store, "log-2", 3)
+        await store.save_snapshot(Snapshot("log-2", "002_Event", {"count": 3}))
+        factory = AggregateFactory(store, Mock(), {})
+
+        aggregates = await factory.load_many(CountingAggregate, ["log-1", "log-2", "missing"])
+
+        assert [a.count for a in aggregates] == [3, 3, 0]
+        assert self.local.request_counts["Query"] == 1
+
+    @pytest.mark.asyncio
+    async def test_iter_load_many_yields_each_aggregate(self, store):
+        for n in range(4):
+            await self.seed(store, f"log-{n}", 2)
+        factory = AggregateFactory(store, Mock(), {})
+
+        loaded = [a.log_id async for a in factory.iter_load_many(CountingAggregate, [f"log-{n}" for n in range(4)])]
+
+        assert sorted(loaded) == ["log-0", "log-1", "log-2", "log-3"]
+
+    @pytest.mark.asyncio
+    async def test_stores_without_log_heads_load_each_log(self):
+        event_store = Mock(spec=EventStore)
+        event_store.get_log_heads = AsyncMock(return_value={})
+        event_store.get_snapshot = AsyncMock(return_value=None)
+        event_store.get_log = AsyncMock(return_value=[mock_event("event-1")])
+
+        factory = AggregateFactory(event_store, Mock(), {})
+        aggregates = await factory.load_many(CountingAggregate, ["a", "b"])
+
+        assert [a.count for a in aggregates] == [1, 1]
+        assert event_store.get_log.await_count == 2
+
+
+class TestAggregateFactoryCoalescing:
+    @pytest.fixture
+    def event_store(self):
+        event_store = Mock(spec=EventStore)
+
+        async def get_log(log_id):
+            await asyncio.sleep(0.01)
+            return [mock_event("event-1"), mock_event("event-2")]
+        event_store.get_snapshot = AsyncMock(return_value=None)
+        event_store.get_log = AsyncMock(side_effect=get_log)
+        return event_store
+
+    @pytest.mark.asyncio
+    async def test_concurrent_loads_share_one_read(self, event_store):
+        factory = AggregateFactory(event_store, Mock(), {})
+
+        aggregates = await asyncio.gather(*(factory.load(CountingAggregate, "log-1") for _ in range(10)))
+
+        assert event_store.get_log.await_count == 1
+        assert factory.coalesced_loads == 9
+        assert [a.count for a in aggregates] == [2] * 10
+        assert len({id(a) for a in aggregates}) == 10
+        assert all(a.event_store is event_store for a in aggregates)
+
+    @pytest.mark.asyncio
+    async def test_writers_get_independent_copies(self, event_store):
+        factory = AggregateFactory(event_store, Mock(), {})
+
+        first, second = await asyncio.gather(factory.load(CountingAggregate, "log-1"),
+                                             factory.load(CountingAggregate, "log-1"))
+        first.count += 1
+
+        assert second.count == 2
+        assert not first.read_only and not second.read_only
+
+    @pytest.mark.asyncio
+    async def test_readers_share_a_read_only_instance(self, event_store):
+        factory = AggregateFactory(event_store, Mock(), {})
+
+        reader, other_reader, writer = await asyncio.gather(
+            factory.load(CountingAggregate, "log-1", read_only=True),
+            factory.load(CountingAggregate, "log-1", read_only=True),
+            factory.load(CountingAggregate, "log-1"))
+
+        assert reader is other_reader and reader is not writer
+        with pytest.raises(RuntimeError):
+            await reader.apply(mock_event("event-3"))
+        event_store.apply.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_sequential_loads_read_again(self, event_store):
+        factory = AggregateFactory(event_store, Mock(), {})
+
+        await factory.load(CountingAggregate, "log-1")
+        await factory.load(CountingAggregate, "log-1")
+
+        assert event_store.get_log.await_count == 2
+        assert factory.coalesced_loads == 0
+
+    @pytest.mark.asyncio
+    async def test_failed_load_fails_every_caller(self, event_store):
+        event_store.get_log.side_effect = ConnectionError("store unavailable")
+        factory = AggregateFactory(event_store, Mock(), {})
+
+        results = await asyncio.gather(factory.load(CountingAggregate, "log-1"),
+                                       factory.load(CountingAggregate, "log-1"), return_exceptions=True)
+
+        assert all(isinstance(result, ConnectionError) for result in results)
+        assert event_store.get_log.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_the_others(self, event_store):
+        factory = AggregateFactory(event_store, Mock(), {})
+
+        first = asyncio.create_task(factory.load(CountingAggregate, "log-1"))
+        second = asyncio.create_task(factory.load(CountingAggregate, "log-1"))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        assert (await second).count == 2
+        assert first.cancelled()
+
+    @pytest.mark.asyncio
+    async def test_loads_after_an_append_do_not_join_a_load_from_before_it(self, event_store):
+        log = [mock_event("event-1"), mock_event("event-2")]
+
+        async def get_log(log_id):
+            events = list(log)
+            await asyncio.sleep(0.01)
+            return events
+        event_store.get_log.side_effect = get_log
+        factory = AggregateFactory(event_store, Mock(), {})
+        writer = await factory.load(CountingAggregate, "log-1")
+
+        async def append(log_id, event, consistency_tag):
+            log.append(event)
+        event_store.apply = AsyncMock(side_effect=append)
+
+        stale = asyncio.create_task(factory.load(CountingAggregate, "log-1", read_only=True))
+        while event_store.get_log.await_count < 2:
+            await asyncio.sleep(0)
+        await writer.apply(mock_event("event-3"))
+        fresh = await factory.load(CountingAggregate, "log-1", read_only=True)
+
+        assert fresh.count == 3
+        assert (await stale).count == 2
+        assert factory.coalesced_loads == 0
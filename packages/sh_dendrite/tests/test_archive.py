@@ -0,0 +1,199 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta, UTC
+
+import pytest
+
+from sh_dendrite.archive import (
+    ArchiveIntegrityError,
+    InMemoryArchive,
+    LocalDirectoryArchive,
+    decode_segment,
+    encode_segment,
+    segment_key,
+)
+from sh_dendrite.dynamodb_event_store import ARCHIVE_TOMBSTONE_PREFIX, ConcurrencyMode, DynamodbEventStore
+from sh_dendrite.event import Event
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+from sh_dendrite.snapshot import Snapshot
+
+TABLE = "sh-event-store"
+BASE_TIME = datetime(2026, 1, 1, tzinfo=UTC)
+
+
+@dataclass
+class Credited(Event):
+    amount: float
+
+
+def stamped(i: int) -> Credited:
+    event = Credited(float(i))
+    event.version = i + 1
+    event.applied_time = BASE_TIME + timedelta(seconds=i)
+    event.event_id = f"{event.applied_time.strftime('%Y%m%d%H%M%S%f')[:-3]}_Credited"
+    return event
+
+
+async def append(store, log_id: str, count: int, start: int = 0) -> list[Event]:
+    events = [stamped(i) for i in range(start, start + count)]
+    previous = None
+    if start:
+        previous = stamped(start - 1).event_id
+    for event in events:
+        await store.apply(log_id, event, previous)
+        previous = event.event_id
+    return events
+
+
+@pytest.fixture
+def local():
+    local = LocalDynamoDB()
+    local.create_table(TABLE)
+    return local
+
+
+@pytest.fixture
+def archive():
+    return InMemoryArchive()
+
+
+@pytest.fixture
+def store(local, archive):
+    return DynamodbEventStore(TABLE, "local", client=local.client(), archive=archive)
+
+
+def hot_event_ids(local) -> list[str]:
+    return [i["SK"]["S"] for i in local.items(TABLE) if not i["SK"]["S"].startswith("#")]
+
+
+class TestSegments:
+    def test_round_trips_items_with_missing_attributes(self):
+        items = [{"PK": "a", "SK": "1", "amount": 1.5}, {"PK": "a", "SK": "2", "kids": ["Amy"]}]
+
+        assert decode_segment(encode_segment(items)) == items
+
+    def test_identical_items_have_identical_keys(self):
+        items = [{"PK": "a", "SK": "1"}]
+
+        assert segment_key(encode_segment(items)) == segment_key(encode_segment(list(items)))
+
+    @pytest.mark.asyncio
+    async def test_local_directory_round_trip(self, tmp_path):
+        archive = LocalDirectoryArchive(str(tmp_path))
+        items = [{"PK": "a", "SK": str(i)} for i in range(3)]
+
+        key = await archive.put_segment(items)
+
+        assert (tmp_path / key).exists()
+        assert await archive.get_segment(key) == items
+
+    @pytest.mark.asyncio
+    async def test_detects_corrupted_segment(self, archive):
+        key = await archive.put_segment([{"PK": "a", "SK": "1"}])
+        archive.objects[key] = encode_segment([{"PK": "a", "SK": "2"}])
+
+        with pytest.raises(ArchiveIntegrityError):
+            await archive.get_segment(key)
+
+
+class TestArchiveLog:
+    @pytest.mark.asyncio
+    async def test_moves_events_behind_snapshot_to_archive(self, store, local):
+        events = await append(store, "log-1", 10)
+        await store.save_snapshot(Snapshot("log-1", events[5].event_id, {"balance": 15.0}))
+
+        result = await store.archive_log("log-1")
+
+        assert result.event_count == 6
+        assert result.last_event == events[5].event_id
+        assert hot_event_ids(local) == [e.event_id for e in events[6:]]
+        assert any(i["SK"]["S"].startswith(ARCHIVE_TOMBSTONE_PREFIX) for i in local.items(TABLE))
+
+    @pytest.mark.asyncio
+    async def test_get_log_reads_archived_history(self, store):
+        events = await append(store, "log-1", 10)
+        await store.save_snapshot(Snapshot("log-1", events[5].event_id, {}))
+        await store.archive_log("log-1")
+
+        assert await store.get_log("log-1") == events
+
+    @pytest.mark.asyncio
+    async def test_repeated_archival_keeps_full_history(self, store):
+        events = await append(store, "log-1", 4)
+        await store.save_snapshot(Snapshot("log-1", events[1].event_id, {}))
+        await store.archive_log("log-1")
+        events += await append(store, "log-1", 4, start=4)
+        await store.save_snapshot(Snapshot("log-1", events[6].event_id, {}))
+        await store.archive_log("log-1")
+
+        assert await store.get_log("log-1") == events
+
+    @pytest.mark.asyncio
+    async def test_get_log_from_reads_hot_tail_only_unless_asked(self, store, local):
+        events = await append(store, "log-1", 10)
+        await store.save_snapshot(Snapshot("log-1", events[5].event_id, {}))
+        await store.archive_log("log-1")
+
+        assert await store.get_log_from("log-1", events[5].event_id) == events[6:]
+        assert await store.get_log_from("log-1", events[2]) == events[6:]
+        assert await store.get_log_from("log-1", events[2], include_archived=True) == events[3:]
+        assert await store.get_log_from("log-1", events[2].applied_time, include_archived=True) == events[2:]
+
+    @pytest.mark.asyncio
+    async def test_iter_log_streams_archived_then_hot_events(self, store):
+        events = await append(store, "log-1", 10)
+        await store.save_snapshot(Snapshot("log-1", events[5].event_id, {}))
+        await store.archive_log("log-1")
+
+        streamed = [event async for _, event in store.iter_log("log-1")]
+        resumed = [event async for _, event in store.iter_log("log-1", after=events[3].event_id)]
+
+        assert streamed == events
+        assert resumed == events[4:]
+
+    @pytest.mark.asyncio
+    async def test_nothing_to_archive_without_snapshot(self, store):
+        await append(store, "log-1", 3)
+
+        assert await store.archive_log("log-1") is None
+
+    @pytest.mark.asyncio
+    async def test_archive_logs(self, store):
+        for log_id in ("log-1", "log-2"):
+            events = await append(store, log_id, 3)
+            await store.save_snapshot(Snapshot(log_id, events[-1].event_id, {}))
+
+        results = await store.archive_logs(["log-1", "log-2", "missing"])
+
+        assert sorted(r.log_id for r in results) == ["log-1", "log-2"]
+
+
+class TestArchiveVersionMode:
+    @pytest.mark.asyncio
+    async def test_archives_through_snapshot_version(self, local, archive):
+        store = DynamodbEventStore(TABLE, "local", client=local.client(), archive=archive,
+                                   concurrency_mode=ConcurrencyMode.VERSION)
+        events = await append(store, "log-1", 10)
+        await store.save_snapshot(Snapshot("log-1", events[5].event_id, {}, version=6))
+
+        result = await store.archive_log("log-1")
+
+        assert result.event_count == 6
+        assert len(hot_event_ids(local)) == 4
+        assert await store.get_log("log-1") == events
+        assert await store.get_log_from("log-1", events[7]) == events[8:]
+
+
+class TestSnapshots:
+    @pytest.mark.asyncio
+    async def test_older_snapshot_does_not_replace_newer(self, store):
+        await store.save_snapshot(Snapshot("log-1", "002_Credited", {"balance": 2}))
+        await store.save_snapshot(Snapshot("log-1", "001_Credited", {"balance": 1}))
+
+        snapshot = await store.get_snapshot("log-1")
+
+        assert snapshot.last_event == "002_Credited"
+        assert snapshot.state == {"balance": 2}
+
+    @pytest.mark.asyncio
+    async def test_missing_snapshot(self, store):
+        assert await store.get_snapshot("log-1") is None
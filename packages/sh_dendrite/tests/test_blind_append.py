@@ -0,0 +1,274 @@
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta, UTC
+
+import pytest
+from aiodynamo.expressions import F
+
+from sh_dendrite import dynamodb_event_store
+from sh_dendrite.aggregate import Aggregate, stamp_events
+from sh_dendrite.aggregate_factory import AggregateFactory
+from sh_dendrite.blind_append import BlindAppendUnavailable, BlindCommand
+from sh_dendrite.concurrency_violation_error import ConcurrencyViolationError
+from sh_dendrite.dynamodb_event_store import ConcurrencyMode, DynamodbEventStore, LOG_METADATA_ITEM
+from sh_dendrite.event import Event, next_event_id
+from sh_dendrite.in_memory_event_store import InMemoryEventStore
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+from sh_dendrite.log_head import LogHead
+
+TABLE = "sh-event-store"
+
+
+@dataclass
+class Opened(Event):
+    balance: float
+
+    def head_counters(self) -> dict[str, float]:
+        return {"balance": self.balance}
+
+
+@dataclass
+class Moved(Event):
+    amount: float
+    balance_before: float
+
+    def head_counters(self) -> dict[str, float]:
+        return {"balance": self.balance_before + self.amount}
+
+
+class Account(Aggregate):
+    def __init__(self, log_id, event_store, event_handlers):
+        super().__init__(log_id, event_store, event_handlers)
+        self.balance = None
+
+    def on(self, event: Event) -> None:
+        match event:
+            case Opened():
+                self.balance = event.balance
+            case Moved():
+                self.balance += event.amount
+
+
+@dataclass
+class Move(BlindCommand):
+    """A deposit, or a withdrawal for a negative amount, which must leave the balance at zero or more"""
+    amount: float
+    check_funds: bool = True
+    commutes: bool = True
+
+    def events(self, head: LogHead) -> list[Event]:
+        if head.is_empty:
+            raise ValueError("no such account")
+        balance = head.counters["balance"]
+        if self.check_funds and balance + self.amount < 0:
+            raise ValueError("insufficient funds")
+        return [Moved(self.amount, balance)]
+
+    def minimums(self, head: LogHead) -> dict[str, float]:
+        return {"balance": -self.amount} if self.amount < 0 else {}
+
+    def deltas(self) -> dict[str, float] | None:
+        return {"balance": self.amount} if self.commutes else None
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.events = []
+
+    def handle_event(self, events):
+        self.events.extend(events)
+
+
+@pytest.fixture
+def local():
+    local = LocalDynamoDB()
+    local.create_table(TABLE)
+    return local
+
+
+@pytest.fixture
+def handler():
+    return RecordingHandler()
+
+
+@pytest.fixture
+def factory(local, handler):
+    store = DynamodbEventStore(TABLE, "local", client=local.client())
+    return AggregateFactory(store, lambda: "account-1", {Moved: [handler]})
+
+
+async def opened(factory: AggregateFactory, balance: float = 100.0) -> Account:
+    account = factory.new(Account)
+    await account.apply(Opened(balance))
+    return account
+
+
+class TestAppendBlind:
+    @pytest.mark.asyncio
+    async def test_appends_against_the_head_without_reading_the_log(self, factory, local, handler):
+        await opened(factory)
+        local.request_counts.clear()
+
+        [event] = await factory.append_blind(Account, "account-1", Move(25))
+
+        assert (event.version, event.balance_before) == (2, 100.0)
+        assert local.request_counts == {"BatchGetItem": 1, "UpdateItem": 1, "TransactWriteItems": 1}
+        assert local.consistent_reads == 0
+        assert handler.events == [event]
+        head = (await factory.event_store.get_log_heads(["account-1"]))["account-1"]
+        assert (head.last_event, head.version, head.counters) == (event.event_id, 2, {"balance": 125.0})
+        account = await factory.load(Account, "account-1")
+        assert (account.balance, account.version) == (125.0, 2)
+
+    @pytest.mark.asyncio
+    async def test_commands_that_do_not_commute_append_after_a_consistent_head(self, factory, local):
+        await opened(factory)
+        local.request_counts.clear()
+
+        [event] = await factory.append_blind(Account, "account-1", Move(25, commutes=False))
+
+        assert (event.version, event.balance_before) == (2, 100.0)
+        assert local.request_counts == {"BatchGetItem": 1, "TransactWriteItems": 1}
+        assert local.consistent_reads == 1
+        account = await factory.load(Account, "account-1")
+        assert (account.balance, account.version) == (125.0, 2)
+
+    @pytest.mark.asyncio
+    async def test_loaded_appends_keep_the_head_current(self, factory):
+        account = await opened(factory)
+        await factory.append_blind(Account, "account-1", Move(-30))
+        account = await factory.load(Account, "account-1")
+        await account.apply(Moved(5, account.balance))
+
+        [event] = await factory.append_blind(Account, "account-1", Move(1))
+
+        assert (event.version, event.balance_before) == (4, 75.0)
+
+    @pytest.mark.asyncio
+    async def test_the_command_rules_on_the_head(self, factory):
+        with pytest.raises(ValueError):
+            await factory.append_blind(Account, "account-1", Move(10))
+        await opened(factory)
+
+        with pytest.raises(ValueError):
+            await factory.append_blind(Account, "account-1", Move(-101))
+
+    @pytest.mark.asyncio
+    async def test_the_store_checks_the_minimums(self, factory):
+        await opened(factory)
+        head = (await factory.event_store.get_log_heads(["account-1"]))["account-1"]
+        command = Move(-101, check_funds=False)
+        events = command.events(head)
+        stamp_events(events, Account, head.version, head.last_event)
+
+        with pytest.raises(ConcurrencyViolationError):
+            await factory.event_store.apply_many_guarded("account-1", events, head.last_event,
+                                                         command.minimums(head))
+
+        assert len(await factory.event_store.get_log("account-1")) == 1
+
+    @pytest.mark.asyncio
+    async def test_concurrent_commuting_appends_do_not_conflict(self, factory):
+        await opened(factory)
+
+        appended = await asyncio.gather(*(factory.append_blind(Account, "account-1", Move(1), max_attempts=1)
+                                          for _ in range(10)))
+
+        assert sorted(events[0].version for events in appended) == list(range(2, 12))
+        assert sorted(events[0].balance_before for events in appended) == [100.0 + n for n in range(10)]
+        account = await factory.load(Account, "account-1")
+        assert (account.balance, account.version) == (110.0, 11)
+        head = (await factory.event_store.get_log_heads(["account-1"]))["account-1"]
+        assert (head.version, head.counters) == (11, {"balance": 110.0})
+
+    @pytest.mark.asyncio
+    async def test_concurrent_withdrawals_never_overdraw(self, factory):
+        await opened(factory)
+
+        appended = await asyncio.gather(*(factory.append_blind(Account, "account-1", Move(-10), max_attempts=2)
+                                          for _ in range(15)), return_exceptions=True)
+
+        assert sum(isinstance(result, list) for result in appended) == 10
+        assert all(isinstance(result, (list, ConcurrencyViolationError, ValueError)) for result in appended)
+        account = await factory.load(Account, "account-1")
+        assert (account.balance, account.version) == (0.0, 11)
+
+    @pytest.mark.asyncio
+    async def test_a_failed_append_releases_its_reservation(self, factory):
+        await opened(factory)
+        store = factory.event_store
+
+        reservation = await store.reserve_append("account-1", 1, {"balance": 25.0}, {})
+        await store.release_append(reservation)
+        head = (await store.get_log_heads(["account-1"]))["account-1"]
+
+        assert (reservation.head.version, reservation.head.counters) == (1, {"balance": 100.0})
+        assert (head.version, head.counters) == (2, {"balance": 100.0})
+        [event] = await factory.append_blind(Account, "account-1", Move(1))
+        assert (event.version, event.balance_before) == (3, 100.0)
+        account = await factory.load(Account, "account-1")
+        await account.apply(Moved(5, account.balance))
+        assert [e.version for e in await store.get_log("account-1")] == [1, 3, 4]
+
+    @pytest.mark.asyncio
+    async def test_reservations_hold_back_loaded_appends_until_they_expire(self, factory, monkeypatch):
+        await opened(factory)
+        account = await factory.load(Account, "account-1")
+        await factory.event_store.reserve_append("account-1", 1, {"balance": 25.0}, {})
+
+        with pytest.raises(ConcurrencyViolationError):
+            await account.apply(Moved(5, account.balance))
+        monkeypatch.setattr(dynamodb_event_store, "RESERVATION_TIMEOUT", timedelta(0))
+        with pytest.raises(ConcurrencyViolationError):
+            await account.apply(Moved(5, account.balance))
+
+        account = await factory.load(Account, "account-1")
+        await account.apply(Moved(5, account.balance))
+        head = (await factory.event_store.get_log_heads(["account-1"]))["account-1"]
+        assert (head.version, head.counters) == (2, {"balance": 105.0})
+
+    @pytest.mark.asyncio
+    async def test_reservations_follow_a_log_written_by_a_clock_ahead(self, factory, local):
+        await opened(factory)
+        ahead = next_event_id(None, datetime.now(UTC) + timedelta(seconds=5), 1, "Opened")
+        await local.client().update_item(TABLE, {"PK": "account-1", "SK": LOG_METADATA_ITEM},
+                                         F("last_event").set(ahead))
+
+        [first] = await factory.append_blind(Account, "account-1", Move(1))
+        [second] = await factory.append_blind(Account, "account-1", Move(1))
+
+        assert ahead < first.event_id < second.event_id
+        head = (await factory.event_store.get_log_heads(["account-1"]))["account-1"]
+        assert head.last_event == second.event_id
+
+    @pytest.mark.asyncio
+    async def test_concurrent_appends_that_do_not_commute_retry_until_all_are_in(self, factory):
+        await opened(factory)
+
+        appended = await asyncio.gather(*(factory.append_blind(Account, "account-1", Move(1, commutes=False),
+                                                               max_attempts=20)
+                                          for _ in range(5)))
+
+        assert sorted(events[0].version for events in appended) == [2, 3, 4, 5, 6]
+        account = await factory.load(Account, "account-1")
+        assert (account.balance, account.version) == (105.0, 6)
+
+    @pytest.mark.asyncio
+    async def test_heads_written_before_counters_are_unavailable(self, factory, local):
+        await opened(factory)
+        last_event = (await factory.event_store.get_log("account-1"))[-1].event_id
+        await local.client().put_item(TABLE, {"PK": "account-1", "SK": LOG_METADATA_ITEM, "last_event": last_event})
+
+        with pytest.raises(BlindAppendUnavailable):
+            await factory.append_blind(Account, "account-1", Move(1))
+
+    @pytest.mark.asyncio
+    async def test_stores_without_counters_are_unavailable(self, local):
+        version_store = DynamodbEventStore(TABLE, "local", client=local.client(),
+                                           concurrency_mode=ConcurrencyMode.VERSION)
+        for store in (InMemoryEventStore(), version_store):
+            factory = AggregateFactory(store, lambda: "account-1", {})
+            await opened(factory)
+
+            with pytest.raises(BlindAppendUnavailable):
+                await factory.append_blind(Account, "account-1", Move(1))
@@ -0,0 +1,175 @@
+import json
+from dataclasses import dataclass
+from datetime import datetime, UTC
+
+import pytest
+
+from sh_dendrite.bulk import AdaptiveBackoff, export_items, import_items, read_dump, write_dump
+from sh_dendrite.dynamodb_event_store import DynamodbEventStore, event_to_item
+from sh_dendrite.event import Event
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+from sh_dendrite.throttle import AdaptiveThrottle
+
+TABLE = "sh-event-store"
+
+
+@dataclass
+class Credited(Event):
+    amount: float
+
+
+def make_items(log_id: str, count: int) -> list[dict]:
+    items = []
+    for i in range(count):
+        event = Credited(float(i))
+        event.event_id = f"{i:06d}_Credited"
+        event.applied_time = datetime.now(UTC)
+        items.append(event_to_item(log_id, event))
+    return items
+
+
+async def collect(iterable):
+    return [item async for item in iterable]
+
+
+@pytest.fixture
+def local():
+    local = LocalDynamoDB()
+    local.create_table(TABLE)
+    return local
+
+
+@pytest.fixture
+def store(local):
+    return DynamodbEventStore(TABLE, "local", client=local.client())
+
+
+class TestAdaptiveBackoff:
+    def test_doubles_when_throttled_and_halves_on_success(self):
+        backoff = AdaptiveBackoff(initial=0.1, maximum=0.3)
+
+        assert backoff.throttled() == 0.1
+        assert backoff.throttled() == 0.2
+        assert backoff.throttled() == 0.3
+        backoff.succeeded()
+        assert backoff.delay == 0.15
+        backoff.succeeded()
+        backoff.succeeded()
+        assert backoff.delay == 0.0
+
+
+class TestImport:
+    @pytest.mark.asyncio
+    async def test_imports_all_items_with_concurrent_writers(self, store, local):
+        items = make_items("log-1", 500)
+
+        progress = await import_items(store, items, writers=8)
+
+        assert progress.items == 500
+        assert progress.batches == 20
+        assert len(local.items(TABLE)) == 500
+        assert [e.amount for e in await store.get_log("log-1")] == [float(i) for i in range(500)]
+
+    @pytest.mark.asyncio
+    async def test_retries_unprocessed_items(self, store, local):
+        local.max_batch_write_items = 10
+
+        progress = await import_items(store, make_items("log-1", 100), writers=4,
+                                      backoff=AdaptiveBackoff(initial=0.001, maximum=0.01))
+
+        assert progress.retries > 0
+        assert len(local.items(TABLE)) == 100
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_attempts(self, store, local):
+        local.max_batch_write_items = 0
+
+        with pytest.raises(RuntimeError, match="unprocessed"):
+            await import_items(store, make_items("log-1", 5), writers=1, max_attempts=2,
+                               backoff=AdaptiveBackoff(initial=0.001, maximum=0.01))
+
+    @pytest.mark.asyncio
+    async def test_writes_are_paced_and_retried_by_the_store_throttle(self, local):
+        store = DynamodbEventStore(TABLE, "local", client=local.client(), throttle=AdaptiveThrottle())
+        local.throttle_next(3)
+
+        progress = await import_items(store, make_items("log-1", 100), writers=1,
+                                      backoff=AdaptiveBackoff(initial=0.001, maximum=0.01))
+
+        assert (progress.items, progress.retries) == (100, 0)
+        assert store.throttle.stats()["write"]["throttled"] == 3
+        assert len(local.items(TABLE)) == 100
+
+    @pytest.mark.asyncio
+    async def test_reports_progress(self, store):
+        reports = []
+
+        await import_items(store, make_items("log-1", 50), writers=2,
+                           on_progress=reports.append, progress_interval=0)
+
+        assert reports
+
+
+class TestExport:
+    @pytest.mark.asyncio
+    async def test_exports_whole_table_with_parallel_scan(self, store):
+        await import_items(store, make_items("log-1", 30) + make_items("log-2", 30))
+
+        items = await collect(export_items(store, segments=4))
+
+        assert len(items) == 60
+
+    @pytest.mark.asyncio
+    async def test_exports_selected_logs(self, store):
+        await import_items(store, make_items("log-1", 30) + make_items("log-2", 30))
+
+        items = await collect(export_items(store, log_ids=["log-2"]))
+
+        assert len(items) == 30
+        assert {item["PK"] for item in items} == {"log-2"}
+
+
+class TestDumps:
+    @pytest.mark.asyncio
+    async def test_jsonl_round_trip(self, store, tmp_path):
+        path = str(tmp_path / "events.jsonl")
+        original = make_items("log-1", 40)
+        await import_items(store, original)
+
+        count = await write_dump(path, export_items(store))
+        restored = list(read_dump(path))
+
+        assert count == 40
+        assert json.loads(open(path).readline())["PK"] == "log-1"
+        assert sorted(restored, key=lambda i: i["SK"]) == original
+
+    @pytest.mark.asyncio
+    async def test_parquet_round_trip(self, store, local, tmp_path):
+        pytest.importorskip("pyarrow")
+        path = str(tmp_path / "events.parquet")
+        original = make_items("log-1", 40)
+        await import_items(store, original)
+
+        await write_dump(path, export_items(store))
+
+        target = LocalDynamoDB()
+        target.create_table(TABLE)
+        target_store = DynamodbEventStore(TABLE, "local", client=target.client())
+        await import_items(target_store, read_dump(path))
+        assert await target_store.get_log("log-1") == await store.get_log("log-1")
+
+    @pytest.mark.asyncio
+    async def test_parquet_row_groups_take_the_columns_of_every_item(self, store, tmp_path):
+        pyarrow = pytest.importorskip("pyarrow.parquet")
+        path = str(tmp_path / "events.parquet")
+        items = make_items("log-1", 5) + [{"PK": "log-1", "SK": "#LOG_METADATA", "last_event": "000004_Credited",
+                                           "version": 5}]
+
+        async def as_async():
+            for item in items:
+                yield item
+
+        assert await write_dump(path, as_async(), row_group_size=2) == 6
+        assert pyarrow.ParquetFile(path).metadata.num_row_groups == 3
+        # absent attributes come back as nulls, which read_dump leaves out
+        assert list(read_dump(path)) == [{k: v for k, v in item.items() if v is not None} for item in items]
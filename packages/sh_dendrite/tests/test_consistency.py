@@ -0,0 +1,16 @@
+import pytest
+
+from sh_dendrite.consistency import ConsistencyToken
+
+
+def test_tokens_round_trip_through_their_encoding():
+    token = ConsistencyToken("ledger:with:colons", 42)
+
+    assert ConsistencyToken.decode(token.encode()) == token
+    assert "=" not in token.encode()
+
+
+@pytest.mark.parametrize("encoded", ["", "!!", "bm8tdmVyc2lvbg", "Mzo"])
+def test_malformed_tokens_are_rejected(encoded):
+    with pytest.raises(ValueError):
+        ConsistencyToken.decode(encoded)
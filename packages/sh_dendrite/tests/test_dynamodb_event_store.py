@@ -0,0 +1,276 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta, UTC
+
+import pytest
+
+from sh_dendrite.concurrency_violation_error import ConcurrencyViolationError
+from sh_dendrite.dynamodb_event_store import (
+    ConcurrencyMode,
+    DynamodbEventStore,
+    LOG_METADATA_ITEM,
+    event_to_item,
+    item_to_event,
+)
+from sh_dendrite.event import Event
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+from sh_dendrite.snapshot import Snapshot
+
+TABLE = "sh-event-store"
+
+
+@dataclass
+class AccountOpened(Event):
+    owner: str
+    kids: list[str]
+
+
+@dataclass
+class Deposited(Event):
+    amount: float
+
+
+def stamped(event: Event, event_id: str, version: int | None = None) -> Event:
+    event.event_id = event_id
+    event.applied_time = datetime.now(UTC)
+    event.version = version
+    return event
+
+
+@pytest.fixture
+def local():
+    local = LocalDynamoDB()
+    local.create_table(TABLE)
+    return local
+
+
+@pytest.fixture
+def store(local):
+    return DynamodbEventStore(TABLE, "local", client=local.client())
+
+
+class TestItemConversion:
+    def test_round_trips_event(self):
+        event = stamped(AccountOpened("Smith", ["Amy", "Bob"]), "001_AccountOpened")
+
+        item = event_to_item("log-1", event)
+        restored = item_to_event(item)
+
+        assert item["PK"] == "log-1"
+        assert item["SK"] == "001_AccountOpened"
+        assert item["event_type"] == f"{AccountOpened.__module__}.AccountOpened"
+        assert restored == event
+
+
+class TestStoreAgainstLocalDynamoDB:
+    @pytest.mark.asyncio
+    async def test_apply_and_get_log(self, store, local):
+        first = stamped(AccountOpened("Smith", ["Amy"]), "001_AccountOpened")
+        second = stamped(Deposited(12.5), "002_Deposited")
+
+        await store.apply("log-1", first, None)
+        await store.apply("log-1", second, first.event_id)
+
+        assert await store.get_log("log-1") == [first, second]
+        assert await store.get_log("other") == []
+        metadata = [i for i in local.items(TABLE) if i["SK"]["S"] == LOG_METADATA_ITEM]
+        assert metadata[0]["last_event"] == {"S": "002_Deposited"}
+
+    @pytest.mark.asyncio
+    async def test_stale_last_event_is_a_concurrency_violation(self, store):
+        first = stamped(Deposited(1.0), "001_Deposited")
+        await store.apply("log-1", first, None)
+        await store.apply("log-1", stamped(Deposited(2.0), "002_Deposited"), first.event_id)
+
+        with pytest.raises(ConcurrencyViolationError):
+            await store.apply("log-1", stamped(Deposited(3.0), "003_Deposited"), first.event_id)
+        with pytest.raises(ConcurrencyViolationError):
+            await store.apply("log-1", stamped(Deposited(3.0), "003_Deposited"), None)
+
+    @pytest.mark.asyncio
+    async def test_apply_many_is_one_transaction(self, store, local):
+        first = stamped(Deposited(1.0), "001_Deposited")
+        await store.apply("log-1", first, None)
+        batch = [stamped(Deposited(float(n)), f"00{n}_Deposited") for n in (2, 3, 4)]
+
+        await store.apply_many("log-1", batch, first.event_id)
+
+        assert await store.get_log("log-1") == [first, *batch]
+        assert local.request_counts["TransactWriteItems"] == 2
+        metadata = [i for i in local.items(TABLE) if i["SK"]["S"] == LOG_METADATA_ITEM]
+        assert metadata[0]["last_event"] == {"S": "004_Deposited"}
+
+    @pytest.mark.asyncio
+    async def test_apply_many_conflict_writes_nothing(self, store, local):
+        first = stamped(Deposited(1.0), "001_Deposited")
+        await store.apply("log-1", first, None)
+
+        with pytest.raises(ConcurrencyViolationError):
+            await store.apply_many("log-1", [stamped(Deposited(2.0), "002_Deposited"),
+                                             stamped(Deposited(3.0), "003_Deposited")], "stale")
+
+        assert await store.get_log("log-1") == [first]
+
+    @pytest.mark.asyncio
+    async def test_apply_many_rejects_batches_over_the_transaction_limit(self, store):
+        batch = [stamped(Deposited(1.0), f"{n:03d}_Deposited") for n in range(store.max_batch_events + 1)]
+
+        with pytest.raises(ValueError):
+            await store.apply_many("log-1", batch, None)
+
+    @pytest.mark.asyncio
+    async def test_warm_up_reads_without_creating_items(self, store, local):
+        await store.warm_up()
+
+        assert local.request_counts["GetItem"] == 1
+        assert local.items(TABLE) == []
+
+    @pytest.mark.asyncio
+    async def test_close_leaves_injected_client(self, store):
+        await store.close()
+
+        await store.apply("log-1", stamped(Deposited(1.0), "001_Deposited"), None)
+
+        assert len(await store.get_log("log-1")) == 1
+
+
+class TestIterLog:
+    @pytest.fixture
+    def local(self):
+        local = LocalDynamoDB(page_size=2)
+        local.create_table(TABLE)
+        return local
+
+    @staticmethod
+    async def seed(store, count: int) -> list[Event]:
+        base = datetime(2026, 1, 1, tzinfo=UTC)
+        events = []
+        previous = None
+        for n in range(count):
+            event = Deposited(float(n)) if n % 2 else AccountOpened("Smith", [])
+            event.applied_time = base + timedelta(seconds=n)
+            event.event_id = f"{event.applied_time.strftime('%Y%m%d%H%M%S%f')[:-3]}_{type(event).__name__}"
+            await store.apply("log-1", event, previous)
+            previous = event.event_id
+            events.append(event)
+        return events
+
+    @pytest.mark.asyncio
+    async def test_streams_page_by_page(self, store, local):
+        events = await self.seed(store, 6)
+        local.request_counts.clear()
+
+        stream = store.iter_log("log-1")
+        first = await anext(stream)
+
+        assert first == (events[0].event_id, events[0])
+        assert local.request_counts["Query"] == 2     # the tombstone lookup and the first page
+        assert [event async for _, event in stream] == events[1:]
+
+    @pytest.mark.asyncio
+    async def test_resumes_after_position(self, store):
+        events = await self.seed(store, 6)
+
+        resumed = [event async for _, event in store.iter_log("log-1", after=events[2].event_id)]
+
+        assert resumed == events[3:]
+
+    @pytest.mark.asyncio
+    async def test_filters_by_type_and_time(self, store):
+        events = await self.seed(store, 6)
+
+        deposits = [e async for _, e in store.iter_log("log-1", event_types=[Deposited])]
+        window = [e async for _, e in store.iter_log("log-1", start=events[1].applied_time,
+                                                        end=events[4].applied_time)]
+        resumed_window = [e async for _, e in store.iter_log("log-1", after=events[2].event_id,
+                                                                start=events[1].applied_time,
+                                                                end=events[4].applied_time)]
+
+        assert deposits == [events[1], events[3], events[5]]
+        assert window == events[1:4]
+        assert resumed_window == [events[3]]
+
+
+class TestLogHeads:
+    @pytest.mark.asyncio
+    async def test_reads_metadata_and_snapshots_in_batches(self, store, local):
+        for n in range(60):
+            await store.apply(f"log-{n}", stamped(Deposited(1.0), "001_Deposited"), None)
+        await store.save_snapshot(Snapshot("log-7", "001_Deposited", {"balance": 1.0}))
+        log_ids = [f"log-{n}" for n in range(60)] + ["missing"]
+
+        heads = await store.get_log_heads(log_ids)
+
+        assert local.request_counts["BatchGetItem"] == 2
+        assert heads["log-3"].last_event == "001_Deposited"
+        assert heads["log-3"].snapshot is None
+        assert heads["log-7"].snapshot_is_current
+        assert heads["missing"].is_empty
+
+
+class TestVersionMode:
+    @pytest.fixture
+    def store(self, local):
+        return DynamodbEventStore(TABLE, "local", client=local.client(), concurrency_mode=ConcurrencyMode.VERSION)
+
+    @pytest.mark.asyncio
+    async def test_appends_are_single_puts_keyed_by_version(self, store, local):
+        events = [stamped(Deposited(float(v)), f"00{v}_Deposited", version=v) for v in (1, 2, 3)]
+
+        for event in events:
+            await store.apply("log-1", event, None)
+
+        assert await store.get_log("log-1") == events
+        assert [i["SK"]["S"] for i in local.items(TABLE)] == [f"{v:020d}" for v in (1, 2, 3)]
+        assert local.request_counts["PutItem"] == 3
+        assert "TransactWriteItems" not in local.request_counts
+
+    @pytest.mark.asyncio
+    async def test_second_writer_of_a_version_conflicts(self, store):
+        await store.apply("log-1", stamped(Deposited(1.0), "001_Deposited", version=1), None)
+
+        with pytest.raises(ConcurrencyViolationError):
+            await store.apply("log-1", stamped(Deposited(9.0), "001_Deposited", version=1), None)
+
+    @pytest.mark.asyncio
+    async def test_apply_many_conflicts_on_any_written_version(self, store):
+        await store.apply("log-1", stamped(Deposited(1.0), "001_Deposited", version=1), None)
+        await store.apply("log-1", stamped(Deposited(2.0), "002_Deposited", version=2), None)
+
+        with pytest.raises(ConcurrencyViolationError):
+            await store.apply_many("log-1", [stamped(Deposited(3.0), "003_Deposited", version=2),
+                                             stamped(Deposited(4.0), "004_Deposited", version=3)], None)
+
+        assert len(await store.get_log("log-1")) == 2
+
+    @pytest.mark.asyncio
+    async def test_rejects_unversioned_events(self, store):
+        with pytest.raises(ValueError):
+            await store.apply("log-1", stamped(Deposited(1.0), "001_Deposited"), None)
+
+    @pytest.mark.asyncio
+    async def test_get_log_from_by_version_event_id_and_snapshot(self, store):
+        events = [stamped(Deposited(float(v)), f"00{v}_Deposited", version=v) for v in (1, 2, 3)]
+        for event in events:
+            await store.apply("log-1", event, None)
+
+        assert await store.get_log_from("log-1", events[0]) == events[1:]
+        assert await store.get_log_from("log-1", "002_Deposited") == events[2:]
+        assert await store.get_log_from("log-1", Snapshot("log-1", "002_Deposited", {}, version=2)) == events[2:]
+
+    @pytest.mark.asyncio
+    async def test_write_units_are_half_of_metadata_mode(self, local):
+        version_store = DynamodbEventStore(TABLE, "local", client=local.client(),
+                                           concurrency_mode=ConcurrencyMode.VERSION)
+        metadata_store = DynamodbEventStore(TABLE, "local", client=local.client())
+
+        previous = None
+        for v in range(1, 11):
+            event = stamped(Deposited(1.0), f"{v:03d}_Deposited", version=v)
+            await metadata_store.apply("metadata", event, previous)
+            previous = event.event_id
+        metadata_units = local.write_units
+        for v in range(1, 11):
+            await version_store.apply("version", stamped(Deposited(1.0), f"{v:03d}_Deposited", version=v), None)
+
+        assert local.write_units - metadata_units == 10
+        assert metadata_units == 40
@@ -110,6 +110,26 @@ class TestClassFrom:
 
         assert isinstance(exc_info.value.__cause__, AttributeError)
 
+    @patch('sh_dendrite.event.import_module')
+    def test_registered_classes_resolve_without_import(self, mock_import):
+        loaded_class = Event.class_from(f"{MyCustomEvent.__module__}.MyCustomEvent")
+
+        assert loaded_class is MyCustomEvent
+        mock_import.assert_not_called()
+
+    def test_subclasses_defined_later_are_registered(self):
+        @dataclass
+        class LateEvent(Event):
+            pass
+
+        assert Event.class_from(f"{LateEvent.__module__}.LateEvent") is LateEvent
+
+    @patch('sh_dendrite.event.import_module')
+    def test_register_modules_imports_each_module(self, mock_import):
+        Event.register_modules(["first.module", "second.module"])
+
+        assert [call.args[0] for call in mock_import.call_args_list] == ["first.module", "second.module"]
+
     @patch('sh_dendrite.event.import_module')
     def test_calls_import_module_with_correct_path(self, mock_import):
         mock_module = MagicMock()
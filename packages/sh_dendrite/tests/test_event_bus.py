@@ -0,0 +1,81 @@
+import asyncio
+from dataclasses import dataclass
+
+import pytest
+
+from sh_dendrite.event import Event
+from sh_dendrite.event_bus import EventBus
+
+
+@dataclass
+class Moved(Event):
+    topic: str
+    n: int
+
+
+@pytest.fixture
+def bus():
+    return EventBus(topic_of=lambda event: event.topic, max_buffered=3)
+
+
+class TestEventBus:
+    @pytest.mark.asyncio
+    async def test_delivers_events_of_the_subscribed_topic(self, bus):
+        subscription = bus.subscribe("a")
+
+        bus.handle_event([Moved("a", 1), Moved("b", 2), Moved("a", 3)])
+
+        assert [(await subscription.next()).n for _ in range(2)] == [1, 3]
+
+    @pytest.mark.asyncio
+    async def test_waiting_reader_is_woken_by_publish(self, bus):
+        subscription = bus.subscribe("a")
+        reader = asyncio.create_task(subscription.next())
+        await asyncio.sleep(0)
+
+        bus.handle_event([Moved("a", 1)])
+
+        assert (await reader).n == 1
+
+    @pytest.mark.asyncio
+    async def test_slow_consumer_is_dropped(self, bus):
+        slow = bus.subscribe("a")
+        fast = bus.subscribe("a", max_buffered=10)
+
+        bus.handle_event([Moved("a", n) for n in range(4)])
+
+        assert slow.dropped
+        assert await slow.next() is None
+        assert bus.subscriber_count("a") == 1
+        assert [event.n async for event in _take(fast, 4)] == [0, 1, 2, 3]
+
+    @pytest.mark.asyncio
+    async def test_closing_ends_iteration_and_unsubscribes(self, bus):
+        with bus.subscribe("a") as subscription:
+            bus.handle_event([Moved("a", 1)])
+        bus.handle_event([Moved("a", 2)])
+
+        assert [event.n async for event in subscription] == [1]
+        assert bus.subscriber_count() == 0
+
+    @pytest.mark.asyncio
+    async def test_close_ends_every_subscription(self, bus):
+        readers = [asyncio.create_task(bus.subscribe(f"t{n}").next()) for n in range(3)]
+        await asyncio.sleep(0)
+
+        bus.close()
+
+        assert await asyncio.gather(*readers) == [None, None, None]
+
+    def test_idle_subscribers_are_cheap_to_publish_past(self, bus):
+        subscriptions = [bus.subscribe(f"ledger-{n}") for n in range(10_000)]
+
+        bus.handle_event([Moved("ledger-42", 1)])
+
+        assert bus.subscriber_count() == 10_000
+        assert sum(len(s._buffer) for s in subscriptions) == 1
+
+
+async def _take(subscription, count):
+    for _ in range(count):
+        yield await subscription.next()
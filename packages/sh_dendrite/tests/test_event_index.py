@@ -0,0 +1,161 @@
+from dataclasses import dataclass
+from datetime import datetime, UTC
+
+import pytest
+
+from sh_dendrite.aggregate import Aggregate, aggregate_type_name
+from sh_dendrite.aggregate_factory import AggregateFactory
+from sh_dendrite.archive import InMemoryArchive
+from sh_dendrite.dynamodb_event_store import ConcurrencyMode, DynamodbEventStore, EVENT_INDEXES, index_buckets
+from sh_dendrite.event import Event
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+from sh_dendrite.snapshot import Snapshot
+from sh_dendrite.unsupported_operation import UnsupportedOperation
+
+TABLE = "sh-event-store"
+
+
+@dataclass
+class Opened(Event):
+    name: str
+
+
+@dataclass
+class Deposited(Event):
+    amount: float
+
+
+class Account(Aggregate):
+    def on(self, event: Event) -> None:
+        pass
+
+    async def open(self, name: str) -> None:
+        await self.apply(Opened(name))
+
+    async def deposit(self, *amounts: float) -> None:
+        await self.apply_many([Deposited(amount) for amount in amounts])
+
+
+class Wallet(Account):
+    pass
+
+
+def stamped(event: Event, event_id: str, applied_time: datetime) -> Event:
+    event.event_id = event_id
+    event.applied_time = applied_time
+    event.version = 1
+    return event
+
+
+@pytest.fixture
+def local():
+    local = LocalDynamoDB(page_size=3)
+    local.create_table(TABLE, indexes=EVENT_INDEXES)
+    return local
+
+
+@pytest.fixture(params=list(ConcurrencyMode))
+def store(request, local):
+    return DynamodbEventStore(TABLE, "local", client=local.client(), concurrency_mode=request.param,
+                              archive=InMemoryArchive(), index_events=True)
+
+
+@pytest.fixture
+def factory(store):
+    return AggregateFactory(store, lambda: "unused", {})
+
+
+async def open_accounts(factory, aggregate_class, log_ids):
+    for log_id in log_ids:
+        account = await factory.load(aggregate_class, log_id)
+        await account.open(log_id)
+        await account.deposit(1.0, 2.0)
+
+
+def test_index_buckets_span_months_and_years():
+    assert index_buckets(datetime(2025, 11, 30, tzinfo=UTC), datetime(2026, 2, 1, tzinfo=UTC)) == [
+        "202511", "202512", "202601", "202602"]
+
+
+class TestEventTypeIndex:
+    @pytest.mark.asyncio
+    async def test_reads_events_of_a_type_across_logs(self, factory, store, local):
+        await open_accounts(factory, Account, ["a", "b", "c", "d"])
+
+        opened = [(log_id, event) async for log_id, event in store.iter_events_by_type([Opened])]
+
+        assert [(log_id, event.name) for log_id, event in opened] == [("a", "a"), ("b", "b"), ("c", "c"), ("d", "d")]
+        assert all(event.aggregate_type == aggregate_type_name(Account) for _, event in opened)
+        assert "Scan" not in local.request_counts
+
+    @pytest.mark.asyncio
+    async def test_merges_several_types_in_event_id_order(self, factory, store):
+        await open_accounts(factory, Account, ["a", "b"])
+
+        events = [event async for _, event in store.iter_events_by_type([Deposited, Opened])]
+
+        assert sorted(type(event).__name__ for event in events) == ["Deposited"] * 4 + ["Opened"] * 2
+        assert [event.event_id for event in events] == sorted(event.event_id for event in events)
+
+    @pytest.mark.asyncio
+    async def test_time_range_spans_buckets(self, store):
+        times = [datetime(2025, 12, 31, 23, tzinfo=UTC), datetime(2026, 1, 15, tzinfo=UTC),
+                 datetime(2026, 2, 1, tzinfo=UTC)]
+        for n, applied_time in enumerate(times):
+            event = stamped(Opened(f"account-{n}"), f"{applied_time:%Y%m%d%H%M%S}000_Opened", applied_time)
+            await store.apply(f"account-{n}", event, None)
+
+        everything = [event.name async for _, event in store.iter_events_by_type([Opened])]
+        january_on = [event.name async for _, event in store.iter_events_by_type(
+            [Opened], start=datetime(2026, 1, 1, tzinfo=UTC), end=datetime(2026, 2, 1, tzinfo=UTC))]
+
+        assert everything == ["account-0", "account-1", "account-2"]
+        assert january_on == ["account-1"]
+
+    @pytest.mark.asyncio
+    async def test_control_items_are_not_indexed(self, factory, store, local):
+        await open_accounts(factory, Account, ["a"])
+        await store.save_snapshot(Snapshot("a", "x", {}, datetime.now(UTC), version=3))
+
+        indexed = [item for item in local.items(TABLE) if "type_bucket" in item]
+
+        assert len(indexed) == 3 and all(not item["SK"]["S"].startswith("#") for item in indexed)
+
+    @pytest.mark.asyncio
+    async def test_archived_events_leave_the_index(self, factory, store):
+        await open_accounts(factory, Account, ["a", "b"])
+        await store.save_snapshot(Snapshot("a", (await store.get_log("a"))[-1].event_id, {}, datetime.now(UTC),
+                                           version=3))
+
+        await store.archive_log("a")
+
+        assert [log_id async for log_id, _ in store.iter_events_by_type([Opened])] == ["b"]
+
+
+class TestAggregateTypeIndex:
+    @pytest.mark.asyncio
+    async def test_reads_the_events_of_one_aggregate_type(self, factory, store):
+        await open_accounts(factory, Account, ["a"])
+        await open_accounts(factory, Wallet, ["w"])
+
+        by_class = [(log_id, type(event).__name__) async for log_id, event in
+                    store.iter_events_by_aggregate_type(Wallet)]
+        by_name = [log_id async for log_id, _ in store.iter_events_by_aggregate_type(aggregate_type_name(Account))]
+
+        assert sorted(by_class) == [("w", "Deposited"), ("w", "Deposited"), ("w", "Opened")]
+        assert by_name == ["a", "a", "a"]
+
+    @pytest.mark.asyncio
+    async def test_events_applied_outside_an_aggregate_have_no_aggregate_key(self, store, local):
+        await store.apply("a", stamped(Opened("a"), "20260101000000000_Opened", datetime(2026, 1, 1, tzinfo=UTC)), None)
+
+        assert [item for item in local.items(TABLE) if "aggregate_bucket" in item] == []
+        assert [log_id async for log_id, _ in store.iter_events_by_type([Opened])] == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_stores_without_the_index_refuse_index_queries(local):
+    store = DynamodbEventStore(TABLE, "local", client=local.client())
+
+    with pytest.raises(UnsupportedOperation):
+        [event async for event in store.iter_events_by_type([Opened])]
@@ -0,0 +1,37 @@
+import pytest
+
+from sh_dendrite.event import Event
+from sh_dendrite.event_store import EventStore
+
+
+class RecordingEventStore(EventStore):
+    def __init__(self):
+        self.applied = []
+
+    async def apply(self, log_id, event, consistency_tag):
+        self.applied.append((log_id, event.event_id, consistency_tag))
+
+    async def get_log(self, log_id):
+        return []
+
+    async def get_log_from(self, log_id, starting_point):
+        return []
+
+
+def event(event_id: str) -> Event:
+    e = Event()
+    e.event_id = event_id
+    return e
+
+
+class TestApplyManyDefault:
+    @pytest.mark.asyncio
+    async def test_applies_in_order_chaining_consistency_tags(self):
+        store = RecordingEventStore()
+
+        await store.apply_many("log-1", [event("e1"), event("e2")], "e0")
+
+        assert store.applied == [("log-1", "e1", "e0"), ("log-1", "e2", "e1")]
+
+    def test_is_not_atomic(self):
+        assert RecordingEventStore.max_batch_events is None
@@ -0,0 +1,34 @@
+import pytest
+
+from sh_dendrite.dynamodb_event_store import ConcurrencyMode, DynamodbEventStore
+from sh_dendrite.event_store_contract import EventStoreContract, PerformanceContract
+from sh_dendrite.in_memory_event_store import InMemoryEventStore
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+from sh_dendrite.single_log_event_store import SingleLogEventStore
+
+TABLE = "sh-event-store"
+
+
+class TestInMemoryEventStore(EventStoreContract):
+    performance_contracts = (
+        PerformanceContract(log_size=1_000, append_per_second=5_000, replay_per_second=100_000),
+        PerformanceContract(log_size=10_000, append_per_second=5_000, replay_per_second=100_000),
+    )
+
+    @pytest.fixture
+    def event_store(self):
+        return InMemoryEventStore()
+
+
+class TestSingleLogEventStore(EventStoreContract):
+    @pytest.fixture
+    def event_store(self):
+        return SingleLogEventStore()
+
+
+class TestDynamodbEventStore(EventStoreContract):
+    @pytest.fixture(params=list(ConcurrencyMode))
+    def event_store(self, request):
+        local = LocalDynamoDB()
+        local.create_table(TABLE)
+        return DynamodbEventStore(TABLE, "local", client=local.client(), concurrency_mode=request.param)
@@ -0,0 +1,233 @@
+import random
+from dataclasses import dataclass
+from datetime import datetime, UTC
+
+import pytest
+
+from sh_dendrite.archive import InMemoryArchive
+from sh_dendrite.dynamodb_event_store import DynamodbEventStore, EVENT_INDEXES
+from sh_dendrite.event import Event
+from sh_dendrite.indexed_projection import ColumnTable, IndexedProjection, _SortedIndex
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+from sh_dendrite.snapshot import Snapshot
+
+TABLE = "sh-event-store"
+
+
+@dataclass
+class Row:
+    ledger_id: str
+    balance: float | None
+    family_id: str | None = None
+    count: int = 0
+
+
+@dataclass
+class Opened(Event):
+    ledger_id: str
+    balance: float
+    family_id: str | None = None
+
+
+@dataclass
+class Moved(Event):
+    ledger_id: str
+    balance: float
+
+
+class Balances(IndexedProjection[Row]):
+    def __init__(self):
+        super().__init__(ColumnTable(Row, key="ledger_id", sorted=["balance"], hashed=["family_id"]))
+
+    def project(self, event: Event) -> None:
+        match event:
+            case Opened():
+                self.table.upsert(Row(event.ledger_id, event.balance, event.family_id), version=event.version)
+            case Moved():
+                self.table.update(event.ledger_id, version=event.version, balance=event.balance)
+
+
+def table() -> ColumnTable[Row]:
+    return ColumnTable(Row, key="ledger_id", sorted=["balance", "family_id"], hashed=["family_id"])
+
+
+def versioned(event: Event, version: int) -> Event:
+    event.version = version
+    return event
+
+
+class TestColumnTable:
+    def test_reads_rows_back_as_their_type(self):
+        rows = table()
+        rows.upsert(Row("a", 10.0, "f", 3))
+        rows.upsert(Row("b", None))
+
+        assert rows.get("a") == Row("a", 10.0, "f", 3)
+        assert rows.get("b") == Row("b", None, None, 0)
+        assert rows.get("c") is None
+        assert len(rows) == 2 and "a" in rows
+
+    def test_range_and_top_k_follow_the_sorted_index(self):
+        rows = table()
+        balances = list(range(-5, 15))
+        random.Random(7).shuffle(balances)
+        for balance in balances:
+            rows.upsert(Row(f"ledger-{balance}", float(balance)))
+
+        assert [row.balance for row in rows.top("balance", 3)] == [14.0, 13.0, 12.0]
+        assert [row.balance for row in rows.bottom("balance", 2)] == [-5.0, -4.0]
+        assert [row.balance for row in rows.range("balance", high=0.0)] == [-5.0, -4.0, -3.0, -2.0, -1.0]
+        assert [row.balance for row in rows.range("balance", 2.0, 4.0, descending=True)] == [3.0, 2.0]
+        assert rows.count_range("balance", low=10.0) == 5
+
+    def test_updates_move_rows_within_the_indexes(self):
+        rows = table()
+        for n in range(5):
+            rows.upsert(Row(f"ledger-{n}", 1.0, "f"))
+
+        rows.update("ledger-2", balance=100.0, family_id="g")
+        rows.update("ledger-3", balance=None)
+
+        assert [row.ledger_id for row in rows.top("balance", 2)] == ["ledger-2", "ledger-4"]
+        assert rows.count_range("balance") == 4
+        assert [row.ledger_id for row in rows.where("family_id", "g")] == ["ledger-2"]
+        assert [row.ledger_id for row in rows.range("family_id", "f", "g")] == [
+            "ledger-0", "ledger-1", "ledger-3", "ledger-4"]
+
+    def test_equal_values_keep_every_row(self):
+        rows = table()
+        for n in range(4):
+            rows.upsert(Row(f"ledger-{n}", 5.0))
+
+        rows.update("ledger-1", balance=6.0)
+
+        assert [row.ledger_id for row in rows.range("balance", 5.0, 5.5)] == ["ledger-0", "ledger-2", "ledger-3"]
+
+    def test_random_writes_agree_with_a_sort(self, monkeypatch):
+        monkeypatch.setattr(_SortedIndex, "CHUNK_SIZE", 4)     # so that chunks split and empty often
+        rng = random.Random(3)
+        rows = table()
+        expected: dict[str, float] = {}
+        for _ in range(2000):
+            key = f"ledger-{rng.randrange(200)}"
+            if rng.random() < 0.2:
+                rows.delete(key)
+                expected.pop(key, None)
+            else:
+                balance = float(rng.randrange(-20, 20))
+                rows.upsert(Row(key, balance))
+                expected[key] = balance
+
+        ordered = sorted((balance, rows._rows[key]) for key, balance in expected.items())
+        assert [(row.balance, rows._rows[row.ledger_id]) for row in rows.range("balance")] == ordered
+        assert [row.balance for row in rows.range("balance", -5.0, 5.0, descending=True)] == sorted(
+            (balance for balance in expected.values() if -5 <= balance < 5), reverse=True)
+        assert rows.count_range("balance", -5.0, 5.0) == sum(-5 <= balance < 5 for balance in expected.values())
+
+    def test_sums_per_group(self):
+        rows = table()
+        rows.upsert(Row("a", 10.0, "f"))
+        rows.upsert(Row("b", 2.5, "f"))
+        rows.upsert(Row("c", None, "f"))
+        rows.upsert(Row("d", 7.0, "g"))
+
+        assert rows.sum_by("family_id", "balance") == {"f": 12.5, "g": 7.0}
+
+    def test_older_versions_are_ignored(self):
+        rows = table()
+        rows.upsert(Row("a", 10.0), version=3)
+
+        assert not rows.upsert(Row("a", 1.0), version=2)
+        assert not rows.update("a", version=3, balance=1.0)
+        assert rows.update("a", version=4, balance=20.0)
+        assert not rows.update("missing", balance=1.0)
+        assert (rows.get("a").balance, rows.version("a")) == (20.0, 4)
+
+    def test_deleted_rows_leave_the_indexes_and_are_reused(self):
+        rows = table()
+        rows.upsert(Row("a", 10.0, "f"))
+        rows.upsert(Row("b", 20.0, "f"))
+
+        assert rows.delete("a")
+        rows.upsert(Row("c", 30.0, "g"))
+
+        assert [row.ledger_id for row in rows.top("balance", 5)] == ["c", "b"]
+        assert rows.where("family_id", "f") == [Row("b", 20.0, "f")]
+        assert rows.where("family_id", None) == []
+        assert len(rows._keys) == 2
+
+    def test_rejects_queries_on_unindexed_columns(self):
+        rows = table()
+
+        with pytest.raises(ValueError):
+            rows.top("count", 1)
+        with pytest.raises(ValueError):
+            rows.where("balance", 1.0)
+        with pytest.raises(ValueError):
+            rows.update("a", nope=1)
+
+    def test_accounts_for_its_memory(self):
+        rows = table()
+        empty = rows.memory_usage()["total"]
+        for n in range(1000):
+            rows.upsert(Row(f"ledger-{n}", float(n), f"family-{n % 10}"))
+
+        usage = rows.memory_usage()
+
+        assert usage["total"] > empty
+        assert usage["total"] == sum(value for name, value in usage.items() if name != "total")
+        # 8 bytes a balance, plus array overhead
+        assert 8000 <= usage["column:balance"] < 12000
+
+
+class TestIndexedProjection:
+    @pytest.mark.asyncio
+    async def test_projects_dispatched_events_and_ignores_replays(self):
+        projection = Balances()
+        events = [versioned(Opened("a", 10.0, "f"), 1), versioned(Moved("a", 15.0), 2)]
+
+        projection.handle_event(events)
+        projection.handle_event(events[:1])
+
+        assert projection.table.get("a") == Row("a", 15.0, "f")
+
+    async def seeded_store(self, archive: InMemoryArchive | None = None) -> DynamodbEventStore:
+        local = LocalDynamoDB(page_size=3)
+        local.create_table(TABLE, indexes=EVENT_INDEXES)
+        store = DynamodbEventStore(TABLE, "local", client=local.client(), archive=archive, index_events=True)
+        for n in range(5):
+            events = [Opened(f"ledger-{n}", 0.0, f"f{n % 2}"), Moved(f"ledger-{n}", n * 10.0)]
+            for version, event in enumerate(events, start=1):
+                event.event_id = f"2026010{version}00000000{n}_{event.event_name}"
+                event.applied_time = datetime(2026, 1, version, tzinfo=UTC)
+                versioned(event, version)
+            await store.apply_many(f"ledger-{n}", events, None)
+        return store
+
+    @pytest.mark.asyncio
+    async def test_rebuilds_from_the_event_type_index(self):
+        store = await self.seeded_store()
+
+        projection = Balances()
+        projection.table.upsert(Row("stale", 1.0))
+        count = await projection.rebuild_from(store, [Opened, Moved])
+
+        assert count == 10
+        assert [row.balance for row in projection.table.top("balance", 2)] == [40.0, 30.0]
+        assert projection.table.sum_by("family_id", "balance") == {"f0": 60.0, "f1": 40.0}
+        assert "stale" not in projection.table
+
+    @pytest.mark.asyncio
+    async def test_rebuilds_archived_logs_from_the_logs(self):
+        store = await self.seeded_store(archive=InMemoryArchive())
+        first_event = (await store.get_log("ledger-3"))[0]
+        await store.save_snapshot(Snapshot("ledger-3", first_event.event_id, {}, version=1))
+        await store.archive_log("ledger-3")
+
+        projection = Balances()
+        with pytest.raises(ValueError):
+            await projection.rebuild_from(store, [Opened, Moved])
+        count = await projection.rebuild_from(store, [Opened, Moved], log_ids=[f"ledger-{n}" for n in range(5)])
+
+        assert count == 10
+        assert projection.table.get("ledger-3") == Row("ledger-3", 30.0, "f1")
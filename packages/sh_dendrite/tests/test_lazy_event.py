@@ -0,0 +1,111 @@
+from dataclasses import dataclass
+from datetime import datetime, UTC
+
+import pytest
+
+from sh_dendrite.aggregate import Aggregate
+from sh_dendrite.aggregate_factory import AggregateFactory
+from sh_dendrite.dynamodb_event_store import DynamodbEventStore, event_to_item, item_to_event, item_to_lazy_event
+from sh_dendrite.event import Event, _registry
+from sh_dendrite.lazy_event import is_lazy, lazy_reads, materialize
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+
+
+@dataclass
+class Paid(Event):
+    amount: float
+    memo: str = "none"
+
+
+class Till(Aggregate):
+    def __init__(self, log_id, event_store, event_handlers):
+        super().__init__(log_id, event_store, event_handlers)
+        self.total = 0.0
+        self.seen: list[Event] = []
+
+    def on(self, event: Event) -> None:
+        match event:
+            case Paid():
+                self.total += event.amount
+        self.seen.append(event)
+
+
+def stored(amount: float, n: int = 1) -> dict:
+    event = Paid(amount, memo="rent")
+    event.event_id = f"{n:03d}_Paid"
+    event.applied_time = datetime(2026, 1, 1, tzinfo=UTC)
+    event.version = n
+    return event_to_item("log-1", event)
+
+
+class TestLazyEvent:
+    def test_is_an_instance_of_the_event_class(self):
+        event = item_to_lazy_event(stored(5.0))
+
+        assert isinstance(event, Paid)
+        assert event.event_name == "Paid"
+        assert type(event).__name__ == "Paid"
+        assert _registry[f"{Paid.__module__}.Paid"] is Paid
+
+    def test_decodes_fields_on_first_read(self):
+        event = item_to_lazy_event(stored(5.0, n=7))
+
+        assert "amount" not in event.__dict__
+        assert event.amount == 5.0
+        assert event.__dict__["amount"] == 5.0
+        assert "applied_time" not in event.__dict__
+        assert event.applied_time == datetime(2026, 1, 1, tzinfo=UTC)
+        assert event.version == 7
+
+    def test_missing_fields_read_as_their_defaults(self):
+        item = stored(5.0)
+        del item["memo"]
+
+        assert item_to_lazy_event(item).memo == "none"
+
+    def test_materialize_returns_the_eagerly_built_event(self):
+        item = stored(5.0)
+        lazy = item_to_lazy_event(item)
+        lazy.version = 9
+
+        real = materialize(lazy)
+
+        assert not is_lazy(real) and type(real) is Paid
+        expected = item_to_event(item)
+        expected.version = 9
+        assert real == expected
+        assert materialize(real) is real
+
+
+class TestLazyReplay:
+    @pytest.fixture
+    def store(self):
+        local = LocalDynamoDB()
+        local.create_table("events")
+        return DynamodbEventStore("events", "local", client=local.client())
+
+    @pytest.mark.asyncio
+    async def test_store_reads_are_lazy_only_when_asked(self, store):
+        await store.apply("log-1", item_to_event(stored(5.0)), None)
+
+        with lazy_reads():
+            lazy = await store.get_log("log-1")
+        eager = await store.get_log("log-1")
+
+        assert is_lazy(lazy[0])
+        assert not is_lazy(eager[0])
+
+    @pytest.mark.asyncio
+    async def test_factory_replays_through_lazy_events(self, store):
+        previous = None
+        for n in range(1, 4):
+            event = item_to_event(stored(float(n), n))
+            await store.apply("log-1", event, previous)
+            previous = event.event_id
+
+        till = await AggregateFactory(store, lambda: "log-1", {}).load(Till, "log-1")
+
+        assert till.total == 6.0
+        assert till.version == 3
+        assert till.last_event_name == "003_Paid"
+        assert all(is_lazy(event) for event in till.seen)
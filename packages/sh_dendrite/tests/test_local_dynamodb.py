@@ -0,0 +1,198 @@
+import pytest
+from aiodynamo.errors import ConditionalCheckFailed, TableNotFound, TransactionCanceled
+from aiodynamo.expressions import F
+from aiodynamo.models import BatchGetRequest, BatchWriteRequest
+from aiodynamo.operations import Put, Update
+
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+
+TABLE = "events"
+
+
+@pytest.fixture
+def local():
+    local = LocalDynamoDB(page_size=10)
+    local.create_table(TABLE)
+    return local
+
+
+@pytest.fixture
+def client(local):
+    return local.client()
+
+
+async def put_log(client, log_id, count):
+    for i in range(count):
+        await client.put_item(TABLE, {"PK": log_id, "SK": f"{i:04d}", "n": i})
+
+
+class TestItems:
+    @pytest.mark.asyncio
+    async def test_put_and_get(self, client):
+        await client.put_item(TABLE, {"PK": "a", "SK": "1", "value": 1.5, "kids": ["Amy", "Bob"]})
+
+        item = await client.get_item(TABLE, {"PK": "a", "SK": "1"})
+
+        assert item == {"PK": "a", "SK": "1", "value": 1.5, "kids": ["Amy", "Bob"]}
+
+    @pytest.mark.asyncio
+    async def test_unknown_table(self, client):
+        with pytest.raises(TableNotFound):
+            await client.put_item("missing", {"PK": "a", "SK": "1"})
+
+    @pytest.mark.asyncio
+    async def test_put_condition_attribute_not_exists(self, client):
+        condition = F("PK").does_not_exist()
+        await client.put_item(TABLE, {"PK": "a", "SK": "1"}, condition=condition)
+
+        with pytest.raises(ConditionalCheckFailed):
+            await client.put_item(TABLE, {"PK": "a", "SK": "1"}, condition=condition)
+
+    @pytest.mark.asyncio
+    async def test_update_with_condition(self, client):
+        key = {"PK": "a", "SK": "meta"}
+        await client.put_item(TABLE, {**key, "last": "e1", "count": 1})
+
+        await client.update_item(TABLE, key, F("last").set("e2") & F("count").add(2),
+                                 condition=F("last").equals("e1"))
+        with pytest.raises(ConditionalCheckFailed):
+            await client.update_item(TABLE, key, F("last").set("e3"), condition=F("last").equals("e1"))
+
+        assert await client.get_item(TABLE, key) == {**key, "last": "e2", "count": 3}
+
+    @pytest.mark.asyncio
+    async def test_update_change_and_remove(self, client):
+        key = {"PK": "a", "SK": "meta"}
+        await client.put_item(TABLE, {**key, "balance": 10, "temp": "x"})
+
+        await client.update_item(TABLE, key, F("balance").change(-4) & F("temp").remove(),
+                                 condition=F("balance").gte(4))
+
+        assert await client.get_item(TABLE, key) == {**key, "balance": 6}
+
+
+class TestQuery:
+    @pytest.mark.asyncio
+    async def test_returns_partition_in_order_across_pages(self, client, local):
+        await put_log(client, "a", 25)
+        await put_log(client, "b", 3)
+
+        items = [item async for item in client.query(TABLE, F("PK").equals("a"))]
+
+        assert [item["n"] for item in items] == list(range(25))
+        assert local.request_counts["Query"] == 3
+
+    @pytest.mark.asyncio
+    async def test_range_conditions(self, client):
+        await put_log(client, "a", 10)
+
+        gt = [i["n"] async for i in client.query(TABLE, F("PK").equals("a") & F("SK").gt("0006"))]
+        between = [i["n"] async for i in client.query(TABLE, F("PK").equals("a") & F("SK").between("0002", "0004"))]
+        prefix = [i["n"] async for i in client.query(TABLE, F("PK").equals("a") & F("SK").begins_with("000"))]
+
+        assert gt == [7, 8, 9]
+        assert between == [2, 3, 4]
+        assert prefix == list(range(10))
+
+    @pytest.mark.asyncio
+    async def test_reverse_with_limit(self, client):
+        await put_log(client, "a", 10)
+
+        items = [i["n"] async for i in client.query(TABLE, F("PK").equals("a"), scan_forward=False, limit=3)]
+
+        assert items == [9, 8, 7]
+
+    @pytest.mark.asyncio
+    async def test_filter_expression(self, client):
+        await put_log(client, "a", 10)
+
+        items = [i["n"] async for i in client.query(TABLE, F("PK").equals("a"), filter_expression=F("n").gte(8))]
+
+        assert items == [8, 9]
+
+
+class TestBatchesAndTransactions:
+    @pytest.mark.asyncio
+    async def test_batch_write_returns_unprocessed_items(self, client, local):
+        local.max_batch_write_items = 2
+        items = [{"PK": "a", "SK": str(i)} for i in range(5)]
+
+        result = await client.batch_write({TABLE: BatchWriteRequest(items_to_put=items)})
+
+        assert len(result[TABLE].unput_items) == 3
+        assert len(local.items(TABLE)) == 2
+
+    @pytest.mark.asyncio
+    async def test_batch_get(self, client):
+        await put_log(client, "a", 3)
+
+        response = await client.batch_get({TABLE: BatchGetRequest(keys=[{"PK": "a", "SK": "0001"},
+                                                                         {"PK": "a", "SK": "9999"}])})
+
+        assert response.items[TABLE] == [{"PK": "a", "SK": "0001", "n": 1}]
+
+    @pytest.mark.asyncio
+    async def test_transaction_is_all_or_nothing(self, client, local):
+        await client.put_item(TABLE, {"PK": "a", "SK": "meta", "last": "e1"})
+
+        with pytest.raises(TransactionCanceled) as exc_info:
+            await client.transact_write_items([
+                Put(table=TABLE, item={"PK": "a", "SK": "e2"}),
+                Update(table=TABLE, key={"PK": "a", "SK": "meta"}, expression=F("last").set("e2"),
+                       condition=F("last").equals("stale")),
+            ])
+
+        assert exc_info.value.cancellation_reasons[0] is None
+        assert exc_info.value.cancellation_reasons[1].code == "ConditionalCheckFailed"
+        assert len(local.items(TABLE)) == 1
+
+    @pytest.mark.asyncio
+    async def test_parallel_scan_segments_cover_table(self, client):
+        for log_id in "abcdef":
+            await put_log(client, log_id, 3)
+
+        seen = []
+        for segment in range(4):
+            payload = {"TableName": TABLE, "Segment": segment, "TotalSegments": 4}
+            while True:
+                response = await client.send_request(action="Scan", payload=payload)
+                seen.extend(response["Items"])
+                if "LastEvaluatedKey" not in response:
+                    break
+                payload = {**payload, "ExclusiveStartKey": response["LastEvaluatedKey"]}
+
+        assert len(seen) == 18
+
+
+class TestIndexes:
+    @pytest.fixture
+    def local(self):
+        local = LocalDynamoDB(page_size=10)
+        local.create_table(TABLE, indexes={"by_kind": ("kind", "n")})
+        return local
+
+    @pytest.mark.asyncio
+    async def test_query_reads_index_partition_in_order_across_pages(self, client, local):
+        for i in range(45):
+            item = {"PK": f"log-{i % 4}", "SK": f"{i:04d}", "n": i}
+            if i % 3 == 0:
+                item["kind"] = "third"      # the others are left out of the sparse index
+            await client.put_item(TABLE, item)
+
+        items = [i async for i in client.query(TABLE, F("kind").equals("third"), index="by_kind")]
+        later = [i["n"] async for i in client.query(TABLE, F("kind").equals("third") & F("n").gt(35), index="by_kind")]
+
+        assert [i["n"] for i in items] == list(range(0, 45, 3))
+        assert items[1] == {"PK": "log-3", "SK": "0003", "n": 3, "kind": "third"}
+        assert later == [36, 39, 42]
+        assert local.request_counts["Query"] == 3
+
+    @pytest.mark.asyncio
+    async def test_index_follows_updates_and_deletes(self, client):
+        await client.put_item(TABLE, {"PK": "a", "SK": "1", "n": 1, "kind": "x"})
+        await client.put_item(TABLE, {"PK": "b", "SK": "1", "n": 2, "kind": "x"})
+        await client.put_item(TABLE, {"PK": "a", "SK": "1", "n": 1, "kind": "y"})
+        await client.delete_item(TABLE, {"PK": "b", "SK": "1"})
+
+        assert [i async for i in client.query(TABLE, F("kind").equals("x"), index="by_kind")] == []
+        assert [i["PK"] async for i in client.query(TABLE, F("kind").equals("y"), index="by_kind")] == ["a"]
@@ -0,0 +1,178 @@
+import asyncio
+import threading
+from dataclasses import dataclass
+from datetime import datetime, UTC
+
+import pytest
+
+from sh_dendrite.archive import InMemoryArchive
+from sh_dendrite.concurrency_violation_error import ConcurrencyViolationError
+from sh_dendrite.dynamodb_event_store import ConcurrencyMode, DynamodbEventStore, OUTBOX_PARTITION_PREFIX
+from sh_dendrite.event import Event
+from sh_dendrite.event_handler import EventHandler
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+from sh_dendrite.outbox import OutboxRelay
+from sh_dendrite.projector import PartitionedProjector
+from sh_dendrite.snapshot import Snapshot
+
+TABLE = "sh-event-store"
+
+
+@dataclass
+class Deposited(Event):
+    amount: float
+
+
+class RecordingHandler(EventHandler):
+    def __init__(self, failures: int = 0):
+        self.events: list[Event] = []
+        self.failures = failures
+
+    def handle_event(self, events):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("read model unavailable")
+        self.events.extend(events)
+
+
+def stamped(n: int, version: int | None = None) -> Deposited:
+    event = Deposited(float(n))
+    event.event_id = f"{n:03d}_Deposited"
+    event.applied_time = datetime.now(UTC)
+    event.version = version
+    return event
+
+
+def markers(local) -> list[dict]:
+    return [i for i in local.items(TABLE) if i["PK"]["S"].startswith(OUTBOX_PARTITION_PREFIX)]
+
+
+@pytest.fixture
+def local():
+    local = LocalDynamoDB()
+    local.create_table(TABLE)
+    return local
+
+
+@pytest.fixture
+def store(local):
+    return DynamodbEventStore(TABLE, "local", client=local.client(), outbox_shards=4)
+
+
+async def append(store, log_id: str, numbers: list[int], previous: str | None) -> str:
+    events = [stamped(n) for n in numbers]
+    await store.apply_many(log_id, events, previous)
+    return events[-1].event_id
+
+
+class TestOutboxMarkers:
+    @pytest.mark.asyncio
+    async def test_marker_is_written_in_the_append_transaction(self, store, local):
+        await append(store, "log-1", [1, 2, 3], None)
+
+        assert local.request_counts["TransactWriteItems"] == 1
+        [marker] = markers(local)
+        assert marker["SK"] == {"S": "log-1#001_Deposited"}
+        assert marker["last_event"] == {"S": "003_Deposited"}
+        assert store.max_batch_events == 98
+
+    @pytest.mark.asyncio
+    async def test_conflicting_append_leaves_no_marker(self, store, local):
+        await append(store, "log-1", [1], None)
+
+        with pytest.raises(ConcurrencyViolationError):
+            await append(store, "log-1", [2], "stale")
+
+        assert len(markers(local)) == 1
+
+    @pytest.mark.asyncio
+    async def test_version_mode_appends_become_transactions(self, local):
+        store = DynamodbEventStore(TABLE, "local", client=local.client(), outbox_shards=1,
+                                   concurrency_mode=ConcurrencyMode.VERSION)
+
+        await store.apply("log-1", stamped(1, version=1), None)
+
+        assert "PutItem" not in local.request_counts
+        assert len(markers(local)) == 1
+        with pytest.raises(ConcurrencyViolationError):
+            await store.apply("log-1", stamped(9, version=1), None)
+
+
+class TestOutboxRelay:
+    @pytest.mark.asyncio
+    async def test_dispatches_each_log_in_order_and_checkpoints(self, store, local):
+        previous = {}
+        for log_id in ("log-1", "log-2", "log-3"):
+            previous[log_id] = await append(store, log_id, [1, 2], None)
+        for log_id in ("log-1", "log-2", "log-3"):
+            await append(store, log_id, [3], previous[log_id])
+        handler = RecordingHandler()
+        relay = OutboxRelay(store, {Deposited: [handler]})
+
+        assert await relay.relay_once() == 9
+        assert await relay.relay_once() == 0
+
+        assert markers(local) == []
+        for log_id in ("log-1", "log-2", "log-3"):
+            assert [e.amount for e in handler.events if e in await store.get_log(log_id)] == [1.0, 2.0, 3.0]
+
+    @pytest.mark.asyncio
+    async def test_failed_dispatch_is_retried_and_holds_back_later_markers(self, local):
+        store = DynamodbEventStore(TABLE, "local", client=local.client(), outbox_shards=1)
+        last = await append(store, "log-1", [1], None)
+        await append(store, "log-1", [2], last)
+        handler = RecordingHandler(failures=1)
+        relay = OutboxRelay(store, {Deposited: [handler]})
+
+        assert await relay.relay_once() == 0
+        assert len(markers(local)) == 2
+        assert await relay.relay_once() == 2
+        assert [e.amount for e in handler.events] == [1.0, 2.0]
+
+    @pytest.mark.asyncio
+    async def test_keeps_markers_until_projectors_have_projected_them(self, store, local):
+        await append(store, "log-1", [1, 2], None)
+        gate = threading.Event()
+
+        class GatedHandler(RecordingHandler):
+            def handle_event(self, events):
+                gate.wait()
+                super().handle_event(events)
+
+        handler = GatedHandler()
+        projector = PartitionedProjector(handler, key_of=lambda event: "log-1")
+        await projector.start()
+        relaying = asyncio.create_task(OutboxRelay(store, {Deposited: [projector]}).relay_once())
+        await asyncio.sleep(0.05)
+
+        assert not relaying.done() and len(markers(local)) == 1
+        gate.set()
+        assert await relaying == 2
+        assert markers(local) == [] and [e.amount for e in handler.events] == [1.0, 2.0]
+        await projector.stop()
+
+    @pytest.mark.asyncio
+    async def test_reads_events_archived_before_they_were_relayed(self, local):
+        store = DynamodbEventStore(TABLE, "local", client=local.client(), outbox_shards=1,
+                                   archive=InMemoryArchive())
+        await append(store, "log-1", [1, 2], None)
+        await store.save_snapshot(Snapshot("log-1", "002_Deposited", {}))
+        await store.archive_log("log-1")
+        handler = RecordingHandler()
+
+        await OutboxRelay(store, {Deposited: [handler]}).relay_once()
+
+        assert [e.amount for e in handler.events] == [1.0, 2.0]
+
+    @pytest.mark.asyncio
+    async def test_relays_only_its_shards(self, store):
+        await append(store, "log-1", [1], None)
+        shard = store.outbox_shard_of("log-1")
+        handler = RecordingHandler()
+
+        assert await OutboxRelay(store, {Deposited: [handler]}, shards=[(shard + 1) % 4]).relay_once() == 0
+        assert await OutboxRelay(store, {Deposited: [handler]}, shards=[shard]).relay_once() == 1
+
+    def test_requires_an_outbox(self, local):
+        with pytest.raises(ValueError):
+            OutboxRelay(DynamodbEventStore(TABLE, "local", client=local.client()), {})
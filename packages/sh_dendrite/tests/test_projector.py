@@ -0,0 +1,234 @@
+import asyncio
+import threading
+from dataclasses import dataclass
+from datetime import datetime, UTC
+
+import pytest
+import pytest_asyncio
+
+from sh_dendrite.dynamodb_event_store import DynamodbEventStore
+from sh_dendrite.event import Event
+from sh_dendrite.event_handler import EventHandler
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+from sh_dendrite.partitioning import partition_of
+from sh_dendrite.projector import PartitionedProjector
+
+
+@dataclass
+class Posted(Event):
+    ledger_id: str
+    n: int
+
+
+class RecordingHandler(EventHandler):
+    def __init__(self, failures: int = 0):
+        self.batches: list[list[Event]] = []
+        self.threads: set[str] = set()
+        self.failures = failures
+
+    def handle_event(self, events):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database unavailable")
+        self.threads.add(threading.current_thread().name)
+        self.batches.append(list(events))
+
+    def handled(self, ledger_id: str) -> list[int]:
+        return [e.n for batch in self.batches for e in batch if e.ledger_id == ledger_id]
+
+
+def posted(ledger_id: str, count: int) -> list[Posted]:
+    events = []
+    for n in range(count):
+        event = Posted(ledger_id, n)
+        event.event_id = f"{n:06d}_Posted"
+        event.applied_time = datetime.now(UTC)
+        events.append(event)
+    return events
+
+
+@pytest_asyncio.fixture
+async def projector_for():
+    projectors = []
+
+    async def create(handler, **kwargs):
+        projector = PartitionedProjector(handler, key_of=lambda e: e.ledger_id, **kwargs)
+        await projector.start()
+        projectors.append(projector)
+        return projector
+
+    yield create
+    for projector in projectors:
+        await projector.stop()
+
+
+class TestPartitionedProjector:
+    def test_partitions_are_stable(self):
+        assert partition_of("ledger-1", 8) == partition_of("ledger-1", 8)
+        assert len({partition_of(f"ledger-{n}", 8) for n in range(100)}) == 8
+
+    @pytest.mark.asyncio
+    async def test_keeps_per_log_order_across_partitions(self, projector_for):
+        handler = RecordingHandler()
+        projector = await projector_for(handler, partitions=4, max_batch=7)
+        interleaved = [e for group in zip(*(posted(f"ledger-{k}", 50) for k in range(10))) for e in group]
+
+        for event in interleaved:
+            projector.handle_event([event])
+        await projector.drain()
+
+        assert all(handler.handled(f"ledger-{k}") == list(range(50)) for k in range(10))
+        assert max(len(batch) for batch in handler.batches) == 7
+        assert len(handler.batches) < len(interleaved)
+
+    @pytest.mark.asyncio
+    async def test_handler_runs_off_the_event_loop(self, projector_for):
+        handler = RecordingHandler()
+        projector = await projector_for(handler)
+
+        await projector.project(posted("ledger-1", 3))
+
+        assert threading.main_thread().name not in handler.threads
+
+    @pytest.mark.asyncio
+    async def test_retries_failed_batches(self, projector_for):
+        handler = RecordingHandler(failures=2)
+        projector = await projector_for(handler, retry_delay=0.001)
+
+        await projector.project(posted("ledger-1", 5))
+
+        assert handler.handled("ledger-1") == [0, 1, 2, 3, 4]
+        assert projector.failed_attempts == 2 and projector.stalled_partitions == set()
+
+    @pytest.mark.asyncio
+    async def test_a_failing_batch_holds_back_only_its_partition(self, projector_for):
+        class FailingForLedger1(RecordingHandler):
+            failing = True
+
+            def handle_event(self, events):
+                if self.failing and events[0].ledger_id == "ledger-1":
+                    raise ConnectionError("database unavailable")
+                super().handle_event(events)
+
+        handler = FailingForLedger1()
+        projector = await projector_for(handler, partitions=4, retry_delay=0.001, max_retry_delay=0.002)
+        assert partition_of("ledger-1", 4) != partition_of("ledger-2", 4)
+        first = asyncio.create_task(projector.project(posted("ledger-1", 2)))
+
+        await projector.project(posted("ledger-2", 2))
+        await asyncio.sleep(0.02)
+
+        assert handler.handled("ledger-2") == [0, 1] and handler.handled("ledger-1") == []
+        assert not first.done() and projector.stalled_partitions == {partition_of("ledger-1", 4)}
+        handler.failing = False
+        await first
+        assert handler.handled("ledger-1") == [0, 1]
+
+    @pytest.mark.asyncio
+    async def test_dead_letters_a_batch_that_keeps_failing_and_moves_on(self, projector_for):
+        class FailingOnPoison(RecordingHandler):
+            def handle_event(self, events):
+                if any(e.n == 0 for e in events):
+                    raise ValueError("cannot project event 0")
+                super().handle_event(events)
+
+        handler, dead_letter = FailingOnPoison(), RecordingHandler()
+        projector = await projector_for(handler, retry_delay=0.001, max_attempts=3, dead_letter=dead_letter)
+
+        await projector.project(posted("ledger-1", 1))
+        await projector.project(posted("ledger-1", 3)[1:])
+
+        assert dead_letter.handled("ledger-1") == [0] and handler.handled("ledger-1") == [1, 2]
+        assert projector.failed_attempts == 3 and projector.dead_lettered == 1
+        assert projector.stalled_partitions == set()
+
+    @pytest.mark.asyncio
+    async def test_stop_gives_up_on_a_stalled_partition_after_its_timeout(self):
+        projector = PartitionedProjector(RecordingHandler(failures=1000), key_of=lambda e: e.ledger_id,
+                                         retry_delay=0.001)
+        await projector.start()
+        projector.handle_event(posted("ledger-1", 1))
+
+        await projector.stop(timeout=0.05)
+
+        assert not projector.running and projector.failed_attempts > 1
+
+    @pytest.mark.asyncio
+    async def test_projects_from_a_local_event_store(self, projector_for):
+        local = LocalDynamoDB(page_size=3)
+        local.create_table("events")
+        store = DynamodbEventStore("events", "local", client=local.client())
+        previous = None
+        for event in posted("ledger-1", 10):
+            await store.apply("ledger-1", event, previous)
+            previous = event.event_id
+        handler = RecordingHandler()
+        projector = await projector_for(handler, partitions=2)
+
+        count = await projector.project(event async for _, event in store.iter_log("ledger-1"))
+
+        assert count == 10
+        assert handler.handled("ledger-1") == list(range(10))
+
+    @pytest.mark.asyncio
+    async def test_stop_handles_queued_events(self):
+        handler = RecordingHandler()
+        projector = PartitionedProjector(handler, key_of=lambda e: e.ledger_id)
+        await projector.start()
+
+        projector.handle_event(posted("ledger-1", 20))
+        await projector.stop()
+
+        assert handler.handled("ledger-1") == list(range(20))
+        with pytest.raises(RuntimeError):
+            projector.handle_event(posted("ledger-1", 1))
+
+
+def versioned(events: list[Posted]) -> list[Posted]:
+    for version, event in enumerate(events, start=1):
+        event.version = version
+    return events
+
+
+class TestWaitFor:
+    @pytest.mark.asyncio
+    async def test_returns_once_the_version_is_projected(self, projector_for):
+        projector = await projector_for(RecordingHandler())
+        waiting = asyncio.create_task(projector.wait_for("ledger-1", 3, timeout=5.0))
+        await asyncio.sleep(0)
+
+        projector.handle_event(versioned(posted("ledger-1", 3)))
+
+        assert await waiting
+        assert projector.projected_version("ledger-1") == 3
+        assert await projector.wait_for("ledger-1", 2, timeout=0.0)
+
+    @pytest.mark.asyncio
+    async def test_times_out_while_the_version_is_not_projected(self, projector_for):
+        projector = await projector_for(RecordingHandler())
+        await projector.project(versioned(posted("ledger-1", 2)))
+
+        assert not await projector.wait_for("ledger-1", 3, timeout=0.01)
+        assert not await projector.wait_for("ledger-2", 1, timeout=0.01)
+        assert projector._waiters == {}
+
+    @pytest.mark.asyncio
+    async def test_failed_batches_are_not_counted_as_projected(self, projector_for):
+        projector = await projector_for(RecordingHandler(failures=1000), retry_delay=0.001)
+
+        projector.handle_event(versioned(posted("ledger-1", 2)))
+        await asyncio.sleep(0.02)
+
+        assert projector.projected_version("ledger-1") is None
+        projector.handler.failures = 0
+        await projector.drain()
+        assert projector.projected_version("ledger-1") == 2
+
+    @pytest.mark.asyncio
+    async def test_forgets_the_least_recently_projected_keys(self, projector_for):
+        projector = await projector_for(RecordingHandler(), tracked_keys=2)
+
+        for ledger_id in ("ledger-1", "ledger-2", "ledger-3"):
+            await projector.project(versioned(posted(ledger_id, 1)))
+
+        assert [projector.projected_version(f"ledger-{n}") for n in (1, 2, 3)] == [None, 1, 1]
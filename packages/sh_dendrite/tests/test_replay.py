@@ -0,0 +1,143 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import pytest
+
+from sh_dendrite.aggregate import Aggregate
+from sh_dendrite.aggregate_factory import AggregateFactory
+from sh_dendrite.dynamodb_event_store import DynamodbEventStore
+from sh_dendrite.event import Event
+from sh_dendrite.in_memory_event_store import InMemoryEventStore
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+from sh_dendrite.replay import ReplayExecutor
+
+TABLE = "sh-event-store"
+
+
+@dataclass
+class Added(Event):
+    amount: int
+
+
+class Counter(Aggregate):
+    def __init__(self, log_id, event_store, event_handlers):
+        super().__init__(log_id, event_store, event_handlers)
+        self.total = 0
+        self.amounts: list[int] = []
+        self.workers: set[tuple[int, str]] = set()     # (process, thread) of each fold
+
+    def on(self, event: Event) -> None:
+        self.total += event.amount
+        self.amounts.append(event.amount)
+        self.workers.add((os.getpid(), threading.current_thread().name))
+
+
+class SlowCounter(Counter):
+    """Takes 2ms an event, and counts the replays of its ten-event logs running at once"""
+    expected = 10
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def on(self, event: Event) -> None:
+        super().on(event)
+        if event.version == 1:
+            with SlowCounter.lock:
+                SlowCounter.running += 1
+                SlowCounter.peak = max(SlowCounter.peak, SlowCounter.running)
+        time.sleep(0.002)
+        if event.version == self.expected:
+            with SlowCounter.lock:
+                SlowCounter.running -= 1
+
+
+async def factory_with_logs(store, replay_executor, **logs: int) -> AggregateFactory:
+    factory = AggregateFactory(store, lambda: "unused", {}, replay_executor=replay_executor)
+    for log_id, count in logs.items():
+        counter = await factory.load(Counter, log_id)
+        await counter.apply_many([Added(n) for n in range(1, count + 1)])
+    return factory
+
+
+class TestReplayExecutor:
+    @pytest.mark.asyncio
+    async def test_short_logs_replay_inline(self):
+        replay = ReplayExecutor(threshold=10)
+        factory = await factory_with_logs(InMemoryEventStore(), replay, short=9)
+
+        counter = await factory.load(Counter, "short")
+
+        assert (counter.total, counter.version) == (45, 9)
+        assert counter.workers == {(os.getpid(), threading.current_thread().name)}
+        assert replay.stats()["inline"] >= 1 and replay.offloaded == 0
+
+    @pytest.mark.asyncio
+    async def test_long_logs_replay_in_a_thread(self):
+        replay = ReplayExecutor(threshold=10)
+        factory = await factory_with_logs(InMemoryEventStore(), replay, long=50)
+
+        counter = await factory.load(Counter, "long")
+        replay.shutdown()
+
+        assert (counter.total, counter.version, counter.amounts[-1]) == (1275, 50, 50)
+        [(process, thread)] = counter.workers
+        assert process == os.getpid() and thread.startswith("dendrite-replay")
+        assert counter.event_store is factory.event_store
+        assert replay.offloaded == 1
+        assert replay.loop_blocking > 0
+
+    @pytest.mark.asyncio
+    async def test_the_loop_keeps_running_during_a_long_replay(self):
+        replay = ReplayExecutor(threshold=10)
+        factory = await factory_with_logs(InMemoryEventStore(), replay, long=10)
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.001)
+
+        ticker = asyncio.create_task(tick())
+        await asyncio.sleep(0)
+        await factory.load(SlowCounter, "long")
+        ticker.cancel()
+        replay.shutdown()
+
+        # ten events of 2ms each, during which the loop went on ticking
+        assert ticks > 5
+        assert replay.max_loop_blocking < 0.01
+
+    @pytest.mark.asyncio
+    async def test_limits_concurrent_heavy_replays(self):
+        SlowCounter.peak = 0
+        replay = ReplayExecutor(threshold=10, max_concurrent=1)
+        factory = await factory_with_logs(InMemoryEventStore(), replay, a=10, b=10, c=10)
+
+        loaded = await asyncio.gather(*(factory.load(SlowCounter, log_id) for log_id in "abc"))
+        replay.shutdown()
+
+        assert [counter.total for counter in loaded] == [55, 55, 55]
+        assert SlowCounter.peak == 1
+
+    @pytest.mark.asyncio
+    async def test_replays_lazily_read_events_in_a_process(self):
+        local = LocalDynamoDB()
+        local.create_table(TABLE)
+        store = DynamodbEventStore(TABLE, "local", client=local.client())
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            replay = ReplayExecutor(threshold=10, executor=pool)
+            factory = await factory_with_logs(store, replay, long=30)
+
+            counter = await factory.load(Counter, "long")
+
+        assert (counter.total, counter.version, counter.amounts[:3]) == (465, 30, [1, 2, 3])
+        assert counter.last_event_name == (await store.get_log("long"))[-1].event_id
+        assert [process for process, _ in counter.workers] != [os.getpid()]
+        assert counter.event_store is store and counter.event_handlers == {}
+        assert replay.offloaded == 1
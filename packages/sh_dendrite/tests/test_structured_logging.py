@@ -0,0 +1,129 @@
+import json
+import logging
+import threading
+
+import pytest
+
+from sh_dendrite.structured_logging import (
+    DeferredQueueHandler,
+    JsonFormatter,
+    LogSampler,
+    StructuredFormatter,
+    configure_logging,
+    shutdown_logging,
+)
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+        self.threads = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+        self.threads.append(threading.current_thread())
+
+
+@pytest.fixture
+def restore_root_logger():
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    level = root.level
+    yield
+    shutdown_logging()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def make_record(msg="hello %s", args=("world",), **extra):
+    record = logging.LogRecord("test.logger", logging.INFO, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+class TestLogSampler:
+    def test_every_one_always_samples(self):
+        sampler = LogSampler(every=1)
+        assert all(sampler() for _ in range(10))
+
+    def test_samples_one_in_n(self):
+        sampler = LogSampler(every=10)
+        results = [sampler() for _ in range(100)]
+        assert results.count(True) == 10
+        assert results[9] is True
+
+    def test_rejects_invalid_rate(self):
+        with pytest.raises(ValueError):
+            LogSampler(every=0)
+
+
+class TestFormatters:
+    def test_structured_formatter_appends_extra_fields(self):
+        formatter = StructuredFormatter("%(message)s")
+        line = formatter.format(make_record(log_id="log-1", event_count=3))
+        assert line == "hello world log_id=log-1 event_count=3"
+
+    def test_structured_formatter_without_extras(self):
+        formatter = StructuredFormatter("%(message)s")
+        assert formatter.format(make_record()) == "hello world"
+
+    def test_json_formatter_includes_extra_fields(self):
+        entry = json.loads(JsonFormatter().format(make_record(log_id="log-1")))
+        assert entry["message"] == "hello world"
+        assert entry["level"] == "INFO"
+        assert entry["logger"] == "test.logger"
+        assert entry["log_id"] == "log-1"
+
+
+class TestDeferredQueueHandler:
+    def test_prepare_does_not_format(self):
+        handler = DeferredQueueHandler(None)
+        record = make_record()
+        prepared = handler.prepare(record)
+        assert prepared.msg == "hello %s"
+        assert prepared.args == ("world",)
+
+
+class TestConfigureLogging:
+    def test_installs_single_queue_handler(self, restore_root_logger):
+        configure_logging(handlers=[RecordingHandler()])
+        root = logging.getLogger()
+        assert len(root.handlers) == 1
+        assert isinstance(root.handlers[0], DeferredQueueHandler)
+
+    def test_records_are_formatted_on_listener_thread(self, restore_root_logger):
+        recorder = RecordingHandler()
+        recorder.setFormatter(StructuredFormatter("%(levelname)s %(message)s"))
+        configure_logging(level=logging.DEBUG, handlers=[recorder])
+
+        logging.getLogger("sh_dendrite.test").debug("read %d events", 5, extra={"log_id": "log-1"})
+        shutdown_logging()
+
+        assert recorder.lines == ["DEBUG read 5 events log_id=log-1"]
+        assert recorder.threads[0] is not threading.current_thread()
+
+    def test_level_filters_records(self, restore_root_logger):
+        recorder = RecordingHandler()
+        configure_logging(level=logging.WARNING, handlers=[recorder])
+
+        logging.getLogger("sh_dendrite.test").info("dropped")
+        logging.getLogger("sh_dendrite.test").warning("kept")
+        shutdown_logging()
+
+        assert recorder.lines == ["kept"]
+
+    def test_reconfigure_replaces_listener(self, restore_root_logger):
+        first = RecordingHandler()
+        second = RecordingHandler()
+        configure_logging(handlers=[first])
+        configure_logging(handlers=[second])
+
+        logging.getLogger("sh_dendrite.test").warning("message")
+        shutdown_logging()
+
+        assert first.lines == []
+        assert second.lines == ["message"]
@@ -0,0 +1,224 @@
+import asyncio
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, UTC
+
+import pytest
+from aiodynamo.errors import InternalDynamoError, ProvisionedThroughputExceeded
+from aiodynamo.expressions import F
+
+from sh_dendrite.aggregate import Aggregate
+from sh_dendrite.dynamodb_event_store import DynamodbEventStore
+from sh_dendrite.event import Event
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+from sh_dendrite.throttle import AdaptiveRateLimiter, AdaptiveThrottle, ThrottledError
+
+TABLE = "sh-event-store"
+
+
+@dataclass
+class Ticked(Event):
+    count: int
+
+
+class Counter(Aggregate):
+    def on(self, event: Event) -> None:
+        pass
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def limiter(**options) -> AdaptiveRateLimiter:
+    return AdaptiveRateLimiter("write", clock=FakeClock(), **options)
+
+
+class TestAdaptiveRateLimiter:
+    @pytest.mark.asyncio
+    async def test_a_throttle_cuts_the_rate_once_for_the_requests_paced_before_it(self):
+        rate_limiter = limiter(rate=1000.0)
+        first = await rate_limiter.acquire()
+        second = await rate_limiter.acquire()
+
+        rate_limiter.on_throttle(first)
+        rate_limiter.on_throttle(second)
+        assert rate_limiter.rate == pytest.approx(700.0)
+
+        rate_limiter.on_throttle(await rate_limiter.acquire())
+        assert rate_limiter.rate == pytest.approx(490.0)
+        assert rate_limiter.stats()["throttled"] == 3
+
+    @pytest.mark.asyncio
+    async def test_the_rate_does_not_fall_below_the_minimum(self):
+        rate_limiter = limiter(rate=1000.0, min_rate=800.0)
+
+        rate_limiter.on_throttle(await rate_limiter.acquire())
+
+        assert rate_limiter.rate == 800.0
+
+    @pytest.mark.asyncio
+    async def test_successes_raise_the_rate_only_while_requests_queue(self):
+        rate_limiter = limiter(rate=1000.0, burst=0.002)
+
+        rate_limiter.on_success(await rate_limiter.acquire())
+        assert rate_limiter.rate == 1000.0
+
+        for _ in range(2):
+            ticket = await rate_limiter.acquire()
+        rate_limiter.on_success(ticket)
+        assert rate_limiter.rate == pytest.approx(1000.01)
+
+    @pytest.mark.asyncio
+    async def test_requests_that_would_wait_too_long_are_shed(self):
+        rate_limiter = limiter(rate=10.0, max_wait=0.05)
+        await rate_limiter.acquire()
+
+        with pytest.raises(ThrottledError) as e:
+            await rate_limiter.acquire()
+
+        assert e.value.operation_class == "write" and e.value.wait == pytest.approx(0.1)
+        assert rate_limiter.stats()["shed"] == 1
+        assert rate_limiter.stats()["admitted"] == 1
+
+    @pytest.mark.asyncio
+    async def test_retry_after_pauses_admission(self):
+        rate_limiter = limiter(rate=1000.0)
+
+        rate_limiter.on_throttle(await rate_limiter.acquire(), retry_after=5.0)
+
+        with pytest.raises(ThrottledError) as e:
+            await rate_limiter.acquire()
+        assert e.value.wait == pytest.approx(5.0)
+
+        rate_limiter.clock.now = 5.0
+        await rate_limiter.acquire()
+
+
+@pytest.fixture
+def local():
+    local = LocalDynamoDB(write_capacity=500.0)
+    local.create_table(TABLE)
+    return local
+
+
+def throttled_store(local, **options) -> DynamodbEventStore:
+    return DynamodbEventStore(TABLE, "local", client=local.client(), throttle=AdaptiveThrottle(**options))
+
+
+class TestThrottledEventStore:
+    @pytest.mark.asyncio
+    async def test_throttled_requests_are_retried(self, local):
+        store = throttled_store(local)
+        counter = Counter("a", store, {})
+
+        local.throttle_next(2)
+        await counter.apply(Ticked(1))
+
+        assert [event.count for event in await store.get_log("a")] == [1]
+        assert local.throttled_requests == 2
+        assert store.throttle.stats()["write"]["throttled"] == 2
+        assert store.throttle.stats()["write"]["rate"] < 200.0
+
+    @pytest.mark.asyncio
+    async def test_retries_are_bounded(self, local):
+        store = throttled_store(local, max_attempts=2)
+
+        local.throttle_next(2)
+        with pytest.raises(ProvisionedThroughputExceeded):
+            await Counter("a", store, {}).apply(Ticked(1))
+
+        assert await store.get_log("a") == []
+
+    @pytest.mark.asyncio
+    async def test_reads_the_store_does_not_pace_are_still_retried(self, local):
+        store = throttled_store(local)
+        await Counter("a", store, {}).apply_many([Ticked(n) for n in range(3)])
+
+        local.throttle_next(1)
+        assert [event.count async for _, event in store.iter_log("a")] == [0, 1, 2]
+        local.throttle_next(1)
+        assert len(await store.get_log_from("a", datetime(2025, 1, 1, tzinfo=UTC), include_archived=True)) == 3
+
+    @pytest.mark.asyncio
+    async def test_a_throttled_page_is_retried_alone(self):
+        local = LocalDynamoDB(page_size=2)
+        local.create_table(TABLE)
+        store = throttled_store(local)
+        await Counter("a", store, {}).apply_many([Ticked(n) for n in range(5)])
+        pages = []
+
+        async def throttle_the_third_page():
+            # the metadata item makes six items, three pages
+            async for item in store._query(F("PK").equals("a")):
+                pages.append(item)
+                if len(pages) == 4:
+                    local.throttle_next(1)
+        local.request_counts.clear()
+        await throttle_the_third_page()
+
+        assert len(pages) == 6
+        assert local.request_counts["Query"] == 4
+        assert store.throttle.stats()["read"]["throttled"] == 1
+
+    @pytest.mark.asyncio
+    async def test_the_retry_after_of_a_throttled_response_pauses_the_limiter(self):
+        local = LocalDynamoDB(retry_after=0.05)
+        local.create_table(TABLE)
+        store = throttled_store(local)
+
+        local.throttle_next(1)
+        await Counter("a", store, {}).apply(Ticked(1))
+
+        assert store.throttle.stats()["write"]["total_wait"] >= 0.04
+
+    @pytest.mark.asyncio
+    async def test_service_errors_are_retried_without_cutting_the_rate(self, local):
+        store = throttled_store(local)
+        attempts = []
+
+        async def request():
+            attempts.append(len(attempts))
+            if len(attempts) < 3:
+                raise InternalDynamoError()
+            return "done"
+
+        assert await store._request(AdaptiveThrottle.WRITE, request) == "done"
+        assert len(attempts) == 3
+        assert store.throttle.stats()["write"]["throttled"] == 0
+        assert store.throttle.stats()["write"]["rate"] == 200.0
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("throttle", [True, False])
+    async def test_transactions_cancelled_for_capacity_are_retried(self, local, throttle):
+        store = throttled_store(local) if throttle else DynamodbEventStore(TABLE, "local", client=local.client())
+        counter = Counter("a", store, {})
+        await counter.apply(Ticked(1))
+
+        local.throttle_next_transactions(2)
+        await counter.apply(Ticked(2))
+
+        assert [event.count for event in await store.get_log("a")] == [1, 2]
+        assert local.throttled_requests == 2
+        if throttle:
+            assert store.throttle.stats()["write"]["throttled"] == 2
+
+    @pytest.mark.asyncio
+    async def test_the_write_rate_settles_at_the_table_capacity(self, local):
+        store = throttled_store(local, write_rate=2000.0)
+
+        async def tick(times: int) -> None:
+            counter = Counter(str(uuid.uuid4()), store, {})
+            for n in range(times):
+                await counter.apply(Ticked(n))
+
+        await asyncio.gather(*(tick(20) for _ in range(16)))
+
+        stats = store.throttle.stats()["write"]
+        assert stats["shed"] == 0
+        assert local.throttled_requests == stats["throttled"] < 100
+        assert 250.0 < stats["rate"] < 1000.0
@@ -0,0 +1,181 @@
+from dataclasses import dataclass
+from unittest.mock import Mock
+
+import pytest
+
+from sh_dendrite.aggregate import Aggregate
+from sh_dendrite.aggregate_factory import AggregateFactory
+from sh_dendrite.concurrency_violation_error import ConcurrencyViolationError
+from sh_dendrite.dynamodb_event_store import ConcurrencyMode, DynamodbEventStore
+from sh_dendrite.event import Event
+from sh_dendrite.event_handler import EventHandler
+from sh_dendrite.local_dynamodb import LocalDynamoDB
+from sh_dendrite.unit_of_work import UnitOfWork, order_event_ids
+
+TABLE = "sh-event-store"
+
+
+@dataclass
+class Moved(Event):
+    amount: int
+
+
+class Account(Aggregate):
+    def __init__(self, log_id, event_store, event_handlers):
+        super().__init__(log_id, event_store, event_handlers)
+        self.balance = 0
+
+    def on(self, event: Event) -> None:
+        self.balance += event.amount
+
+    async def move(self, amount: int) -> None:
+        if self.balance + amount < 0:
+            raise ValueError("insufficient funds")
+        await self.apply(Moved(amount))
+
+
+@pytest.fixture
+def local():
+    local = LocalDynamoDB()
+    local.create_table(TABLE)
+    return local
+
+
+@pytest.fixture
+def handler():
+    return Mock(spec=EventHandler)
+
+
+@pytest.fixture(params=list(ConcurrencyMode))
+def factory(request, local, handler):
+    store = DynamodbEventStore(TABLE, "local", client=local.client(), concurrency_mode=request.param)
+    return AggregateFactory(store, lambda: "unused", {Moved: [handler]})
+
+
+async def opened(factory, log_id: str, balance: int) -> Account:
+    account = await factory.load(Account, log_id)
+    await account.move(balance)
+    return account
+
+
+async def balances(factory, *log_ids: str) -> list[int]:
+    return [(await factory.load(Account, log_id)).balance for log_id in log_ids]
+
+
+class TestUnitOfWork:
+    @pytest.mark.asyncio
+    async def test_commits_the_events_of_all_aggregates_in_one_transaction(self, factory, local, handler):
+        source, target = await opened(factory, "a", 100), await opened(factory, "b", 0)
+        handler.reset_mock()
+        transactions = local.request_counts.get("TransactWriteItems", 0)
+
+        async with UnitOfWork(factory.event_store) as unit:
+            unit.enlist(source, target)
+            await source.move(-30)
+            await target.move(30)
+            handler.handle_event.assert_not_called()
+
+        assert local.request_counts.get("TransactWriteItems", 0) == transactions + 1
+        assert await balances(factory, "a", "b") == [70, 30]
+        assert [call.args[0][0].amount for call in handler.handle_event.call_args_list] == [-30, 30]
+        assert (source.version, target.version) == (2, 2)
+        assert source.event_store is factory.event_store
+
+    @pytest.mark.asyncio
+    async def test_several_applies_to_one_aggregate_get_distinct_ordered_ids(self, factory):
+        source, target = await opened(factory, "a", 100), await opened(factory, "b", 0)
+
+        async with UnitOfWork(factory.event_store) as unit:
+            unit.enlist(source, target)
+            for _ in range(3):
+                await source.move(-10)
+                await target.move(10)
+
+        log = await factory.event_store.get_log("a")
+        assert [event.amount for event in log] == [100, -10, -10, -10]
+        assert [event.event_id for event in log] == sorted({event.event_id for event in log})
+        assert source.last_event_name == log[-1].event_id
+
+    @pytest.mark.asyncio
+    async def test_a_log_that_moved_on_fails_the_whole_unit(self, factory, handler):
+        source, target = await opened(factory, "a", 100), await opened(factory, "b", 0)
+        await (await factory.load(Account, "b")).move(5)
+        handler.reset_mock()
+
+        unit = UnitOfWork(factory.event_store)
+        unit.enlist(source, target)
+        await source.move(-30)
+        await target.move(30)
+        with pytest.raises(ConcurrencyViolationError):
+            await unit.commit()
+
+        assert await balances(factory, "a", "b") == [100, 5]
+        handler.handle_event.assert_not_called()
+        # rolled back to the state they were enlisted in, and writing to the store again
+        assert (source.balance, source.version, target.balance) == (100, 1, 0)
+        assert source.event_store is factory.event_store
+        await source.move(-1)
+        assert await balances(factory, "a") == [99]
+
+    @pytest.mark.asyncio
+    async def test_an_error_inside_the_unit_discards_its_events(self, factory):
+        source, target = await opened(factory, "a", 100), await opened(factory, "b", 0)
+
+        with pytest.raises(ValueError):
+            async with UnitOfWork(factory.event_store) as unit:
+                unit.enlist(source, target)
+                await target.move(500)
+                await source.move(-500)
+
+        assert await balances(factory, "a", "b") == [100, 0]
+        assert target.balance == 0
+
+    @pytest.mark.asyncio
+    async def test_new_logs_can_be_enlisted(self, factory):
+        source = await opened(factory, "a", 100)
+        target = await factory.load(Account, "new")
+
+        async with UnitOfWork(factory.event_store) as unit:
+            unit.enlist(source, target)
+            await source.move(-40)
+            await target.move(40)
+
+        assert await balances(factory, "a", "new") == [60, 40]
+
+    @pytest.mark.asyncio
+    async def test_refuses_to_enlist_a_log_twice_or_a_read_only_aggregate(self, factory):
+        account = await opened(factory, "a", 100)
+        unit = UnitOfWork(factory.event_store)
+        unit.enlist(account)
+
+        with pytest.raises(ValueError):
+            unit.enlist(await factory.load(Account, "a"))
+        with pytest.raises(ValueError):
+            UnitOfWork(factory.event_store).enlist(account)
+        with pytest.raises(RuntimeError):
+            unit.enlist(await factory.load(Account, "b", read_only=True))
+
+    @pytest.mark.asyncio
+    async def test_units_too_large_for_a_transaction_are_refused(self, factory):
+        accounts = [await factory.load(Account, f"account-{n}") for n in range(3)]
+
+        unit = UnitOfWork(factory.event_store)
+        unit.enlist(*accounts)
+        for account in accounts:
+            await account.apply_many([Moved(1) for _ in range(40)])
+
+        with pytest.raises(ValueError):
+            await unit.commit()
+        assert await factory.event_store.get_log("account-0") == []
+
+
+def test_renumbers_events_that_would_sort_before_the_last_event():
+    previous = "99990101000000000_0000000001_Moved"   # written by a writer whose clock runs ahead
+    events = [Moved(1), Moved(2)]
+    for version, event in enumerate(events, start=2):
+        event.event_id, event.version = f"20260101000000000_{version:010d}_Moved", version
+
+    order_event_ids(events, previous)
+
+    assert events[0].event_id == "99990101000000001_0000000002_Moved"
+    assert previous < events[0].event_id < events[1].event_id